@@ -1,5 +1,6 @@
 from .chat import router as chat_router
 from .health import router as health_router
 from .documents import router as documents_router
+from .admin import router as admin_router
 
-__all__ = ["chat_router", "health_router", "documents_router"]
\ No newline at end of file
+__all__ = ["chat_router", "health_router", "documents_router", "admin_router"]
\ No newline at end of file
@@ -0,0 +1,66 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from typing import Optional
+import hmac
+import logging
+
+from app.core.config import settings
+from app.core.intent_engine import current_snapshot
+from app.services.intent_registry import intent_registry_watcher
+from app.services.faq_catalogue import faq_catalogue
+
+logger = logging.getLogger(__name__)
+
+async def verify_admin_key(x_admin_key: Optional[str] = Header(None)):
+    """Require the X-Admin-Key header; the endpoints are disabled (404) while ADMIN_API_KEY is unset"""
+    if not settings.ADMIN_API_KEY:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Admin endpoints are disabled")
+    if not hmac.compare_digest(x_admin_key or "", settings.ADMIN_API_KEY):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin key")
+
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(verify_admin_key)])
+
+@router.get("/intents", summary="Current intent registry version")
+async def get_intent_registry():
+    """
+    Version of the intent registry this worker is serving.
+    The version is a hash of the file content, so workers serving the same file report the same value.
+    """
+    return current_snapshot().info()
+
+@router.post("/intents/reload", summary="Reload the intent registry")
+async def reload_intent_registry():
+    """
+    Rebuild the intent registry from its file and swap it in atomically.
+    Only the worker handling this request reloads immediately; the others pick
+    the change up through the file watcher.
+    """
+    try:
+        return await intent_registry_watcher.reload()
+    except Exception as e:
+        logger.error(f"Intent registry reload failed: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Intent registry not reloaded, still serving version {current_snapshot().version}: {e}"
+        )
+
+@router.get("/faq", summary="Current FAQ catalogue version")
+async def get_faq_catalogue():
+    """Version (row counts and latest updated_at per FAQ table) of the FAQ catalogue this worker is serving"""
+    return faq_catalogue.info()
+
+@router.post("/faq/reload", summary="Reload the FAQ catalogue")
+async def reload_faq_catalogue():
+    """
+    Reload the FAQ catalogue from the database now, e.g. right after editing FAQs.
+    Only the worker handling this request reloads immediately; the others pick
+    the change up at their next check.
+    """
+    try:
+        snapshot = await faq_catalogue.reload()
+        return snapshot.info()
+    except Exception as e:
+        logger.error(f"FAQ catalogue reload failed: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"FAQ catalogue not reloaded, still serving version {faq_catalogue.info()['version']}: {e}"
+        )
@@ -1,13 +1,24 @@
 from fastapi import APIRouter, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from app.core.admission import UpstreamSaturated, chat_limiter
 from app.models import ChatRequest, ChatResponse, ErrorResponse
 from app.services import chat_service
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
+def _saturated(e: UpstreamSaturated) -> HTTPException:
+    """429 or 503 telling the client when to retry"""
+    return HTTPException(
+        status_code=e.status_code,
+        detail="The service is busy, please try again later",
+        headers={"Retry-After": e.retry_after_header}
+    )
+
 @router.post(
     "/",
     response_model=ChatResponse,
@@ -20,7 +31,8 @@ async def chat(request: ChatRequest):
     Chat endpoint to interact with the AI assistant
     
     - **message**: The user's message to send to the chatbot
-    - **conversation_history**: Optional list of previous messages in the conversation
+    - **conversation_id**: Optional id returned by an earlier response; the server supplies the conversation's recent history
+    - **conversation_history**: Optional list of previous messages in the conversation (overrides the server-side history)
     - **system_prompt**: Optional custom system prompt to modify chatbot behavior
     - **temperature**: Optional creativity parameter (0.0 to 2.0)
     - **max_tokens**: Optional maximum length of the response
@@ -40,6 +52,9 @@ async def chat(request: ChatRequest):
             detail=str(e)
         )
     
+    except UpstreamSaturated as e:
+        raise _saturated(e)
+    
     except Exception as e:
         logger.error(f"Error in chat endpoint: {e}")
         raise HTTPException(
@@ -47,6 +62,49 @@ async def chat(request: ChatRequest):
             detail="An error occurred while processing your request"
         )
 
+@router.post(
+    "/stream",
+    summary="Stream a chat response",
+    description="Send a message to the chatbot and receive the response token by token as Server-Sent Events"
+)
+async def chat_stream(request: ChatRequest):
+    """
+    Streaming chat endpoint (text/event-stream)
+    
+    Emits a `meta` event with the conversation id and model, `delta` events with
+    `{"text": ...}` chunks of the plain-text answer, and a final `done` event
+    (or `error` if generation fails midway, with `status_code` and `retry_after`
+    when the language model was saturated). Answers 429 or 503 with Retry-After
+    when it is saturated before the stream starts.
+    """
+    try:
+        chat_service.validate_request(request)
+        # Once the stream has started its status can no longer change, so refuse up front when saturated
+        chat_limiter.check()
+    except ValueError as e:
+        logger.warning(f"Validation error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except UpstreamSaturated as e:
+        raise _saturated(e)
+    
+    events = chat_service.stream_response(request)
+    
+    async def event_stream():
+        async for event, data in events:
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    
+    # Runs after the response ends, including when the client disconnects mid-stream,
+    # so the stream's upstream slot and connection are released without waiting for garbage collection
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(events.aclose)
+    )
+
 @router.get(
     "/models",
     summary="Get available AI models",
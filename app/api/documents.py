@@ -1,10 +1,12 @@
-from fastapi import APIRouter, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, HTTPException, status, Query
 from pydantic import BaseModel, Field
 from typing import List, Optional
 import logging
 
 from app.repositories.document_repository import document_repository
-from app.services.embedding_service import embedding_service
+from app.repositories.embedding_job_repository import embedding_job_repository
+from app.services.embedding_backfill import embedding_backfill
+from app.services.semantic_cache import semantic_cache
 
 logger = logging.getLogger(__name__)
 
@@ -27,23 +29,22 @@ class DocumentUpdate(BaseModel):
 class BulkDocumentCreate(BaseModel):
     documents: List[DocumentCreate]
 
-# --- Background Tasks ---
+# --- Embedding Jobs ---
 
-async def generate_and_update_embedding(doc_id: int, text: str):
-    """Generate embedding and update the document in the background."""
-    try:
-        embedding = await embedding_service.generate_embedding(text)
-        await document_repository.update_document(doc_id, embedding=embedding)
-        logger.info(f"Successfully generated and updated embedding for document {doc_id}")
-    except Exception as e:
-        logger.error(f"Background task failed for document {doc_id}: {e}")
+async def enqueue_embedding(document_ids: List[int]) -> bool:
+    """Queue embedding jobs for the embedding worker; False if they could not be queued"""
+    jobs = await embedding_job_repository.enqueue(document_ids)
+    if len(jobs) < len(set(document_ids)):
+        logger.warning(f"Embedding jobs not queued for documents {document_ids}; run generate_embeddings.py to backfill them")
+        return False
+    return True
 
 # --- API Endpoints ---
 
 @router.post("/", status_code=status.HTTP_202_ACCEPTED, summary="Create a new document")
-async def create_document(document: DocumentCreate, background_tasks: BackgroundTasks):
+async def create_document(document: DocumentCreate):
     """
-    Create a new document. Embedding generation will run in the background.
+    Create a new document. Its embedding is generated by the embedding worker.
     """
     try:
         doc_id = await document_repository.create_document(
@@ -55,17 +56,17 @@ async def create_document(document: DocumentCreate, background_tasks: Background
         if not doc_id:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to create document")
         
-        background_tasks.add_task(generate_and_update_embedding, doc_id, f"{document.title} {document.content}")
+        queued = await enqueue_embedding([doc_id])
         
-        return {"message": "Document creation accepted. Embedding will be generated in the background.", "document_id": doc_id}
+        return {"message": "Document creation accepted. Embedding will be generated in the background.", "document_id": doc_id, "embedding_queued": queued}
     except Exception as e:
         logger.error(f"Error creating document: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An error occurred while creating the document")
 
 @router.post("/bulk", status_code=status.HTTP_202_ACCEPTED, summary="Create multiple documents")
-async def create_documents_bulk(bulk: BulkDocumentCreate, background_tasks: BackgroundTasks):
+async def create_documents_bulk(bulk: BulkDocumentCreate):
     """
-    Create multiple documents in one request. Embeddings will be generated in the background.
+    Create multiple documents in one request. Their embeddings are generated by the embedding worker.
     """
     created_ids = []
     for doc in bulk.documents:
@@ -78,15 +79,15 @@ async def create_documents_bulk(bulk: BulkDocumentCreate, background_tasks: Back
             )
             if doc_id:
                 created_ids.append(doc_id)
-                background_tasks.add_task(generate_and_update_embedding, doc_id, f"{doc.title} {doc.content}")
         except Exception as e:
             logger.error(f"Error creating document '{doc.title}' in bulk: {e}")
             # Continue with other documents
+    queued = await enqueue_embedding(created_ids) if created_ids else False
     
-    return {"message": f"Accepted {len(created_ids)} documents for creation. Embeddings will be generated in the background.", "document_ids": created_ids}
+    return {"message": f"Accepted {len(created_ids)} documents for creation. Embeddings will be generated in the background.", "document_ids": created_ids, "embedding_queued": queued}
 
 @router.put("/{document_id}", status_code=status.HTTP_202_ACCEPTED, summary="Update a document")
-async def update_document(document_id: int, document: DocumentUpdate, background_tasks: BackgroundTasks):
+async def update_document(document_id: int, document: DocumentUpdate):
     """
     Update an existing document. If content is updated, the embedding will be regenerated in the background.
     """
@@ -103,11 +104,13 @@ async def update_document(document_id: int, document: DocumentUpdate, background
     )
     if not success:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to update document")
+    semantic_cache.invalidate_document(document_id)
     
+    queued = None
     if document.content:
-        background_tasks.add_task(generate_and_update_embedding, document_id, f"{document.title or existing_doc['title']} {document.content}")
+        queued = await enqueue_embedding([document_id])
     
-    return {"message": "Document update accepted. Embedding will be regenerated if content was changed.", "document_id": document_id}
+    return {"message": "Document update accepted. Embedding will be regenerated if content was changed.", "document_id": document_id, "embedding_queued": queued}
 
 @router.delete("/{document_id}", status_code=status.HTTP_200_OK, summary="Delete a document")
 async def delete_document(document_id: int, hard_delete: bool = False):
@@ -117,17 +120,19 @@ async def delete_document(document_id: int, hard_delete: bool = False):
     success = await document_repository.delete_document(document_id, soft_delete=not hard_delete)
     if not success:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Document {document_id} not found")
+    semantic_cache.invalidate_document(document_id)
     
     return {"message": f"Document {document_id} {'permanently deleted' if hard_delete else 'deactivated'}"}
 
 @router.get("/{document_id}", summary="Get a document by ID")
 async def get_document(document_id: int):
     """
-    Retrieve a specific document by its ID.
+    Retrieve a specific document by its ID, with the status of its latest embedding job.
     """
     document = await document_repository.get_document(document_id)
     if not document:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Document {document_id} not found")
+    embedding_job = await embedding_job_repository.get_latest_job(document_id)
     
     return {
         "id": document["id"],
@@ -136,6 +141,7 @@ async def get_document(document_id: int):
         "document_type": document["document_type"],
         "tags": document["tags"],
         "has_embedding": document["content_embedding"] is not None,
+        "embedding_job": embedding_job,
         "created_at": document["created_at"]
     }
 
@@ -164,15 +170,22 @@ async def list_documents(document_type: Optional[str] = None, tag: Optional[str]
     ]
 
 @router.post("/embeddings/regenerate", status_code=status.HTTP_202_ACCEPTED, summary="Regenerate embeddings")
-async def trigger_regenerate_embeddings(background_tasks: BackgroundTasks):
+async def trigger_regenerate_embeddings(
+    mode: str = Query("missing", pattern="^(missing|all)$", description="'missing' embeds documents without an embedding, 'all' re-embeds every document"),
+    resume: bool = Query(True, description="Continue from the checkpoint of an interrupted run")
+):
     """
-    Trigger a background task to regenerate embeddings for all documents that are missing them.
+    Start a batched embedding backfill in the background. Progress is available from GET /documents/embeddings/backfill.
     """
-    # This is a simplified approach. A more robust solution would use a proper job queue.
-    documents = await document_repository.get_documents_without_embeddings()
-    count = 0
-    for doc in documents:
-        background_tasks.add_task(generate_and_update_embedding, doc['id'], f"{doc['title']} {doc['content']}")
-        count += 1
+    if embedding_backfill.running:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="An embedding backfill is already running")
+    embedding_backfill.start(mode=mode, resume=resume)
     
-    return {"message": f"Accepted {count} documents for embedding regeneration in the background."}
\ No newline at end of file
+    return {"message": f"Embedding backfill ({mode}) started in the background.", "progress": embedding_backfill.progress()}
+
+@router.get("/embeddings/backfill", summary="Embedding backfill progress")
+async def get_backfill_progress():
+    """
+    Progress of the current or last embedding backfill: documents embedded and failed, throughput, ETA and checkpoint.
+    """
+    return embedding_backfill.progress()
\ No newline at end of file
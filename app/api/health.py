@@ -1,6 +1,13 @@
-from fastapi import APIRouter, status
+from fastapi import APIRouter, HTTPException, Response, status
 from app.models import HealthResponse
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.embedding_service import embedding_service
+from app.services.semantic_cache import semantic_cache
+from app.services.message_buffer import message_buffer
+from app.services.session_store import session_store
+from app.services.conversation_retrieval import conversation_retriever
+from app.services.faq_catalogue import faq_catalogue
 from datetime import datetime
 
 # Create router
@@ -37,4 +44,40 @@ async def read_root():
         "version": settings.API_VERSION,
         "documentation": "/docs",
         "health_check": "/health"
-    }
\ No newline at end of file
+    }
+
+@router.get(
+    "/health/caches",
+    summary="Cache statistics",
+    description="Get hit/miss counters for the in-process caches"
+)
+async def cache_stats():
+    """Cache statistics endpoint"""
+    return {
+        "embedding_cache": embedding_service.query_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "session_store": session_store.stats(),
+        "conversation_retrieval": conversation_retriever.stats(),
+        "faq_catalogue": faq_catalogue.stats()
+    }
+
+@router.get(
+    "/health/message-buffer",
+    summary="Message buffer statistics",
+    description="Get queue depth and write counters for buffered chat message storage"
+)
+async def message_buffer_stats():
+    """Message buffer statistics endpoint"""
+    return message_buffer.stats()
+
+@router.get(
+    "/metrics",
+    summary="Prometheus metrics",
+    description="Request routes, per-stage latency, token usage and database call timings in the Prometheus text format",
+    include_in_schema=False
+)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    if not metrics.enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Metrics are disabled")
+    return Response(content=await metrics.collect(), media_type=metrics.content_type)
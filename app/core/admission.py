@@ -0,0 +1,251 @@
+import asyncio
+import logging
+import math
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+from app.core.config import settings
+from app.core.metrics import (
+    UPSTREAM_IN_FLIGHT, UPSTREAM_QUEUE_DEPTH, UPSTREAM_REJECTED, UPSTREAM_RETRIES, UPSTREAM_WAIT_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class UpstreamSaturated(Exception):
+    """
+    A call to an upstream was not admitted in time, or was still rate limited
+    after its retries. status_code is the HTTP status to answer with: 429 when
+    rate limited, 503 when the queue is full or the wait ran out.
+    """
+
+    def __init__(self, upstream: str, reason: str, retry_after: float):
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after = max(0.0, retry_after)
+        self.status_code = 429 if reason in ("rate_limited", "throttled") else 503
+        super().__init__(f"{upstream} is saturated ({reason}), retry after {self.retry_after:.1f}s")
+
+    @property
+    def retry_after_header(self) -> str:
+        """Retry-After value: whole seconds, at least 1"""
+        return str(max(1, math.ceil(self.retry_after)))
+
+def backoff_delay(error: Exception, attempt: int, max_delay: float = 60.0) -> float:
+    """Retry-After of the error or its response when there is one, else exponential backoff with full jitter"""
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is None:
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), max_delay)
+        except ValueError:
+            pass
+    return random.uniform(0, min(max_delay, 0.5 * 2 ** attempt))
+
+class UpstreamLimiter:
+    """
+    Admission control for calls to one upstream: at most max_concurrency in
+    flight and rate_per_second started, from a token bucket holding one
+    second of calls. Calls wait first come, first served for at most
+    max_wait_seconds, and are rejected with UpstreamSaturated beyond that or
+    when max_queue calls are waiting already. 0 disables a limit.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int = 0,
+        rate_per_second: float = 0.0,
+        max_queue: int = 0,
+        max_wait_seconds: float = 0.0
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.rate_per_second = rate_per_second
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self.burst = max(1.0, rate_per_second)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._in_flight = 0
+        self._waiting = 0
+        # Calls waiting for a concurrency slot; release() hands its slot to the first one
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "max_concurrency": self.max_concurrency,
+            "rate_per_second": self.rate_per_second,
+            "paused_seconds": round(max(0.0, self._paused_until - time.monotonic()), 3)
+        }
+
+    def check(self) -> None:
+        """Reject a call now when it could not be admitted in time (raises UpstreamSaturated)"""
+        if self.max_queue and self._waiting >= self.max_queue:
+            self._reject("queue_full", self.max_wait_seconds)
+        now = time.monotonic()
+        delay = max(self._paused_until, now) - now
+        if self.rate_per_second > 0:
+            tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_per_second)
+            delay = max(delay, (1 - tokens) / self.rate_per_second)
+        if self.max_wait_seconds > 0 and delay > self.max_wait_seconds:
+            self._reject("rate_limited", delay)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every call back for seconds, e.g. the Retry-After of a rate limited response"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self) -> None:
+        """Wait for admission; every acquire needs a release (raises UpstreamSaturated)"""
+        now = time.monotonic()
+        if self.max_queue and self._waiting >= self.max_queue:
+            self._reject("queue_full", self.max_wait_seconds)
+        deadline = now + self.max_wait_seconds if self.max_wait_seconds > 0 else None
+        delay = self._reserve(now, deadline)
+        self._waiting += 1
+        UPSTREAM_QUEUE_DEPTH.set(self._waiting, self.name)
+        admitted = False
+        try:
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self._take_slot(deadline)
+            admitted = True
+        finally:
+            self._waiting -= 1
+            UPSTREAM_QUEUE_DEPTH.set(self._waiting, self.name)
+            if not admitted and self.rate_per_second > 0:
+                # Rejected or cancelled before starting: its token goes back to the calls behind it
+                self._tokens += 1
+        UPSTREAM_WAIT_SECONDS.observe(time.monotonic() - now, self.name)
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot passes to the waiter, so the number in flight is unchanged
+                waiter.set_result(None)
+                return
+        self._in_flight -= 1
+        UPSTREAM_IN_FLIGHT.set(self._in_flight, self.name)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one admitted call for the duration of the block"""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def call(
+        self,
+        request: Callable[[], Awaitable[T]],
+        retryable: Tuple[type, ...] = (),
+        max_retries: int = 0,
+        keep_slot: bool = False
+    ) -> T:
+        """
+        Run request() once admitted, retrying errors of the retryable types up
+        to max_retries times after backoff_delay. The slot is freed while
+        backing off, and a rate limited answer (429) pauses the limiter for
+        that delay so waiting calls do not add to it. Still rate limited after
+        the retries: UpstreamSaturated; other errors are raised unchanged.
+        With keep_slot the slot stays taken after success, for the caller to
+        release (e.g. when a stream ends).
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            await self.acquire()
+            try:
+                result = await request()
+            except retryable as e:
+                self.release()
+                error = e
+            except BaseException:
+                self.release()
+                raise
+            else:
+                if not keep_slot:
+                    self.release()
+                return result
+
+            delay = backoff_delay(error, attempt)
+            throttled = getattr(error, "status_code", None) == 429
+            if throttled:
+                self.pause(delay)
+            if attempt > max_retries:
+                if throttled:
+                    self._reject("throttled", delay, error)
+                raise error
+            UPSTREAM_RETRIES.inc(self.name)
+            logger.warning(f"{self.name} call failed ({type(error).__name__}), retrying in {delay:.1f}s (attempt {attempt}/{max_retries + 1})")
+            await asyncio.sleep(delay)
+
+    def _reserve(self, now: float, deadline: Optional[float]) -> float:
+        """Seconds until a call may start under the rate limit and any pause; takes its token"""
+        start_at = max(now, self._paused_until)
+        if self.rate_per_second > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_per_second)
+            self._updated = now
+            # Tokens go negative for calls already waiting, so later ones queue behind them
+            start_at = max(start_at, now + max(0.0, (1 - self._tokens) / self.rate_per_second))
+        if deadline is not None and start_at > deadline:
+            self._reject("rate_limited", start_at - now)
+        if self.rate_per_second > 0:
+            self._tokens -= 1
+        return start_at - now
+
+    async def _take_slot(self, deadline: Optional[float]) -> None:
+        if self.max_concurrency <= 0 or (self._in_flight < self.max_concurrency and not self._waiters):
+            self._in_flight += 1
+            UPSTREAM_IN_FLIGHT.set(self._in_flight, self.name)
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait([waiter], timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        if not waiter.done():
+            self._abandon(waiter)
+            self._reject("timeout", self.max_wait_seconds)
+
+    def _abandon(self, waiter: asyncio.Future) -> None:
+        if waiter.done() and not waiter.cancelled():
+            # Handed a slot just as the wait ended: pass it on
+            self.release()
+            return
+        waiter.cancel()
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def _reject(self, reason: str, retry_after: float, cause: Optional[BaseException] = None) -> None:
+        UPSTREAM_REJECTED.inc(self.name, reason)
+        logger.warning(f"{self.name} call rejected ({reason}): {self._in_flight} in flight, {self._waiting} waiting")
+        raise UpstreamSaturated(self.name, reason, retry_after) from cause
+
+def _limiter(name: str, max_concurrency: int, rate_per_second: float) -> UpstreamLimiter:
+    return UpstreamLimiter(
+        name,
+        max_concurrency=max_concurrency,
+        rate_per_second=rate_per_second,
+        max_queue=settings.UPSTREAM_MAX_QUEUE,
+        max_wait_seconds=settings.UPSTREAM_MAX_WAIT_SECONDS
+    )
+
+chat_limiter = _limiter("chat", settings.CHAT_MAX_CONCURRENCY, settings.CHAT_RATE_LIMIT_PER_SECOND)
+embedding_limiter = _limiter("embedding", settings.EMBEDDING_MAX_CONCURRENCY, settings.EMBEDDING_RATE_LIMIT_PER_SECOND)
+database_limiter = _limiter("database", settings.SUPABASE_POOL_MAX_CONNECTIONS, settings.SUPABASE_RATE_LIMIT_PER_SECOND)
@@ -0,0 +1,65 @@
+import math
+from dataclasses import dataclass
+from typing import Optional
+
+# Tables whose content_embedding has an ANN index (idx_<table>_embedding)
+VECTOR_INDEX_TABLES = ("documents", "document_chunks", "faq_items")
+
+@dataclass(frozen=True)
+class VectorIndexPlan:
+    """
+    Parameters of one pgvector index and the search settings that go with it.
+    probes and ef_search are the recommended ivfflat_probes / hnsw_ef_search
+    search parameters (VECTOR_SEARCH_IVFFLAT_PROBES / VECTOR_SEARCH_HNSW_EF_SEARCH).
+    """
+    table: str
+    method: str
+    rows: int
+    lists: Optional[int] = None
+    m: int = 16
+    ef_construction: int = 64
+    probes: Optional[int] = None
+    ef_search: Optional[int] = None
+
+    @property
+    def index_name(self) -> str:
+        return f"idx_{self.table}_embedding"
+
+    def options(self) -> str:
+        if self.method == "ivfflat":
+            return f"lists = {self.lists}"
+        return f"m = {self.m}, ef_construction = {self.ef_construction}"
+
+    def sql(self) -> str:
+        """Statements rebuilding the index by hand (psql, SQL editor)"""
+        return (
+            f"DROP INDEX IF EXISTS {self.index_name};\n"
+            f"CREATE INDEX {self.index_name} ON {self.table} "
+            f"USING {self.method} (content_embedding vector_cosine_ops) WITH ({self.options()});"
+        )
+
+def plan_vector_index(
+    table: str,
+    rows: int,
+    method: str = "hnsw",
+    lists: Optional[int] = None,
+    m: int = 16,
+    ef_construction: int = 64,
+    match_count: int = 8
+) -> VectorIndexPlan:
+    """
+    Index parameters for a table of the given size, following the pgvector
+    guidance: ivfflat lists = rows / 1000 up to a million rows and sqrt(rows)
+    above, probed sqrt(lists) at a time; HNSW keeps its build parameters and
+    searches at least 40 candidates, and never fewer than a query returns.
+    """
+    if table not in VECTOR_INDEX_TABLES:
+        raise ValueError(f"no vector index on table {table}")
+    if method == "ivfflat":
+        lists = lists or max(1, rows // 1000 if rows <= 1_000_000 else int(math.sqrt(rows)))
+        return VectorIndexPlan(table=table, method=method, rows=rows, lists=lists,
+                               probes=max(1, round(math.sqrt(lists))))
+    if method == "hnsw":
+        return VectorIndexPlan(table=table, method=method, rows=rows, m=m,
+                               ef_construction=max(ef_construction, 2 * m), ef_search=max(40, 2 * match_count))
+    raise ValueError("method must be 'hnsw' or 'ivfflat'")
@@ -0,0 +1,154 @@
+import re
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+# A top-level numbered step ("1. ", "2) ", "Langkah 3") starts a new unit; "1.1" sub-steps stay with their parent
+_STEP_START = re.compile(r"[ \t]{0,3}(?:\d{1,3}[.)][ \t]|(?:langkah|tahap|step)[ \t]+\d{1,3}\b)", re.IGNORECASE)
+_SENTENCE_END = re.compile(r"[.!?;:](?=\s)|\s")
+
+@dataclass(frozen=True)
+class Chunk:
+    """A slice of a document's content: content == document_content[start_offset:end_offset]"""
+    index: int
+    content: str
+    start_offset: int
+    end_offset: int
+
+def _lines(content: str) -> List[Tuple[int, int]]:
+    """(start, end) of every line, newline excluded"""
+    lines, start = [], 0
+    for line in content.split("\n"):
+        lines.append((start, start + len(line)))
+        start += len(line) + 1
+    return lines
+
+def _units(content: str, lines: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Group lines into steps and paragraphs; blank lines and numbered steps start a new unit"""
+    units, start, end = [], None, None
+    for line_start, line_end in lines:
+        text = content[line_start:line_end]
+        if not text.strip():
+            if start is not None:
+                units.append((start, end))
+                start = None
+            continue
+        if start is not None and _STEP_START.match(text):
+            units.append((start, end))
+            start = None
+        if start is None:
+            start = line_start + (len(text) - len(text.lstrip()))
+        end = line_start + len(text.rstrip())
+    if start is not None:
+        units.append((start, end))
+    return units
+
+def _split_span(content: str, start: int, end: int, max_chars: int) -> List[Tuple[int, int]]:
+    """Cut a span longer than max_chars at line, then sentence, then word boundaries"""
+    spans = []
+    while end - start > max_chars:
+        limit = start + max_chars
+        cut = content.rfind("\n", start + 1, limit)
+        if cut == -1:
+            cut = max((m.end() for m in _SENTENCE_END.finditer(content, start + 1, limit)), default=-1)
+        if cut <= start:
+            cut = limit
+        piece_end = cut
+        while content[piece_end - 1].isspace():
+            piece_end -= 1
+        spans.append((start, piece_end))
+        start = cut
+        while start < end and content[start].isspace():
+            start += 1
+    if start < end:
+        spans.append((start, end))
+    return spans
+
+def split_into_chunks(content: str, max_chars: int, overlap_chars: int) -> List[Chunk]:
+    """
+    Split a document into chunks of at most max_chars along numbered steps and
+    paragraphs. Consecutive chunks overlap by the whole trailing lines of the
+    previous chunk that fit in overlap_chars.
+    """
+    lines = _lines(content)
+    units = []
+    for start, end in _units(content, lines):
+        units.extend(_split_span(content, start, end, max_chars))
+    if not units:
+        return []
+
+    line_starts = [start for start, _ in lines]
+    spans = []
+    start, end = units[0]
+    for unit_start, unit_end in units[1:]:
+        if unit_end - start <= max_chars:
+            end = unit_end
+            continue
+        spans.append((start, end))
+        # Earliest line start inside the previous chunk whose tail fits in the overlap budget
+        first = bisect_left(line_starts, max(start + 1, end - overlap_chars, unit_end - max_chars))
+        last = bisect_right(line_starts, end - 1)
+        overlap = [s for s in line_starts[first:last] if content[s:end].strip()]
+        start = overlap[0] + len(content[overlap[0]:end]) - len(content[overlap[0]:end].lstrip()) if overlap else unit_start
+        end = unit_end
+    spans.append((start, end))
+    return [Chunk(index=i, content=content[s:e], start_offset=s, end_offset=e) for i, (s, e) in enumerate(spans)]
+
+def passage_rank(passage: Dict[str, Any]) -> float:
+    """Ranking key of a retrieved passage or document: hybrid score, else similarity"""
+    return passage.get("score", passage.get("similarity", 0.5))
+
+def merge_adjacent_chunks(chunks: List[Dict[str, Any]], max_chars: int) -> List[Dict[str, Any]]:
+    """
+    Merge retrieved chunks of the same document with consecutive chunk_index
+    into one passage, removing the overlap between them. Passages keep the best
+    similarity (and hybrid search score) of their chunks and are ordered by the
+    score when chunks have one, by similarity otherwise. FAQ items found by
+    hybrid search (source "faq") are passages of their own, keyed by FAQ ID.
+    """
+    by_document: Dict[int, List[Dict[str, Any]]] = {}
+    passages = []
+    for chunk in chunks:
+        if chunk.get("source") == "faq":
+            passage = {key: chunk.get(key) for key in ("id", "title", "document_type", "content", "similarity", "source")}
+            passage.update(chunk_indexes=[0], start_offset=0, end_offset=len(chunk["content"]))
+            if "score" in chunk:
+                passage["score"] = chunk["score"]
+            passages.append(passage)
+            continue
+        by_document.setdefault(chunk["document_id"], []).append(chunk)
+
+    for document_id, document_chunks in by_document.items():
+        document_chunks.sort(key=lambda c: c["chunk_index"])
+        passage = None
+        for chunk in document_chunks:
+            if (passage is not None and chunk["chunk_index"] == passage["chunk_indexes"][-1] + 1
+                    and chunk["end_offset"] - passage["start_offset"] <= max_chars):
+                overlap = passage["end_offset"] - chunk["start_offset"]
+                if overlap > 0:
+                    passage["content"] += chunk["content"][overlap:]
+                else:
+                    # Only whitespace separates non-overlapping neighbours
+                    passage["content"] += ("\n" if overlap == -1 else "\n\n") + chunk["content"]
+                passage["end_offset"] = chunk["end_offset"]
+                passage["chunk_indexes"].append(chunk["chunk_index"])
+                passage["similarity"] = max(passage["similarity"], chunk["similarity"])
+                if "score" in chunk:
+                    passage["score"] = max(passage["score"], chunk["score"])
+                continue
+            passage = {
+                "id": document_id,
+                "title": chunk.get("title"),
+                "document_type": chunk.get("document_type"),
+                "content": chunk["content"],
+                "similarity": chunk["similarity"],
+                "chunk_indexes": [chunk["chunk_index"]],
+                "start_offset": chunk["start_offset"],
+                "end_offset": chunk["end_offset"],
+                "source": "document",
+            }
+            if "score" in chunk:
+                passage["score"] = chunk["score"]
+            passages.append(passage)
+    passages.sort(key=passage_rank, reverse=True)
+    return passages
@@ -1,5 +1,5 @@
 import os
-from typing import List
+from typing import Dict, List
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -11,6 +11,109 @@ class Settings:
     MODEL_NAME: str = os.getenv("MODEL_NAME", "gpt-3.5-turbo")
     MAX_TOKENS: int = int(os.getenv("MAX_TOKENS", "1000"))
     TEMPERATURE: float = float(os.getenv("TEMPERATURE", "0.7"))
+    OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "")
+
+    # OpenAI HTTP Client Configuration
+    OPENAI_MAX_CONNECTIONS: int = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    OPENAI_CONNECT_TIMEOUT: float = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+    OPENAI_CHAT_TIMEOUT: float = float(os.getenv("OPENAI_CHAT_TIMEOUT", "60"))
+    OPENAI_EMBEDDING_TIMEOUT: float = float(os.getenv("OPENAI_EMBEDDING_TIMEOUT", "15"))
+    OPENAI_MAX_RETRIES: int = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+    # Upstream Admission Control (per worker process; 0 disables a limit)
+    # Concurrent calls and calls started per second (token bucket holding one
+    # second of calls) per upstream; the database allows SUPABASE_POOL_MAX_CONNECTIONS
+    CHAT_MAX_CONCURRENCY: int = int(os.getenv("CHAT_MAX_CONCURRENCY", "50"))
+    CHAT_RATE_LIMIT_PER_SECOND: float = float(os.getenv("CHAT_RATE_LIMIT_PER_SECOND", "0"))
+    EMBEDDING_MAX_CONCURRENCY: int = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "50"))
+    EMBEDDING_RATE_LIMIT_PER_SECOND: float = float(os.getenv("EMBEDDING_RATE_LIMIT_PER_SECOND", "0"))
+    SUPABASE_RATE_LIMIT_PER_SECOND: float = float(os.getenv("SUPABASE_RATE_LIMIT_PER_SECOND", "0"))
+    # Calls waiting per upstream, and how long one waits before it is rejected (429/503 with Retry-After)
+    UPSTREAM_MAX_QUEUE: int = int(os.getenv("UPSTREAM_MAX_QUEUE", "200"))
+    UPSTREAM_MAX_WAIT_SECONDS: float = float(os.getenv("UPSTREAM_MAX_WAIT_SECONDS", "5"))
+
+    # Prompt Token Budget Configuration
+    # Prompt tokens per request (system prompt, documents, history, question);
+    # CONTEXT_TOKEN_BUDGETS overrides it per model, e.g. "gpt-4=6000,gpt-4o=12000"
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+    CONTEXT_TOKEN_BUDGETS: Dict[str, int] = {
+        model.strip(): int(budget)
+        for model, _, budget in (item.partition("=") for item in os.getenv("CONTEXT_TOKEN_BUDGETS", "").split(","))
+        if budget.strip()
+    }
+    # Tokens kept for conversation history before documents fill the budget
+    CONTEXT_HISTORY_TOKENS: int = int(os.getenv("CONTEXT_HISTORY_TOKENS", "800"))
+    
+    # Embedding Configuration
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+    
+    # Minimum cosine similarity of retrieved context; semantic cache invalidation uses the same value
+    RETRIEVAL_SIMILARITY_THRESHOLD: float = float(os.getenv("RETRIEVAL_SIMILARITY_THRESHOLD", "0.3"))
+    
+    # Document Chunking Configuration
+    CHUNK_MAX_CHARS: int = int(os.getenv("CHUNK_MAX_CHARS", "800"))
+    CHUNK_OVERLAP_CHARS: int = int(os.getenv("CHUNK_OVERLAP_CHARS", "150"))
+    CHUNK_RETRIEVAL_ENABLED: bool = os.getenv("CHUNK_RETRIEVAL_ENABLED", "True").lower() == "true"
+    CHUNK_MATCH_COUNT: int = int(os.getenv("CHUNK_MATCH_COUNT", "8"))
+    CHUNK_MERGED_MAX_CHARS: int = int(os.getenv("CHUNK_MERGED_MAX_CHARS", "1600"))
+    
+    # Hybrid Retrieval Configuration (vector + full-text, fused in the database)
+    HYBRID_SEARCH_ENABLED: bool = os.getenv("HYBRID_SEARCH_ENABLED", "True").lower() == "true"
+    HYBRID_CANDIDATE_COUNT: int = int(os.getenv("HYBRID_CANDIDATE_COUNT", "8"))
+    HYBRID_RRF_K: int = int(os.getenv("HYBRID_RRF_K", "60"))
+    
+    # ANN Search Configuration (0 keeps the database setting; see manage_vector_indexes.py)
+    VECTOR_SEARCH_IVFFLAT_PROBES: int = int(os.getenv("VECTOR_SEARCH_IVFFLAT_PROBES", "0"))
+    VECTOR_SEARCH_HNSW_EF_SEARCH: int = int(os.getenv("VECTOR_SEARCH_HNSW_EF_SEARCH", "0"))
+    
+    # Embedding Backfill Configuration
+    EMBEDDING_BACKFILL_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BACKFILL_BATCH_SIZE", "64"))
+    EMBEDDING_BACKFILL_CONCURRENCY: int = int(os.getenv("EMBEDDING_BACKFILL_CONCURRENCY", "4"))
+    EMBEDDING_BACKFILL_MAX_ATTEMPTS: int = int(os.getenv("EMBEDDING_BACKFILL_MAX_ATTEMPTS", "6"))
+    EMBEDDING_BACKFILL_CHECKPOINT_PATH: str = os.getenv("EMBEDDING_BACKFILL_CHECKPOINT_PATH", "embedding_backfill.checkpoint.json")
+    
+    # Embedding Job Queue Configuration (processed by worker.py)
+    EMBEDDING_WORKER_BATCH_SIZE: int = int(os.getenv("EMBEDDING_WORKER_BATCH_SIZE", "16"))
+    EMBEDDING_WORKER_CONCURRENCY: int = int(os.getenv("EMBEDDING_WORKER_CONCURRENCY", "2"))
+    EMBEDDING_WORKER_POLL_SECONDS: float = float(os.getenv("EMBEDDING_WORKER_POLL_SECONDS", "2"))
+    EMBEDDING_WORKER_IN_PROCESS: bool = os.getenv("EMBEDDING_WORKER_IN_PROCESS", "False").lower() == "true"
+    EMBEDDING_JOB_MAX_ATTEMPTS: int = int(os.getenv("EMBEDDING_JOB_MAX_ATTEMPTS", "5"))
+    EMBEDDING_JOB_LEASE_SECONDS: int = int(os.getenv("EMBEDDING_JOB_LEASE_SECONDS", "300"))
+    
+    # Query Embedding Cache Configuration
+    EMBEDDING_CACHE_MAX_ENTRIES: int = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "2048"))
+    EMBEDDING_CACHE_TTL_SECONDS: float = float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", "86400"))
+    EMBEDDING_CACHE_PATH: str = os.getenv("EMBEDDING_CACHE_PATH", "")
+    EMBEDDING_CACHE_DISK_TTL_SECONDS: float = float(os.getenv("EMBEDDING_CACHE_DISK_TTL_SECONDS", "2592000"))
+    EMBEDDING_CACHE_DISK_MAX_ENTRIES: int = int(os.getenv("EMBEDDING_CACHE_DISK_MAX_ENTRIES", "100000"))
+    
+    # Semantic Response Cache Configuration
+    SEMANTIC_CACHE_ENABLED: bool = os.getenv("SEMANTIC_CACHE_ENABLED", "True").lower() == "true"
+    SEMANTIC_CACHE_MAX_DISTANCE: float = float(os.getenv("SEMANTIC_CACHE_MAX_DISTANCE", "0.05"))
+    SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+    SEMANTIC_CACHE_TTL_SECONDS: float = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "86400"))
+    # Seconds between checks for documents and FAQ items changed by other processes (0 disables)
+    SEMANTIC_CACHE_SYNC_SECONDS: float = float(os.getenv("SEMANTIC_CACHE_SYNC_SECONDS", "30"))
+    
+    # Local Vector Index Configuration
+    LOCAL_VECTOR_INDEX_ENABLED: bool = os.getenv("LOCAL_VECTOR_INDEX_ENABLED", "False").lower() == "true"
+    LOCAL_VECTOR_INDEX_REFRESH_SECONDS: float = float(os.getenv("LOCAL_VECTOR_INDEX_REFRESH_SECONDS", "300"))
+    
+    # Intent Registry Configuration
+    INTENTS_PATH: str = os.getenv("INTENTS_PATH", "")
+    INTENTS_WATCH_INTERVAL_SECONDS: float = float(os.getenv("INTENTS_WATCH_INTERVAL_SECONDS", "10"))
+    ADMIN_API_KEY: str = os.getenv("ADMIN_API_KEY", "")
+    
+    # FAQ Catalogue Configuration (0 loads once at startup and on admin reload only)
+    FAQ_CATALOGUE_REFRESH_SECONDS: float = float(os.getenv("FAQ_CATALOGUE_REFRESH_SECONDS", "300"))
+    
+    # Metrics Configuration (GET /metrics; spans need opentelemetry-api and an SDK configured)
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+    OTEL_TRACING_ENABLED: bool = os.getenv("OTEL_TRACING_ENABLED", "False").lower() == "true"
+    # serve.py: directory where workers share their metrics (empty: a temporary one) and how often they write them
+    METRICS_MULTIPROCESS_DIR: str = os.getenv("METRICS_MULTIPROCESS_DIR", "")
+    METRICS_SHARE_INTERVAL_SECONDS: float = float(os.getenv("METRICS_SHARE_INTERVAL_SECONDS", "5"))
     
     # Application Configuration
     PANTAS_NAME: str = os.getenv("PANTAS_NAME", "PANTAS")
@@ -27,6 +130,9 @@ class Settings:
     API_HOST: str = os.getenv("API_HOST", "127.0.0.1")
     API_PORT: int = int(os.getenv("API_PORT", "8000"))
     DEBUG: bool = os.getenv("DEBUG", "True").lower() == "true"
+    # serve.py: worker processes (0: one per CPU) and seconds to finish requests on shutdown
+    API_WORKERS: int = int(os.getenv("API_WORKERS", "0"))
+    API_GRACEFUL_SHUTDOWN_SECONDS: float = float(os.getenv("API_GRACEFUL_SHUTDOWN_SECONDS", "30"))
     
     # CORS Configuration
     ALLOWED_ORIGINS: List[str] = os.getenv(
@@ -37,6 +143,30 @@ class Settings:
     # Supabase Configuration
     SUPABASE_URL: str = os.getenv("SUPABASE_URL", "")
     SUPABASE_ANON_KEY: str = os.getenv("SUPABASE_ANON_KEY", "")
+    SUPABASE_REST_URL: str = os.getenv("SUPABASE_REST_URL", "")
+    SUPABASE_POOL_MAX_CONNECTIONS: int = int(os.getenv("SUPABASE_POOL_MAX_CONNECTIONS", "50"))
+    SUPABASE_POOL_MAX_KEEPALIVE: int = int(os.getenv("SUPABASE_POOL_MAX_KEEPALIVE", "20"))
+    SUPABASE_TIMEOUT: float = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+    
+    # Chat Message Write-Behind Buffer Configuration
+    MESSAGE_BUFFER_ENABLED: bool = os.getenv("MESSAGE_BUFFER_ENABLED", "True").lower() == "true"
+    MESSAGE_BUFFER_BATCH_SIZE: int = int(os.getenv("MESSAGE_BUFFER_BATCH_SIZE", "200"))
+    MESSAGE_BUFFER_FLUSH_SECONDS: float = float(os.getenv("MESSAGE_BUFFER_FLUSH_SECONDS", "1"))
+    MESSAGE_BUFFER_MAX_PENDING: int = int(os.getenv("MESSAGE_BUFFER_MAX_PENDING", "10000"))
+    MESSAGE_BUFFER_MAX_WAIT_SECONDS: float = float(os.getenv("MESSAGE_BUFFER_MAX_WAIT_SECONDS", "2"))
+    MESSAGE_BUFFER_MAX_ATTEMPTS: int = int(os.getenv("MESSAGE_BUFFER_MAX_ATTEMPTS", "5"))
+    
+    # Conversation Session Store Configuration
+    SESSION_STORE_MAX_SESSIONS: int = int(os.getenv("SESSION_STORE_MAX_SESSIONS", "10000"))
+    SESSION_HISTORY_MAX_MESSAGES: int = int(os.getenv("SESSION_HISTORY_MAX_MESSAGES", "20"))
+    SESSION_STORE_TTL_SECONDS: float = float(os.getenv("SESSION_STORE_TTL_SECONDS", "1800"))
+    # Check sessions in memory against chat_messages on use, for processes serving the same conversations (serve.py sets it with several workers)
+    SESSION_STORE_SHARED: bool = os.getenv("SESSION_STORE_SHARED", "False").lower() == "true"
+    
+    # Conversation-Aware Retrieval Configuration
+    CONVERSATION_RETRIEVAL_ENABLED: bool = os.getenv("CONVERSATION_RETRIEVAL_ENABLED", "True").lower() == "true"
+    FOLLOW_UP_MAX_WORDS: int = int(os.getenv("FOLLOW_UP_MAX_WORDS", "4"))
+    QUERY_REWRITE_CACHE_SIZE: int = int(os.getenv("QUERY_REWRITE_CACHE_SIZE", "32"))
     
     # Support Configuration
     WHATSAPP_NUMBER: str = os.getenv("WHATSAPP_NUMBER", "+62-812-3456-7890")
@@ -56,6 +186,5 @@ class Settings:
             raise ValueError("SUPABASE_ANON_KEY is required")
         return True
 
-# Create settings instance
-settings = Settings()
-settings.validate_settings()
\ No newline at end of file
+# Create settings instance; entry points validate it on startup, so importing the app needs no credentials
+settings = Settings()
\ No newline at end of file
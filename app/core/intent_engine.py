@@ -1,52 +1,337 @@
+import hashlib
 import json
+import math
 import os
+import threading
+import time
 import re
 import logging
 import unicodedata
+from bisect import bisect_left
+from dataclasses import dataclass
 from difflib import SequenceMatcher
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
-_INTENTS: Dict[str, Any] = {}
 _INTENTS_PATH = os.path.join(os.path.dirname(__file__), "intents.json")
+_SNAPSHOT: Optional["IntentSnapshot"] = None
+_RELOAD_LOCK = threading.Lock()
+
+
+class _Message:
+    """A normalized message with the token offsets and bigram positions the matchers share."""
+
+    __slots__ = ("text", "_intents", "_tokens", "_positions")
+
+    def __init__(self, text: str, intents: "CompiledIntents"):
+        self.text = text
+        self._intents = intents
+        self._tokens: Optional[Tuple[List[int], List[int]]] = None
+        self._positions: Optional[List[List[int]]] = None
+
+    @property
+    def tokens(self) -> Tuple[List[int], List[int]]:
+        """Start and end offsets of each token in the text"""
+        if self._tokens is None:
+            starts, ends, pos = [], [], 0
+            for token in self.text.split(" "):
+                starts.append(pos)
+                pos += len(token)
+                ends.append(pos)
+                pos += 1
+            self._tokens = (starts, ends)
+        return self._tokens
+
+    def bigram_positions(self, pattern_id: int) -> List[int]:
+        """Sorted offsets of the message bigrams that also occur in a fuzzy pattern"""
+        if self._positions is None:
+            self._positions = self._intents.find_bigram_positions(self.text)
+        return self._positions[pattern_id]
+
+
+class _FuzzyPattern:
+    """
+    A pre-normalized fuzzy pattern.
+    Windows are screened with bounds that can only reject windows whose
+    SequenceMatcher ratio is below the threshold, so the final ratio check
+    is reached rarely and results are unchanged.
+    """
+
+    __slots__ = ("id", "text", "length", "token_count", "threshold", "masks", "bigrams", "min_shared_bigrams")
+
+    def __init__(self, pattern_id: int, text: str, threshold: float):
+        self.id = pattern_id
+        self.text = text
+        self.length = len(text)
+        self.token_count = len(text.split())
+        self.threshold = threshold
+        masks: Dict[str, int] = {}
+        for i, ch in enumerate(text):
+            masks[ch] = masks.get(ch, 0) | (1 << i)
+        self.masks = masks
+        self.bigrams = set(_bigrams(text))
+        self.min_shared_bigrams = _min_shared_bigrams(self.length, threshold)
+
+    def lcs_length(self, window: str) -> int:
+        """Longest common subsequence with the pattern (bit-parallel, one step per window character)"""
+        full = (1 << self.length) - 1
+        v = full
+        masks = self.masks
+        for ch in window:
+            m = masks.get(ch)
+            if m:
+                u = v & m
+                v = ((v + u) | (v - u)) & full
+        return self.length - bin(v).count("1")
+
+    def matches(self, message: _Message) -> bool:
+        text = message.text
+        if self.text in text:
+            return True
+        positions = message.bigram_positions(self.id)
+        if len(positions) < self.min_shared_bigrams:
+            return False
+        starts, ends = message.tokens
+        n = len(starts)
+        length = self.length
+        threshold = self.threshold
+        # Token windows of the pattern's token length +-1, as before
+        for size in {max(1, self.token_count - 1), self.token_count, self.token_count + 1}:
+            if size > n:
+                continue
+            for i in range(0, n - size + 1):
+                start, end = starts[i], ends[i + size - 1]
+                window_length = end - start
+                total = window_length + length
+                # ratio = 2*M/total, and M is at most the shorter length and at most the LCS
+                if 2.0 * min(window_length, length) / total < threshold:
+                    continue
+                # Bigram bound of _min_shared_bigrams for this window length
+                shared = bisect_left(positions, end - 1) - bisect_left(positions, start)
+                if shared < 1.5 * threshold * total - total - 1 - 1e-9:
+                    continue
+                window = text[start:end]
+                if 2.0 * self.lcs_length(window) / total < threshold:
+                    continue
+                if SequenceMatcher(None, window, self.text).ratio() >= threshold:
+                    return True
+        return False
+
+
+def _bigrams(text: str) -> List[str]:
+    return [text[i:i + 2] for i in range(len(text) - 1)]
+
+
+def _min_shared_bigrams(length: int, threshold: float) -> int:
+    """
+    Lower bound on the bigrams a message must share with a pattern of the given
+    length for any window to reach the threshold.
+    With L = LCS(window, pattern), at least (length-1) - 2*(length-L) - (window-L)
+    pattern bigrams survive in the window; ratio >= t needs L >= t*(window+length)/2
+    and window >= t*length/(2-t), giving (3t-2)*length/(2-t) - 1.
+    """
+    if threshold < 2 / 3:
+        return 0
+    if threshold >= 1:
+        return max(length - 1, 0)
+    bound = (3 * threshold - 2) * length / (2 - threshold) - 1
+    return max(math.ceil(bound - 1e-9), 0)
+
+
+class CompiledIntents:
+    """
+    Intent registry compiled for matching.
+    Patterns are normalized once, regexes compiled once, and fuzzy patterns are
+    pruned per message through a bigram inverted index before any window scoring.
+    Intents are tried in file order and the first match wins.
+    """
+
+    def __init__(self, registry: Dict[str, Any]):
+        self._entries: List[Tuple[str, Any, Optional[Dict[str, Any]]]] = []
+        self._postings: Dict[str, List[int]] = {}
+        self._fuzzy_count = 0
+        self.pattern_count = 0
+        for intent in registry.get("intents", []):
+            matcher = intent.get("match", {}) or {}
+            compiled = self._compile_matcher(matcher)
+            if compiled is not None:
+                self._entries.append((compiled[0], compiled[1], intent.get("action")))
+                self.pattern_count += len(compiled[1])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _compile_matcher(self, matcher: Dict[str, Any]) -> Optional[Tuple[str, Any]]:
+        mtype = matcher.get("type", "includes")
+        patterns: List[str] = matcher.get("patterns", [])
+        if not patterns:
+            return None
+        if mtype == "includes":
+            return mtype, [_normalize(p or "") for p in patterns]
+        if mtype == "regex":
+            compiled = []
+            for p in patterns:
+                try:
+                    compiled.append(re.compile(p, re.IGNORECASE))
+                except (re.error, TypeError) as e:
+                    logger.error("Invalid intent regex %r skipped: %s", p, e)
+            return mtype, compiled
+        if mtype == "fuzzy":
+            threshold = float(matcher.get("threshold", 0.82))
+            fuzzy = []
+            for p in patterns:
+                text = _normalize(p or "")
+                if not text:
+                    continue
+                pattern = _FuzzyPattern(self._fuzzy_count, text, threshold)
+                self._fuzzy_count += 1
+                for bigram in pattern.bigrams:
+                    self._postings.setdefault(bigram, []).append(pattern.id)
+                fuzzy.append(pattern)
+            return mtype, fuzzy
+        return None
+
+    def find_bigram_positions(self, text: str) -> List[List[int]]:
+        positions: List[List[int]] = [[] for _ in range(self._fuzzy_count)]
+        postings = self._postings
+        for offset in range(len(text) - 1):
+            for pattern_id in postings.get(text[offset:offset + 2], ()):
+                positions[pattern_id].append(offset)
+        return positions
+
+    def resolve(self, message: str) -> Optional[Dict[str, Any]]:
+        text = _normalize(message or "")
+        if not text:
+            return None
+        prepared = _Message(text, self)
+        for mtype, patterns, action in self._entries:
+            if mtype == "includes":
+                matched = any(p in text for p in patterns)
+            elif mtype == "regex":
+                matched = any(p.search(text) for p in patterns)
+            else:
+                matched = any(p.matches(prepared) for p in patterns)
+            if matched:
+                return action
+        return None
+
+
+@dataclass(frozen=True)
+class IntentSnapshot:
+    """
+    One compiled version of the registry.
+    Snapshots are never modified; a reload builds a new one and replaces the
+    module reference in a single assignment, so a request resolves against
+    either the old or the new registry, never a partial one.
+    """
+    version: str
+    compiled: CompiledIntents
+    path: str
+    source_mtime: Optional[float]
+    loaded_at: float
+    build_ms: float
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "intent_count": len(self.compiled),
+            "pattern_count": self.compiled.pattern_count,
+            "path": self.path,
+            "loaded_at": self.loaded_at,
+            "build_ms": round(self.build_ms, 2)
+        }
+
+
+def intents_path() -> str:
+    """Registry file location; INTENTS_PATH lets every worker share one file"""
+    return settings.INTENTS_PATH or _INTENTS_PATH
+
+
+def build_snapshot(path: Optional[str] = None) -> IntentSnapshot:
+    """Read and compile the registry file. Raises if the file is missing or invalid."""
+    path = path or intents_path()
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        raw = f.read()
+    source_mtime = os.path.getmtime(path)
+    registry = json.loads(raw.decode("utf-8"))
+    if not isinstance(registry, dict):
+        raise ValueError("Invalid intents.json format: root must be an object")
+    compiled = CompiledIntents(registry)
+    return IntentSnapshot(
+        # Content hash, so independent workers loading the same file agree on the version
+        version=hashlib.sha256(raw).hexdigest()[:12],
+        compiled=compiled,
+        path=path,
+        source_mtime=source_mtime,
+        loaded_at=time.time(),
+        build_ms=(time.perf_counter() - start) * 1000
+    )
+
+
+def _empty_snapshot(path: str) -> IntentSnapshot:
+    return IntentSnapshot(
+        version="empty",
+        compiled=CompiledIntents({"intents": []}),
+        path=path,
+        source_mtime=None,
+        loaded_at=time.time(),
+        build_ms=0.0
+    )
 
 
 def load_intents(force: bool = False) -> None:
-    """Load intents from the JSON registry file into memory."""
-    global _INTENTS
-    if _INTENTS and not force:
+    """Load intents from the JSON registry file into memory and compile them."""
+    global _SNAPSHOT
+    if _SNAPSHOT is not None and not force:
         return
-    try:
-        with open(_INTENTS_PATH, "r", encoding="utf-8") as f:
-            _INTENTS = json.load(f)
-            if not isinstance(_INTENTS, dict):
-                raise ValueError("Invalid intents.json format: root must be an object")
-    except FileNotFoundError:
-        logger.warning("intents.json not found at %s; special intents disabled", _INTENTS_PATH)
-        _INTENTS = {"intents": []}
-    except Exception as e:
-        logger.error("Failed to load intents.json: %s", e)
-        _INTENTS = {"intents": []}
-
-
-def _match(text: str, matcher: Dict[str, Any]) -> bool:
-    t = _normalize(text or "")
-    m = matcher or {}
-    mtype = m.get("type", "includes")
-    patterns: List[str] = m.get("patterns", [])
-    if not t or not patterns:
-        return False
-    if mtype == "includes":
-        return any(_normalize(p or "") in t for p in patterns)
-    if mtype == "regex":
-        return any(re.search(p, t, re.IGNORECASE) for p in patterns)
-    if mtype == "fuzzy":
-        threshold = float(m.get("threshold", 0.82))
-        return any(_fuzzy_contains(t, _normalize(p or ""), threshold) for p in patterns)
-    return False
+    path = intents_path()
+    with _RELOAD_LOCK:
+        if _SNAPSHOT is not None and not force:
+            return
+        try:
+            _SNAPSHOT = build_snapshot(path)
+        except FileNotFoundError:
+            logger.warning("intents.json not found at %s; special intents disabled", path)
+            _SNAPSHOT = _empty_snapshot(path)
+        except Exception as e:
+            logger.error("Failed to load intents.json: %s", e)
+            _SNAPSHOT = _empty_snapshot(path)
+
+
+def reload_intents() -> Dict[str, Any]:
+    """
+    Rebuild the registry from its file and swap it in if the content changed.
+    Raises (keeping the current registry) when the file cannot be loaded.
+    """
+    global _SNAPSHOT
+    with _RELOAD_LOCK:
+        snapshot = build_snapshot()
+        previous = _SNAPSHOT
+        changed = previous is None or previous.version != snapshot.version
+        if changed:
+            _SNAPSHOT = snapshot
+    logger.info(
+        "Intent registry %s: version %s, %d intents, %d patterns, built in %.1fms",
+        "reloaded" if changed else "unchanged", snapshot.version, len(snapshot.compiled),
+        snapshot.compiled.pattern_count, snapshot.build_ms
+    )
+    return {
+        **(snapshot if changed else previous).info(),
+        "changed": changed,
+        "previous_version": previous.version if previous else None,
+        "reload_ms": round(snapshot.build_ms, 2)
+    }
+
+
+def current_snapshot() -> IntentSnapshot:
+    """The registry snapshot requests currently resolve against"""
+    if _SNAPSHOT is None:
+        load_intents()
+    return _SNAPSHOT
 
 
 def _normalize(s: str) -> str:
@@ -60,42 +345,9 @@ def _normalize(s: str) -> str:
     return s
 
 
-def _fuzzy_contains(text: str, pattern: str, threshold: float) -> bool:
-    """
-    Approximate substring match: checks if any window in text is similar to pattern above threshold.
-    Uses token windows with size equal to pattern's token length ±1.
-    """
-    if not text or not pattern:
-        return False
-    # Quick path: direct include
-    if pattern in text:
-        return True
-    t_tokens = text.split()
-    p_tokens = pattern.split()
-    if not t_tokens or not p_tokens:
-        return False
-    p_len = len(p_tokens)
-    # Consider windows of size p_len-1 to p_len+1
-    for win_size in {max(1, p_len - 1), p_len, p_len + 1}:
-        if win_size > len(t_tokens):
-            continue
-        for i in range(0, len(t_tokens) - win_size + 1):
-            window = " ".join(t_tokens[i:i + win_size])
-            score = SequenceMatcher(None, window, pattern).ratio()
-            if score >= threshold:
-                return True
-    return False
-
-
 def resolve(message: str) -> Optional[Dict[str, Any]]:
     """Resolve message to an action dict from the intents registry."""
-    if not _INTENTS:
-        load_intents()
-    intents = _INTENTS.get("intents", [])
-    for intent in intents:
-        if _match(message, intent.get("match", {})):
-            return intent.get("action")
-    return None
+    return current_snapshot().compiled.resolve(message)
 
 
 def render_template(template: str) -> str:
@@ -0,0 +1,346 @@
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # optional: spans are only recorded when OpenTelemetry is installed
+    otel_trace = None
+
+logger = logging.getLogger(__name__)
+
+# Seconds; from a cache hit to a slow completion
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 16000)
+
+# model_used values of answers that did not call the language model
+DIRECT_ROUTES = {"system-greeting", "direct-answer", "kb-direct", "semantic-cache"}
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Counter:
+    """Monotonic counter per label values"""
+
+    kind = "counter"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        if self.registry.enabled:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        return self._values
+
+    def render(self, values: Optional[Dict[Tuple[str, ...], float]] = None) -> List[str]:
+        values = self._values if values is None else values
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}" for labels, value in values.items()]
+
+class Gauge:
+    """Current value per label values"""
+
+    kind = "gauge"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        if self.registry.enabled:
+            self._values[labels] = value
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        return self._values
+
+    def render(self, values: Optional[Dict[Tuple[str, ...], float]] = None) -> List[str]:
+        values = self._values if values is None else values
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}" for labels, value in values.items()]
+
+class Histogram:
+    """
+    Bucketed distribution per label values.
+    An observation is one bisect and two additions; buckets are only made
+    cumulative when rendered.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        registry: "MetricsRegistry",
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # Per label values: [count per bucket (last one +Inf)..., sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        if not self.registry.enabled:
+            return
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def values(self) -> Dict[Tuple[str, ...], List[float]]:
+        return self._series
+
+    def render(self, values: Optional[Dict[Tuple[str, ...], List[float]]] = None) -> List[str]:
+        lines = []
+        for labels, series in (self._series if values is None else values).items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class MetricsRegistry:
+    """
+    Process-wide metrics rendered in the Prometheus text exposition format.
+    With a shared directory (serve.py's workers), every process writes its
+    values there every share_interval_seconds and when it stops, and a scrape
+    of any of them reports the sum over all of them: counters and histograms
+    of every process that ever ran, so totals do not drop when a worker is
+    replaced, and gauges of the processes still running.
+    """
+
+    # Starlette appends "; charset=utf-8"
+    content_type = "text/plain; version=0.0.4"
+
+    def __init__(self, enabled: bool = True, share_interval_seconds: float = 5.0):
+        self.enabled = enabled
+        self.share_interval_seconds = share_interval_seconds
+        self.directory: Optional[str] = None
+        self._metrics: List = []
+        self._task: Optional[asyncio.Task] = None
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(self, name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        metric = Gauge(self, name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(self, name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self, merged: Optional[Dict[str, Dict[Tuple[str, ...], Any]]] = None) -> str:
+        """This process's metrics, or the merged values of all processes"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render(merged.get(metric.name, {}) if merged is not None else None))
+        return "\n".join(lines) + "\n"
+
+    async def collect(self) -> str:
+        """Render for a scrape: merged over the shared directory when there is one, read off the event loop"""
+        if self.directory is None:
+            return self.render()
+        snapshot = self.snapshot()
+        return self.render(await asyncio.to_thread(self._write_and_merge, snapshot))
+
+    def reset(self) -> None:
+        for metric in self._metrics:
+            metric.values().clear()
+
+    def snapshot(self) -> Dict[str, List]:
+        """A copy of this process's values as JSON-serializable [labels, value] pairs per metric"""
+        return {
+            metric.name: [[list(labels), list(value) if isinstance(value, list) else value] for labels, value in metric.values().items()]
+            for metric in self._metrics
+        }
+
+    def _write(self, snapshot: Dict[str, List]) -> None:
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        try:
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+            # Readers see the previous snapshot or this one, never a partial file
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            logger.warning(f"Failed to write metrics to {path}: {e}")
+
+    def _write_and_merge(self, snapshot: Dict[str, List]) -> Dict[str, Dict[Tuple[str, ...], Any]]:
+        self._write(snapshot)
+        gauges = {metric.name for metric in self._metrics if metric.kind == "gauge"}
+        merged: Dict[str, Dict[Tuple[str, ...], Any]] = {}
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                pid = int(os.path.basename(path)[:-len(".json")])
+                with open(path, "r", encoding="utf-8") as f:
+                    values = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping metrics file {path}: {e}")
+                continue
+            alive = pid == os.getpid() or _alive(pid)
+            for name, series in values.items():
+                if name in gauges and not alive:
+                    continue
+                merged_series = merged.setdefault(name, {})
+                for labels, value in series:
+                    labels = tuple(labels)
+                    current = merged_series.get(labels)
+                    if current is None:
+                        merged_series[labels] = value
+                    elif isinstance(value, list):
+                        merged_series[labels] = [a + b for a, b in zip(current, value)]
+                    else:
+                        merged_series[labels] = current + value
+        return merged
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.share_interval_seconds)
+            await asyncio.to_thread(self._write, self.snapshot())
+
+    def start(self) -> None:
+        """Write this process's values to the shared directory periodically (no-op without one)"""
+        if self.directory is not None and self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            # Final values, so the totals keep what this process counted
+            await asyncio.to_thread(self._write, self.snapshot())
+
+metrics = MetricsRegistry(enabled=settings.METRICS_ENABLED, share_interval_seconds=settings.METRICS_SHARE_INTERVAL_SECONDS)
+
+CHAT_REQUESTS = metrics.counter(
+    "chat_requests_total", "Chat requests by endpoint and route (model_used, llm, error, or rejected when an upstream was saturated)", ("endpoint", "route"))
+CHAT_REQUEST_SECONDS = metrics.histogram(
+    "chat_request_duration_seconds", "Chat request handling time by endpoint and route", ("endpoint", "route"))
+CHAT_STAGE_SECONDS = metrics.histogram(
+    "chat_stage_duration_seconds", "Time spent in each stage of a chat request", ("stage",))
+CHAT_PROMPT_TOKENS = metrics.histogram(
+    "chat_prompt_tokens", "Estimated prompt tokens sent to the language model", (), TOKEN_BUCKETS)
+LLM_TOKENS = metrics.counter(
+    "llm_tokens_total", "Tokens reported by the OpenAI API (prompt, completion, embedding)", ("kind",))
+EMBEDDING_REQUEST_SECONDS = metrics.histogram(
+    "embedding_request_duration_seconds", "Embedding API request time (query: one query, batch: backfill and jobs)", ("kind",))
+EMBEDDING_INPUTS = metrics.counter(
+    "embedding_inputs_total", "Texts sent to the embedding API", ("kind",))
+DB_REQUEST_SECONDS = metrics.histogram(
+    "db_request_duration_seconds", "PostgREST request time until the response headers, by table or RPC", ("operation",))
+DB_REQUEST_ERRORS = metrics.counter(
+    "db_request_errors_total", "PostgREST requests that failed or returned an error status", ("operation",))
+UPSTREAM_QUEUE_DEPTH = metrics.gauge(
+    "upstream_queue_depth", "Requests waiting for admission to an upstream (chat, embedding, database)", ("upstream",))
+UPSTREAM_IN_FLIGHT = metrics.gauge(
+    "upstream_in_flight", "Admitted requests in flight per upstream", ("upstream",))
+UPSTREAM_WAIT_SECONDS = metrics.histogram(
+    "upstream_admission_wait_seconds", "Time admitted requests waited for a concurrency slot and the rate limit", ("upstream",))
+UPSTREAM_REJECTED = metrics.counter(
+    "upstream_rejected_total", "Requests not admitted to an upstream (queue_full, timeout, rate_limited, throttled)", ("upstream", "reason"))
+UPSTREAM_RETRIES = metrics.counter(
+    "upstream_retries_total", "Upstream calls retried after a transient error or rate limit", ("upstream",))
+
+_tracer = otel_trace.get_tracer("chatbot-api") if otel_trace is not None and settings.OTEL_TRACING_ENABLED else None
+if settings.OTEL_TRACING_ENABLED and otel_trace is None:
+    logger.warning("OTEL_TRACING_ENABLED is set but opentelemetry-api is not installed; no spans are recorded")
+
+class track_stage:
+    """
+    Time a block into chat_stage_duration_seconds under the given stage, or
+    into another single-label histogram, and wrap it in an OpenTelemetry span
+    when tracing is enabled.
+    """
+
+    __slots__ = ("histogram", "label", "_start", "_span")
+
+    def __init__(self, label: str, histogram: Histogram = CHAT_STAGE_SECONDS):
+        self.histogram = histogram
+        self.label = label
+        self._span = _tracer.start_as_current_span(f"{histogram.name.split('_')[0]}.{label}") if _tracer is not None else None
+
+    def __enter__(self) -> "track_stage":
+        if self._span is not None:
+            self._span.__enter__()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.histogram.observe(time.perf_counter() - self._start, self.label)
+        if self._span is not None:
+            self._span.__exit__(exc_type, exc, tb)
+
+def chat_route(model_used: Optional[str]) -> str:
+    """Route label of an answer: how it was produced, with every language model counted as llm"""
+    return model_used if model_used in DIRECT_ROUTES else "llm"
+
+def record_chat_request(endpoint: str, route: str, seconds: float) -> None:
+    CHAT_REQUESTS.inc(endpoint, route)
+    CHAT_REQUEST_SECONDS.observe(seconds, endpoint, route)
+
+def db_operation(method: str, path: str) -> str:
+    """Operation label of a PostgREST request: "rpc <function>" or "<METHOD> <table>" """
+    resource = path.rstrip("/").rsplit("/rest/v1/", 1)[-1]
+    if resource.startswith("rpc/"):
+        return f"rpc {resource[4:]}"
+    return f"{method} {resource}"
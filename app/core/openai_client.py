@@ -0,0 +1,52 @@
+import logging
+from typing import TYPE_CHECKING, Optional, Tuple
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    import openai
+
+logger = logging.getLogger(__name__)
+
+# openai and httpx take a few hundred milliseconds to import: done with the first client, not with the app
+_client: Optional["openai.AsyncOpenAI"] = None
+
+def get_openai_client() -> "openai.AsyncOpenAI":
+    """Get the shared async OpenAI client backed by a bounded connection pool"""
+    global _client
+    if _client is None:
+        import httpx
+        import openai
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS
+            ),
+            timeout=httpx.Timeout(settings.OPENAI_CHAT_TIMEOUT, connect=settings.OPENAI_CONNECT_TIMEOUT)
+        )
+        _client = openai.AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL or None,
+            # Retried by the admission limiters (app.core.admission), which free the slot while backing off
+            max_retries=0,
+            http_client=http_client
+        )
+        logger.info(f"OpenAI async client initialized (max_connections={settings.OPENAI_MAX_CONNECTIONS})")
+    return _client
+
+def transient_errors() -> Tuple[type, ...]:
+    """OpenAI errors worth retrying with backoff"""
+    import openai
+
+    return (
+        openai.RateLimitError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
+    )
+
+async def close_openai_client() -> None:
+    """Close the shared OpenAI client and release pooled connections"""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -0,0 +1,110 @@
+import logging
+import math
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - tiktoken is in requirements.txt
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Context window per model family (prompt + completion); longest prefix wins
+MODEL_CONTEXT_WINDOWS: Dict[str, int] = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-3.5-turbo-instruct": 4096,
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4-1106": 128000,
+    "gpt-4-0125": 128000,
+    "gpt-4o": 128000,
+}
+DEFAULT_CONTEXT_WINDOW = 4096
+
+# Chat format overhead: every message is wrapped in ~3 tokens, the reply is primed with 3
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+# Used when no encoding can be loaded; deliberately pessimistic so prompts never overflow
+_FALLBACK_CHARS_PER_TOKEN = 3
+
+def context_window(model: str) -> int:
+    """Context window of a model, matched on the longest known name prefix"""
+    matches = [name for name in MODEL_CONTEXT_WINDOWS if model == name or model.startswith(f"{name}-")]
+    return MODEL_CONTEXT_WINDOWS[max(matches, key=len)] if matches else DEFAULT_CONTEXT_WINDOW
+
+@lru_cache(maxsize=None)
+def _encoding(model: str) -> Optional[Any]:
+    """tiktoken encoding for a model, loaded once per model (None when unavailable)"""
+    if tiktoken is None:
+        logger.warning("tiktoken is not installed; estimating token counts from text length")
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # The BPE file is downloaded on first use; offline hosts need TIKTOKEN_CACHE_DIR
+        logger.warning(f"Could not load tokenizer for {model}, estimating token counts from text length: {e}")
+        return None
+
+class TokenCounter:
+    """
+    Token counting for one model.
+    Counts of repeated texts (static prompt parts, popular documents) are kept
+    in a bounded LRU cache, so only new text is encoded.
+    """
+
+    def __init__(self, model: str, cache_size: int = 1024):
+        self.model = model
+        self.encoding = _encoding(model)
+        self.cache_size = cache_size
+        self._counts: "OrderedDict[str, int]" = OrderedDict()
+
+    @property
+    def exact(self) -> bool:
+        return self.encoding is not None
+
+    def count(self, text: str) -> int:
+        """Number of tokens in text"""
+        if not text:
+            return 0
+        cached = self._counts.get(text)
+        if cached is not None:
+            self._counts.move_to_end(text)
+            return cached
+        if self.encoding is not None:
+            tokens = len(self.encoding.encode(text, disallowed_special=()))
+        else:
+            tokens = math.ceil(len(text) / _FALLBACK_CHARS_PER_TOKEN)
+        self._counts[text] = tokens
+        if len(self._counts) > self.cache_size:
+            self._counts.popitem(last=False)
+        return tokens
+
+    def count_message(self, role: str, content: str) -> int:
+        """Tokens a chat message takes in the prompt, including its framing"""
+        return TOKENS_PER_MESSAGE + self.count(role) + self.count(content)
+
+    def count_messages(self, messages: List[Dict[str, str]]) -> int:
+        return TOKENS_PER_REPLY + sum(self.count_message(m["role"], m["content"]) for m in messages)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Longest prefix of text that fits in max_tokens"""
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        if self.encoding is not None:
+            # A cut inside a multi-byte character decodes to U+FFFD
+            return self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:max_tokens]).rstrip("\ufffd")
+        return text[:max_tokens * _FALLBACK_CHARS_PER_TOKEN]
+
+@lru_cache(maxsize=None)
+def get_token_counter(model: str) -> TokenCounter:
+    """Shared token counter per model"""
+    return TokenCounter(model)
@@ -0,0 +1,156 @@
+import json
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def to_vector(value: Any, dimension: int) -> Optional[np.ndarray]:
+    """Convert an embedding from PostgREST (list or pgvector text) into a float32 array"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = json.loads(value)
+    vector = np.asarray(value, dtype=np.float32)
+    if vector.shape != (dimension,):
+        return None
+    return vector
+
+class VectorIndex:
+    """
+    In-process index of active document (or FAQ item) embeddings.
+    Rows are L2-normalized and kept in one contiguous float32 matrix, so a
+    top-k cosine query is a single matrix-vector product.
+    """
+
+    def __init__(self, dimension: int = 1536):
+        self.dimension = dimension
+        self._matrix = np.empty((0, dimension), dtype=np.float32)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._size = 0
+        self._row_of: Dict[int, int] = {}
+        self._docs: Dict[int, Dict[str, Any]] = {}
+        self.versions: Dict[int, Optional[str]] = {}
+        self.ready = False
+
+    def __len__(self) -> int:
+        return self._size
+
+    def load(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Replace the whole index with the given document rows"""
+        vectors, ids, docs, versions = [], [], {}, {}
+        for row in rows:
+            vector = self._normalize(to_vector(row.get("content_embedding"), self.dimension))
+            if vector is None:
+                continue
+            vectors.append(vector)
+            ids.append(row["id"])
+            docs[row["id"]] = self._metadata(row)
+            versions[row["id"]] = row.get("updated_at")
+        matrix = np.vstack(vectors) if vectors else np.empty((0, self.dimension), dtype=np.float32)
+        self._matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self._ids = np.asarray(ids, dtype=np.int64)
+        self._size = len(ids)
+        self._row_of = {doc_id: i for i, doc_id in enumerate(ids)}
+        self._docs = docs
+        self.versions = versions
+        self.ready = True
+        return self._size
+
+    def upsert(self, row: Dict[str, Any]) -> bool:
+        """Insert or replace one document; documents without an embedding are removed"""
+        doc_id = row["id"]
+        if row.get("is_active") is False:
+            self.remove(doc_id)
+            return False
+        if "content_embedding" not in row and doc_id in self._docs:
+            # Metadata-only change, keep the existing vector
+            self._docs[doc_id].update({k: v for k, v in self._metadata(row).items() if k in row})
+            self.versions[doc_id] = row.get("updated_at", self.versions.get(doc_id))
+            return True
+        vector = self._normalize(to_vector(row.get("content_embedding"), self.dimension))
+        if vector is None:
+            self.remove(doc_id)
+            return False
+        index = self._row_of.get(doc_id)
+        if index is None:
+            index = self._append_slot(doc_id)
+        self._matrix[index] = vector
+        self._docs[doc_id] = self._metadata(row)
+        self.versions[doc_id] = row.get("updated_at")
+        return True
+
+    def remove(self, doc_id: int) -> bool:
+        """Remove a document by moving the last row into its slot"""
+        index = self._row_of.pop(doc_id, None)
+        if index is None:
+            return False
+        last = self._size - 1
+        if index != last:
+            moved_id = int(self._ids[last])
+            self._matrix[index] = self._matrix[last]
+            self._ids[index] = moved_id
+            self._row_of[moved_id] = index
+        self._size = last
+        self._docs.pop(doc_id, None)
+        self.versions.pop(doc_id, None)
+        return True
+
+    def search(self, query_embedding: List[float], threshold: float = 0.7, limit: int = 5) -> List[Dict[str, Any]]:
+        """Top-k cosine search with the same threshold/limit semantics as search_similar_content"""
+        if self._size == 0 or limit <= 0:
+            return []
+        query = self._normalize(np.asarray(query_embedding, dtype=np.float32))
+        if query is None:
+            return []
+        scores = self._matrix[:self._size] @ query
+        candidates = np.flatnonzero(scores > threshold)
+        if candidates.size == 0:
+            return []
+        if candidates.size > limit:
+            top = np.argpartition(scores[candidates], -limit)[-limit:]
+            candidates = candidates[top]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [
+            {**self._docs[int(self._ids[i])], "similarity": float(scores[i])}
+            for i in candidates
+        ]
+
+    def _append_slot(self, doc_id: int) -> int:
+        if self._size == self._matrix.shape[0]:
+            capacity = max(16, self._matrix.shape[0] * 2)
+            matrix = np.empty((capacity, self.dimension), dtype=np.float32)
+            matrix[:self._size] = self._matrix[:self._size]
+            ids = np.empty(capacity, dtype=np.int64)
+            ids[:self._size] = self._ids[:self._size]
+            self._matrix, self._ids = matrix, ids
+        index = self._size
+        self._ids[index] = doc_id
+        self._row_of[doc_id] = index
+        self._size += 1
+        return index
+
+    @staticmethod
+    def _normalize(vector: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        if vector is None:
+            return None
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            return None
+        return vector / norm
+
+    @staticmethod
+    def _metadata(row: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": row["id"],
+            "title": row.get("title"),
+            "content": row.get("content"),
+            "document_type": row.get("document_type"),
+            "source": row.get("source", "document"),
+        }
+
+# Shared index of active document embeddings
+document_index = VectorIndex()
+# Shared index of active FAQ item embeddings, rows shaped like the FAQ hits of search_similar_content
+faq_index = VectorIndex()
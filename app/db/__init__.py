@@ -1,3 +1,3 @@
-from .supabase import get_supabase_client
+from .supabase import get_supabase_client, get_async_supabase_client, close_async_supabase_client
 
-__all__ = ["get_supabase_client"]
\ No newline at end of file
+__all__ = ["get_supabase_client", "get_async_supabase_client", "close_async_supabase_client"]
@@ -0,0 +1,79 @@
+from postgrest import AsyncPostgrestClient
+from typing import AsyncIterator, Callable, Dict, Union
+from app.core.admission import UpstreamLimiter, database_limiter
+from app.core.config import settings
+from app.core.metrics import DB_REQUEST_ERRORS, DB_REQUEST_SECONDS, db_operation, track_stage
+import httpx
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response stream that frees its pool slot once the body is closed"""
+    
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+        self._released = False
+    
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+    
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._release()
+
+class BoundedAsyncTransport(httpx.AsyncBaseTransport):
+    """
+    HTTP transport that queues requests in an admission limiter sized to the
+    pool, which also bounds their wait and rate. Waiting there is O(1),
+    whereas httpcore rescans its whole request queue on every connection
+    event once the pool is saturated.
+    """
+    
+    def __init__(self, limits: httpx.Limits, limiter: UpstreamLimiter, **kwargs):
+        self._transport = httpx.AsyncHTTPTransport(limits=limits, **kwargs)
+        self._limiter = limiter
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        # Timed here so every repository call is measured, including the wait for a pool slot
+        operation = db_operation(request.method, request.url.path)
+        with track_stage(operation, DB_REQUEST_SECONDS):
+            await self._limiter.acquire()
+            try:
+                response = await self._transport.handle_async_request(request)
+            except BaseException:
+                self._limiter.release()
+                DB_REQUEST_ERRORS.inc(operation)
+                raise
+        if response.status_code >= 400:
+            DB_REQUEST_ERRORS.inc(operation)
+        response.stream = _ReleasingStream(response.stream, self._limiter.release)
+        return response
+    
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+class PooledAsyncPostgrestClient(AsyncPostgrestClient):
+    """Async PostgREST client whose HTTP session uses a bounded connection pool"""
+    
+    def create_session(
+        self,
+        base_url: str,
+        headers: Dict[str, str],
+        timeout: Union[int, float, httpx.Timeout],
+        verify: bool = True
+    ) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=settings.SUPABASE_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.SUPABASE_POOL_MAX_KEEPALIVE
+        )
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            follow_redirects=True,
+            transport=BoundedAsyncTransport(limits, database_limiter, verify=verify, http2=True)
+        )
@@ -1,19 +1,55 @@
-from supabase import create_client, Client
+from typing import TYPE_CHECKING, Optional
 from app.core.config import settings
 import logging
 
+if TYPE_CHECKING:
+    from postgrest import AsyncPostgrestClient
+    from supabase import Client
+
 logger = logging.getLogger(__name__)
 
-_client: Client = None
+# httpx, postgrest and supabase are imported when the first client is built, not with the app
+_client: Optional["Client"] = None
+_async_client: Optional["AsyncPostgrestClient"] = None
 
-def get_supabase_client() -> Client:
+def get_supabase_client() -> "Client":
     """Get Supabase client instance"""
     global _client
     if _client is None:
         try:
+            from supabase import create_client
             _client = create_client(settings.SUPABASE_URL, settings.SUPABASE_ANON_KEY)
             logger.info("Supabase client initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Supabase client: {e}")
             raise
-    return _client
\ No newline at end of file
+    return _client
+
+def get_async_supabase_client() -> "AsyncPostgrestClient":
+    """Get the shared async PostgREST client for the Supabase database"""
+    global _async_client
+    if _async_client is None:
+        try:
+            from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS
+            from app.db.pool import PooledAsyncPostgrestClient
+            _async_client = PooledAsyncPostgrestClient(
+                settings.SUPABASE_REST_URL or f"{settings.SUPABASE_URL.rstrip('/')}/rest/v1",
+                headers={
+                    **DEFAULT_POSTGREST_CLIENT_HEADERS,
+                    "apikey": settings.SUPABASE_ANON_KEY,
+                    "Authorization": f"Bearer {settings.SUPABASE_ANON_KEY}"
+                },
+                timeout=settings.SUPABASE_TIMEOUT
+            )
+            logger.info(f"Async Supabase client initialized (pool size {settings.SUPABASE_POOL_MAX_CONNECTIONS})")
+        except Exception as e:
+            logger.error(f"Failed to initialize async Supabase client: {e}")
+            raise
+    return _async_client
+
+async def close_async_supabase_client() -> None:
+    """Close the shared async client and release pooled connections"""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
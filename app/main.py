@@ -1,9 +1,25 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
 from app.core.config import settings
-from app.api import chat_router, health_router, documents_router
+from app.core.intent_engine import load_intents
+from app.core.metrics import metrics
+from app.core.openai_client import close_openai_client
+from app.core.tokenizer import get_token_counter
+from app.db import close_async_supabase_client
+from app.services.document_index_sync import document_index_sync, faq_index_sync
+from app.services.semantic_cache_sync import semantic_cache_sync
+from app.services.intent_registry import intent_registry_watcher
+from app.services.faq_catalogue import faq_catalogue
+from app.services.embedding_backfill import embedding_backfill
+from app.services.embedding_worker import embedding_worker
+from app.services.message_buffer import message_buffer
+from app.services.chat_service import chat_service
+from app.api import chat_router, health_router, documents_router, admin_router
+import asyncio
 import logging
+import time
 
 # Configure logging
 logging.basicConfig(
@@ -12,6 +28,92 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup and shutdown hooks"""
+    try:
+        settings.validate_settings()
+    except ValueError as e:
+        logger.error(f"Invalid configuration, not starting: {e}")
+        raise
+    # Refresh loops start first, so their initial loads overlap the warm-up
+    if settings.LOCAL_VECTOR_INDEX_ENABLED:
+        document_index_sync.start()
+        faq_index_sync.start()
+    intent_registry_watcher.start()
+    faq_catalogue.start()
+    if settings.SEMANTIC_CACHE_ENABLED and settings.SEMANTIC_CACHE_SYNC_SECONDS > 0:
+        semantic_cache_sync.start()
+    if settings.EMBEDDING_WORKER_IN_PROCESS:
+        embedding_worker.start()
+    if settings.MESSAGE_BUFFER_ENABLED:
+        message_buffer.start()
+    metrics.start()
+    await warm_up()
+    # Imported while the server already accepts requests; a request that needs a client first waits for it
+    client_modules = asyncio.ensure_future(asyncio.to_thread(import_client_modules))
+    yield
+    await asyncio.wait([client_modules])
+    await intent_registry_watcher.stop()
+    await faq_catalogue.stop()
+    await embedding_worker.stop()
+    await embedding_backfill.stop()
+    await document_index_sync.stop()
+    await faq_index_sync.stop()
+    await semantic_cache_sync.stop()
+    # Write buffered chat messages, including those of the last streams, while the database client is still open
+    await chat_service.drain()
+    await message_buffer.stop()
+    # Release pooled upstream connections
+    await close_openai_client()
+    await close_async_supabase_client()
+    await metrics.stop()
+
+def import_client_modules() -> None:
+    """
+    Import the OpenAI and database client libraries. They take a few hundred
+    milliseconds to import, so importing the app leaves them to the first
+    client built
+    """
+    import openai  # noqa: F401
+    import app.db.pool  # noqa: F401
+
+async def warm_up() -> None:
+    """Load the tokenizer (it may download its BPE file) and compile the intents, concurrently and off the event loop"""
+    start = time.perf_counter()
+    await asyncio.gather(
+        asyncio.to_thread(get_token_counter, settings.MODEL_NAME),
+        asyncio.to_thread(load_intents)
+    )
+    logger.info(f"Warm-up finished in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+async def preload_state() -> None:
+    """
+    Build the read-only state before worker processes fork (serve.py): the
+    tokenizer, compiled intents, the FAQ catalogue and, when enabled, the
+    local document and FAQ indexes. Workers then only refresh what changed. The network
+    clients used here are closed, so each worker opens its own.
+    """
+    try:
+        loads = {"FAQ catalogue": faq_catalogue.reload()}
+        if settings.LOCAL_VECTOR_INDEX_ENABLED:
+            loads["Document index"] = document_index_sync.sync_once()
+            loads["FAQ index"] = faq_index_sync.sync_once()
+        # Client modules too, so the workers share them instead of each importing its own
+        warmed, imported, *results = await asyncio.gather(
+            warm_up(), asyncio.to_thread(import_client_modules), *loads.values(), return_exceptions=True)
+        for result in (warmed, imported):
+            if isinstance(result, BaseException):
+                raise result
+        for name, result in zip(loads, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"{name} not preloaded, workers load it on start: {result}")
+    finally:
+        await close_openai_client()
+        await close_async_supabase_client()
+        # Calls made while preloading are not any worker's
+        metrics.reset()
+
 def create_app() -> FastAPI:
     """Create and configure the FastAPI application"""
     
@@ -22,7 +124,8 @@ def create_app() -> FastAPI:
         version=settings.API_VERSION,
         debug=settings.DEBUG,
         docs_url="/docs",
-        redoc_url="/redoc"
+        redoc_url="/redoc",
+        lifespan=lifespan
     )
     
     # Add CORS middleware
@@ -38,6 +141,7 @@ def create_app() -> FastAPI:
     app.include_router(health_router)
     app.include_router(chat_router, prefix="/api/v1")
     app.include_router(documents_router, prefix="/api/v1")
+    app.include_router(admin_router, prefix="/api/v1")
     
     # Global exception handler
     @app.exception_handler(HTTPException)
@@ -48,7 +152,8 @@ def create_app() -> FastAPI:
             content={
                 "error": exc.detail,
                 "status_code": exc.status_code
-            }
+            },
+            headers=getattr(exc, "headers", None)
         )
     
     @app.exception_handler(Exception)
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
+from uuid import UUID
 
 class Message(BaseModel):
     """Individual message model"""
@@ -11,7 +12,8 @@ class Message(BaseModel):
 class ChatRequest(BaseModel):
     """Request model for chat endpoint"""
     message: str = Field(..., min_length=1, max_length=2000, description="User message")
-    conversation_history: Optional[List[Message]] = Field(default_factory=list, description="Previous conversation messages")
+    conversation_id: Optional[UUID] = Field(default=None, description="Conversation to continue; the server supplies its recent history")
+    conversation_history: Optional[List[Message]] = Field(default_factory=list, description="Previous conversation messages (overrides the server-side history)")
     system_prompt: Optional[str] = Field(default=None, description="Custom system prompt")
     temperature: Optional[float] = Field(default=None, ge=0.0, le=2.0, description="Response creativity (0-2)")
     max_tokens: Optional[int] = Field(default=None, ge=1, le=4000, description="Maximum response length")
@@ -24,6 +26,7 @@ class ChatResponse(BaseModel):
     timestamp: datetime = Field(default_factory=datetime.now, description="Response timestamp")
     model_used: str = Field(..., description="AI model used for the response")
     tokens_used: Optional[int] = Field(default=None, description="Number of tokens consumed")
+    prompt_tokens: Optional[Dict[str, int]] = Field(default=None, description="Prompt token breakdown by part (system, context, history, user)")
 
     # Avoid conflicts with Pydantic's protected namespaces if fields resemble them
     model_config = {
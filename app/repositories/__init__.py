@@ -1,5 +1,6 @@
 from .faq_repository import faq_repository
 from .chat_session_repository import chat_session_repository
 from .document_repository import document_repository
+from .embedding_job_repository import embedding_job_repository
 
-__all__ = ["faq_repository", "chat_session_repository", "document_repository"]
\ No newline at end of file
+__all__ = ["faq_repository", "chat_session_repository", "document_repository", "embedding_job_repository"]
\ No newline at end of file
@@ -1,40 +1,43 @@
-from typing import List, Optional, Dict, Any
-from app.db import get_supabase_client
+from typing import TYPE_CHECKING, List, Optional, Dict, Any
+from app.db import get_async_supabase_client
 import logging
 import uuid
 
+if TYPE_CHECKING:
+    from postgrest import AsyncPostgrestClient
+
 logger = logging.getLogger(__name__)
 
 class ChatSessionRepository:
     """Repository for chat sessions and messages"""
     
-    def __init__(self):
-        self.client = get_supabase_client()
+    @property
+    def client(self) -> "AsyncPostgrestClient":
+        """Shared async PostgREST client"""
+        return get_async_supabase_client()
     
-    async def create_session(self, user_id: Optional[str] = None) -> str:
-        """Create a new chat session"""
+    async def create_session(self, user_id: Optional[str] = None, session_id: Optional[str] = None) -> str:
+        """Create a new chat session; an existing session with the same id is kept as it is"""
+        from postgrest.types import ReturnMethod
+
+        session_id = session_id or str(uuid.uuid4())
         try:
-            session_id = str(uuid.uuid4())
-            response = self.client.table("chat_sessions").insert({
+            # Messages may have created the session already (see add_messages)
+            await self.client.table("chat_sessions").upsert({
                 "id": session_id,
                 "user_id": user_id,
                 "stage": "active"
-            }).execute()
-            
-            if response.data:
-                return session_id
-            else:
-                logger.error("Failed to create session")
-                return session_id  # Return generated ID even if insert failed
+            }, on_conflict="id", ignore_duplicates=True, returning=ReturnMethod.minimal).execute()
+            return session_id
                 
         except Exception as e:
-            logger.error(f"Error creating session: {e}")
-            return str(uuid.uuid4())  # Return a new ID as fallback
+            logger.error(f"Error creating session {session_id}: {e}")
+            return session_id  # Return the ID even if the insert failed
     
     async def add_message(self, session_id: str, role: str, content: str) -> bool:
         """Add a message to a chat session"""
         try:
-            response = self.client.table("chat_messages").insert({
+            response = await self.client.table("chat_messages").insert({
                 "session_id": session_id,
                 "role": role,
                 "content": content
@@ -46,20 +49,48 @@ class ChatSessionRepository:
             logger.error(f"Error adding message to session {session_id}: {e}")
             return False
     
-    async def get_session_messages(self, session_id: str) -> List[Dict[str, Any]]:
-        """Get all messages for a session"""
+    async def add_messages(self, messages: List[Dict[str, Any]]) -> None:
+        """
+        Insert messages with one multi-row insert, creating sessions that do
+        not exist yet so the session_id foreign key holds (raises on error)
+        """
+        from postgrest.types import ReturnMethod
+
+        session_ids = list(dict.fromkeys(message["session_id"] for message in messages))
+        await self.client.table("chat_sessions").upsert(
+            [{"id": session_id} for session_id in session_ids],
+            on_conflict="id",
+            ignore_duplicates=True,
+            returning=ReturnMethod.minimal
+        ).execute()
+        await self.client.table("chat_messages").insert(messages, returning=ReturnMethod.minimal).execute()
+    
+    async def get_session_messages(self, session_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get the messages of a session, oldest first; with limit, only the most recent ones"""
         try:
-            response = self.client.table("chat_messages").select("*").eq("session_id", session_id).order("created_at").execute()
-            return response.data or []
+            if limit is None:
+                response = await self.client.table("chat_messages").select("*").eq("session_id", session_id).order("created_at").execute()
+                return response.data or []
+            response = await self.client.table("chat_messages").select("*").eq("session_id", session_id).order(
+                "created_at", desc=True
+            ).limit(limit).execute()
+            return list(reversed(response.data or []))
             
         except Exception as e:
             logger.error(f"Error fetching messages for session {session_id}: {e}")
             return []
     
+    async def get_latest_message_time(self, session_id: str) -> Optional[str]:
+        """Get created_at of the newest stored message of a session (raises on error)"""
+        response = await self.client.table("chat_messages").select("created_at").eq("session_id", session_id).order(
+            "created_at", desc=True
+        ).limit(1).execute()
+        return response.data[0]["created_at"] if response.data else None
+    
     async def update_session_helpful(self, session_id: str, helpful: bool) -> bool:
         """Update whether the session was helpful"""
         try:
-            response = self.client.table("chat_sessions").update({
+            response = await self.client.table("chat_sessions").update({
                 "helpful": helpful
             }).eq("id", session_id).execute()
             
@@ -72,7 +103,7 @@ class ChatSessionRepository:
     async def mark_session_escalated(self, session_id: str) -> bool:
         """Mark session as escalated to human support"""
         try:
-            response = self.client.table("chat_sessions").update({
+            response = await self.client.table("chat_sessions").update({
                 "escalated": True,
                 "escalated_at": "now()"
             }).eq("id", session_id).execute()
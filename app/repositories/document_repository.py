@@ -1,12 +1,21 @@
-from typing import List, Dict, Any, Optional
-from app.db import get_supabase_client
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple
+from app.db import get_async_supabase_client
+from app.core.vector_index import document_index
+from app.core.ann_index import VectorIndexPlan
 import logging
 
+if TYPE_CHECKING:
+    from postgrest import AsyncPostgrestClient
+
 logger = logging.getLogger(__name__)
 
 class DocumentRepository:
-    def __init__(self):
-        self.client = get_supabase_client()
+    page_size = 1000
+    
+    @property
+    def client(self) -> "AsyncPostgrestClient":
+        """Shared async PostgREST client"""
+        return get_async_supabase_client()
     
     async def create_document(
         self, 
@@ -27,10 +36,11 @@ class DocumentRepository:
                 "is_active": True
             }
             
-            response = self.client.table("documents").insert(document_data).execute()
+            response = await self.client.table("documents").insert(document_data).execute()
             
             if response.data:
                 doc_id = response.data[0]["id"]
+                self._sync_index(response.data[0])
                 logger.info(f"Document created successfully with ID: {doc_id}")
                 return doc_id
             
@@ -66,9 +76,11 @@ class DocumentRepository:
             if not update_data:
                 return False
             
-            response = self.client.table("documents").update(update_data).eq("id", document_id).execute()
+            response = await self.client.table("documents").update(update_data).eq("id", document_id).execute()
             
             if response.data:
+                for row in response.data:
+                    self._sync_index(row)
                 logger.info(f"Document {document_id} updated successfully")
                 return True
             return False
@@ -82,14 +94,15 @@ class DocumentRepository:
         try:
             if soft_delete:
                 # Soft delete - mark as inactive
-                response = self.client.table("documents").update({
+                response = await self.client.table("documents").update({
                     "is_active": False
                 }).eq("id", document_id).execute()
             else:
                 # Hard delete - actually remove from database
-                response = self.client.table("documents").delete().eq("id", document_id).execute()
+                response = await self.client.table("documents").delete().eq("id", document_id).execute()
             
             if response.data:
+                document_index.remove(document_id)
                 logger.info(f"Document {document_id} {'soft' if soft_delete else 'hard'} deleted successfully")
                 return True
             return False
@@ -101,7 +114,7 @@ class DocumentRepository:
     async def get_document(self, document_id: int) -> Optional[Dict[str, Any]]:
         """Get a single document by ID"""
         try:
-            response = self.client.table("documents").select("*").eq("id", document_id).eq("is_active", True).limit(1).execute()
+            response = await self.client.table("documents").select("*").eq("id", document_id).eq("is_active", True).limit(1).execute()
             
             if response.data:
                 return response.data[0]
@@ -128,7 +141,7 @@ class DocumentRepository:
             if tags:
                 query = query.contains("tags", tags)
             
-            response = query.order("created_at", desc=True).range(offset, offset + limit - 1).execute()
+            response = await query.order("created_at", desc=True).range(offset, offset + limit - 1).execute()
             
             return response.data or []
             
@@ -139,7 +152,7 @@ class DocumentRepository:
     async def get_documents_without_embeddings(self) -> List[Dict[str, Any]]:
         """Get all documents that don't have embeddings yet"""
         try:
-            response = self.client.table("documents").select("id, title, content").eq("is_active", True).is_("content_embedding", "null").execute()
+            response = await self.client.table("documents").select("id, title, content").eq("is_active", True).is_("content_embedding", "null").execute()
             
             return response.data or []
             
@@ -147,4 +160,109 @@ class DocumentRepository:
             logger.error(f"Error fetching documents without embeddings: {e}")
             return []
 
+    async def get_documents_for_embedding(self, after_id: int, limit: int, only_missing: bool = True) -> List[Dict[str, Any]]:
+        """Get the next page of active documents to embed, in ID order after the given ID (raises on error)"""
+        query = self.client.table("documents").select("id, title, content, document_type, updated_at").eq("is_active", True).gt("id", after_id)
+        if only_missing:
+            query = query.is_("content_embedding", "null")
+        response = await query.order("id").limit(limit).execute()
+        return response.data or []
+    
+    async def count_documents_for_embedding(self, after_id: int = 0, only_missing: bool = True) -> Optional[int]:
+        """Count active documents a backfill would embed (None on error)"""
+        try:
+            query = self.client.table("documents").select("id", count="exact").eq("is_active", True).gt("id", after_id)
+            if only_missing:
+                query = query.is_("content_embedding", "null")
+            response = await query.limit(1).execute()
+            return response.count
+            
+        except Exception as e:
+            logger.error(f"Error counting documents for embedding: {e}")
+            return None
+    
+    async def bulk_update_embeddings(
+        self,
+        embeddings: Dict[int, List[float]],
+        chunks: Optional[List[Dict[str, Any]]] = None
+    ) -> int:
+        """
+        Write many embeddings in one statement; returns the number of rows updated (raises on error).
+        When chunks is given, the stored chunks of these documents are replaced by it.
+        """
+        params = {"updates": [{"id": doc_id, "embedding": embedding} for doc_id, embedding in embeddings.items()]}
+        if chunks is not None:
+            params["chunks"] = chunks
+        response = await self.client.rpc("bulk_update_embeddings", params).execute()
+        return response.data or 0
+    
+    async def get_document_versions(self) -> Optional[List[Dict[str, Any]]]:
+        """Get id and updated_at of every active document with an embedding (None on error)"""
+        try:
+            versions = []
+            offset = 0
+            while True:
+                response = await self.client.table("documents").select("id, updated_at").eq("is_active", True).not_.is_("content_embedding", "null").order("id").range(offset, offset + self.page_size - 1).execute()
+                rows = response.data or []
+                versions.extend(rows)
+                if len(rows) < self.page_size:
+                    return versions
+                offset += self.page_size
+            
+        except Exception as e:
+            logger.error(f"Error fetching document versions: {e}")
+            return None
+    
+    async def get_documents_version(self) -> Tuple[int, Optional[str]]:
+        """Get the row count and latest updated_at of the documents table; any insert, update or delete changes one of them (raises on error)"""
+        response = await self.client.table("documents").select("updated_at", count="exact").order("updated_at", desc=True).limit(1).execute()
+        return response.count, response.data[0]["updated_at"] if response.data else None
+    
+    async def get_documents_updated_since(self, updated_at: str, limit: int) -> List[Dict[str, Any]]:
+        """Get id, is_active and embedding of documents updated at or after a time, oldest first (raises on error)"""
+        response = await self.client.table("documents").select("id, is_active, content_embedding, updated_at").gte("updated_at", updated_at).order("updated_at").limit(limit).execute()
+        return response.data or []
+    
+    async def get_documents_with_embeddings(self, document_ids: List[int]) -> List[Dict[str, Any]]:
+        """Get full rows, including embeddings, for the given document IDs"""
+        try:
+            response = await self.client.table("documents").select("id, title, content, document_type, is_active, content_embedding, updated_at").in_("id", document_ids).execute()
+            
+            return response.data or []
+            
+        except Exception as e:
+            logger.error(f"Error fetching documents with embeddings: {e}")
+            return []
+    
+    async def get_documents_text(self, document_ids: List[int]) -> List[Dict[str, Any]]:
+        """Get the text of the given active documents, for embedding (raises on error)"""
+        response = await self.client.table("documents").select("id, title, content, document_type, updated_at").in_("id", document_ids).eq("is_active", True).execute()
+        return response.data or []
+    
+    async def get_vector_index_stats(self) -> Optional[List[Dict[str, Any]]]:
+        """Get row counts and the current embedding index of each vector-indexed table (None on error)"""
+        try:
+            response = await self.client.rpc("vector_index_stats", {}).execute()
+            return response.data or []
+            
+        except Exception as e:
+            logger.error(f"Error fetching vector index stats: {e}")
+            return None
+    
+    async def rebuild_vector_index(self, plan: VectorIndexPlan) -> str:
+        """Drop and recreate a table's embedding index as planned; returns its definition (raises on error)"""
+        response = await self.client.rpc("rebuild_vector_index", {
+            "target_table": plan.table,
+            "index_method": plan.method,
+            "lists": plan.lists,
+            "m": plan.m,
+            "ef_construction": plan.ef_construction
+        }).execute()
+        return response.data
+    
+    def _sync_index(self, row: Dict[str, Any]) -> None:
+        """Mirror a written row into the in-process vector index once it is loaded"""
+        if document_index.ready:
+            document_index.upsert(row)
+
 document_repository = DocumentRepository()
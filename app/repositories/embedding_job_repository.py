@@ -0,0 +1,93 @@
+from typing import TYPE_CHECKING, List, Optional, Dict, Any
+from datetime import datetime
+from app.db import get_async_supabase_client
+from app.core.config import settings
+import logging
+
+if TYPE_CHECKING:
+    from postgrest import AsyncPostgrestClient
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingJobRepository:
+    """Repository for the embedding_jobs queue table"""
+
+    @property
+    def client(self) -> "AsyncPostgrestClient":
+        """Shared async PostgREST client"""
+        return get_async_supabase_client()
+
+    async def enqueue(self, document_ids: List[int]) -> List[Dict[str, Any]]:
+        """Queue an embedding job per document; documents that already have a pending job keep it"""
+        if not document_ids:
+            return []
+        try:
+            response = await self.client.rpc("enqueue_embedding_jobs", {
+                "document_ids": document_ids,
+                "max_attempts": settings.EMBEDDING_JOB_MAX_ATTEMPTS
+            }).execute()
+
+            return response.data or []
+
+        except Exception as e:
+            logger.error(f"Error enqueueing embedding jobs for documents {document_ids}: {e}")
+            return []
+
+    async def claim(self, worker_id: str, limit: int, lease_seconds: int) -> List[Dict[str, Any]]:
+        """Claim up to limit due jobs for a worker (raises on error)"""
+        response = await self.client.rpc("claim_embedding_jobs", {
+            "worker_id": worker_id,
+            "batch_size": limit,
+            "lease_seconds": lease_seconds
+        }).execute()
+        return response.data or []
+
+    async def complete(self, job_ids: List[int], worker_id: str) -> bool:
+        """Mark claimed jobs as succeeded"""
+        try:
+            await self.client.table("embedding_jobs").update({
+                "status": "succeeded",
+                "locked_by": None,
+                "locked_until": None,
+                "last_error": None
+            }).in_("id", job_ids).eq("locked_by", worker_id).execute()
+
+            return True
+
+        except Exception as e:
+            logger.error(f"Error completing embedding jobs {job_ids}: {e}")
+            return False
+
+    async def reschedule(self, job_id: int, worker_id: str, error: str, run_after: Optional[datetime]) -> bool:
+        """Put a claimed job back in the queue for run_after, or mark it failed when run_after is None"""
+        try:
+            changes = {
+                "status": "pending" if run_after is not None else "failed",
+                "locked_by": None,
+                "locked_until": None,
+                "last_error": error[:1000]
+            }
+            if run_after is not None:
+                changes["run_after"] = run_after.isoformat()
+            await self.client.table("embedding_jobs").update(changes).eq("id", job_id).eq("locked_by", worker_id).execute()
+
+            return True
+
+        except Exception as e:
+            logger.error(f"Error rescheduling embedding job {job_id}: {e}")
+            return False
+
+    async def get_latest_job(self, document_id: int) -> Optional[Dict[str, Any]]:
+        """Get the most recent embedding job of a document"""
+        try:
+            response = await self.client.table("embedding_jobs").select(
+                "id, status, attempts, max_attempts, run_after, last_error, created_at, updated_at"
+            ).eq("document_id", document_id).order("id", desc=True).limit(1).execute()
+
+            return response.data[0] if response.data else None
+
+        except Exception as e:
+            logger.error(f"Error fetching embedding job for document {document_id}: {e}")
+            return None
+
+embedding_job_repository = EmbeddingJobRepository()
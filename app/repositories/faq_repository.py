@@ -1,19 +1,27 @@
-from typing import List, Optional, Dict, Any
-from app.db import get_supabase_client
+import asyncio
+from typing import TYPE_CHECKING, List, Optional, Dict, Any
+from app.db import get_async_supabase_client
 import logging
 
+if TYPE_CHECKING:
+    from postgrest import AsyncPostgrestClient
+
 logger = logging.getLogger(__name__)
 
 class FAQRepository:
     """Repository for FAQ data access"""
     
-    def __init__(self):
-        self.client = get_supabase_client()
+    page_size = 1000
+    
+    @property
+    def client(self) -> "AsyncPostgrestClient":
+        """Shared async PostgREST client"""
+        return get_async_supabase_client()
     
     async def get_categories(self) -> List[Dict[str, Any]]:
         """Get all FAQ categories ordered by display_order"""
         try:
-            response = self.client.table("faq_categories").select("*").order("display_order").execute()
+            response = await self.client.table("faq_categories").select("*").order("display_order").execute()
             return response.data or []
         except Exception as e:
             logger.error(f"Error fetching categories: {e}")
@@ -22,7 +30,7 @@ class FAQRepository:
     async def get_subcategories(self, category_id: int) -> List[Dict[str, Any]]:
         """Get subcategories for a specific category"""
         try:
-            response = self.client.table("faq_subcategories").select("*").eq("category_id", category_id).order("display_order").execute()
+            response = await self.client.table("faq_subcategories").select("*").eq("category_id", category_id).order("display_order").execute()
             return response.data or []
         except Exception as e:
             logger.error(f"Error fetching subcategories for category {category_id}: {e}")
@@ -31,7 +39,7 @@ class FAQRepository:
     async def get_answer(self, category_id: int, subcategory_id: int) -> Optional[str]:
         """Get answer for specific category and subcategory"""
         try:
-            response = self.client.table("faq_items").select("answer").eq("category_id", category_id).eq("subcategory_id", subcategory_id).limit(1).execute()
+            response = await self.client.table("faq_items").select("answer").eq("category_id", category_id).eq("subcategory_id", subcategory_id).limit(1).execute()
             if response.data:
                 return response.data[0]["answer"]
             return None
@@ -39,92 +47,122 @@ class FAQRepository:
             logger.error(f"Error fetching answer for category {category_id}, subcategory {subcategory_id}: {e}")
             return None
     
-    async def get_all_faq_content(self) -> str:
-        """Get all FAQ content as formatted text for AI context"""
+    async def get_faq_catalogue(self) -> List[Dict[str, Any]]:
+        """Get every category with its subcategories and their answers in one query (raises on error)"""
+        response = await self.client.table("faq_categories").select("""
+            name,
+            faq_subcategories(
+                name,
+                faq_items(answer)
+            )
+        """).order("display_order").execute()
+        return response.data or []
+    
+    async def get_faq_versions(self) -> Optional[Dict[str, Any]]:
+        """
+        Get the row count and latest updated_at of each FAQ table (None on error).
+        Any insert, update or delete changes one of them.
+        """
         try:
-            # Get all categories with their subcategories and answers
-            categories_response = self.client.table("faq_categories").select("""
-                *,
-                faq_subcategories(
-                    *,
-                    faq_items(answer)
-                )
-            """).order("display_order").execute()
-            
-            if not categories_response.data:
-                return "No FAQ content available."
-            
-            formatted_content = "FAQ Knowledge Base:\n\n"
+            tables = ("faq_categories", "faq_subcategories", "faq_items")
+            responses = await asyncio.gather(*(
+                self.client.table(table).select("updated_at", count="exact").order("updated_at", desc=True).limit(1).execute()
+                for table in tables
+            ))
+            return {
+                table: (response.count, response.data[0]["updated_at"] if response.data else None)
+                for table, response in zip(tables, responses)
+            }
             
-            for category in categories_response.data:
-                formatted_content += f"Category: {category['name']}\n"
-                formatted_content += "=" * 50 + "\n"
-                
-                subcategories = category.get('faq_subcategories', [])
-                for subcategory in subcategories:
-                    formatted_content += f"\nSubcategory: {subcategory['name']}\n"
-                    formatted_content += "-" * 30 + "\n"
-                    
-                    faq_items = subcategory.get('faq_items', [])
-                    for item in faq_items:
-                        formatted_content += f"Answer: {item['answer']}\n\n"
-                
-                formatted_content += "\n"
-            
-            return formatted_content
+        except Exception as e:
+            logger.error(f"Error fetching FAQ versions: {e}")
+            return None
+    
+    async def get_faq_items_for_embedding(self, after_id: int, limit: int, only_missing: bool = True) -> List[Dict[str, Any]]:
+        """Get the next page of active FAQ items to embed, in ID order after the given ID (raises on error)"""
+        query = self.client.table("faq_items").select("""
+            id,
+            question,
+            answer,
+            faq_categories(name),
+            faq_subcategories(name)
+        """).eq("is_active", True).gt("id", after_id)
+        if only_missing:
+            query = query.is_("content_embedding", "null")
+        response = await query.order("id").limit(limit).execute()
+        return response.data or []
+    
+    async def bulk_update_faq_embeddings(self, embeddings: Dict[int, List[float]]) -> int:
+        """Write many FAQ item embeddings in one statement; returns the number of rows updated (raises on error)"""
+        params = {"updates": [{"id": faq_id, "embedding": embedding} for faq_id, embedding in embeddings.items()]}
+        response = await self.client.rpc("bulk_update_faq_embeddings", params).execute()
+        return response.data or 0
+    
+    async def get_faq_item_versions(self) -> Optional[List[Dict[str, Any]]]:
+        """Get id and updated_at of every active FAQ item with an embedding (None on error)"""
+        try:
+            versions = []
+            offset = 0
+            while True:
+                response = await self.client.table("faq_items").select("id, updated_at").eq("is_active", True).not_.is_("content_embedding", "null").order("id").range(offset, offset + self.page_size - 1).execute()
+                rows = response.data or []
+                versions.extend(rows)
+                if len(rows) < self.page_size:
+                    return versions
+                offset += self.page_size
             
         except Exception as e:
-            logger.error(f"Error fetching all FAQ content: {e}")
-            return "Error loading FAQ content."
+            logger.error(f"Error fetching FAQ item versions: {e}")
+            return None
     
-    async def search_faq_content(self, query: str) -> List[Dict[str, Any]]:
-        """Search FAQ content for relevant answers"""
+    async def get_faq_items_with_embeddings(self, faq_ids: List[int]) -> List[Dict[str, Any]]:
+        """Get FAQ items, including embeddings and category names, for the given IDs"""
         try:
-            # Simple text search across answers
-            # Note: For better search, consider using PostgreSQL full-text search or embeddings
-            response = self.client.table("faq_items").select("""
-                *,
+            response = await self.client.table("faq_items").select("""
+                id,
+                question,
+                answer,
+                is_active,
+                content_embedding,
+                updated_at,
                 faq_categories(name),
                 faq_subcategories(name)
-            """).ilike("answer", f"%{query}%").limit(5).execute()
+            """).in_("id", faq_ids).execute()
             
             return response.data or []
             
         except Exception as e:
-            logger.error(f"Error searching FAQ content: {e}")
+            logger.error(f"Error fetching FAQ items with embeddings: {e}")
             return []
     
-    async def get_all_faqs(self) -> List[Dict[str, Any]]:
-        """
-        Get all FAQs as a simple list with category and subcategory names.
-        Returns list of dicts with 'question' field formatted as "Category - Subcategory"
-        """
+    async def get_faq_items_updated_since(self, updated_at: str, limit: int) -> List[Dict[str, Any]]:
+        """Get id, is_active and embedding of FAQ items updated at or after a time, oldest first (raises on error)"""
+        response = await self.client.table("faq_items").select("id, is_active, content_embedding, updated_at").gte("updated_at", updated_at).order("updated_at").limit(limit).execute()
+        return response.data or []
+    
+    async def search_faq_content(self, query: str) -> List[Dict[str, Any]]:
+        """Search FAQ content for relevant answers"""
         try:
-            # Get all categories with their subcategories
-            response = self.client.table("faq_categories").select("""
-                name,
+            # Full-text search on the GIN-indexed search_content column
+            response = await self.client.table("faq_items").select("""
+                id,
+                category_id,
+                subcategory_id,
+                question,
+                answer,
+                faq_categories(name),
                 faq_subcategories(name)
-            """).order("display_order").execute()
-            
-            if not response.data:
-                return []
+            """).eq("is_active", True).limit(5).text_search(
+                # text_search returns the final query builder, so it goes last
+                "search_content",
+                query,
+                options={"type": "plain", "config": "indonesian"}
+            ).execute()
             
-            faq_list = []
-            for category in response.data:
-                category_name = category['name']
-                subcategories = category.get('faq_subcategories', [])
-                
-                for subcategory in subcategories:
-                    subcategory_name = subcategory['name']
-                    # Format as "Category - Subcategory"
-                    faq_list.append({
-                        'question': f"{category_name} - {subcategory_name}"
-                    })
-            
-            return faq_list
+            return response.data or []
             
         except Exception as e:
-            logger.error(f"Error fetching all FAQs: {e}")
+            logger.error(f"Error searching FAQ content: {e}")
             return []
 
 # Create repository instance
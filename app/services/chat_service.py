@@ -1,36 +1,122 @@
-import openai
+import asyncio
 import re
-import uuid
 import logging
-from typing import List, Optional, Dict, Any
+import time
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, AsyncIterator, Callable, List, Optional, Dict, Any, Set, Tuple
+from app.core.admission import UpstreamSaturated, chat_limiter
 from app.core.config import settings
 from app.models.schemas import Message, ChatRequest, ChatResponse
 from app.services.faq_service import faq_service
+from app.repositories.document_repository import document_repository
 from app.services.embedding_service import embedding_service
-from app.repositories import chat_session_repository
+from app.services.semantic_cache import faq_cache_key, semantic_cache
+from app.services.context_builder import PromptContext, context_builder
+from app.services.message_buffer import message_buffer
+from app.services.session_store import session_store
+from app.services.conversation_retrieval import RetrievalPlan, conversation_retriever
 from app.core.intent_engine import resolve as resolve_intent, render_template
+from app.core.metrics import CHAT_PROMPT_TOKENS, LLM_TOKENS, chat_route, record_chat_request, track_stage
+from app.core.openai_client import get_openai_client, transient_errors
+from app.core.prompts import DEFAULT_SYSTEM_PROMPT, SystemPrompt, custom_system_prompt
+
+if TYPE_CHECKING:
+    import openai
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class PlainTextStreamSanitizer:
+    """
+    Applies a plain-text sanitizer to a token stream.
+    Only the open window of raw text is re-sanitized on each call, holding back
+    the tail that later tokens could still change (whitespace, digits, list
+    punctuation and Markdown marker characters). Finished lines are committed
+    and dropped from the window once nothing after them can change their
+    output, so a chunk costs O(chunk + line) rather than O(answer). Emitted text
+    is always a prefix of the sanitized complete answer, and numbered-list
+    reformatting stays correct when a step number is split across chunks.
+    """
+
+    _UNSTABLE_TAIL = re.compile(r"[\s\d.)*`_]+$")
+    # A line ending like this may be a list number whose item follows on the next line
+    _OPEN_LIST_NUMBER = re.compile(r"\d[.)]$")
+    _FINAL_LINE = "x\n"
+
+    def __init__(self, sanitize: Callable[[str], str]):
+        self._sanitize = sanitize
+        self._raw = ""
+        self._emitted = ""
+        self._committed = False
+
+    def feed(self, chunk: str) -> str:
+        """Add raw text and return the newly stable sanitized text"""
+        self._raw += chunk
+        delta = self._commit_finished_lines()
+        tail = self._UNSTABLE_TAIL.search(self._raw)
+        stable = self._raw[:tail.start()] if tail else self._raw
+        return delta + self._emit(self._render(stable))
+
+    def flush(self) -> str:
+        """Return whatever remains once the stream has ended"""
+        return self._emit(self._render(self._raw))
+
+    def _render(self, raw: str) -> str:
+        """Sanitized window text, led by the line break(s) separating it from the committed text"""
+        if not self._committed:
+            return self._sanitize(raw) or ""
+        # The committed text ends in a final line; any other final line joins the window the same way
+        return (self._sanitize(self._FINAL_LINE + raw) or "")[len(self._FINAL_LINE) - 1:]
+
+    def _commit_finished_lines(self) -> str:
+        """
+        Commit the window up to its last line break when the line before it is
+        final: not blank, so blank lines after it are not dropped, and not ending
+        in a list number that would join the next line. Returns the part of the
+        committed text not emitted yet.
+        """
+        end = self._raw.rfind("\n")
+        if end < 0:
+            return ""
+        line = self._sanitize(self._raw[self._raw.rfind("\n", 0, end) + 1:end]) or ""
+        if not line or self._OPEN_LIST_NUMBER.search(line):
+            return ""
+        finished = self._render(self._raw[:end + 1])
+        self._raw = self._raw[end + 1:]
+        self._committed = True
+        if finished.startswith(self._emitted):
+            delta, self._emitted = finished[len(self._emitted):], ""
+            return delta
+        if self._emitted.startswith(finished):
+            self._emitted = self._emitted[len(finished):]
+            return ""
+        # Should not happen; drop the difference rather than emit inconsistent text
+        logger.warning("Stream sanitizer output diverged; holding back text")
+        self._emitted = ""
+        return ""
+
+    def _emit(self, sanitized: str) -> str:
+        if not sanitized.startswith(self._emitted):
+            # Should not happen; wait for more input rather than emit inconsistent text
+            logger.warning("Stream sanitizer output diverged; holding back text")
+            return ""
+        delta = sanitized[len(self._emitted):]
+        self._emitted = sanitized
+        return delta
+
 class ChatService:
     """Service class for handling AI-powered chat interactions with FAQ knowledge base"""
     
     def __init__(self):
-        """Initialize the ChatService with OpenAI client and repositories"""
-        self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+        """Initialize the ChatService with repositories"""
         self.faq_service = faq_service
         self.embedding_service = embedding_service
-        self.chat_repository = chat_session_repository
-        # Plain text formatting rules with emphasis on completeness
-        self.plain_text_rules = (
-            "Aturan format PENTING: "
-            "1) Jawab HANYA dalam teks biasa (plain text) - tanpa Markdown, tanpa **bold**, _italic_, kode, tautan, atau emoji. "
-            "2) Untuk daftar langkah, gunakan format: 1. [langkah pertama]\\n2. [langkah kedua]\\n3. [langkah ketiga] dst. "
-            "3) WAJIB menyebutkan SEMUA langkah dari dokumen - jangan potong atau ringkas meskipun panjang. "
-            "4) Gunakan kata-kata PERSIS dari dokumen tanpa parafrase."
-        )
+        self.message_buffer = message_buffer
+        self.session_store = session_store
+        self.conversation_retriever = conversation_retriever
+        # Conversations of closed streams still being stored
+        self._pending_stores: Set[asyncio.Future] = set()
         # Keywords to detect intent to view full document
         # More aggressive detection to ensure users get complete SOPs
         self.full_doc_keywords = [
@@ -38,231 +124,491 @@ class ChatService:
             "cara", "bagaimana", "langkah", "prosedur", "proses", "sop", "tutorial",
             "gimana", "step", "tahap", "panduan", "petunjuk"
         ]
+        # Messages that trigger the initial greeting
+        self.initial_triggers = {"start", "/start", "hello", "hi", "halo", "mulai"}
+
+    @property
+    def client(self) -> "openai.AsyncOpenAI":
+        """Shared async OpenAI client"""
+        return get_openai_client()
     
     async def _prepare_messages_with_smart_context(
         self, 
         user_message: str, 
         conversation_history: List[Message], 
-        system_prompt: Optional[str] = None
-    ) -> List[Dict[str, str]]:
-        """Prepare messages with smart context using similarity search"""
-        messages = []
-        
-        # Ignore placeholder or empty system prompts
-        if system_prompt and system_prompt.strip().lower() in ['string', '', 'none']:
-            system_prompt = None
-        
-        # Always search for similar documents to get RAG context
-        relevant_context = await self.embedding_service.get_context_from_similar_docs(
-            user_message, max_context_length=2000
+        system_prompt: Optional[str] = None,
+        context_docs: Optional[List[Dict[str, Any]]] = None,
+        max_completion_tokens: Optional[int] = None
+    ) -> PromptContext:
+        """
+        Prepare messages with the retrieved documents as context (None means retrieval failed),
+        packed into the model's prompt token budget
+        """
+        return context_builder.build(
+            model=settings.MODEL_NAME,
+            system_prompt=self._system_prompt(system_prompt),
+            context_docs=context_docs,
+            conversation_history=conversation_history,
+            user_message=user_message,
+            max_completion_tokens=max_completion_tokens or settings.MAX_TOKENS
         )
-        
-        # Create enhanced system prompt with relevant context and plain-text formatting rules
-        if system_prompt:
-            # If user provided a custom system prompt, append RAG context to it
-            final_system_prompt = f"""{system_prompt}
-
-{self.plain_text_rules}
-
-{relevant_context}
-
-Instruksi tambahan:
-1. Jawab HANYA pertanyaan yang terkait dengan proses/layanan pemerintahan Provinsi Kalimantan Barat
-2. Gunakan langkah-langkah yang tercantum dalam dokumen jika tersedia
-3. Jika informasi tidak ditemukan di dokumen atau tidak relevan, TOLAK dengan sopan dan arahkan ke WhatsApp support: {settings.WHATSAPP_NUMBER}
-4. Jika user membutuhkan bantuan lebih lanjut, sarankan untuk menghubungi support WhatsApp: {settings.WHATSAPP_NUMBER}
-
-Jam Support:
-- Senin-Jumat: 09:00-18:00 WIB
-- Sabtu: 09:00-14:00 WIB
-- Darurat: 24/7
-"""
-        else:
-            # Use default system prompt with RAG context
-            final_system_prompt = f"""Anda adalah asisten chatbot untuk aplikasi web {settings.PANTAS_NAME} (Pemerintah Provinsi Kalimantan Barat).
-{settings.PANTAS_NAME} adalah aplikasi internal untuk membantu proses layanan digital, SOP, dan dukungan teknis infrastruktur digital.
-
-Anda membantu pengguna dengan:
-- Informasi tentang SOP dan prosedur pemerintahan
-- Proses pembuatan dan migrasi website
-- Panduan teknis terkait layanan digital
-- FAQ dan pertanyaan umum
-
-{self.plain_text_rules}
-
-{relevant_context}
-
-Instruksi PENTING:
-1. Jawab HANYA pertanyaan yang terkait dengan proses/layanan pemerintahan Provinsi Kalimantan Barat
-2. PRIORITASKAN dan gunakan informasi dari dokumen di atas untuk menjawab pertanyaan user
-3. SALIN SEMUA LANGKAH dari dokumen - JANGAN ringkas, JANGAN potong, JANGAN ubah kata-katanya
-4. Jika dokumen memiliki 14 langkah, Anda HARUS menyebutkan SEMUA 14 langkah dengan lengkap
-5. Gunakan kata-kata PERSIS SAMA dengan yang ada di dokumen
-6. Format setiap langkah dengan nomor pada baris terpisah (1. ... \\n2. ... \\n3. ...)
-7. Jika informasi tidak ditemukan di dokumen atau tidak relevan dengan pemerintahan, TOLAK dengan sopan dan sarankan hubungi WhatsApp support: {settings.WHATSAPP_LINK}
-8. Jika user membutuhkan bantuan lebih lanjut di luar kemampuan Anda, arahkan ke WhatsApp: {settings.WHATSAPP_LINK}
-9. Jawab dalam bahasa Indonesia dengan ramah dan profesional
-
-CATATAN: Untuk SOP atau prosedur panjang, user lebih suka melihat SEMUA detail lengkap daripada ringkasan.
-
-Kontak Support WhatsApp: {settings.WHATSAPP_LINK}
-Jam Support:
-- Senin-Jumat: 09:00-18:00 WIB
-- Sabtu: 09:00-14:00 WIB
-- Darurat: 24/7
-- Darurat: 24/7
-"""
-        
-        messages.append({"role": "system", "content": final_system_prompt})
-        
-        # Add conversation history (limit to last 8 messages to save tokens)
-        for msg in conversation_history[-8:]:
-            messages.append({"role": msg.role, "content": msg.content})
-        
-        # Add current user message
-        messages.append({"role": "user", "content": user_message})
-        
-        return messages
+    
+    def _system_prompt(self, system_prompt: Optional[str]) -> SystemPrompt:
+        """The prebuilt default system prompt, or the client's own with the rules appended"""
+        # Ignore placeholder or empty system prompts
+        if not system_prompt or self._is_placeholder_prompt(system_prompt):
+            return DEFAULT_SYSTEM_PROMPT
+        return custom_system_prompt(system_prompt)
     
     async def generate_response(self, chat_request: ChatRequest) -> ChatResponse:
         """Generate AI-powered response using FAQ knowledge base context"""
+        started = time.perf_counter()
+        route = "error"
         try:
-            conversation_history = chat_request.conversation_history or []
-            
-            # Create or get session ID
-            session_id = str(uuid.uuid4())  # In a real app, you'd get this from the request or create one
-
-            # Special greeting for initial load messages (do not trigger domain guard)
-            initial_triggers = {"start", "/start", "hello", "hi", "halo", "mulai"}
-            if (chat_request.message or "").strip().lower() in initial_triggers:
-                greeting = (
-                    "Halo! Saya asisten dukungan digital Pemprov Kalimantan Barat. Saya dapat membantu pertanyaan "
-                    "yang berkaitan dengan proses/layanan pemerintahan dan SOP di lingkungan Pemprov Kalbar.\n\n"
-                    "Cara menggunakan:\n"
-                    "- Tanyakan topik yang Anda butuhkan (misal: 'SOP Pembuatan Website Baru di AWDI')\n"
-                    "- Untuk melihat dokumen lengkap, tambahkan kata 'lengkap' atau gunakan opsi 'return_full_document'\n"
-                    f"- Bantuan lebih lanjut: WhatsApp {settings.WHATSAPP_LINK}"
-                )
-                greeting = self._sanitize_plain_text(greeting)
-                try:
-                    await self.chat_repository.add_message(session_id, "assistant", greeting)
-                except Exception as e:
-                    logger.warning(f"Failed to store greeting: {e}")
-                return ChatResponse(
-                    response=greeting,
-                    conversation_id=session_id,
-                    model_used="system-greeting",
-                    tokens_used=0
-                )
+            received_at = datetime.now(timezone.utc)
+            with track_stage("session"):
+                session_id, chat_request = await self._resolve_session(chat_request)
+                plan = self.conversation_retriever.plan(session_id, chat_request.message, chat_request.conversation_history)
 
-            # Check for special intents that can be answered directly (0 tokens)
-            special_response = await self._check_special_intents(chat_request.message)
-            if special_response:
-                try:
-                    await self.chat_repository.add_message(session_id, "user", chat_request.message)
-                    await self.chat_repository.add_message(session_id, "assistant", special_response)
-                except Exception as e:
-                    logger.warning(f"Failed to store special intent conversation: {e}")
+            # Greetings, special intents and full documents are answered directly (0 tokens)
+            with track_stage("direct_answer"):
+                direct_answer = await self._resolve_direct_answer(chat_request, plan)
+            if direct_answer:
+                text, model_used = direct_answer
+                route = model_used
+                with track_stage("store"):
+                    await self._store_conversation(session_id, chat_request.message, received_at, text, model_used, 0)
                 return ChatResponse(
-                    response=special_response,
+                    response=text,
                     conversation_id=session_id,
-                    model_used="direct-answer",
+                    model_used=model_used,
                     tokens_used=0
                 )
-            
-            logger.info(f"Processing query (domain guard disabled): {chat_request.message[:50]}...")
 
-            if chat_request.return_full_document or self._is_full_doc_intent(chat_request.message):
-                logger.info("Full document mode triggered - returning document directly without OpenAI")
-                
-                # Try up to 3 times with different embeddings to handle OpenAI embedding variance
-                similar_docs = []
-                for attempt in range(3):
-                    similar_docs = await self.embedding_service.search_similar_documents(
-                        chat_request.message, 
-                        threshold=0.3,
-                        limit=1
-                    )
-                    if similar_docs:
-                        logger.info(f"Found document on attempt {attempt + 1}")
-                        break
-                    logger.warning(f"Attempt {attempt + 1}/3: No documents found, retrying with new embedding...")
-                
-                if similar_docs:
-                    doc = similar_docs[0]
-                    title = doc.get('title', 'Dokumen')
-                    content = doc.get('content', '')             
-                    full_text = f"{title}:\n\n{content}"
-                    full_text = self._sanitize_plain_text(full_text)
-                    
-                    logger.info(f"Returning full document: {title} ({len(content)} chars, 0 tokens)")
-                    
-                    try:
-                        await self.chat_repository.add_message(session_id, "user", chat_request.message)
-                        await self.chat_repository.add_message(session_id, "assistant", full_text)
-                    except Exception as e:
-                        logger.warning(f"Failed to store full-doc conversation: {e}")
-                    
-                    return ChatResponse(
-                        response=full_text,
-                        conversation_id=session_id,
-                        model_used="kb-direct",
-                        tokens_used=0 
-                    )
-
-            response = await self._generate_ai_response_with_context(chat_request, session_id)
+            response = await self._generate_ai_response_with_context(chat_request, session_id, plan)
+            route = chat_route(response.model_used)
             
-            try:
-                await self.chat_repository.add_message(session_id, "user", chat_request.message)
-                await self.chat_repository.add_message(session_id, "assistant", response.response)
-            except Exception as e:
-                logger.warning(f"Failed to store conversation: {e}")
-                # Don't fail the response if database storage fails
+            # Don't fail the response if database storage fails
+            with track_stage("store"):
+                await self._store_conversation(
+                    session_id, chat_request.message, received_at, response.response, response.model_used, response.tokens_used
+                )
             
             return response
             
+        except UpstreamSaturated:
+            route = "rejected"
+            raise
+        
         except Exception as e:
             logger.error(f"Unexpected error in chat service: {e}")
             raise Exception(f"An unexpected error occurred: {str(e)}")
+
+        finally:
+            record_chat_request("chat", route, time.perf_counter() - started)
     
-    async def _generate_ai_response_with_context(self, chat_request: ChatRequest, session_id: str) -> ChatResponse:
+    async def stream_response(self, chat_request: ChatRequest) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Stream a chat response as (event, data) pairs: one "meta" event, then
+        "delta" events carrying sanitized text, then "done" (or "error").
+        The conversation is stored once the stream closes.
+        """
+        started = time.perf_counter()
+        received_at = datetime.now(timezone.utc)
+        session_id = None
+        model_used = settings.MODEL_NAME
+        route = "error"
+        tokens_used: Optional[int] = None
+        parts: List[str] = []
+        try:
+            with track_stage("session"):
+                session_id, chat_request = await self._resolve_session(chat_request)
+                plan = self.conversation_retriever.plan(session_id, chat_request.message, chat_request.conversation_history)
+            with track_stage("direct_answer"):
+                direct_answer = await self._resolve_direct_answer(chat_request, plan)
+            if direct_answer:
+                text, model_used = direct_answer
+                route = model_used
+                tokens_used = 0
+                yield "meta", {"conversation_id": session_id, "model_used": model_used}
+                for chunk in self._split_for_streaming(text):
+                    parts.append(chunk)
+                    yield "delta", {"text": chunk}
+                yield "done", {"model_used": model_used, "tokens_used": 0}
+                return
+
+            with track_stage("semantic_cache"):
+                query_embedding, cached_answer = await self._lookup_semantic_cache(chat_request)
+            if cached_answer:
+                model_used = route = "semantic-cache"
+                tokens_used = 0
+                yield "meta", {"conversation_id": session_id, "model_used": model_used}
+                for chunk in self._split_for_streaming(cached_answer):
+                    parts.append(chunk)
+                    yield "delta", {"text": chunk}
+                yield "done", {"model_used": model_used, "tokens_used": 0}
+                return
+
+            route = chat_route(model_used)
+            yield "meta", {"conversation_id": session_id, "model_used": model_used}
+            with track_stage("retrieval"):
+                context_docs = await self._retrieve_context_documents(session_id, plan)
+            with track_stage("prompt"):
+                prompt = await self._prepare_messages_with_smart_context(
+                    user_message=chat_request.message,
+                    conversation_history=chat_request.conversation_history,
+                    system_prompt=chat_request.system_prompt,
+                    context_docs=context_docs,
+                    max_completion_tokens=chat_request.max_tokens
+                )
+            CHAT_PROMPT_TOKENS.observe(prompt.breakdown.get("total", 0))
+            sanitizer = PlainTextStreamSanitizer(self._sanitize_plain_text)
+            usage: Dict[str, Any] = {}
+            # Includes the time the client takes to read the stream
+            with track_stage("completion_stream"):
+                completion = self._stream_ai_response(chat_request, prompt.messages, usage)
+                try:
+                    async for raw in completion:
+                        chunk = sanitizer.feed(raw)
+                        if chunk:
+                            parts.append(chunk)
+                            yield "delta", {"text": chunk}
+                finally:
+                    # Closed now rather than when garbage collected, so a disconnect frees the chat slot at once
+                    await completion.aclose()
+            chunk = sanitizer.flush()
+            if chunk:
+                parts.append(chunk)
+                yield "delta", {"text": chunk}
+            tokens_used = self._record_usage(usage.get("usage"))
+            self._store_semantic_cache(chat_request, query_embedding, context_docs, "".join(parts))
+            yield "done", {"model_used": model_used, "tokens_used": tokens_used, "prompt_tokens": prompt.breakdown}
+
+        except UpstreamSaturated as e:
+            route = "rejected"
+            yield "error", {
+                "detail": "The service is busy, please try again later",
+                "status_code": e.status_code,
+                "retry_after": int(e.retry_after_header)
+            }
+
+        except Exception as e:
+            route = "error"
+            logger.error(f"Error while streaming chat response: {e}")
+            yield "error", {"detail": "An error occurred while processing your request"}
+
+        finally:
+            record_chat_request("stream", route, time.perf_counter() - started)
+            if parts:
+                # Runs in its own task so a client disconnect cannot cancel the write
+                task = asyncio.ensure_future(self._store_conversation(
+                    session_id, chat_request.message, received_at, "".join(parts), model_used, tokens_used
+                ))
+                self._pending_stores.add(task)
+                task.add_done_callback(self._pending_stores.discard)
+
+    async def drain(self) -> None:
+        """Wait for the conversations of finished streams to be queued for storage (on shutdown)"""
+        if self._pending_stores:
+            await asyncio.gather(*self._pending_stores, return_exceptions=True)
+
+    async def _resolve_session(self, chat_request: ChatRequest) -> Tuple[str, ChatRequest]:
+        """
+        The session a request belongs to, and the request with the session's
+        recent history unless the client sent its own; a request without
+        conversation_id starts a new session
+        """
+        if chat_request.conversation_id is None:
+            return self.session_store.start_session(), chat_request
+        session_id = str(chat_request.conversation_id)
+        if chat_request.conversation_history:
+            return session_id, chat_request
+        history = await self.session_store.history(session_id)
+        return session_id, chat_request.model_copy(update={"conversation_history": history})
+
+    async def _resolve_direct_answer(self, chat_request: ChatRequest, plan: RetrievalPlan) -> Optional[Tuple[str, str]]:
+        """
+        Answer without the language model when possible: initial greeting,
+        special intents and full knowledge-base documents. A follow-up that
+        reuses the session's documents gets the first of the passages it
+        focuses on; other messages search with the retrieval query.
+        Returns (response text, model_used) or None to continue with the LLM.
+        """
+        # Special greeting for initial load messages (do not trigger domain guard)
+        if (chat_request.message or "").strip().lower() in self.initial_triggers:
+            greeting = (
+                "Halo! Saya asisten dukungan digital Pemprov Kalimantan Barat. Saya dapat membantu pertanyaan "
+                "yang berkaitan dengan proses/layanan pemerintahan dan SOP di lingkungan Pemprov Kalbar.\n\n"
+                "Cara menggunakan:\n"
+                "- Tanyakan topik yang Anda butuhkan (misal: 'SOP Pembuatan Website Baru di AWDI')\n"
+                "- Untuk melihat dokumen lengkap, tambahkan kata 'lengkap' atau gunakan opsi 'return_full_document'\n"
+                f"- Bantuan lebih lanjut: WhatsApp {settings.WHATSAPP_LINK}"
+            )
+            return self._sanitize_plain_text(greeting), "system-greeting"
+
+        # Check for special intents that can be answered directly (0 tokens)
+        special_response = await self._check_special_intents(chat_request.message)
+        if special_response:
+            return special_response, "direct-answer"
+        
+        logger.info(f"Processing query (domain guard disabled): {chat_request.message[:50]}...")
+
+        if chat_request.return_full_document or self._is_full_doc_intent(chat_request.message):
+            logger.info("Full document mode triggered - returning document directly without OpenAI")
+            
+            if plan.documents is not None:
+                similar_docs = [await self._full_document(plan.documents[0])] if plan.documents else []
+            else:
+                # Query embeddings are cached, so re-embedding the same text cannot change the result
+                similar_docs = await self.embedding_service.search_similar_documents(
+                    plan.query,
+                    threshold=settings.RETRIEVAL_SIMILARITY_THRESHOLD,
+                    limit=1
+                )
+            
+            if similar_docs:
+                doc = similar_docs[0]
+                title = doc.get('title', 'Dokumen')
+                content = doc.get('content', '')             
+                full_text = f"{title}:\n\n{content}"
+                full_text = self._sanitize_plain_text(full_text)
+                
+                logger.info(f"Returning full document: {title} ({len(content)} chars, 0 tokens)")
+                return full_text, "kb-direct"
+
+        return None
+
+    async def _full_document(self, passage: Dict[str, Any]) -> Dict[str, Any]:
+        """The whole document a retrieved chunk passage was cut from (FAQ items and documents are whole already)"""
+        if "chunk_indexes" not in passage or passage.get("source") == "faq":
+            return passage
+        document = await document_repository.get_document(passage["id"])
+        return document or passage
+
+    async def _store_conversation(
+        self,
+        session_id: str,
+        user_message: str,
+        received_at: datetime,
+        assistant_message: str,
+        model_used: str,
+        tokens_used: Optional[int]
+    ) -> None:
+        """Queue a user/assistant exchange for storage; storage failures never fail the response"""
+        try:
+            # Timestamps are taken here, not at insert time, so buffered messages keep their order
+            message = {"session_id": session_id, "tokens_used": None, "model_used": None}
+            messages = []
+            # The greeting is shown on load, so there is no user turn to record
+            if model_used != "system-greeting":
+                messages.append({**message, "role": "user", "content": user_message, "created_at": received_at.isoformat()})
+            messages.append({
+                **message,
+                "role": "assistant",
+                "content": assistant_message,
+                "tokens_used": tokens_used,
+                "model_used": model_used,
+                "created_at": datetime.now(timezone.utc).isoformat()
+            })
+            await self.message_buffer.add(messages)
+            self.session_store.append(session_id, [
+                Message(role=row["role"], content=row["content"], timestamp=datetime.fromisoformat(row["created_at"]))
+                for row in messages
+            ])
+        except Exception as e:
+            logger.warning(f"Failed to store conversation: {e}")
+
+    @staticmethod
+    def _is_placeholder_prompt(system_prompt: Optional[str]) -> bool:
+        return system_prompt is not None and system_prompt.strip().lower() in ['string', '', 'none']
+
+    def _semantic_cache_params(self, chat_request: ChatRequest) -> Optional[Tuple[str, float, int]]:
+        """
+        Generation parameters an answer is cached under, or None when the answer
+        depends on more than the question (conversation history or a custom system prompt).
+        """
+        if chat_request.conversation_history:
+            return None
+        if chat_request.system_prompt and not self._is_placeholder_prompt(chat_request.system_prompt):
+            return None
+        return (
+            settings.MODEL_NAME,
+            chat_request.temperature or settings.TEMPERATURE,
+            chat_request.max_tokens or settings.MAX_TOKENS
+        )
+
+    async def _lookup_semantic_cache(self, chat_request: ChatRequest) -> Tuple[Optional[List[float]], Optional[str]]:
+        """Return (query embedding, cached answer); the embedding is reused when storing the new answer"""
+        params = self._semantic_cache_params(chat_request)
+        if not settings.SEMANTIC_CACHE_ENABLED or params is None:
+            return None, None
+        try:
+            query_embedding = await self.embedding_service.embed_query(chat_request.message)
+        except Exception as e:
+            logger.warning(f"Semantic cache lookup skipped, could not embed query: {e}")
+            return None, None
+        return query_embedding, semantic_cache.lookup(query_embedding, params)
+
+    def _store_semantic_cache(
+        self,
+        chat_request: ChatRequest,
+        query_embedding: Optional[List[float]],
+        context_docs: Optional[List[Dict[str, Any]]],
+        answer: str
+    ) -> None:
+        # Answers built without a successful retrieval are not cached
+        if query_embedding is None or context_docs is None or not answer:
+            return
+        doc_ids = [
+            faq_cache_key(doc["id"]) if doc.get("source") == "faq" else doc["id"]
+            for doc in context_docs if doc.get("id") is not None
+        ]
+        semantic_cache.store(query_embedding, doc_ids, answer, self._semantic_cache_params(chat_request))
+
+    async def _retrieve_context_documents(self, session_id: str, plan: RetrievalPlan) -> Optional[List[Dict[str, Any]]]:
+        """Retrieve RAG context documents, reusing the session's documents for follow-ups; None when retrieval failed"""
+        return await self.conversation_retriever.retrieve(session_id, plan)
+
+    @staticmethod
+    def _split_for_streaming(text: str, max_chunk: int = 400) -> List[str]:
+        """Split a ready answer into line-aligned chunks so long documents stream progressively"""
+        chunks: List[str] = []
+        current = ""
+        for line in text.splitlines(keepends=True):
+            if current and len(current) + len(line) > max_chunk:
+                chunks.append(current)
+                current = ""
+            current += line
+        if current:
+            chunks.append(current)
+        return chunks
+
+    async def _stream_ai_response(
+        self,
+        chat_request: ChatRequest,
+        messages: List[Dict[str, str]],
+        usage: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        """
+        Stream raw completion text from OpenAI for messages prepared as in the
+        non-streaming path; the token usage of the final chunk is put in usage["usage"]
+        """
+        logger.info(f"Streaming request to OpenAI with {len(messages)} messages and smart context")
+        
+        # The admission slot is held until the stream ends
+        stream = await chat_limiter.call(
+            lambda: self.client.chat.completions.create(
+                model=settings.MODEL_NAME,
+                messages=messages,
+                temperature=chat_request.temperature or settings.TEMPERATURE,
+                max_tokens=chat_request.max_tokens or settings.MAX_TOKENS,
+                timeout=settings.OPENAI_CHAT_TIMEOUT,
+                stream=True,
+                # Adds a final chunk with the usage; sent as extra_body as this SDK version has no stream_options
+                extra_body={"stream_options": {"include_usage": True}}
+            ),
+            transient_errors(),
+            settings.OPENAI_MAX_RETRIES,
+            keep_slot=True
+        )
+        try:
+            async for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    usage["usage"] = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            try:
+                # Ends an unfinished completion (client gone) and returns its connection to the pool
+                await stream.response.aclose()
+            finally:
+                chat_limiter.release()
+    
+    @staticmethod
+    def _record_usage(usage: Any) -> Optional[int]:
+        """Count the prompt and completion tokens of a completion's usage; returns its total (None without usage)"""
+        if not usage:
+            return None
+        # A model from the API, or a plain dict when this SDK version does not know the field (stream chunks)
+        counts = dict(usage)
+        LLM_TOKENS.inc("prompt", amount=counts.get("prompt_tokens") or 0)
+        LLM_TOKENS.inc("completion", amount=counts.get("completion_tokens") or 0)
+        return counts.get("total_tokens")
+
+    async def _generate_ai_response_with_context(self, chat_request: ChatRequest, session_id: str, plan: RetrievalPlan) -> ChatResponse:
         """Generate AI response with smart similarity-based context"""
+        # Already loaded by the client; imported here so the app does not load openai at import time
+        import openai
         try:
+            # Near-identical questions reuse a cached answer (0 tokens)
+            with track_stage("semantic_cache"):
+                query_embedding, cached_answer = await self._lookup_semantic_cache(chat_request)
+            if cached_answer:
+                return ChatResponse(
+                    response=cached_answer,
+                    conversation_id=session_id,
+                    model_used="semantic-cache",
+                    tokens_used=0
+                )
+
             # Prepare messages with smart context using similarity search
-            messages = await self._prepare_messages_with_smart_context(
-                user_message=chat_request.message,
-                conversation_history=chat_request.conversation_history,
-                system_prompt=chat_request.system_prompt
-            )
+            with track_stage("retrieval"):
+                context_docs = await self._retrieve_context_documents(session_id, plan)
+            with track_stage("prompt"):
+                prompt = await self._prepare_messages_with_smart_context(
+                    user_message=chat_request.message,
+                    conversation_history=chat_request.conversation_history,
+                    system_prompt=chat_request.system_prompt,
+                    context_docs=context_docs,
+                    max_completion_tokens=chat_request.max_tokens
+                )
+            CHAT_PROMPT_TOKENS.observe(prompt.breakdown.get("total", 0))
             
             # Set parameters with defaults from config or request
             temperature = chat_request.temperature or settings.TEMPERATURE
             max_tokens = chat_request.max_tokens or settings.MAX_TOKENS
             
-            logger.info(f"Sending request to OpenAI with {len(messages)} messages and smart context")
+            logger.info(f"Sending request to OpenAI with {len(prompt.messages)} messages and smart context")
             
             # Make API call to OpenAI
-            response = self.client.chat.completions.create(
-                model=settings.MODEL_NAME,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
+            # Includes waiting for admission and backing off between retries
+            with track_stage("completion"):
+                response = await chat_limiter.call(
+                    lambda: self.client.chat.completions.create(
+                        model=settings.MODEL_NAME,
+                        messages=prompt.messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        timeout=settings.OPENAI_CHAT_TIMEOUT
+                    ),
+                    transient_errors(),
+                    settings.OPENAI_MAX_RETRIES
+                )
             
             # Extract response content and sanitize Markdown/rich formatting
-            assistant_message = response.choices[0].message.content
-            assistant_message = self._sanitize_plain_text(assistant_message)
-            tokens_used = response.usage.total_tokens if response.usage else None
+            with track_stage("sanitize"):
+                assistant_message = response.choices[0].message.content
+                assistant_message = self._sanitize_plain_text(assistant_message)
+            tokens_used = self._record_usage(response.usage)
             
             logger.info(f"Generated AI response with {tokens_used} tokens")
+            self._store_semantic_cache(chat_request, query_embedding, context_docs, assistant_message)
             
             return ChatResponse(
                 response=assistant_message,
                 conversation_id=session_id,
                 model_used=settings.MODEL_NAME,
-                tokens_used=tokens_used
+                tokens_used=tokens_used,
+                prompt_tokens=prompt.breakdown
             )
             
+        except UpstreamSaturated:
+            raise
+        
+        except openai.APITimeoutError:
+            logger.error(f"OpenAI request timed out after {settings.OPENAI_CHAT_TIMEOUT}s")
+            raise Exception("OpenAI request timed out. Please try again later.")
+        
         except openai.RateLimitError:
             logger.error("OpenAI rate limit exceeded")
             raise Exception("Rate limit exceeded. Please try again later.")
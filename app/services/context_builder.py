@@ -0,0 +1,138 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.chunking import passage_rank
+from app.core.config import settings
+from app.core.prompts import SystemPrompt
+from app.core.tokenizer import TOKENS_PER_MESSAGE, TOKENS_PER_REPLY, TokenCounter, context_window, get_token_counter
+from app.models.schemas import Message
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_HEADER = "Berdasarkan dokumen yang relevan:\n\n"
+NO_DOCUMENTS = "Tidak ada dokumen yang relevan ditemukan."
+RETRIEVAL_FAILED = "Terjadi kesalahan saat mencari dokumen yang relevan."
+
+@dataclass
+class PromptContext:
+    """Chat messages for one request and their token breakdown"""
+    messages: List[Dict[str, str]]
+    breakdown: Dict[str, int] = field(default_factory=dict)
+
+class ContextBuilder:
+    """
+    Packs the system prompt, retrieved documents and conversation history into
+    a per-model prompt token budget.
+    The system prompt and the question are always sent. Documents are added
+    best ranked first while they fit, after keeping up to CONTEXT_HISTORY_TOKENS
+    for history; history then fills what the documents left, newest first.
+    Messages are ordered static system prompt, history, documents, question,
+    so consecutive requests share the longest possible prompt prefix.
+    """
+
+    # Smallest useful slice of a document that does not fit whole
+    min_document_tokens = 64
+
+    def budget(self, model: str, max_completion_tokens: int) -> int:
+        """Prompt tokens available for a request to a model"""
+        budget = settings.CONTEXT_TOKEN_BUDGETS.get(model, settings.CONTEXT_TOKEN_BUDGET)
+        return max(0, min(budget, context_window(model) - max_completion_tokens))
+
+    def build(
+        self,
+        model: str,
+        system_prompt: SystemPrompt,
+        context_docs: Optional[List[Dict[str, Any]]],
+        conversation_history: List[Message],
+        user_message: str,
+        max_completion_tokens: int
+    ) -> PromptContext:
+        """Build the messages for a request; context_docs None means retrieval failed"""
+        counter = get_token_counter(model)
+        budget = self.budget(model, max_completion_tokens)
+        system_tokens = TOKENS_PER_MESSAGE + counter.count("system") + system_prompt.tokens(counter)
+        user_tokens = counter.count_message("user", user_message)
+        # The documents travel in a system message of their own
+        context_framing = TOKENS_PER_MESSAGE + counter.count("system")
+        available = max(0, budget - TOKENS_PER_REPLY - system_tokens - user_tokens - context_framing)
+
+        history_tokens = [counter.count_message(msg.role, msg.content) for msg in conversation_history]
+        history_reserve = min(settings.CONTEXT_HISTORY_TOKENS, sum(history_tokens), available)
+        context, context_tokens, documents = self._pack_documents(counter, context_docs, available - history_reserve)
+
+        # Newest messages first, stopping at the first that does not fit so the history stays contiguous
+        history_budget = available - context_tokens
+        kept, used = 0, 0
+        for tokens in reversed(history_tokens):
+            if used + tokens > history_budget:
+                break
+            used += tokens
+            kept += 1
+        history = conversation_history[len(conversation_history) - kept:]
+
+        messages = [{"role": "system", "content": system_prompt.text}]
+        messages.extend({"role": msg.role, "content": msg.content} for msg in history)
+        messages.append({"role": "system", "content": context})
+        messages.append({"role": "user", "content": user_message})
+
+        breakdown = {
+            "budget": budget,
+            "system": system_tokens,
+            "context": context_framing + context_tokens,
+            "history": used,
+            "user": user_tokens,
+            "total": TOKENS_PER_REPLY + system_tokens + context_framing + context_tokens + used + user_tokens,
+            "documents": documents,
+            "documents_dropped": len(context_docs or []) - documents,
+            "history_messages": kept,
+            "history_dropped": len(conversation_history) - kept,
+        }
+        logger.info(f"Prompt tokens for {model}{'' if counter.exact else ' (estimated)'}: {breakdown}")
+        return PromptContext(messages=messages, breakdown=breakdown)
+
+    def _pack_documents(
+        self,
+        counter: TokenCounter,
+        context_docs: Optional[List[Dict[str, Any]]],
+        budget: int
+    ) -> Tuple[str, int, int]:
+        """Render the documents that fit in budget; returns (text, tokens, documents included)"""
+        if context_docs is None:
+            return RETRIEVAL_FAILED, counter.count(RETRIEVAL_FAILED), 0
+
+        parts = [CONTEXT_HEADER]
+        used = counter.count(CONTEXT_HEADER)
+        included = 0
+        for doc in sorted(context_docs, key=passage_rank, reverse=True):
+            head = f"Dokumen {included + 1}: {doc['title']}\nRelevansi: {doc.get('similarity', 0.5):.2f}\nKonten: "
+            content = doc.get("content") or ""
+            # Token counts of parts add up to at least the count of their concatenation
+            fixed = counter.count(head) + counter.count("\n\n")
+            room = budget - used - fixed
+            if counter.count(content) > room:
+                if "chunk_indexes" in doc or room < self.min_document_tokens:
+                    # Chunk passages are cut along steps already; a later, shorter one may still fit
+                    continue
+                content = self._cut(counter, content, room - counter.count("..."))
+                if not content:
+                    continue
+                content += "..."
+            parts.append(f"{head}{content}\n\n")
+            used += fixed + counter.count(content)
+            included += 1
+
+        if not included:
+            return NO_DOCUMENTS, counter.count(NO_DOCUMENTS), 0
+        return "".join(parts), used, included
+
+    @staticmethod
+    def _cut(counter: TokenCounter, content: str, max_tokens: int) -> str:
+        """Prefix of content within max_tokens, ending at a line break when one is near"""
+        prefix = counter.truncate(content, max_tokens)
+        line_end = prefix.rfind("\n")
+        if line_end > len(prefix) // 2:
+            prefix = prefix[:line_end]
+        return prefix.rstrip()
+
+context_builder = ContextBuilder()
@@ -0,0 +1,179 @@
+import logging
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set
+
+from app.core.config import settings
+from app.models.schemas import Message
+from app.services.embedding_service import EmbeddingService, embedding_service
+from app.services.session_store import SessionStore, session_store
+
+logger = logging.getLogger(__name__)
+
+# Words that point back at earlier turns ("itu", "tadi", "maksudnya") or continue them ("lalu", "terus")
+REFERENCE_WORDS = {
+    "itu", "ini", "tersebut", "tadi", "barusan", "diatas", "sebelumnya", "selanjutnya", "berikutnya",
+    "maksudnya", "artinya", "contohnya", "caranya", "syaratnya", "lalu", "terus", "kemudian"
+}
+# "langkah ke 5", "nomor 3", "tahap ke-2", "poin terakhir"
+STEP_REFERENCE = re.compile(
+    r"\b(?:langkah|step|tahap|poin|nomor|no)\s*(?:ke)?[\s-]*(?:\d+|pertama|kedua|ketiga|terakhir)\b"
+)
+# Question and function words that say nothing about the topic
+FUNCTION_WORDS = {
+    "apa", "apakah", "yang", "ke", "di", "dari", "untuk", "dengan", "dan", "atau", "ada", "saya", "kami",
+    "aku", "bisa", "bisakah", "harus", "perlu", "mana", "kenapa", "mengapa", "bagaimana", "gimana", "kapan",
+    "siapa", "berapa", "jika", "jelaskan", "tolong", "mohon", "maksud", "lagi", "juga", "sudah", "belum",
+    "tidak", "nggak", "gak", "dong", "ya", "saja", "aja", "sih", "kah", "kok", "jadi", "kalau", "kalo", "mau",
+    "ingin", "boleh", "akan", "begitu", "begini", "gitu", "gini", "seperti", "misalnya", "contoh", "setelah",
+    "sesudah", "sebelum", "sama", "lain", "lainnya", "cara", "hal", "bagian", "step", "langkah", "tahap",
+    "poin", "nomor", "no"
+}
+STEP_NUMBER = re.compile(r"\b(?:langkah|step|tahap|poin|nomor|no)\s*(?:ke)?[\s-]*(\d+)\b")
+
+@dataclass
+class RetrievalPlan:
+    """
+    How the documents for a message are found: "standalone" retrieves the
+    message itself, "pinned" and "cached" reuse documents already retrieved
+    in the session, "rewrite" retrieves the follow-up joined to the session's
+    last standalone question (anchor).
+    """
+    mode: str
+    query: str
+    message: str
+    anchor: Optional[str] = None
+    documents: Optional[List[Dict[str, Any]]] = None
+
+class ConversationRetriever:
+    """
+    Retrieval for a message in the context of its conversation.
+    A standalone question is retrieved as is and its documents are pinned to
+    the session. A follow-up (at most max_words words, or referring back with
+    words like "itu", "tadi" or "langkah ke 5") whose topic words all occur in
+    the pinned documents reuses them: no query embedding, no database call.
+    Other follow-ups, and follow-ups in a session without pinned documents
+    (rehydrated, or served by another worker), are rewritten into a standalone
+    query and retrieved once when they point back at the earlier turns
+    (reference words, a step, or no topic words of their own); the rewrite is
+    cached per session. A short message on a new topic ("biaya paspor?") is
+    retrieved as is and the old documents are unpinned.
+    """
+
+    def __init__(
+        self,
+        store: SessionStore = session_store,
+        embeddings: EmbeddingService = embedding_service,
+        max_words: int = settings.FOLLOW_UP_MAX_WORDS,
+        max_rewrites: int = settings.QUERY_REWRITE_CACHE_SIZE
+    ):
+        self.store = store
+        self.embeddings = embeddings
+        self.max_words = max_words
+        self.max_rewrites = max_rewrites
+        self._stats = {"standalone": 0, "pinned": 0, "cached": 0, "rewrite": 0, "failed": 0}
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._stats)
+
+    def plan(self, session_id: str, message: str, conversation_history: List[Message]) -> RetrievalPlan:
+        """Decide how to retrieve documents for a message (no I/O)"""
+        standalone = RetrievalPlan(mode="standalone", query=message, message=message)
+        if not settings.CONVERSATION_RETRIEVAL_ENABLED or not self.is_follow_up(message):
+            return standalone
+
+        key = self._normalize(message)
+        pinned = self.store.pinned(session_id)
+        if pinned is not None:
+            rewrite = pinned.rewrites.get(key)
+            if rewrite is not None:
+                return RetrievalPlan(mode="cached", query=rewrite[0], message=message, anchor=pinned.query, documents=rewrite[1])
+            topic_words = self._topic_words(message)
+            if topic_words <= self._words(pinned.documents):
+                documents = self._focus(pinned.documents, message, topic_words)
+                return RetrievalPlan(mode="pinned", query=pinned.query, message=message, anchor=pinned.query, documents=documents)
+            if not self._refers_back(message):
+                # Short, but about something the pinned documents do not cover
+                self.store.unpin(session_id)
+                return standalone
+            anchor = pinned.query
+        else:
+            anchor = self._anchor(conversation_history)
+            if anchor is None:
+                # Nothing earlier to refer to
+                return standalone
+            if self._topic_words(message) and not self._refers_back(message):
+                return standalone
+        return RetrievalPlan(mode="rewrite", query=f"{anchor} {message}", message=message, anchor=anchor)
+
+    async def retrieve(self, session_id: str, plan: RetrievalPlan) -> Optional[List[Dict[str, Any]]]:
+        """Documents for a planned retrieval; None when retrieval failed"""
+        self._stats[plan.mode] += 1
+        if plan.documents is not None:
+            logger.info(f"Follow-up reuses {len(plan.documents)} documents retrieved for: {plan.anchor[:50]}...")
+            return plan.documents
+        try:
+            documents = await self.embeddings.find_context_documents(plan.query)
+        except Exception as e:
+            self._stats["failed"] += 1
+            logger.error(f"Error getting context from similar docs: {e}")
+            return None
+
+        if documents and settings.CONVERSATION_RETRIEVAL_ENABLED:
+            if plan.mode == "rewrite":
+                self.store.pin(session_id, plan.anchor, documents)
+                self.store.remember_rewrite(session_id, self._normalize(plan.message), plan.query, documents, self.max_rewrites)
+            else:
+                self.store.pin(session_id, plan.query, documents)
+        return documents
+
+    def is_follow_up(self, message: str) -> bool:
+        """Heuristic for a message that only makes sense after the previous turns"""
+        return len(re.findall(r"\w+", (message or "").lower())) <= self.max_words or self._refers_back(message)
+
+    @staticmethod
+    def _refers_back(message: str) -> bool:
+        """Whether a message points at earlier turns with a reference word or a step"""
+        text = (message or "").lower()
+        return any(word in REFERENCE_WORDS for word in re.findall(r"\w+", text)) or STEP_REFERENCE.search(text) is not None
+
+    def _anchor(self, conversation_history: List[Message]) -> Optional[str]:
+        """The latest standalone question in the history"""
+        for message in reversed(conversation_history):
+            if message.role == "user" and not self.is_follow_up(message.content):
+                return message.content
+        return None
+
+    def _focus(self, documents: List[Dict[str, Any]], message: str, topic_words: Set[str]) -> List[Dict[str, Any]]:
+        """The pinned passages a follow-up names (a step number or a topic word), or all of them"""
+        step = STEP_NUMBER.search(message.lower())
+        step_line = re.compile(rf"(?m)^\s*{step.group(1)}[.)]") if step else None
+        focused = [
+            doc for doc in documents
+            if (step_line is not None and step_line.search(doc.get("content", "")))
+            or (topic_words and topic_words & self._words([doc]))
+        ]
+        return focused or documents
+
+    @staticmethod
+    def _normalize(message: str) -> str:
+        return " ".join(re.findall(r"\w+", message.lower()))
+
+    @staticmethod
+    def _topic_words(message: str) -> Set[str]:
+        words = set()
+        for word in re.findall(r"[^\W\d_]+", message.lower()):
+            if len(word) < 3 or word in FUNCTION_WORDS or word in REFERENCE_WORDS:
+                continue
+            # "websitenya" is asking about "website"
+            if word.endswith("nya") and len(word) > 5:
+                word = word[:-3]
+            words.add(word)
+        return words
+
+    @staticmethod
+    def _words(documents: List[Dict[str, Any]]) -> Set[str]:
+        text = " ".join(f"{doc.get('title', '')} {doc.get('content', '')}" for doc in documents)
+        return set(re.findall(r"[^\W\d_]+", text.lower()))
+
+conversation_retriever = ConversationRetriever()
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Hashable, List, Optional
+
+from app.core.config import settings
+from app.core.vector_index import VectorIndex, document_index, faq_index, to_vector
+from app.repositories.document_repository import DocumentRepository, document_repository
+from app.repositories.faq_repository import FAQRepository, faq_repository
+from app.services.semantic_cache import faq_cache_key, semantic_cache
+
+logger = logging.getLogger(__name__)
+
+def faq_index_row(item: Dict[str, Any]) -> Dict[str, Any]:
+    """An FAQ item as an index row, titled like the FAQ hits of search_similar_content"""
+    names = [(item.get(table) or {}).get("name") or "" for table in ("faq_categories", "faq_subcategories")]
+    row = {
+        "id": item["id"],
+        "title": item.get("question") or " - ".join(names),
+        "content": item.get("answer"),
+        "document_type": "faq",
+        "source": "faq",
+    }
+    for key in ("is_active", "content_embedding", "updated_at"):
+        if key in item:
+            row[key] = item[key]
+    return row
+
+class DocumentIndexSync:
+    """
+    Keeps the in-process document index in step with the documents table.
+    Writes made through DocumentRepository are applied immediately; this
+    periodic pass picks up changes made elsewhere (other workers, SQL edits)
+    by comparing updated_at versions and fetching only the rows that changed.
+    """
+
+    fetch_batch_size = 100
+    name = "Document"
+
+    def __init__(
+        self,
+        index: VectorIndex = document_index,
+        repository: DocumentRepository = document_repository,
+        interval_seconds: float = settings.LOCAL_VECTOR_INDEX_REFRESH_SECONDS
+    ):
+        self.index = index
+        self.repository = repository
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    async def sync_once(self) -> Dict[str, int]:
+        """Bring the index up to date with the database"""
+        start = time.perf_counter()
+        versions = await self._versions()
+        if versions is None:
+            raise RuntimeError(f"could not list {self.name.lower()} versions")
+        remote = {row["id"]: row.get("updated_at") for row in versions}
+
+        if self.index.ready:
+            changed = [doc_id for doc_id, version in remote.items()
+                       if doc_id not in self.index.versions or self.index.versions[doc_id] != version]
+            removed = [doc_id for doc_id in list(self.index.versions) if doc_id not in remote]
+        else:
+            changed, removed = list(remote), []
+
+        rows = []
+        for i in range(0, len(changed), self.fetch_batch_size):
+            rows.extend(await self._rows(changed[i:i + self.fetch_batch_size]))
+
+        if self.index.ready:
+            for row in rows:
+                self.index.upsert(row)
+                vector = to_vector(row.get("content_embedding"), self.index.dimension)
+                if vector is not None:
+                    # Embeddings written by another process (e.g. the embedding worker) make cached answers stale
+                    semantic_cache.invalidate_for_embedding(self._cache_key(row["id"]), vector)
+            for doc_id in removed:
+                self.index.remove(doc_id)
+        else:
+            self.index.load(rows)
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"{self.name} index synced: {len(self.index)} vectors, {len(rows)} updated, {len(removed)} removed in {elapsed_ms:.0f}ms")
+        return {"size": len(self.index), "updated": len(rows), "removed": len(removed)}
+
+    async def _versions(self) -> Optional[List[Dict[str, Any]]]:
+        return await self.repository.get_document_versions()
+
+    async def _rows(self, ids: List[int]) -> List[Dict[str, Any]]:
+        return await self.repository.get_documents_with_embeddings(ids)
+
+    def _cache_key(self, row_id: int) -> Hashable:
+        return row_id
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sync_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"{self.name} index sync failed, retrieval keeps using {'the local index' if self.index.ready else 'the RPC'}: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self) -> None:
+        """Start the background sync loop on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+class FAQIndexSync(DocumentIndexSync):
+    """
+    Keeps the in-process FAQ item index in step with the faq_items table, so
+    local search returns FAQ items like the search_similar_content RPC does.
+    """
+
+    name = "FAQ"
+
+    def __init__(
+        self,
+        index: VectorIndex = faq_index,
+        repository: FAQRepository = faq_repository,
+        interval_seconds: float = settings.LOCAL_VECTOR_INDEX_REFRESH_SECONDS
+    ):
+        super().__init__(index, repository, interval_seconds)
+
+    async def _versions(self) -> Optional[List[Dict[str, Any]]]:
+        return await self.repository.get_faq_item_versions()
+
+    async def _rows(self, ids: List[int]) -> List[Dict[str, Any]]:
+        return [faq_index_row(item) for item in await self.repository.get_faq_items_with_embeddings(ids)]
+
+    def _cache_key(self, row_id: int) -> Hashable:
+        return faq_cache_key(row_id)
+
+document_index_sync = DocumentIndexSync()
+faq_index_sync = FAQIndexSync()
@@ -0,0 +1,418 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.admission import UpstreamSaturated, backoff_delay
+from app.core.config import settings
+from app.core.openai_client import transient_errors as openai_transient_errors
+from app.core.vector_index import document_index, faq_index
+from app.repositories.document_repository import DocumentRepository, document_repository
+from app.repositories.faq_repository import FAQRepository, faq_repository
+from app.services.document_index_sync import faq_index_row
+from app.services.embedding_service import EmbeddingService, embedding_service
+from app.services.semantic_cache import faq_cache_key, semantic_cache
+
+logger = logging.getLogger(__name__)
+
+def transient_errors() -> Tuple[type, ...]:
+    """Errors worth retrying with backoff; anything else fails the batch immediately"""
+    return openai_transient_errors() + (UpstreamSaturated,)
+
+def faq_embedding_text(item: Dict[str, Any]) -> str:
+    """Text embedded for an FAQ item: its category and subcategory, question and answer"""
+    names = [(item.get(table) or {}).get("name") for table in ("faq_categories", "faq_subcategories")]
+    parts = [" - ".join(name for name in names if name), item.get("question") or "", item.get("answer") or ""]
+    return "\n".join(part for part in parts if part)
+
+class AdaptiveConcurrency:
+    """
+    Concurrency limit for upstream requests.
+    A throttled request halves the limit and pauses every worker until the
+    backoff delay has passed; the limit grows back by one after a run of
+    successful requests.
+    """
+
+    def __init__(self, limit: int):
+        self.max_limit = max(1, limit)
+        self.limit = self.max_limit
+        self._in_flight = 0
+        self._successes = 0
+        self._resume_at = 0.0
+        self._changed = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._changed:
+            while self._in_flight >= self.limit:
+                await self._changed.wait()
+            self._in_flight += 1
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def release(self, backoff: Optional[float] = None) -> None:
+        """Release a slot; pass the backoff delay when the request was throttled"""
+        async with self._changed:
+            self._in_flight -= 1
+            if backoff is not None:
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+                self._resume_at = max(self._resume_at, time.monotonic() + backoff)
+            else:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.max_limit:
+                    self.limit += 1
+                    self._successes = 0
+            self._changed.notify_all()
+
+@dataclass
+class _Batch:
+    seq: int
+    rows: List[Dict[str, Any]]
+    written: Optional[int] = None
+
+    @property
+    def last_id(self) -> int:
+        return self.rows[-1]["id"]
+
+class EmbeddingBackfill:
+    """
+    Batched, concurrent embedding backfill.
+    Documents are read in ID order and embedded together with their chunks,
+    ``batch_size`` documents per request with up to ``concurrency`` requests in flight, and written back with one
+    bulk update per batch. The highest ID below which every batch is written
+    is checkpointed to a JSON file, so an interrupted run resumes from there.
+    FAQ items are embedded after the documents, ``batch_size`` per request;
+    there are few of them, so that pass is not checkpointed.
+    """
+
+    page_size = 500
+    max_batch_chars = 200_000
+    max_backoff_seconds = 60.0
+
+    def __init__(
+        self,
+        service: EmbeddingService = embedding_service,
+        repository: DocumentRepository = document_repository,
+        faq_repository: FAQRepository = faq_repository,
+        batch_size: int = settings.EMBEDDING_BACKFILL_BATCH_SIZE,
+        concurrency: int = settings.EMBEDDING_BACKFILL_CONCURRENCY,
+        max_attempts: int = settings.EMBEDDING_BACKFILL_MAX_ATTEMPTS,
+        checkpoint_path: str = settings.EMBEDDING_BACKFILL_CHECKPOINT_PATH
+    ):
+        self.service = service
+        self.repository = repository
+        self.faq_repository = faq_repository
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.checkpoint_path = checkpoint_path
+        self._task: Optional[asyncio.Task] = None
+        self._progress: Dict[str, Any] = {"state": "idle"}
+        self._limiter: Optional[AdaptiveConcurrency] = None
+        self._done: Dict[int, _Batch] = {}
+        self._next_seq = 0
+        self._blocked = False
+        self._checkpointed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._progress.get("state") == "running"
+
+    def progress(self) -> Dict[str, Any]:
+        """Snapshot of the current or last run"""
+        progress = dict(self._progress)
+        if "started_at" not in progress:
+            return progress
+        elapsed = progress.get("finished_at", time.time()) - progress["started_at"]
+        rate = (progress["processed"] - progress["resumed_from"]) / elapsed if elapsed > 0 else 0.0
+        progress["elapsed_seconds"] = round(elapsed, 1)
+        progress["docs_per_second"] = round(rate, 2)
+        if progress["state"] == "running":
+            remaining = (progress["total"] or 0) - progress["processed"] - progress["failed"]
+            progress["eta_seconds"] = round(remaining / rate, 1) if rate > 0 and remaining > 0 else None
+            progress["concurrency"] = self._limiter.limit if self._limiter else None
+        return progress
+
+    def start(self, mode: str = "missing", resume: bool = True) -> None:
+        """Run the backfill in the background on the running event loop"""
+        if self.running:
+            raise RuntimeError("An embedding backfill is already running")
+        self._progress = {"state": "running", "mode": mode, "started_at": time.time(),
+                          "processed": 0, "failed": 0, "resumed_from": 0, "total": None}
+        self._task = asyncio.create_task(self._run_logged(mode, resume))
+
+    async def _run_logged(self, mode: str, resume: bool) -> None:
+        try:
+            await self.run(mode, resume)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Embedding backfill failed: {e}")
+
+    async def stop(self) -> None:
+        """Cancel a background run; the checkpoint already covers every finished batch"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self, mode: str = "missing", resume: bool = True) -> Dict[str, Any]:
+        """
+        Embed every active document and FAQ item ("all") or only those without
+        an embedding ("missing") and return the final progress.
+        """
+        if mode not in ("missing", "all"):
+            raise ValueError("mode must be 'missing' or 'all'")
+        only_missing = mode == "missing"
+        checkpoint = self._load_checkpoint() if resume else None
+        if checkpoint and (checkpoint.get("mode") != mode or checkpoint.get("model") != self.service.embedding_model
+                           or checkpoint.get("state") == "completed"):
+            checkpoint = None
+        after_id = checkpoint["last_id"] if checkpoint else 0
+        processed = checkpoint["processed"] if checkpoint else 0
+        # Only rejections below the checkpoint are final; later batches run again
+        failed_ids = [doc_id for doc_id in checkpoint.get("failed_ids", []) if doc_id <= after_id] if checkpoint else []
+
+        self._progress = {
+            "state": "running",
+            "mode": mode,
+            "model": self.service.embedding_model,
+            "started_at": time.time(),
+            "last_id": after_id,
+            "resumed_from": processed,
+            "processed": processed,
+            "failed": len(failed_ids),
+            "failed_ids": failed_ids,
+            "faq_processed": 0,
+            "faq_failed": 0,
+            "batches": 0,
+            "requests": 0,
+            "throttled": 0,
+            "total": None,
+        }
+        remaining = await self.repository.count_documents_for_embedding(after_id, only_missing)
+        self._progress["total"] = processed + self._progress["failed"] + remaining if remaining is not None else None
+        logger.info(f"Embedding backfill started ({mode}, resuming after ID {after_id}, {remaining} documents to embed)")
+
+        self._limiter = AdaptiveConcurrency(self.concurrency)
+        self._done = {}
+        self._next_seq = 0
+        self._blocked = False
+        self._checkpointed = processed
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.concurrency)]
+        try:
+            seq = 0
+            cursor = after_id
+            while True:
+                rows = await self.repository.get_documents_for_embedding(cursor, self.page_size, only_missing)
+                if not rows:
+                    break
+                for batch_rows in self._split(rows):
+                    await queue.put(_Batch(seq, batch_rows))
+                    seq += 1
+                cursor = rows[-1]["id"]
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+            await self._embed_faq_items(only_missing)
+        except BaseException as e:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self._progress["state"] = "cancelled" if isinstance(e, asyncio.CancelledError) else "failed"
+            self._progress["error"] = None if isinstance(e, asyncio.CancelledError) else str(e)
+            self._progress["finished_at"] = time.time()
+            self._save_checkpoint()
+            raise
+
+        self._progress["state"] = "incomplete" if self._blocked else "completed"
+        self._progress["finished_at"] = time.time()
+        self._save_checkpoint()
+        logger.info(
+            f"Embedding backfill {self._progress['state']}: {self._progress['processed']} embedded, "
+            f"{self._progress['failed']} failed, {self._progress['faq_processed']} FAQ items embedded, "
+            f"{self._progress['faq_failed']} failed, {self._progress['requests']} requests, "
+            f"{self._progress['throttled']} throttled"
+        )
+        return self.progress()
+
+    def _split(self, rows: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Group rows into batches bounded by count and total text size"""
+        batches, current, chars = [], [], 0
+        for row in rows:
+            # Each document is embedded whole and once more as chunks
+            size = 2 * (len(row.get("title") or "") + len(row.get("content") or "") + 1)
+            if current and (len(current) >= self.batch_size or chars + size > self.max_batch_chars):
+                batches.append(current)
+                current, chars = [], 0
+            current.append(row)
+            chars += size
+        if current:
+            batches.append(current)
+        return batches
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            batch = await queue.get()
+            if batch is None:
+                return
+            batch.written = await self._process(batch.rows)
+            self._complete(batch)
+
+    async def _process(self, rows: List[Dict[str, Any]]) -> Optional[int]:
+        """
+        Embed and store one batch. Returns the number of rows written, or None
+        when transient errors outlasted every attempt.
+        """
+        import openai
+
+        for attempt in range(1, self.max_attempts + 1):
+            await self._limiter.acquire()
+            try:
+                self._progress["requests"] += 1
+                updates, chunks = await self.service.embed_documents(rows, max_retries=0)
+            except transient_errors() as e:
+                delay = backoff_delay(e, attempt, self.max_backoff_seconds)
+                self._progress["throttled"] += 1
+                await self._limiter.release(backoff=delay)
+                logger.warning(f"Embedding batch throttled ({type(e).__name__}), retrying in {delay:.1f}s (attempt {attempt}/{self.max_attempts})")
+                continue
+            except openai.BadRequestError as e:
+                await self._limiter.release()
+                if len(rows) == 1:
+                    # Permanently rejected (e.g. too long); skip it rather than block the run
+                    logger.error(f"Embedding rejected for document {rows[0]['id']}: {e}")
+                    self._progress["failed_ids"].append(rows[0]["id"])
+                    return 0
+                # Isolate the rejected input by splitting the batch
+                middle = len(rows) // 2
+                first = await self._process(rows[:middle])
+                second = await self._process(rows[middle:])
+                return None if first is None or second is None else first + second
+            except Exception as e:
+                await self._limiter.release()
+                logger.error(f"Embedding batch ending at ID {rows[-1]['id']} failed: {e}")
+                return None
+            await self._limiter.release()
+            return await self._store(rows, updates, chunks)
+        return None
+
+    async def _store(self, rows: List[Dict[str, Any]], updates: Dict[int, List[float]], chunks: List[Dict[str, Any]]) -> Optional[int]:
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                written = await self.repository.bulk_update_embeddings(updates, chunks)
+                break
+            except Exception as e:
+                delay = backoff_delay(e, attempt, self.max_backoff_seconds)
+                logger.warning(f"Bulk embedding update failed, retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+        else:
+            return None
+        for row in rows:
+            semantic_cache.invalidate_document(row["id"])
+            if document_index.ready:
+                document_index.upsert({**row, "content_embedding": updates[row["id"]]})
+        return written
+
+    async def _embed_faq_items(self, only_missing: bool) -> None:
+        """Embed active FAQ items in ID order; a failed batch is counted and skipped"""
+        cursor = 0
+        while True:
+            rows = await self.faq_repository.get_faq_items_for_embedding(cursor, self.page_size, only_missing)
+            if not rows:
+                return
+            for start in range(0, len(rows), self.batch_size):
+                batch = rows[start:start + self.batch_size]
+                written = await self._process_faq_items(batch)
+                self._progress["faq_processed"] += written or 0
+                self._progress["faq_failed"] += len(batch) - (written or 0)
+            cursor = rows[-1]["id"]
+
+    async def _process_faq_items(self, rows: List[Dict[str, Any]]) -> Optional[int]:
+        """Embed and store one batch of FAQ items; None when it failed"""
+        for attempt in range(1, self.max_attempts + 1):
+            await self._limiter.acquire()
+            try:
+                self._progress["requests"] += 1
+                embeddings = await self.service.generate_embeddings([faq_embedding_text(row) for row in rows], max_retries=0)
+            except transient_errors() as e:
+                delay = backoff_delay(e, attempt, self.max_backoff_seconds)
+                self._progress["throttled"] += 1
+                await self._limiter.release(backoff=delay)
+                logger.warning(f"FAQ embedding batch throttled ({type(e).__name__}), retrying in {delay:.1f}s (attempt {attempt}/{self.max_attempts})")
+                continue
+            except Exception as e:
+                await self._limiter.release()
+                logger.error(f"FAQ embedding batch ending at ID {rows[-1]['id']} failed: {e}")
+                return None
+            await self._limiter.release()
+            updates = {row["id"]: embedding for row, embedding in zip(rows, embeddings)}
+            try:
+                written = await self.faq_repository.bulk_update_faq_embeddings(updates)
+            except Exception as e:
+                logger.error(f"Bulk FAQ embedding update ending at ID {rows[-1]['id']} failed: {e}")
+                return None
+            for row in rows:
+                semantic_cache.invalidate_for_embedding(faq_cache_key(row["id"]), updates[row["id"]])
+                if faq_index.ready:
+                    faq_index.upsert(faq_index_row({**row, "content_embedding": updates[row["id"]]}))
+            return written
+        logger.error(f"FAQ embedding batch ending at ID {rows[-1]['id']} failed after {self.max_attempts} attempts")
+        return None
+
+    def _complete(self, batch: _Batch) -> None:
+        """Record a finished batch and advance the checkpoint over the contiguous finished prefix"""
+        self._progress["batches"] += 1
+        if batch.written is None:
+            self._progress["failed"] += len(batch.rows)
+            logger.error(f"Embedding batch ending at ID {batch.last_id} failed after {self.max_attempts} attempts")
+        else:
+            self._progress["processed"] += batch.written
+            self._progress["failed"] += len(batch.rows) - batch.written
+        self._done[batch.seq] = batch
+        advanced = False
+        while not self._blocked and self._next_seq in self._done:
+            done = self._done.pop(self._next_seq)
+            if done.written is None:
+                # A failed batch must be retried, so the checkpoint cannot move past it
+                self._blocked = True
+                break
+            self._progress["last_id"] = done.last_id
+            self._checkpointed += done.written
+            self._next_seq += 1
+            advanced = True
+        if advanced:
+            self._save_checkpoint()
+
+    def _load_checkpoint(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable embedding backfill checkpoint {self.checkpoint_path}: {e}")
+            return None
+
+    def _save_checkpoint(self) -> None:
+        checkpoint = {key: self._progress.get(key) for key in ("state", "mode", "model", "last_id", "failed_ids", "started_at")}
+        # Rows written beyond the checkpoint are counted again when their batches are redone
+        checkpoint["processed"] = self._checkpointed
+        checkpoint["saved_at"] = time.time()
+        temp_path = f"{self.checkpoint_path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(checkpoint, f)
+            os.replace(temp_path, self.checkpoint_path)
+        except OSError as e:
+            logger.warning(f"Failed to write embedding backfill checkpoint: {e}")
+
+embedding_backfill = EmbeddingBackfill()
@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class EmbeddingCache:
+    """
+    Two-tier cache for query embeddings.
+    Tier 1 is an in-process LRU with TTL; tier 2 is an optional SQLite file
+    storing float32 vectors so hot queries survive restarts. It is opened on
+    first use in each process, as SQLite connections must not cross a fork,
+    and only used from that process's disk thread, off the event loop.
+    Expired rows are deleted, and the oldest beyond disk_max_entries, when
+    the tier is opened and then every prune_interval_seconds of writes.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        ttl_seconds: float = 86400,
+        db_path: Optional[str] = None,
+        disk_ttl_seconds: float = 30 * 86400,
+        disk_max_entries: int = 100000,
+        prune_interval_seconds: float = 3600
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_ttl_seconds = disk_ttl_seconds
+        self.disk_max_entries = disk_max_entries
+        self.prune_interval_seconds = prune_interval_seconds
+        self._pruned_at = 0.0
+        self._entries: "OrderedDict[str, Tuple[float, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.db_path = db_path
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid: Optional[int] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _disk(self) -> Optional[sqlite3.Connection]:
+        """This process's disk tier connection (None when disabled or it failed to open); disk thread only"""
+        if self.db_path and self._db_pid != os.getpid():
+            self._open_disk_tier(self.db_path)
+            self._db_pid = os.getpid()
+        return self._db
+
+    async def _run_on_disk_thread(self, function: Callable[..., T], *args: Any) -> T:
+        """Run a disk tier call on this process's single disk thread, which serializes them"""
+        if self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-cache")
+            self._executor_pid = os.getpid()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    def _open_disk_tier(self, db_path: str) -> None:
+        try:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS query_embeddings_created_at ON query_embeddings (created_at)")
+            logger.info(f"Embedding cache disk tier enabled at {db_path}")
+            self._prune(time.time())
+        except sqlite3.Error as e:
+            logger.error(f"Failed to open embedding cache at {db_path}, disk tier disabled: {e}")
+            self._db = None
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Normalize query text so trivially different spellings share an entry"""
+        return " ".join((text or "").lower().split())
+
+    @classmethod
+    def make_key(cls, text: str, model: str) -> str:
+        return hashlib.sha256(f"{model}\x00{cls.normalize(text)}".encode("utf-8")).hexdigest()
+
+    async def get(self, text: str, model: str) -> Optional[List[float]]:
+        """Return the cached embedding or None on a miss"""
+        key = self.make_key(text, model)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, embedding = entry
+                if now - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return embedding
+                del self._entries[key]
+
+        embedding = await self._run_on_disk_thread(self._get_from_disk, key, now) if self.db_path else None
+        with self._lock:
+            if embedding is not None:
+                self.disk_hits += 1
+                self._store(key, embedding, now)
+            else:
+                self.misses += 1
+        return embedding
+
+    async def set(self, text: str, model: str, embedding: List[float]) -> None:
+        """Store an embedding in both tiers"""
+        key = self.make_key(text, model)
+        now = time.time()
+        with self._lock:
+            self._store(key, embedding, now)
+        if self.db_path:
+            await self._run_on_disk_thread(self._put_on_disk, key, model, embedding, now)
+
+    def _store(self, key: str, embedding: List[float], now: float) -> None:
+        self._entries[key] = (now, embedding)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _put_on_disk(self, key: str, model: str, embedding: List[float], now: float) -> None:
+        db = self._disk()
+        if db is None:
+            return
+        try:
+            db.execute(
+                "INSERT OR REPLACE INTO query_embeddings (key, model, vector, created_at) VALUES (?, ?, ?, ?)",
+                (key, model, array("f", embedding).tobytes(), now)
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to persist embedding to disk cache: {e}")
+        if now - self._pruned_at >= self.prune_interval_seconds:
+            self._prune(now)
+
+    def _prune(self, now: float) -> int:
+        """Delete expired rows, then the oldest beyond disk_max_entries; returns the rows deleted (disk thread only)"""
+        self._pruned_at = now
+        try:
+            deleted = self._db.execute(
+                "DELETE FROM query_embeddings WHERE created_at < ?", (now - self.disk_ttl_seconds,)
+            ).rowcount
+            excess = self._db.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0] - self.disk_max_entries
+            if excess > 0:
+                deleted += self._db.execute(
+                    "DELETE FROM query_embeddings WHERE key IN "
+                    "(SELECT key FROM query_embeddings ORDER BY created_at LIMIT ?)", (excess,)
+                ).rowcount
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to prune embedding disk cache: {e}")
+            return 0
+        if deleted:
+            logger.info(f"Pruned {deleted} rows from the embedding disk cache")
+        return deleted
+
+    def _get_from_disk(self, key: str, now: float) -> Optional[List[float]]:
+        db = self._disk()
+        if db is None:
+            return None
+        try:
+            row = db.execute(
+                "SELECT vector, created_at FROM query_embeddings WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to read embedding from disk cache: {e}")
+            return None
+        if row is None:
+            return None
+        if now - row[1] > self.disk_ttl_seconds:
+            return None
+        vector = array("f")
+        vector.frombytes(row[0])
+        return vector.tolist()
+
+    def clear(self) -> None:
+        """Drop all in-memory entries (the disk tier is left intact)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            # Only reports the disk tier once this process has opened it
+            "disk_tier": self._db is not None and self._db_pid == os.getpid()
+        }
@@ -1,19 +1,49 @@
-import openai
-from typing import List, Dict, Any, Optional
+import asyncio
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple, Union
+from app.core.admission import UpstreamSaturated, embedding_limiter
 from app.core.config import settings
-from app.db import get_supabase_client
+from app.core.chunking import merge_adjacent_chunks, split_into_chunks
+from app.core.metrics import EMBEDDING_INPUTS, EMBEDDING_REQUEST_SECONDS, LLM_TOKENS, track_stage
+from app.db import get_async_supabase_client
+from app.core.openai_client import get_openai_client, transient_errors
+from app.core.vector_index import document_index, faq_index
+from app.services.embedding_cache import EmbeddingCache
 import logging
 
+if TYPE_CHECKING:
+    import openai
+    from postgrest import AsyncPostgrestClient
+
 logger = logging.getLogger(__name__)
 
 class EmbeddingService:
     """Service for generating and managing embeddings for similarity search"""
     
+    # Upper bound on inputs per embeddings request
+    max_inputs_per_request = 2048
+    
     def __init__(self):
-        self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-        self.supabase = get_supabase_client()
-        self.embedding_model = "text-embedding-ada-002"
+        self.embedding_model = settings.EMBEDDING_MODEL
         self.embedding_dimension = 1536
+        self.query_cache = EmbeddingCache(
+            max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.EMBEDDING_CACHE_TTL_SECONDS,
+            db_path=settings.EMBEDDING_CACHE_PATH or None,
+            disk_ttl_seconds=settings.EMBEDDING_CACHE_DISK_TTL_SECONDS,
+            disk_max_entries=settings.EMBEDDING_CACHE_DISK_MAX_ENTRIES
+        )
+        # In-flight query embeddings, so concurrent identical misses share one API call
+        self._pending_queries: Dict[str, asyncio.Task] = {}
+
+    @property
+    def client(self) -> "openai.AsyncOpenAI":
+        """Shared async OpenAI client"""
+        return get_openai_client()
+
+    @property
+    def supabase(self) -> "AsyncPostgrestClient":
+        """Shared async PostgREST client"""
+        return get_async_supabase_client()
     
     async def generate_embedding(self, text: str) -> List[float]:
         """Generate embedding for given text using OpenAI"""
@@ -22,19 +52,123 @@ class EmbeddingService:
             cleaned_text = text.replace("\n", " ").strip()
             
             # Generate embedding
-            response = self.client.embeddings.create(
-                model=self.embedding_model,
-                input=cleaned_text
+            response = await embedding_limiter.call(
+                lambda: self._create_embeddings("query", cleaned_text), transient_errors(), settings.OPENAI_MAX_RETRIES
             )
+            self._record_usage("query", 1, response)
             
             embedding = response.data[0].embedding
             logger.info(f"Generated embedding for text of length {len(cleaned_text)}")
             return embedding
             
+        except UpstreamSaturated:
+            raise
+        
         except Exception as e:
             logger.error(f"Error generating embedding: {e}")
             raise Exception(f"Failed to generate embedding: {str(e)}")
     
+    async def generate_embeddings(self, texts: List[str], max_retries: Optional[int] = None) -> List[List[float]]:
+        """
+        Generate embeddings for many texts in one request, in input order.
+        Errors are raised unchanged so callers can react to rate limits;
+        max_retries overrides OPENAI_MAX_RETRIES for transient errors.
+        """
+        retries = settings.OPENAI_MAX_RETRIES if max_retries is None else max_retries
+        embeddings = []
+        for start in range(0, len(texts), self.max_inputs_per_request):
+            batch = [text.replace("\n", " ").strip() for text in texts[start:start + self.max_inputs_per_request]]
+            response = await embedding_limiter.call(
+                lambda: self._create_embeddings("batch", batch), transient_errors(), retries
+            )
+            self._record_usage("batch", len(batch), response)
+            embeddings.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+        return embeddings
+    
+    async def _create_embeddings(self, kind: str, inputs: Union[str, List[str]]):
+        with track_stage(kind, EMBEDDING_REQUEST_SECONDS):
+            return await self.client.embeddings.create(
+                model=self.embedding_model,
+                input=inputs,
+                timeout=settings.OPENAI_EMBEDDING_TIMEOUT
+            )
+    
+    @staticmethod
+    def _record_usage(kind: str, inputs: int, response) -> None:
+        EMBEDDING_INPUTS.inc(kind, amount=inputs)
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            LLM_TOKENS.inc("embedding", amount=usage.total_tokens)
+    
+    async def embed_documents(
+        self,
+        documents: List[Dict[str, Any]],
+        max_retries: Optional[int] = None
+    ) -> Tuple[Dict[int, List[float]], List[Dict[str, Any]]]:
+        """
+        Embed documents together with their chunks in one batch.
+        Returns the document embeddings by ID and the chunk rows to store
+        (raises like generate_embeddings).
+        """
+        texts: List[str] = []
+        positions: Dict[str, int] = {}
+        
+        def position(text: str) -> int:
+            # Single-chunk documents embed the same text twice; send it once
+            if text not in positions:
+                positions[text] = len(texts)
+                texts.append(text)
+            return positions[text]
+        
+        document_positions = {}
+        chunk_rows = []
+        for doc in documents:
+            document_positions[doc["id"]] = position(f"{doc['title']} {doc['content']}")
+            for chunk in split_into_chunks(doc["content"], settings.CHUNK_MAX_CHARS, settings.CHUNK_OVERLAP_CHARS):
+                chunk_rows.append(({
+                    "document_id": doc["id"],
+                    "chunk_index": chunk.index,
+                    "content": chunk.content,
+                    "start_offset": chunk.start_offset,
+                    "end_offset": chunk.end_offset
+                }, position(f"{doc['title']} {chunk.content}")))
+        
+        embeddings = await self.generate_embeddings(texts, max_retries=max_retries)
+        return (
+            {doc_id: embeddings[i] for doc_id, i in document_positions.items()},
+            [{**row, "embedding": embeddings[i]} for row, i in chunk_rows]
+        )
+    
+    async def embed_query(self, query: str) -> List[float]:
+        """Get the embedding for a search query, served from the query cache when possible"""
+        cached = await self.query_cache.get(query, self.embedding_model)
+        if cached is not None:
+            return cached
+        
+        key = self.query_cache.make_key(query, self.embedding_model)
+        task = self._pending_queries.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._embed_and_cache_query(query))
+            self._pending_queries[key] = task
+            task.add_done_callback(lambda _: self._pending_queries.pop(key, None))
+        return await asyncio.shield(task)
+    
+    async def _embed_and_cache_query(self, query: str) -> List[float]:
+        # Only the cache key is normalized; the model sees the query as asked
+        embedding = await self.generate_embedding(query)
+        await self.query_cache.set(query, self.embedding_model, embedding)
+        return embedding
+    
+    @staticmethod
+    def ann_search_params() -> Dict[str, int]:
+        """Per-query ANN settings for the vector search RPCs; unset ones keep the database setting"""
+        params = {}
+        if settings.VECTOR_SEARCH_IVFFLAT_PROBES > 0:
+            params["ivfflat_probes"] = settings.VECTOR_SEARCH_IVFFLAT_PROBES
+        if settings.VECTOR_SEARCH_HNSW_EF_SEARCH > 0:
+            params["hnsw_ef_search"] = settings.VECTOR_SEARCH_HNSW_EF_SEARCH
+        return params
+    
     async def search_similar_documents(
         self, 
         query: str, 
@@ -45,17 +179,27 @@ class EmbeddingService:
         try:
             # Generate embedding for the query
             logger.debug(f"search_similar_documents: Generating embedding for query: '{query[:50]}...'")
-            query_embedding = await self.generate_embedding(query)
+            query_embedding = await self.embed_query(query)
             logger.debug(f"search_similar_documents: Embedding generated, first 5 values: {query_embedding[:5]}")
             
+            # Answer from the in-process indexes when both are loaded, saving a network round-trip;
+            # like the RPC, documents and FAQ items compete for the same limit
+            if settings.LOCAL_VECTOR_INDEX_ENABLED and document_index.ready and faq_index.ready:
+                results = document_index.search(query_embedding, threshold=threshold, limit=limit)
+                results += faq_index.search(query_embedding, threshold=threshold, limit=limit)
+                results = sorted(results, key=lambda doc: doc["similarity"], reverse=True)[:limit]
+                logger.info(f"Found {len(results)} similar documents in local index for query: {query[:50]}...")
+                return results
+            
             # Search similar documents using Supabase RPC function
             logger.debug(f"search_similar_documents: Calling RPC with threshold={threshold}, limit={limit}")
-            response = self.supabase.rpc(
+            response = await self.supabase.rpc(
                 'search_similar_content',
                 {
                     'query_embedding': query_embedding,
                     'match_threshold': threshold,
-                    'match_count': limit
+                    'match_count': limit,
+                    **self.ann_search_params()
                 }
             ).execute()
             
@@ -75,34 +219,80 @@ class EmbeddingService:
             
             # Fallback to full-text search if vector search fails
             logger.info(f"Falling back to full-text search for query: {query}")
-            try:
-                # Perform full-text search
-                response = self.client.table("document_chunks").select("content").text_search(
-                    "content", f"'{query}'"
-                ).limit(5).execute()
-                
-                if response.data:
-                    context = "\n\n---\n\n".join([item['content'] for item in response.data])
-                    logger.info("Fallback full-text search successful")
-                    return [{"content": c, "similarity": 0.5} for c in context.split("\n\n---\n\n")]
-                else:
-                    logger.info("No results from fallback full-text search")
-                    return []
+            return await self.fallback_text_search(query, limit=limit)
+    
+    async def search_similar_chunks(
+        self,
+        query: str,
+        threshold: float = 0.3,
+        limit: int = settings.CHUNK_MATCH_COUNT
+    ) -> List[Dict[str, Any]]:
+        """Search for document chunks similar to the query"""
+        try:
+            query_embedding = await self.embed_query(query)
+            response = await self.supabase.rpc(
+                'search_similar_chunks',
+                {
+                    'query_embedding': query_embedding,
+                    'match_threshold': threshold,
+                    'match_count': limit,
+                    **self.ann_search_params()
+                }
+            ).execute()
             
-            except Exception as e:
-                logger.error(f"Error in fallback full-text search: {e}")
-                return []
+            logger.info(f"Found {len(response.data or [])} similar chunks for query: {query[:50]}...")
+            return response.data or []
+            
+        except Exception as e:
+            logger.error(f"Error searching similar chunks: {e}")
+            return []
+    
+    async def hybrid_search(
+        self,
+        query: str,
+        threshold: float = 0.3,
+        limit: int = settings.CHUNK_MATCH_COUNT
+    ) -> List[Dict[str, Any]]:
+        """
+        Search document chunks by embedding similarity and full-text rank in
+        one database call; rows are ordered by their fused score and carry
+        similarity, text_rank, vector_position and text_position
+        """
+        try:
+            query_embedding = await self.embed_query(query)
+            response = await self.supabase.rpc(
+                'hybrid_search',
+                {
+                    'query_text': query,
+                    'query_embedding': query_embedding,
+                    'match_threshold': threshold,
+                    'match_count': limit,
+                    'candidate_count': max(limit, settings.HYBRID_CANDIDATE_COUNT),
+                    'rrf_k': settings.HYBRID_RRF_K,
+                    **self.ann_search_params()
+                }
+            ).execute()
+            
+            rows = response.data or []
+            text_only = sum(row.get("vector_position") is None for row in rows)
+            logger.info(f"Hybrid search found {len(rows)} chunks ({text_only} by full-text only) for query: {query[:50]}...")
+            return rows
+            
+        except Exception as e:
+            logger.error(f"Error in hybrid search: {e}")
+            return []
     
     async def fallback_text_search(self, query: str, limit: int = 3) -> List[Dict[str, Any]]:
         """Fallback to PostgreSQL full-text search if vector search fails"""
         try:
-            response = self.supabase.table("documents").select(
+            response = await self.supabase.table("documents").select(
                 "id, title, content, document_type"
-            ).text_search(
+            ).eq("is_active", True).limit(limit).text_search(
+                # text_search returns the final query builder, so it goes last
                 "search_content", 
                 query, 
-                config="indonesian"
-            ).eq("is_active", True).limit(limit).execute()
+                options={"type": "plain", "config": "indonesian"}
+            ).execute()
             
             # Format response to match vector search format
             results = []
@@ -160,7 +350,7 @@ class EmbeddingService:
             embedding = await self.generate_embedding(f"{title} {content}")
             
             # Insert document
-            response = self.supabase.table("documents").insert({
+            response = await self.supabase.table("documents").insert({
                 "title": title,
                 "content": content,
                 "document_type": document_type,
@@ -169,6 +359,8 @@ class EmbeddingService:
             }).execute()
             
             if response.data:
+                if document_index.ready:
+                    document_index.upsert(response.data[0])
                 logger.info(f"Successfully added document: {title}")
                 return True
             else:
@@ -181,73 +373,74 @@ class EmbeddingService:
     
     async def update_all_embeddings(self) -> int:
         """Update embeddings for all documents that don't have them"""
+        # Imported here: the backfill pipeline is built on this service
+        from app.services.embedding_backfill import embedding_backfill
         try:
-            # Get documents without embeddings
-            response = self.supabase.table("documents").select(
-                "id, title, content"
-            ).is_("content_embedding", "null").eq("is_active", True).execute()
-            
-            if not response.data:
-                logger.info("No documents need embedding updates")
-                return 0
-            
-            updated_count = 0
-            for doc in response.data:
-                try:
-                    # Generate embedding
-                    embedding = await self.generate_embedding(f"{doc['title']} {doc['content']}")
-                    
-                    # Update document
-                    update_response = self.supabase.table("documents").update({
-                        "content_embedding": embedding
-                    }).eq("id", doc["id"]).execute()
-                    
-                    if update_response.data:
-                        updated_count += 1
-                        logger.info(f"Updated embedding for document: {doc['title']}")
-                    
-                except Exception as e:
-                    logger.error(f"Failed to update embedding for document {doc['id']}: {e}")
-                    continue
-            
-            logger.info(f"Updated embeddings for {updated_count} documents")
-            return updated_count
+            progress = await embedding_backfill.run(mode="missing", resume=True)
+            logger.info(f"Updated embeddings for {progress['processed']} documents")
+            return progress["processed"]
             
         except Exception as e:
             logger.error(f"Error updating embeddings: {e}")
             return 0
     
+    async def find_context_documents(self, query: str, threshold: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Retrieve the documents used as RAG context for a query (threshold defaults to RETRIEVAL_SIMILARITY_THRESHOLD)"""
+        if threshold is None:
+            threshold = settings.RETRIEVAL_SIMILARITY_THRESHOLD
+        # Prefer the matching steps of long documents over whole documents
+        if settings.CHUNK_RETRIEVAL_ENABLED:
+            if settings.HYBRID_SEARCH_ENABLED:
+                chunks = await self.hybrid_search(query, threshold=threshold, limit=settings.CHUNK_MATCH_COUNT)
+            else:
+                chunks = await self.search_similar_chunks(query, threshold=threshold, limit=settings.CHUNK_MATCH_COUNT)
+            if chunks:
+                return merge_adjacent_chunks(chunks, settings.CHUNK_MERGED_MAX_CHARS)
+        
+        # Search for similar documents with a lower threshold
+        similar_docs = await self.search_similar_documents(query, threshold=threshold, limit=5)
+        
+        # If vector search finds nothing, try text search
+        if not similar_docs:
+            logger.info(f"Vector search found no results, trying text search for context: {query[:50]}...")
+            similar_docs = await self.fallback_text_search(query, limit=3)
+        
+        return similar_docs
+
+    def format_context(self, similar_docs: List[Dict[str, Any]], max_context_length: int = 3000) -> str:
+        """Format retrieved documents or merged chunk passages as context for AI"""
+        if not similar_docs:
+            return "Tidak ada dokumen yang relevan ditemukan."
+        
+        # Format context
+        context = "Berdasarkan dokumen yang relevan:\n\n"
+        current_length = len(context)
+        included = 0
+        
+        for doc in similar_docs:
+            doc_context = f"Dokumen {included + 1}: {doc['title']}\n"
+            doc_context += f"Relevansi: {doc.get('similarity', 0.5):.2f}\n"
+            if "chunk_indexes" in doc:
+                # Chunk passages are already cut along steps and paragraphs
+                doc_context += f"Konten: {doc['content']}\n\n"
+            else:
+                doc_context += f"Konten: {doc['content'][:1000]}...\n\n"
+            
+            # Skip documents that would exceed max length; a shorter one may still fit
+            if current_length + len(doc_context) > max_context_length:
+                continue
+            
+            context += doc_context
+            current_length += len(doc_context)
+            included += 1
+        
+        return context
+
     async def get_context_from_similar_docs(self, query: str, max_context_length: int = 3000) -> str:
         """Get formatted context from similar documents for AI"""
         try:
-            # Search for similar documents with a lower threshold
-            similar_docs = await self.search_similar_documents(query, threshold=0.3, limit=5)
-            
-            # If vector search finds nothing, try text search
-            if not similar_docs:
-                logger.info(f"Vector search found no results, trying text search for context: {query[:50]}...")
-                similar_docs = await self.fallback_text_search(query, limit=3)
-            
-            if not similar_docs:
-                return "Tidak ada dokumen yang relevan ditemukan."
-            
-            # Format context
-            context = "Berdasarkan dokumen yang relevan:\n\n"
-            current_length = len(context)
-            
-            for i, doc in enumerate(similar_docs, 1):
-                doc_context = f"Dokumen {i}: {doc['title']}\n"
-                doc_context += f"Relevansi: {doc.get('similarity', 0.5):.2f}\n"
-                doc_context += f"Konten: {doc['content'][:1000]}...\n\n"
-                
-                # Check if adding this document exceeds max length
-                if current_length + len(doc_context) > max_context_length:
-                    break
-                
-                context += doc_context
-                current_length += len(doc_context)
-            
-            return context
+            similar_docs = await self.find_context_documents(query)
+            return self.format_context(similar_docs, max_context_length)
             
         except Exception as e:
             logger.error(f"Error getting context from similar docs: {e}")
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from app.core.admission import backoff_delay
+from app.core.config import settings
+from app.core.vector_index import document_index
+from app.repositories.document_repository import DocumentRepository, document_repository
+from app.repositories.embedding_job_repository import EmbeddingJobRepository, embedding_job_repository
+from app.services.embedding_service import EmbeddingService, embedding_service
+from app.services.semantic_cache import semantic_cache
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingWorker:
+    """
+    Processes queued embedding jobs.
+    Each of ``concurrency`` loops claims up to ``batch_size`` due jobs, embeds
+    their documents and chunks with one request and writes them back with one bulk
+    update. Failed jobs go back to the queue with exponential backoff until
+    they run out of attempts. Meant to run in its own process (worker.py), so
+    embedding work never competes with chat requests.
+    """
+
+    max_backoff_seconds = 600.0
+
+    def __init__(
+        self,
+        service: EmbeddingService = embedding_service,
+        jobs: EmbeddingJobRepository = embedding_job_repository,
+        documents: DocumentRepository = document_repository,
+        batch_size: int = settings.EMBEDDING_WORKER_BATCH_SIZE,
+        concurrency: int = settings.EMBEDDING_WORKER_CONCURRENCY,
+        poll_seconds: float = settings.EMBEDDING_WORKER_POLL_SECONDS,
+        lease_seconds: int = settings.EMBEDDING_JOB_LEASE_SECONDS
+    ):
+        self.service = service
+        self.jobs = jobs
+        self.documents = documents
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"claimed": 0, "succeeded": 0, "retried": 0, "failed": 0}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"worker_id": self.worker_id, **self._stats}
+
+    async def run_once(self) -> int:
+        """Claim and process one batch of due jobs; returns the number claimed"""
+        jobs = await self.jobs.claim(self.worker_id, self.batch_size, self.lease_seconds)
+        if jobs:
+            self._stats["claimed"] += len(jobs)
+            await self._process(jobs)
+        return len(jobs)
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                claimed = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Embedding worker could not claim jobs: {e}")
+                claimed = 0
+            if claimed < self.batch_size:
+                # The queue is drained; a full batch means more jobs are probably waiting
+                await asyncio.sleep(self.poll_seconds)
+
+    async def run(self) -> None:
+        """Process jobs until cancelled"""
+        logger.info(f"Embedding worker {self.worker_id} started (batch {self.batch_size}, concurrency {self.concurrency})")
+        await asyncio.gather(*(self._loop() for _ in range(self.concurrency)))
+
+    def start(self) -> None:
+        """Run the worker on the running event loop (single-process deployments)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _process(self, jobs: List[Dict[str, Any]]) -> None:
+        by_document = {job["document_id"]: job for job in jobs}
+        try:
+            documents = await self.documents.get_documents_text(list(by_document))
+        except Exception as e:
+            await self._retry(jobs, e)
+            return
+
+        found = {doc["id"] for doc in documents}
+        # Deleted or deactivated documents need no embedding
+        done = [job["id"] for doc_id, job in by_document.items() if doc_id not in found]
+        if documents:
+            done += await self._embed(documents, by_document)
+        if done and await self.jobs.complete(done, self.worker_id):
+            self._stats["succeeded"] += len(done)
+
+    async def _embed(self, documents: List[Dict[str, Any]], by_document: Dict[int, Dict[str, Any]]) -> List[int]:
+        """Embed and store documents; returns the IDs of the jobs that succeeded"""
+        import openai
+
+        jobs = [by_document[doc["id"]] for doc in documents]
+        try:
+            updates, chunks = await self.service.embed_documents(documents, max_retries=0)
+        except openai.BadRequestError as e:
+            if len(documents) == 1:
+                # Permanently rejected (e.g. too long); retrying cannot help
+                await self._retry(jobs, e, permanent=True)
+                return []
+            # Isolate the rejected input so the rest of the batch still succeeds
+            middle = len(documents) // 2
+            return await self._embed(documents[:middle], by_document) + await self._embed(documents[middle:], by_document)
+        except Exception as e:
+            await self._retry(jobs, e)
+            return []
+
+        try:
+            await self.documents.bulk_update_embeddings(updates, chunks)
+        except Exception as e:
+            await self._retry(jobs, e)
+            return []
+
+        for doc in documents:
+            if document_index.ready:
+                document_index.upsert({**doc, "content_embedding": updates[doc["id"]]})
+            # Cached answers that would now retrieve this document are stale
+            semantic_cache.invalidate_for_embedding(
+                doc["id"], updates[doc["id"]],
+                chunk_embeddings=[chunk["embedding"] for chunk in chunks if chunk["document_id"] == doc["id"]]
+            )
+        logger.info(f"Embedded {len(documents)} documents ({len(chunks)} chunks): {sorted(updates)}")
+        return [job["id"] for job in jobs]
+
+    async def _retry(self, jobs: List[Dict[str, Any]], error: Exception, permanent: bool = False) -> None:
+        """Requeue jobs with backoff, or fail those out of attempts"""
+        for job in jobs:
+            if permanent or job["attempts"] >= job["max_attempts"]:
+                run_after = None
+                self._stats["failed"] += 1
+                logger.error(f"Embedding job {job['id']} for document {job['document_id']} failed after {job['attempts']} attempts: {error}")
+            else:
+                delay = backoff_delay(error, job["attempts"], self.max_backoff_seconds)
+                run_after = datetime.now(timezone.utc) + timedelta(seconds=delay)
+                self._stats["retried"] += 1
+                logger.warning(f"Embedding job {job['id']} for document {job['document_id']} retrying in {delay:.1f}s: {error}")
+            await self.jobs.reschedule(job["id"], self.worker_id, f"{type(error).__name__}: {error}", run_after)
+
+embedding_worker = EmbeddingWorker()
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.repositories.faq_repository import FAQRepository, faq_repository
+
+logger = logging.getLogger(__name__)
+
+FAQ_CONTEXT_TEMPLATE = """
+You are a helpful customer support AI assistant. Here is the complete FAQ knowledge base:
+
+{faq_content}
+
+Additional Support Information:
+- WhatsApp Support: {whatsapp_number}
+- Support Hours: Monday-Friday 9:00 AM - 6:00 PM (GMT+7), Saturday 9:00 AM - 2:00 PM (GMT+7)
+- Emergency support: 24/7
+
+ Instructions:
+ 1. Use the FAQ knowledge base to answer user questions accurately
+ 2. If you cannot find a relevant answer in the FAQ or the request is not related to government processes/services, POLITELY DECLINE and direct the user to official support
+ 3. If the user seems unsatisfied or needs complex help, suggest contacting WhatsApp support
+ 4. Always be friendly, professional, and concise
+ 5. When suggesting WhatsApp contact, provide the number and support hours
+
+ Formatting rules:
+ - Respond in plain text only
+ - Do not use Markdown or rich formatting (no **bold**, _italic_, code blocks, links, or emojis)
+ - If listing steps, use simple numbered lists like: 1. ..., 2. ..., 3. ...
+"""
+
+@dataclass(frozen=True)
+class FAQSnapshot:
+    """
+    One loaded version of the FAQ catalogue, rendered once.
+    Snapshots are never modified; a reload replaces the reference in a single
+    assignment, so a request sees either the old or the new catalogue.
+    """
+    version: Optional[Dict[str, Any]]
+    faq_list: str
+    content: str
+    context: str
+    entries: int
+    loaded_at: float
+    build_ms: float
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "entries": self.entries,
+            "loaded_at": self.loaded_at,
+            "build_ms": round(self.build_ms, 2)
+        }
+
+def render_catalogue(categories: List[Dict[str, Any]]) -> Tuple[str, str, int]:
+    """Render categories with their subcategories and answers into (numbered FAQ list, knowledge base text, entries)"""
+    if not categories:
+        return "", "No FAQ content available.", 0
+    faq_lines: List[str] = []
+    content = ["FAQ Knowledge Base:\n\n"]
+    for category in categories:
+        content.append(f"Category: {category['name']}\n{'=' * 50}\n")
+        for subcategory in category.get("faq_subcategories") or []:
+            faq_lines.append(f"{len(faq_lines) + 1}. {category['name']} - {subcategory['name']}")
+            content.append(f"\nSubcategory: {subcategory['name']}\n{'-' * 30}\n")
+            for item in subcategory.get("faq_items") or []:
+                content.append(f"Answer: {item['answer']}\n\n")
+        content.append("\n")
+    return "\n".join(faq_lines), "".join(content), len(faq_lines)
+
+class FAQCatalogue:
+    """
+    In-memory FAQ catalogue.
+    The categories, subcategories and answers are loaded in one query and
+    rendered into the FAQ list shown to users and the knowledge base text, so
+    serving them needs no database call. Every interval_seconds a background
+    check compares the row count and latest updated_at of the FAQ tables and
+    reloads when they changed; reload() forces a reload. Until the first load
+    succeeds, the catalogue is loaded on demand.
+    """
+
+    def __init__(
+        self,
+        repository: FAQRepository = faq_repository,
+        interval_seconds: float = settings.FAQ_CATALOGUE_REFRESH_SECONDS
+    ):
+        self.repository = repository
+        self.interval_seconds = interval_seconds
+        self._snapshot: Optional[FAQSnapshot] = None
+        self._loading: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"hits": 0, "loads": 0, "checks": 0, "failed": 0}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"loaded": self._snapshot is not None, **self._stats}
+
+    def info(self) -> Dict[str, Any]:
+        return self._snapshot.info() if self._snapshot is not None else {"version": None}
+
+    async def get(self) -> Optional[FAQSnapshot]:
+        """The current catalogue, loading it if it never loaded (None when that fails)"""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            self._stats["hits"] += 1
+            return snapshot
+        try:
+            return await self.reload()
+        except Exception as e:
+            logger.error(f"Error loading FAQ catalogue: {e}")
+            return None
+
+    async def reload(self) -> FAQSnapshot:
+        """Load and render the catalogue; concurrent calls share one load (raises on error)"""
+        task = self._loading
+        if task is None:
+            task = asyncio.ensure_future(self._load())
+            self._loading = task
+            task.add_done_callback(self._load_done)
+        return await asyncio.shield(task)
+
+    async def check_once(self) -> bool:
+        """Reload when the FAQ tables changed since the catalogue was loaded; returns whether it reloaded"""
+        self._stats["checks"] += 1
+        version = await self.repository.get_faq_versions()
+        if version is None:
+            raise RuntimeError("could not read FAQ versions")
+        if self._snapshot is not None and self._snapshot.version == version:
+            return False
+        await self.reload()
+        return True
+
+    async def _load(self) -> FAQSnapshot:
+        start = time.perf_counter()
+        # Read before the rows, so a change made during the load is picked up by the next check
+        version = await self.repository.get_faq_versions()
+        categories = await self.repository.get_faq_catalogue()
+        faq_list, content, entries = render_catalogue(categories)
+        context = FAQ_CONTEXT_TEMPLATE.format(faq_content=content, whatsapp_number=settings.WHATSAPP_NUMBER)
+        self._snapshot = FAQSnapshot(
+            version=version,
+            faq_list=faq_list,
+            content=content,
+            context=context,
+            entries=entries,
+            loaded_at=time.time(),
+            build_ms=(time.perf_counter() - start) * 1000
+        )
+        self._stats["loads"] += 1
+        logger.info(f"FAQ catalogue loaded: {entries} entries in {self._snapshot.build_ms:.0f}ms")
+        return self._snapshot
+
+    def _load_done(self, task: asyncio.Future) -> None:
+        self._loading = None
+        if not task.cancelled() and task.exception() is not None:
+            self._stats["failed"] += 1
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.check_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"FAQ catalogue refresh failed, keeping {'the loaded catalogue' if self._snapshot else 'on-demand loading'}: {e}")
+            if self.interval_seconds <= 0:
+                return
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self) -> None:
+        """Load the catalogue and start watching for changes on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+faq_catalogue = FAQCatalogue()
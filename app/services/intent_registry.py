@@ -0,0 +1,69 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.core.intent_engine import current_snapshot, intents_path, load_intents, reload_intents
+
+logger = logging.getLogger(__name__)
+
+class IntentRegistryWatcher:
+    """
+    Hot-reloads the intent registry.
+    Reloads are compiled in a worker thread and swapped in as a new snapshot.
+    Every worker process polls the same file, so a deployment converges on the
+    same content-hash version within one polling interval.
+    """
+
+    def __init__(self, interval_seconds: float = settings.INTENTS_WATCH_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+        self._seen_mtime: Optional[float] = None
+
+    async def reload(self) -> Dict[str, Any]:
+        """Rebuild the registry off the event loop; raises if the file is invalid"""
+        try:
+            # Recorded before reading, so a failed reload is not retried until the file changes again
+            self._seen_mtime = os.path.getmtime(intents_path())
+        except OSError:
+            pass
+        return await asyncio.to_thread(reload_intents)
+
+    async def check_once(self) -> Optional[Dict[str, Any]]:
+        """Reload when the registry file was modified since it was last seen"""
+        try:
+            mtime = os.path.getmtime(intents_path())
+        except OSError:
+            return None
+        if mtime == self._seen_mtime:
+            return None
+        return await self.reload()
+
+    async def _run(self) -> None:
+        await asyncio.to_thread(load_intents)
+        self._seen_mtime = current_snapshot().source_mtime
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.check_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Intent registry reload failed, keeping version {current_snapshot().version}: {e}")
+
+    def start(self) -> None:
+        """Start watching the registry file on the running event loop"""
+        if self._task is None and self.interval_seconds > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+intent_registry_watcher = IntentRegistryWatcher()
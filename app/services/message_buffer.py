@@ -0,0 +1,158 @@
+import asyncio
+import itertools
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from app.core.admission import backoff_delay
+from app.core.config import settings
+from app.repositories.chat_session_repository import ChatSessionRepository, chat_session_repository
+
+logger = logging.getLogger(__name__)
+
+class MessageBuffer:
+    """
+    Write-behind buffer for chat messages.
+    add() returns as soon as the messages are queued; a background task writes
+    them with one multi-row insert per batch, once batch_size messages are
+    waiting or flush_seconds after the first one arrived. At most max_pending
+    messages are held (including the batch being written): when the database
+    falls behind, add() waits up to max_wait_seconds for room and then drops
+    the messages rather than grow without bound. stop() writes what is left.
+    Until start() is called (scripts, MESSAGE_BUFFER_ENABLED=False) add()
+    writes immediately.
+    """
+
+    max_backoff_seconds = 30.0
+
+    def __init__(
+        self,
+        repository: ChatSessionRepository = chat_session_repository,
+        batch_size: int = settings.MESSAGE_BUFFER_BATCH_SIZE,
+        flush_seconds: float = settings.MESSAGE_BUFFER_FLUSH_SECONDS,
+        max_pending: int = settings.MESSAGE_BUFFER_MAX_PENDING,
+        max_wait_seconds: float = settings.MESSAGE_BUFFER_MAX_WAIT_SECONDS,
+        max_attempts: int = settings.MESSAGE_BUFFER_MAX_ATTEMPTS
+    ):
+        self.repository = repository
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self.max_wait_seconds = max_wait_seconds
+        self.max_attempts = max_attempts
+        self._pending: Deque[Dict[str, Any]] = deque()
+        self._task: Optional[asyncio.Task] = None
+        # Created in start() so they belong to the serving event loop
+        self._changed: Optional[asyncio.Condition] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._closing = False
+        self._stats = {"written": 0, "batches": 0, "waited": 0, "dropped": 0, "failed": 0}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"running": self._task is not None, "pending": len(self._pending), "max_pending": self.max_pending, **self._stats}
+
+    def pending_messages(self, session_id: str) -> List[Dict[str, Any]]:
+        """Messages of a session that may not be in the database yet"""
+        return [message for message in self._pending if message["session_id"] == session_id]
+
+    async def add(self, messages: List[Dict[str, Any]]) -> bool:
+        """Queue messages for writing; returns False when they were dropped"""
+        if self._task is None:
+            try:
+                await self.repository.add_messages(messages)
+                self._stats["written"] += len(messages)
+                return True
+            except Exception as e:
+                logger.error(f"Error storing {len(messages)} chat messages: {e}")
+                self._stats["failed"] += len(messages)
+                return False
+
+        async with self._changed:
+            if len(self._pending) + len(messages) > self.max_pending:
+                # The database is falling behind; slow the caller down before dropping anything
+                self._stats["waited"] += 1
+                try:
+                    await asyncio.wait_for(
+                        self._changed.wait_for(lambda: len(self._pending) + len(messages) <= self.max_pending),
+                        self.max_wait_seconds
+                    )
+                except asyncio.TimeoutError:
+                    self._stats["dropped"] += len(messages)
+                    logger.warning(f"Message buffer full ({len(self._pending)} pending), dropped {len(messages)} chat messages")
+                    return False
+            self._pending.extend(messages)
+            self._changed.notify_all()
+        return True
+
+    async def flush(self) -> int:
+        """Write every queued message; returns the number written"""
+        written = 0
+        async with self._flush_lock:
+            while self._pending:
+                # Messages stay queued (and count against max_pending) until their batch is written
+                batch = list(itertools.islice(self._pending, self.batch_size))
+                if await self._write(batch):
+                    written += len(batch)
+                for _ in batch:
+                    self._pending.popleft()
+                async with self._changed:
+                    self._changed.notify_all()
+        return written
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> bool:
+        for attempt in range(self.max_attempts):
+            try:
+                await self.repository.add_messages(batch)
+                self._stats["written"] += len(batch)
+                self._stats["batches"] += 1
+                return True
+            except Exception as e:
+                if attempt + 1 == self.max_attempts:
+                    logger.error(f"Dropped {len(batch)} chat messages after {self.max_attempts} attempts: {e}")
+                    self._stats["failed"] += len(batch)
+                    return False
+                delay = backoff_delay(e, attempt, self.max_backoff_seconds)
+                logger.warning(f"Storing {len(batch)} chat messages failed, retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+        return False
+
+    async def _run(self) -> None:
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: self._pending or self._closing)
+                if not self._closing and len(self._pending) < self.batch_size:
+                    # Give the batch flush_seconds to fill up
+                    try:
+                        await asyncio.wait_for(
+                            self._changed.wait_for(lambda: len(self._pending) >= self.batch_size or self._closing),
+                            self.flush_seconds
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+            await self.flush()
+            if self._closing and not self._pending:
+                return
+
+    def start(self) -> None:
+        """Start the background writer on the running event loop"""
+        if self._task is None:
+            self._changed = asyncio.Condition()
+            self._flush_lock = asyncio.Lock()
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Write the queued messages and stop the background writer"""
+        if self._task is not None:
+            async with self._changed:
+                self._closing = True
+                self._changed.notify_all()
+            try:
+                await self._task
+            except Exception as e:
+                logger.error(f"Message buffer writer failed: {e}")
+                await self.flush()
+            self._task = None
+            logger.info(f"Message buffer stopped: {self.stats()}")
+
+message_buffer = MessageBuffer()
@@ -0,0 +1,167 @@
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, List, Optional, Set
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+def faq_cache_key(faq_id: int) -> str:
+    """Key of an FAQ item among the document IDs of cache entries (FAQ and document IDs overlap)"""
+    return f"faq:{faq_id}"
+
+@dataclass(frozen=True)
+class SemanticCacheEntry:
+    answer: str
+    document_ids: frozenset
+    params: Hashable
+    created_at: float
+
+class SemanticCache:
+    """
+    Answer cache keyed by query embedding.
+    A lookup hits when a cached query lies within ``max_distance`` cosine
+    distance of the new one and was answered with the same generation
+    parameters. Entries are dropped when a document they were answered from
+    changes, or when a new document embedding would have been retrieved for them.
+    """
+
+    def __init__(self, max_entries: int = 1000, max_distance: float = 0.05, ttl_seconds: float = 86400, dimension: int = 1536):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.ttl_seconds = ttl_seconds
+        self.dimension = dimension
+        self._index = VectorIndex(dimension=dimension)
+        self._index.ready = True
+        self._entries: "OrderedDict[int, SemanticCacheEntry]" = OrderedDict()
+        self._embeddings: Dict[int, np.ndarray] = {}
+        self._by_document: Dict[Hashable, Set[int]] = {}
+        self._ids = itertools.count(1)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def lookup(self, query_embedding: List[float], params: Hashable = None) -> Optional[str]:
+        """Return a cached answer for a semantically equivalent query, if any"""
+        matches = self._index.search(query_embedding, threshold=1.0 - self.max_distance, limit=5)
+        now = time.time()
+        for match in matches:
+            entry_id = match["id"]
+            entry = self._entries.get(entry_id)
+            if entry is None:
+                continue
+            if now - entry.created_at > self.ttl_seconds:
+                self._remove(entry_id)
+                continue
+            if entry.params != params:
+                continue
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            logger.info(f"Semantic cache hit (similarity {match['similarity']:.3f})")
+            return entry.answer
+        self.misses += 1
+        return None
+
+    def store(self, query_embedding: List[float], document_ids: List[Hashable], answer: str, params: Hashable = None) -> None:
+        """Cache an answer together with the documents (and faq_cache_key of FAQ items) it was generated from"""
+        entry_id = next(self._ids)
+        if not self._index.upsert({"id": entry_id, "content_embedding": query_embedding}):
+            return
+        self._entries[entry_id] = SemanticCacheEntry(
+            answer=answer,
+            document_ids=frozenset(document_ids),
+            params=params,
+            created_at=time.time()
+        )
+        query = np.asarray(query_embedding, dtype=np.float32)
+        self._embeddings[entry_id] = query / float(np.linalg.norm(query))
+        for doc_id in document_ids:
+            self._by_document.setdefault(doc_id, set()).add(entry_id)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate_document(self, document_id: Hashable) -> int:
+        """Drop every entry that was answered from the given document"""
+        entry_ids = self._by_document.pop(document_id, set())
+        for entry_id in list(entry_ids):
+            self._remove(entry_id)
+        if entry_ids:
+            self.invalidations += len(entry_ids)
+            logger.info(f"Semantic cache: invalidated {len(entry_ids)} entries for document {document_id}")
+        return len(entry_ids)
+
+    def invalidate_for_embedding(
+        self,
+        document_id: Hashable,
+        embedding: List[float],
+        retrieval_threshold: Optional[float] = None,
+        chunk_embeddings: Optional[List[List[float]]] = None
+    ) -> int:
+        """
+        Handle a new or changed document embedding: drop entries built from the
+        document, and entries whose query would now retrieve it or one of its chunks.
+        retrieval_threshold defaults to RETRIEVAL_SIMILARITY_THRESHOLD, the one retrieval uses.
+        """
+        if retrieval_threshold is None:
+            retrieval_threshold = settings.RETRIEVAL_SIMILARITY_THRESHOLD
+        removed = self.invalidate_document(document_id)
+        if not self._entries:
+            return removed
+        vectors = np.asarray([embedding, *(chunk_embeddings or [])], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1)
+        vectors = vectors[norms > 0] / norms[norms > 0, None]
+        if not len(vectors):
+            return removed
+        affected = [
+            entry_id for entry_id, query in self._embeddings.items()
+            if float((vectors @ query).max()) > retrieval_threshold
+        ]
+        for entry_id in affected:
+            self._remove(entry_id)
+        if affected:
+            self.invalidations += len(affected)
+            logger.info(f"Semantic cache: invalidated {len(affected)} entries that would now retrieve document {document_id}")
+        return removed + len(affected)
+
+    def clear(self) -> int:
+        """Drop every entry; returns how many there were"""
+        entry_ids = list(self._entries)
+        for entry_id in entry_ids:
+            self._remove(entry_id)
+        return len(entry_ids)
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id, None)
+        self._embeddings.pop(entry_id, None)
+        self._index.remove(entry_id)
+        if entry is None:
+            return
+        for doc_id in entry.document_ids:
+            refs = self._by_document.get(doc_id)
+            if refs is not None:
+                refs.discard(entry_id)
+                if not refs:
+                    del self._by_document[doc_id]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations
+        }
+
+semantic_cache = SemanticCache(
+    max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+    max_distance=settings.SEMANTIC_CACHE_MAX_DISTANCE,
+    ttl_seconds=settings.SEMANTIC_CACHE_TTL_SECONDS
+)
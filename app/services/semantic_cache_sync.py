@@ -0,0 +1,133 @@
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.vector_index import to_vector
+from app.repositories.document_repository import DocumentRepository, document_repository
+from app.repositories.faq_repository import FAQRepository, faq_repository
+from app.services.semantic_cache import SemanticCache, faq_cache_key, semantic_cache
+
+logger = logging.getLogger(__name__)
+
+Version = Tuple[Optional[int], Optional[str]]
+
+class SemanticCacheSync:
+    """
+    Invalidates semantic cache entries for document and FAQ changes made by
+    other processes (other serve.py workers, worker.py, SQL edits), which the
+    in-process invalidation never sees.
+    Every interval_seconds the row count and latest updated_at of documents
+    and faq_items are compared with the last check. Rows updated since are
+    fetched and invalidated like local changes: entries answered from them
+    are dropped, and so are entries whose query would now retrieve their new
+    embedding. A lower row count (hard delete) or more changed rows than
+    fetch_limit clears the cache.
+    """
+
+    fetch_limit = 500
+
+    def __init__(
+        self,
+        cache: SemanticCache = semantic_cache,
+        documents: DocumentRepository = document_repository,
+        faqs: FAQRepository = faq_repository,
+        interval_seconds: float = settings.SEMANTIC_CACHE_SYNC_SECONDS
+    ):
+        self.cache = cache
+        self.documents = documents
+        self.faqs = faqs
+        self.interval_seconds = interval_seconds
+        self._versions: Dict[str, Version] = {}
+        # IDs of the rows handled at the latest updated_at of each table, fetched again by the next check
+        self._boundary: Dict[str, Set[int]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"checks": 0, "invalidated": 0, "cleared": 0}
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._stats)
+
+    async def check_once(self) -> int:
+        """Invalidate entries for rows changed since the last check; returns the number of entries removed"""
+        self._stats["checks"] += 1
+        faq_versions = await self.faqs.get_faq_versions()
+        if faq_versions is None:
+            raise RuntimeError("could not read FAQ versions")
+        removed = await self._sync("documents", await self.documents.get_documents_version(), self.documents.get_documents_updated_since, lambda row_id: row_id)
+        removed += await self._sync("faq_items", tuple(faq_versions["faq_items"]), self.faqs.get_faq_items_updated_since, faq_cache_key)
+        self._stats["invalidated"] += removed
+        return removed
+
+    async def _sync(
+        self,
+        table: str,
+        version: Version,
+        updated_since: Callable,
+        cache_key: Callable[[int], Hashable]
+    ) -> int:
+        previous = self._versions.get(table)
+        self._versions[table] = version
+        count, updated_at = version
+        if previous is None:
+            # The first check only records where the cache starts from
+            if updated_at is not None:
+                self._boundary[table] = {row["id"] for row in await updated_since(updated_at, self.fetch_limit)}
+            return 0
+        if previous == version:
+            return 0
+        previous_count, previous_updated_at = previous
+        if previous_updated_at is None or (count or 0) < (previous_count or 0):
+            return self._clear(f"{table} rows were deleted")
+        # Rows updated in the same instant as the last one seen are fetched too, minus those already handled
+        handled = self._boundary.get(table, set())
+        rows: List[Dict[str, Any]] = [
+            row for row in await updated_since(previous_updated_at, self.fetch_limit)
+            if not (row["id"] in handled and row.get("updated_at") == previous_updated_at)
+        ]
+        if len(rows) >= self.fetch_limit:
+            return self._clear(f"{table} has more than {self.fetch_limit} changed rows")
+        if rows:
+            latest = rows[-1].get("updated_at")
+            self._boundary[table] = {row["id"] for row in rows if row.get("updated_at") == latest}
+        removed = 0
+        for row in rows:
+            vector = to_vector(row.get("content_embedding"), self.cache.dimension)
+            if row.get("is_active") is False or vector is None:
+                removed += self.cache.invalidate_document(cache_key(row["id"]))
+            else:
+                removed += self.cache.invalidate_for_embedding(cache_key(row["id"]), vector)
+        if removed:
+            logger.info(f"Semantic cache: {removed} entries invalidated for {len(rows)} changed {table} rows")
+        return removed
+
+    def _clear(self, reason: str) -> int:
+        removed = self.cache.clear()
+        self._stats["cleared"] += 1
+        logger.info(f"Semantic cache cleared ({removed} entries): {reason}")
+        return removed
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.check_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Semantic cache sync failed, changes made by other processes are not invalidated yet: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self) -> None:
+        """Start the background check loop on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+semantic_cache_sync = SemanticCacheSync()
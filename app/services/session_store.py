@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import re
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.models.schemas import Message
+from app.repositories.chat_session_repository import ChatSessionRepository, chat_session_repository
+from app.services.message_buffer import MessageBuffer, message_buffer
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class PinnedRetrieval:
+    """Documents retrieved for a session's last standalone question, and the follow-up queries rewritten against it"""
+    query: str
+    documents: List[Dict[str, Any]]
+    rewrites: "OrderedDict[str, Tuple[str, List[Dict[str, Any]]]]" = field(default_factory=OrderedDict)
+
+@dataclass
+class _Session:
+    touched: float
+    messages: Deque[Message]
+    pinned: Optional[PinnedRetrieval] = None
+
+class SessionStore:
+    """
+    Recent conversation history per session, so clients send only the new
+    message and their conversation_id.
+    Keeps the last max_messages messages of up to max_sessions sessions in an
+    LRU. A session that is not in memory (evicted, idle for ttl_seconds, or
+    served by another worker) is rehydrated on first use from chat_messages
+    plus the messages still waiting in the message buffer. Retrieval pinned to
+    a session lives only in memory and is not rehydrated.
+    With shared set (SESSION_STORE_SHARED, or serve.py with several workers), the newest stored message
+    of a session in memory is checked on each use; a turn another worker
+    answered since reloads the session. Turns still in the other worker's
+    message buffer show up once it is flushed.
+    """
+
+    # Fractional seconds as Postgres returns them (trailing zeros dropped), which datetime.fromisoformat needs as 6 digits
+    _FRACTION = re.compile(r"\.(\d{1,6})(?=[+-]|$)")
+
+    def __init__(
+        self,
+        repository: ChatSessionRepository = chat_session_repository,
+        buffer: MessageBuffer = message_buffer,
+        max_sessions: int = settings.SESSION_STORE_MAX_SESSIONS,
+        max_messages: int = settings.SESSION_HISTORY_MAX_MESSAGES,
+        ttl_seconds: float = settings.SESSION_STORE_TTL_SECONDS,
+        shared: bool = settings.SESSION_STORE_SHARED
+    ):
+        self.repository = repository
+        self.buffer = buffer
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._background: Set[asyncio.Future] = set()
+        self._stats = {"hits": 0, "loads": 0, "created": 0, "evictions": 0, "stale": 0}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"sessions": len(self._sessions), "max_sessions": self.max_sessions, **self._stats}
+
+    def start_session(self, user_id: Optional[str] = None) -> str:
+        """Start a new session; its chat_sessions row is created in the background"""
+        session_id = str(uuid.uuid4())
+        self._remember(session_id, [])
+        self._stats["created"] += 1
+        task = asyncio.ensure_future(self.repository.create_session(user_id=user_id, session_id=session_id))
+        # Keep a reference so the task is not garbage collected before it runs
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return session_id
+
+    async def history(self, session_id: str) -> List[Message]:
+        """Recent messages of a session, oldest first"""
+        entry = self._live(session_id)
+        if entry is not None and self.shared and not await self._current(session_id, entry):
+            self._stats["stale"] += 1
+            entry = None
+        if entry is not None:
+            self._sessions.move_to_end(session_id)
+            self._stats["hits"] += 1
+            return list(entry.messages)
+
+        # Concurrent requests for the same session share one database read
+        task = self._loading.get(session_id)
+        if task is None:
+            task = asyncio.ensure_future(self._load(session_id))
+            self._loading[session_id] = task
+            task.add_done_callback(lambda _: self._loading.pop(session_id, None))
+        return list(await asyncio.shield(task))
+
+    def append(self, session_id: str, messages: List[Message]) -> None:
+        """Record new messages of a session that is in memory (others are rehydrated when used)"""
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            # Messages go to the buffer before they are appended, so a load in progress sees them anyway
+            return
+        entry.messages.extend(messages)
+        entry.touched = time.monotonic()
+        self._sessions.move_to_end(session_id)
+
+    def pinned(self, session_id: str) -> Optional[PinnedRetrieval]:
+        """Retrieval pinned to a session that is in memory, if any"""
+        entry = self._live(session_id)
+        return entry.pinned if entry is not None else None
+
+    def pin(self, session_id: str, query: str, documents: List[Dict[str, Any]]) -> None:
+        """Pin the documents retrieved for a query; rewrites made against another query are dropped"""
+        entry = self._live(session_id)
+        if entry is None:
+            return
+        if entry.pinned is None or entry.pinned.query != query:
+            entry.pinned = PinnedRetrieval(query=query, documents=documents)
+        else:
+            entry.pinned.documents = documents
+
+    def unpin(self, session_id: str) -> None:
+        """Drop the retrieval pinned to a session, e.g. when the conversation changes topic"""
+        entry = self._live(session_id)
+        if entry is not None:
+            entry.pinned = None
+
+    def remember_rewrite(
+        self,
+        session_id: str,
+        message: str,
+        query: str,
+        documents: List[Dict[str, Any]],
+        max_rewrites: int
+    ) -> None:
+        """Cache the rewritten query of a follow-up and its documents under the pinned retrieval"""
+        pinned = self.pinned(session_id)
+        if pinned is None:
+            return
+        pinned.rewrites[message] = (query, documents)
+        pinned.rewrites.move_to_end(message)
+        while len(pinned.rewrites) > max_rewrites:
+            pinned.rewrites.popitem(last=False)
+
+    async def _load(self, session_id: str) -> List[Message]:
+        self._stats["loads"] += 1
+        rows = await self.repository.get_session_messages(session_id, limit=self.max_messages)
+        # The batch being written can be in both; the timestamp tells duplicates apart
+        seen = set()
+        messages = []
+        for row in rows + self.buffer.pending_messages(session_id):
+            message = Message(role=row["role"], content=row["content"], timestamp=self._timestamp(row.get("created_at")))
+            key = (message.role, message.content, message.timestamp)
+            if key not in seen:
+                seen.add(key)
+                messages.append(message)
+        messages.sort(key=lambda message: message.timestamp)
+        messages = messages[-self.max_messages:]
+        self._remember(session_id, messages)
+        logger.info(f"Rehydrated session {session_id} with {len(messages)} messages")
+        return messages
+
+    async def _current(self, session_id: str, entry: _Session) -> bool:
+        """Whether no other process stored a message of the session after those in memory"""
+        try:
+            latest = await self.repository.get_latest_message_time(session_id)
+        except Exception as e:
+            logger.warning(f"Could not check session {session_id} for newer messages, using the history in memory: {e}")
+            return True
+        if latest is None:
+            return True
+        latest = self._timestamp(latest)
+        # Messages of this process may not be stored yet, so the newest stored one can be older than those in memory
+        return any(message.timestamp == latest for message in entry.messages) or (
+            len(entry.messages) > 0 and latest < entry.messages[0].timestamp
+        )
+
+    def _live(self, session_id: str) -> Optional[_Session]:
+        entry = self._sessions.get(session_id)
+        if entry is not None and time.monotonic() - entry.touched < self.ttl_seconds:
+            return entry
+        return None
+
+    def _remember(self, session_id: str, messages: List[Message]) -> None:
+        self._sessions[session_id] = _Session(time.monotonic(), deque(messages, maxlen=self.max_messages))
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    @classmethod
+    def _timestamp(cls, value: Optional[str]) -> datetime:
+        try:
+            value = cls._FRACTION.sub(lambda match: "." + match.group(1).ljust(6, "0"), value.replace("Z", "+00:00"))
+            return datetime.fromisoformat(value)
+        except (AttributeError, TypeError, ValueError):
+            return datetime.fromisoformat("1970-01-01T00:00:00+00:00")
+
+session_store = SessionStore()
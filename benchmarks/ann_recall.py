@@ -0,0 +1,149 @@
+"""
+Benchmark: recall@k vs latency of the pgvector indexes and search settings.
+
+Runs against a local Postgres with pgvector behind PostgREST (see
+benchmarks/docker-compose.yml; export SUPABASE_ANON_KEY with the token in its
+header comment). Inserts --rows synthetic documents whose embeddings are
+drawn around --clusters random centres, computes the exact top --k of
+--queries query embeddings with NumPy over every active document and FAQ
+item embedding in the database, then for each index method:
+
+- rebuilds idx_documents_embedding (manage_vector_indexes.py's plan for the
+  table size, or --lists / --m / --ef-construction) and reports the build time
+- calls search_similar_content for every query with each --probes value
+  (ivfflat) or --ef-search value (hnsw)
+
+Reports recall@k (share of the exact top k returned) and the RPC latency per
+setting. The seeded documents are deleted afterwards unless --keep; the
+documents index stays as the last method built, so rebuild it with
+manage_vector_indexes.py --apply. Without --rest-url the in-process PostgREST
+stub is used, which searches exactly: only useful to check the harness.
+
+Usage:
+    docker compose -f benchmarks/docker-compose.yml up -d
+    python -m benchmarks.ann_recall --rest-url http://127.0.0.1:3001 --rows 20000 --queries 200 --k 8
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from contextlib import nullcontext
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
+from postgrest.types import ReturnMethod
+
+from benchmarks.stubs import create_postgrest_stub, run_stub_server, use_stub_environment
+
+use_stub_environment()
+
+from app.core.config import settings  # noqa: E402
+
+TITLE_PREFIX = "ann-recall"
+
+def _embeddings(rng: np.random.Generator, centres: np.ndarray, count: int, spread: float) -> np.ndarray:
+    points = centres[rng.integers(len(centres), size=count)] + rng.standard_normal((count, centres.shape[1])) * spread
+    return (points / np.linalg.norm(points, axis=1, keepdims=True)).astype(np.float32)
+
+async def _seed(client, vectors: np.ndarray, batch_size: int = 500) -> None:
+    for start in range(0, len(vectors), batch_size):
+        rows = [
+            {"title": f"{TITLE_PREFIX} {start + i}", "content": "synthetic", "document_type": "sop",
+             "is_active": True, "content_embedding": [round(float(x), 6) for x in vector]}
+            for i, vector in enumerate(vectors[start:start + batch_size])
+        ]
+        await client.table("documents").insert(rows, returning=ReturnMethod.minimal).execute()
+
+async def _stored_embeddings(client) -> Tuple[List[Tuple[str, int]], np.ndarray]:
+    """Every active document and FAQ item embedding, keyed like search_similar_content rows"""
+    from app.core.vector_index import to_vector
+
+    keys, vectors = [], []
+    for table, source in (("documents", "document"), ("faq_items", "faq")):
+        offset = 0
+        while True:
+            response = await client.table(table).select("id, content_embedding").eq("is_active", True).not_.is_(
+                "content_embedding", "null").order("id").range(offset, offset + 999).execute()
+            for row in response.data or []:
+                vector = to_vector(row["content_embedding"], 1536)
+                if vector is not None:
+                    keys.append((source, row["id"]))
+                    vectors.append(vector / (np.linalg.norm(vector) or 1.0))
+            if len(response.data or []) < 1000:
+                break
+            offset += 1000
+    return keys, np.stack(vectors)
+
+async def _sweep(client, queries: np.ndarray, truth: List[Set[Tuple[str, int]]], k: int, params: Dict[str, int]) -> Tuple[float, List[float]]:
+    recalls, latencies = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        response = await client.rpc("search_similar_content", {
+            "query_embedding": [float(x) for x in query], "match_threshold": -1.0, "match_count": k, **params
+        }).execute()
+        latencies.append(time.perf_counter() - start)
+        found = {(row.get("source", "document"), row["id"]) for row in response.data or []}
+        recalls.append(len(found & expected) / k)
+    return statistics.mean(recalls), sorted(latencies)
+
+async def run(args) -> None:
+    from app.core.ann_index import plan_vector_index
+    from app.db import close_async_supabase_client, get_async_supabase_client
+    from app.repositories.document_repository import document_repository
+
+    client = get_async_supabase_client()
+    rng = np.random.default_rng(args.seed)
+    centres = rng.standard_normal((args.clusters, 1536)).astype(np.float32)
+    try:
+        start = time.perf_counter()
+        await _seed(client, _embeddings(rng, centres, args.rows, args.spread))
+        print(f"seeded {args.rows} documents in {time.perf_counter() - start:.1f}s")
+        keys, matrix = await _stored_embeddings(client)
+        queries = _embeddings(rng, centres, args.queries, args.spread)
+        nearest = np.argsort(-(matrix @ queries.T), axis=0)[:args.k].T
+        truth = [{keys[i] for i in row} for row in nearest]
+        print(f"exact top {args.k} of {args.queries} queries over {len(keys)} stored embeddings")
+
+        for method in args.methods.split(","):
+            plan = plan_vector_index("documents", len(keys), method=method, lists=args.lists or None,
+                                     m=args.m, ef_construction=args.ef_construction, match_count=args.k)
+            start = time.perf_counter()
+            definition = await document_repository.rebuild_vector_index(plan)
+            print(f"\n{definition}: built in {time.perf_counter() - start:.1f}s")
+            name, values = ("ivfflat_probes", args.probes) if method == "ivfflat" else ("hnsw_ef_search", args.ef_search)
+            for value in (int(v) for v in values.split(",")):
+                recall, latencies = await _sweep(client, queries, truth, args.k, {name: value})
+                print(f"  {name}={value:<5} recall@{args.k} {recall:6.1%}  latency mean "
+                      f"{statistics.mean(latencies) * 1000:6.1f} ms, p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:6.1f} ms")
+    finally:
+        if not args.keep:
+            await client.table("documents").delete(returning=ReturnMethod.minimal).like("title", f"{TITLE_PREFIX} %").execute()
+        await close_async_supabase_client()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rest-url", default="", help="PostgREST of a local pgvector database (default: exact-search stub)")
+    parser.add_argument("--rows", type=int, default=20000, help="synthetic documents inserted")
+    parser.add_argument("--clusters", type=int, default=100, help="centres the embeddings are drawn around")
+    parser.add_argument("--spread", type=float, default=1.0, help="noise standard deviation per dimension (centres have 1)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=8, help="match_count; recall is measured at k")
+    parser.add_argument("--methods", default="hnsw,ivfflat", help="comma-separated index methods to build")
+    parser.add_argument("--probes", default="1,2,4,8,16,32", help="ivfflat_probes values")
+    parser.add_argument("--ef-search", default="10,20,40,80,160", help="hnsw_ef_search values")
+    parser.add_argument("--lists", type=int, default=0, help="ivfflat lists (default: planned for the table size)")
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=64)
+    parser.add_argument("--keep", action="store_true", help="keep the seeded documents")
+    parser.add_argument("--seed", type=int, default=20)
+    args = parser.parse_args()
+    # Index builds of large tables take longer than a chat request
+    settings.SUPABASE_TIMEOUT = 600.0
+
+    server = nullcontext(args.rest_url) if args.rest_url else run_stub_server(create_postgrest_stub, latency=0.0)
+    with server as url:
+        settings.SUPABASE_REST_URL = url if args.rest_url else f"{url}/rest/v1"
+        asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
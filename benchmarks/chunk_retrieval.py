@@ -0,0 +1,132 @@
+"""
+Benchmark: RAG context quality with whole-document vs chunk retrieval.
+
+Seeds stub PostgREST with long synthetic SOPs of numbered steps, embeds them
+with the backfill pipeline (documents and chunks) and asks one question per
+sampled step. Each question names the two distinctive terms of its target
+step. Compares two setups on the context sent to the model:
+
+- previous: whole-document search, each hit cut to content[:1000]
+- chunks: chunk search with adjacent chunks merged into passages
+
+Reports how often the target step ends up in the context (hit rate) and the
+context size in characters and approximate tokens. The stub's bag-of-words
+embeddings score far lower than real ones, so both searches run with
+--threshold (default 0) instead of the service's 0.3.
+
+Usage:
+    python -m benchmarks.chunk_retrieval --documents 40 --steps 15 --questions 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.stubs import create_openai_stub, create_postgrest_stub, run_stub_server, use_stub_environment
+
+use_stub_environment()
+
+from app.core.config import settings  # noqa: E402
+
+def _term(rng: random.Random) -> str:
+    return "".join(rng.choice("bcdfghjklmnprstvz") + rng.choice("aiueo") for _ in range(3))
+
+def _documents(count: int, steps: int, seed: int) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    filler = [_term(rng) for _ in range(2000)]
+    documents = []
+    for d in range(count):
+        step_texts = []
+        for s in range(steps):
+            terms = (_term(rng), _term(rng))
+            sentence = " ".join(rng.choices(filler, k=rng.randint(15, 25)))
+            text = f"{s + 1}. Langkah {terms[0]} {terms[1]}: {sentence}."
+            sub_steps = "\n".join(f"   - {' '.join(rng.choices(filler, k=8))}" for _ in range(rng.randint(1, 3)))
+            step_texts.append({"terms": terms, "text": f"{text}\n{sub_steps}"})
+        documents.append({
+            "title": f"SOP layanan {d + 1}",
+            "content": "Prosedur layanan:\n\n" + "\n\n".join(step["text"] for step in step_texts),
+            "steps": step_texts
+        })
+    return documents
+
+def _previous_context(similar_docs: List[Dict[str, Any]], max_context_length: int) -> str:
+    """format_context before chunking: every hit cut to its first 1000 characters"""
+    context = "Berdasarkan dokumen yang relevan:\n\n"
+    for i, doc in enumerate(similar_docs, 1):
+        doc_context = f"Dokumen {i}: {doc['title']}\nRelevansi: {doc.get('similarity', 0.5):.2f}\nKonten: {doc['content'][:1000]}...\n\n"
+        if len(context) + len(doc_context) > max_context_length:
+            break
+        context += doc_context
+    return context
+
+async def run(args, rest_url: str) -> None:
+    from app.core.chunking import merge_adjacent_chunks
+    from app.services.embedding_backfill import EmbeddingBackfill
+    from app.services.embedding_service import embedding_service
+
+    documents = _documents(args.documents, args.steps, args.seed)
+    async with httpx.AsyncClient() as client:
+        for doc in documents:
+            response = await client.post(f"{rest_url}/documents", json={
+                "title": doc["title"], "content": doc["content"], "document_type": "sop", "is_active": True
+            })
+            response.raise_for_status()
+
+    with tempfile.TemporaryDirectory() as directory:
+        backfill = EmbeddingBackfill(checkpoint_path=os.path.join(directory, "checkpoint.json"))
+        progress = await backfill.run(mode="all", resume=False)
+    async with httpx.AsyncClient() as client:
+        response = await client.get(f"{rest_url}/document_chunks", params={"select": "id"})
+        chunk_count = len(response.json())
+    print(f"{progress['processed']} documents embedded with {chunk_count} chunks "
+          f"(max {settings.CHUNK_MAX_CHARS} chars, overlap {settings.CHUNK_OVERLAP_CHARS})")
+
+    rng = random.Random(args.seed + 1)
+    questions = [step for doc in documents for step in doc["steps"]]
+    questions = rng.sample(questions, min(args.questions, len(questions)))
+    results = {"previous": {"hits": 0, "sizes": []}, "chunks": {"hits": 0, "sizes": []}}
+    for step in questions:
+        query = f"bagaimana cara {step['terms'][0]} {step['terms'][1]}?"
+        target = step["text"].split(":", 1)[0]
+        for setup in results:
+            if setup == "chunks":
+                chunks = await embedding_service.search_similar_chunks(query, threshold=args.threshold)
+                passages = merge_adjacent_chunks(chunks, settings.CHUNK_MERGED_MAX_CHARS)
+                context = embedding_service.format_context(passages, max_context_length=args.context_chars)
+            else:
+                similar_docs = await embedding_service.search_similar_documents(query, threshold=args.threshold, limit=5)
+                context = _previous_context(similar_docs, args.context_chars)
+            results[setup]["hits"] += target in context
+            results[setup]["sizes"].append(len(context))
+
+    for setup, result in results.items():
+        sizes = result["sizes"]
+        per_hit = f"{sum(sizes) / result['hits']:.0f}" if result["hits"] else "-"
+        print(f"{setup:>8}: hit rate {result['hits'] / len(questions):.0%} over {len(questions)} questions; "
+              f"context mean {statistics.mean(sizes):.0f} chars (~{statistics.mean(sizes) / 4:.0f} tokens), "
+              f"max {max(sizes)}, {per_hit} context chars per hit")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=40)
+    parser.add_argument("--steps", type=int, default=15, help="numbered steps per document")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--context-chars", type=int, default=2000, help="context budget, as used by the chat service")
+    parser.add_argument("--threshold", type=float, default=0.0, help="similarity threshold for both searches")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    with run_stub_server(create_openai_stub, latency=0.0, token_interval=0.0) as openai_url, \
+            run_stub_server(create_postgrest_stub, latency=0.0) as postgrest_url:
+        settings.OPENAI_BASE_URL = f"{openai_url}/v1"
+        settings.SUPABASE_REST_URL = f"{postgrest_url}/rest/v1"
+        asyncio.run(run(args, settings.SUPABASE_REST_URL))
+
+if __name__ == "__main__":
+    main()
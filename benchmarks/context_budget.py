@@ -0,0 +1,125 @@
+"""
+Benchmark: prompt size with character-based vs token-budgeted context.
+
+Builds prompts for synthetic requests with a varying number of retrieved
+documents (long whole documents and short chunk passages) and conversation
+histories of varying length, in two setups:
+
+- previous: 2000-character context from format_context (whole documents cut
+  to 1000 characters) inside the system prompt, last 8 history messages
+  whatever their length
+- budget: the context builder packing everything into CONTEXT_TOKEN_BUDGET
+
+Reports prompt tokens against the budget (how often it overflows, how full
+it is on average), retrieved text that made it in, the build time per
+request, and the prompt prefix a follow-up turn of the same conversation
+shares with the previous turn (what provider-side prompt caching can reuse). Token counts use tiktoken when its encoding can be loaded and a
+length estimate otherwise.
+
+Usage:
+    python -m benchmarks.context_budget --requests 2000 --budget 3000
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from typing import Any, Dict, List
+
+from benchmarks.stubs import use_stub_environment
+
+use_stub_environment()
+
+from app.core.config import settings  # noqa: E402
+from app.models.schemas import Message  # noqa: E402
+
+_WORDS = ("buka menu pilih klik tombol simpan isi formulir data pengguna server aplikasi akses layanan "
+          "periksa status konfigurasi unggah berkas verifikasi admin sistem jaringan domain hosting").split()
+
+def _text(rng: random.Random, words: int) -> str:
+    lines, line = [], []
+    for i in range(words):
+        line.append(rng.choice(_WORDS))
+        if len(line) >= 12:
+            lines.append(f"{len(lines) + 1}. {' '.join(line)}")
+            line = []
+    return "\n".join(lines + [" ".join(line)])
+
+def _request(rng: random.Random) -> Dict[str, Any]:
+    docs = []
+    for i in range(rng.randint(0, 6)):
+        if rng.random() < 0.5:
+            docs.append({"id": i, "title": f"SOP {i}", "content": _text(rng, rng.randint(200, 1500)),
+                         "similarity": rng.uniform(0.3, 0.9)})
+        else:
+            docs.append({"id": i, "title": f"SOP {i}", "content": _text(rng, rng.randint(40, 200)),
+                         "similarity": rng.uniform(0.3, 0.9), "chunk_indexes": [0]})
+    history = [Message(role="user" if j % 2 == 0 else "assistant", content=_text(rng, rng.randint(5, 400)))
+               for j in range(rng.choice([0, 0, 2, 6, 12, 20]))]
+    return {"docs": docs, "history": history, "message": "bagaimana cara " + _text(rng, 8)}
+
+def _follow_up(rng: random.Random, request: Dict[str, Any]) -> Dict[str, Any]:
+    """The next turn: the question and its answer join the history, retrieval finds other documents"""
+    history = request["history"] + [Message(role="user", content=request["message"]),
+                                     Message(role="assistant", content=_text(rng, rng.randint(50, 300)))]
+    return {**_request(rng), "history": history}
+
+def _previous(service, system_prompt: str, request: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Message assembly before the context builder: documents inside the system prompt"""
+    context = service.embedding_service.format_context(request["docs"], max_context_length=2000)
+    split = system_prompt.index("Instruksi PENTING:")
+    messages = [{"role": "system", "content": f"{system_prompt[:split]}{context}\n\n{system_prompt[split:]}"}]
+    messages.extend({"role": m.role, "content": m.content} for m in request["history"][-8:])
+    messages.append({"role": "user", "content": request["message"]})
+    return messages
+
+def _serialize(messages: List[Dict[str, str]]) -> str:
+    return "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--budget", type=int, default=3000, help="prompt token budget")
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+    settings.CONTEXT_TOKEN_BUDGET = args.budget
+
+    from app.core.tokenizer import get_token_counter
+    from app.services.chat_service import chat_service
+    from app.services.context_builder import context_builder
+
+    counter = get_token_counter(settings.MODEL_NAME)
+    rng = random.Random(args.seed)
+    requests = [_request(rng) for _ in range(args.requests)]
+    follow_ups = [_follow_up(rng, request) for request in requests]
+    system_prompt = chat_service._system_prompt(None)
+    prompt = context_builder.build(settings.MODEL_NAME, system_prompt, [], [], "", settings.MAX_TOKENS)
+    budget = prompt.breakdown["budget"]
+    print(f"{len(requests)} requests, prompt budget {budget} tokens "
+          f"({'tiktoken' if counter.exact else 'estimated'} counts)")
+
+    for setup in ("previous", "budget"):
+        def prompt(request: Dict[str, Any]) -> List[Dict[str, str]]:
+            if setup == "previous":
+                return _previous(chat_service, system_prompt.text, request)
+            return context_builder.build(settings.MODEL_NAME, system_prompt, request["docs"],
+                                         request["history"], request["message"], settings.MAX_TOKENS).messages
+
+        totals, retrieved, shared, elapsed = [], [], [], 0.0
+        for request, follow_up in zip(requests, follow_ups):
+            start = time.perf_counter()
+            messages = prompt(request)
+            elapsed += time.perf_counter() - start
+            totals.append(counter.count_messages(messages))
+            prompt_text = _serialize(messages)
+            shared.append(counter.count(os.path.commonprefix([prompt_text, _serialize(prompt(follow_up))])))
+            retrieved.append(sum(len(line) for doc in request["docs"] for line in doc["content"].split("\n")
+                                 if line and line in prompt_text))
+        over = sum(total > budget for total in totals)
+        print(f"{setup:>8}: prompt tokens mean {statistics.mean(totals):.0f} max {max(totals)}; "
+              f"over budget {over / len(totals):.1%}; budget used {statistics.mean(min(t, budget) for t in totals) / budget:.0%}; "
+              f"retrieved chars in prompt {statistics.mean(retrieved):.0f}; "
+              f"prefix shared with the next turn {statistics.mean(shared):.0f} tokens; build {elapsed / len(requests) * 1000:.3f} ms")
+
+if __name__ == "__main__":
+    main()
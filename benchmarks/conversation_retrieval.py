@@ -0,0 +1,157 @@
+"""
+Benchmark: retrieval for follow-up questions, per message vs per conversation.
+
+Seeds stub PostgREST with synthetic service documents of numbered steps and
+embeds them with the backfill pipeline. Each conversation opens with a
+standalone question about one document, then asks --follow-ups follow-ups
+drawn from short, anaphoric ones ("kenapa begitu?", "nomor 3 maksudnya
+apa?", "apa maksud <term> itu?", "kalau muncul kode <code> harus apa?"),
+sent with conversation_id through chat_service in two setups:
+
+- message: every message is searched on its own (CONVERSATION_RETRIEVAL_ENABLED=False)
+- conversation: follow-ups reuse the documents pinned to the session, or are
+  searched once together with the opening question
+
+Reports per conversation the query embeddings computed (embedding cache
+misses; the cache is cleared before each setup), the retrieval searches run,
+and the prompt tokens sent, plus the passages a follow-up's context holds and
+how often one of them is from the conversation's document. The stub's
+bag-of-words embeddings find nothing for most vague follow-ups searched on
+their own, where real embeddings return passages of unrelated documents, so
+the message setup's prompt token count is a lower bound. The semantic cache
+is disabled so every turn reaches retrieval.
+
+Usage:
+    python -m benchmarks.conversation_retrieval --documents 30 --conversations 100 --follow-ups 4
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.stubs import create_openai_stub, create_postgrest_stub, run_stub_server, use_stub_environment
+
+use_stub_environment()
+
+from app.core.config import settings  # noqa: E402
+from app.models.schemas import ChatRequest  # noqa: E402
+
+_COMMON = ("buka menu pilih klik tombol simpan isi formulir data pengguna server aplikasi akses layanan "
+           "periksa status konfigurasi unggah berkas verifikasi admin sistem jaringan domain hosting").split()
+
+def _term(rng: random.Random) -> str:
+    return "".join(rng.choice("bcdfghjklmnprstvz") + rng.choice("aiueo") for _ in range(3))
+
+def _documents(count: int, steps: int, seed: int) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    documents = []
+    for _ in range(count):
+        name = _term(rng)
+        step_texts = []
+        for s in range(steps):
+            terms = (_term(rng), _term(rng))
+            code = f"e{rng.randint(10000, 99999)}"
+            sentence = " ".join(rng.choices(_COMMON, k=rng.randint(6, 10)))
+            step_texts.append({"terms": terms, "code": code,
+                               "text": f"{s + 1}. {terms[0]} {terms[1]} {name}: {sentence}. Jika muncul kode {code}, ulangi."})
+        documents.append({"title": f"Layanan {name}", "name": name, "steps": step_texts,
+                          "content": "Syarat layanan:\n\n" + "\n\n".join(step["text"] for step in step_texts)})
+    return documents
+
+def _conversation(rng: random.Random, document: Dict[str, Any], follow_ups: int) -> List[str]:
+    step = rng.choice(document["steps"])
+    messages = [f"apa saja syarat layanan {document['name']} untuk {step['terms'][0]} {step['terms'][1]}?"]
+    for _ in range(follow_ups):
+        other = rng.choice(document["steps"])
+        messages.append(rng.choice([
+            "kenapa begitu?",
+            "contohnya seperti apa?",
+            "terus setelah itu?",
+            f"nomor {rng.randint(1, len(document['steps']))} maksudnya apa?",
+            f"apa maksud {rng.choice(other['terms'])} itu?",
+            f"kalau muncul kode {step['code']} harus apa?"
+        ]))
+    return messages
+
+async def run(args, rest_url: str) -> None:
+    from app.services.chat_service import chat_service
+    from app.services.embedding_backfill import EmbeddingBackfill
+    from app.services.embedding_service import embedding_service
+
+    documents = _documents(args.documents, args.steps, args.seed)
+    async with httpx.AsyncClient() as client:
+        for doc in documents:
+            response = await client.post(f"{rest_url}/documents", json={
+                "title": doc["title"], "content": doc["content"], "document_type": "sop", "is_active": True
+            })
+            response.raise_for_status()
+    with tempfile.TemporaryDirectory() as directory:
+        backfill = EmbeddingBackfill(checkpoint_path=os.path.join(directory, "checkpoint.json"))
+        progress = await backfill.run(mode="all", resume=False)
+    rng = random.Random(args.seed + 1)
+    conversations = [(doc, _conversation(rng, doc, args.follow_ups))
+                     for doc in (rng.choice(documents) for _ in range(args.conversations))]
+    print(f"{progress['processed']} documents embedded, {len(conversations)} conversations of "
+          f"{args.follow_ups + 1} messages, retrieval threshold 0.3")
+
+    # Record the documents each turn was answered with
+    retrieve = chat_service._retrieve_context_documents
+    retrieved: List[Any] = []
+
+    async def recording_retrieve(session_id, plan):
+        docs = await retrieve(session_id, plan)
+        retrieved.append(docs)
+        return docs
+
+    chat_service._retrieve_context_documents = recording_retrieve
+    retriever = chat_service.conversation_retriever
+
+    for setup in ("message", "conversation"):
+        settings.CONVERSATION_RETRIEVAL_ENABLED = setup == "conversation"
+        embedding_service.query_cache.clear()
+        misses = embedding_service.query_cache.misses
+        modes = retriever.stats()
+        tokens, relevant, passages = [], [], []
+        for document, messages in conversations:
+            conversation_id, total = None, 0
+            for turn, message in enumerate(messages):
+                retrieved.clear()
+                response = await chat_service.generate_response(ChatRequest(message=message, conversation_id=conversation_id))
+                conversation_id = response.conversation_id
+                total += (response.prompt_tokens or {}).get("total", 0)
+                if turn and retrieved:
+                    relevant.append(any(doc.get("title") == document["title"] for doc in retrieved[0] or []))
+                    passages.append(len(retrieved[0] or []))
+            tokens.append(total)
+        stats = retriever.stats()
+        searches = sum(stats[mode] - modes[mode] for mode in ("standalone", "rewrite"))
+        reused = sum(stats[mode] - modes[mode] for mode in ("pinned", "cached"))
+        print(f"{setup:>12}: per conversation embeddings {(embedding_service.query_cache.misses - misses) / len(conversations):.2f}, "
+              f"searches {searches / len(conversations):.2f}, reused {reused / len(conversations):.2f}, "
+              f"prompt tokens {statistics.mean(tokens):.0f}; follow-ups: passages {statistics.mean(passages):.1f}, "
+              f"with the conversation's document {statistics.mean(relevant):.0%}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=30)
+    parser.add_argument("--steps", type=int, default=12, help="numbered steps per document")
+    parser.add_argument("--conversations", type=int, default=100)
+    parser.add_argument("--follow-ups", type=int, default=4, help="follow-up messages per conversation")
+    parser.add_argument("--db-latency", type=float, default=0.0, help="seconds added to each stub PostgREST request")
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+    settings.SEMANTIC_CACHE_ENABLED = False
+
+    with run_stub_server(create_openai_stub, latency=0.0, token_interval=0.0) as openai_url, \
+            run_stub_server(create_postgrest_stub, latency=args.db_latency) as postgrest_url:
+        settings.OPENAI_BASE_URL = f"{openai_url}/v1"
+        settings.SUPABASE_REST_URL = f"{postgrest_url}/rest/v1"
+        asyncio.run(run(args, settings.SUPABASE_REST_URL))
+
+if __name__ == "__main__":
+    main()
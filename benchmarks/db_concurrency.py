@@ -0,0 +1,125 @@
+"""
+Benchmark: repository latency under concurrent chats against a PostgREST stand-in.
+
+Each simulated chat performs the database work of one LLM turn: the
+similarity RPC plus the user and assistant message inserts. By default the
+in-process PostgREST stub is used; pass --rest-url to target a real local
+PostgREST (see benchmarks/docker-compose.yml). --buffered also runs the
+chats with the messages handed to the write-behind message buffer, and
+reports how long the buffer then takes to drain.
+
+Usage:
+    python -m benchmarks.db_concurrency --levels 50,100,200 --latency 0.02 --buffered
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from contextlib import nullcontext
+
+from benchmarks.stubs import (
+    create_postgrest_stub, fake_embedding, run_stub_server, use_stub_environment
+)
+
+use_stub_environment()
+
+from app.core.config import settings  # noqa: E402
+from app.db import close_async_supabase_client, get_supabase_client  # noqa: E402
+from app.repositories import chat_session_repository  # noqa: E402
+from app.services.embedding_service import embedding_service  # noqa: E402
+from app.services.message_buffer import message_buffer  # noqa: E402
+
+QUERY_EMBEDDING = fake_embedding("bagaimana cara migrasi website")
+
+def _percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+async def _async_chat() -> float:
+    start = time.perf_counter()
+    session_id = str(uuid.uuid4())
+    await embedding_service.supabase.rpc("search_similar_content", {
+        "query_embedding": QUERY_EMBEDDING, "match_threshold": 0.3, "match_count": 5
+    }).execute()
+    await chat_session_repository.add_message(session_id, "user", "bagaimana cara migrasi website")
+    await chat_session_repository.add_message(session_id, "assistant", "1. Langkah pertama")
+    return time.perf_counter() - start
+
+async def _buffered_chat() -> float:
+    start = time.perf_counter()
+    session_id = str(uuid.uuid4())
+    await embedding_service.supabase.rpc("search_similar_content", {
+        "query_embedding": QUERY_EMBEDDING, "match_threshold": 0.3, "match_count": 5
+    }).execute()
+    await message_buffer.add([
+        {"session_id": session_id, "role": "user", "content": "bagaimana cara migrasi website",
+         "tokens_used": None, "model_used": None},
+        {"session_id": session_id, "role": "assistant", "content": "1. Langkah pertama",
+         "tokens_used": 120, "model_used": settings.MODEL_NAME}
+    ])
+    return time.perf_counter() - start
+
+async def _sync_chat() -> float:
+    # Mirrors the previous implementation: blocking PostgREST calls inside a coroutine
+    client = get_supabase_client()
+    start = time.perf_counter()
+    session_id = str(uuid.uuid4())
+    client.rpc("search_similar_content", {
+        "query_embedding": QUERY_EMBEDDING, "match_threshold": 0.3, "match_count": 5
+    }).execute()
+    for role, content in (("user", "bagaimana cara migrasi website"), ("assistant", "1. Langkah pertama")):
+        client.table("chat_messages").insert({"session_id": session_id, "role": role, "content": content}).execute()
+    return time.perf_counter() - start
+
+async def _run_level(concurrency: int, mode: str) -> dict:
+    chat = {"sync": _sync_chat, "async": _async_chat, "buffered": _buffered_chat}[mode]
+    if mode == "buffered":
+        message_buffer.start()
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(chat() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    drain = 0.0
+    if mode == "buffered":
+        drain_start = time.perf_counter()
+        await message_buffer.stop()
+        drain = time.perf_counter() - drain_start
+    if mode != "sync":
+        await close_async_supabase_client()
+    return {
+        "concurrency": concurrency,
+        "wall_seconds": wall,
+        "drain_seconds": drain,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "chats_per_second": concurrency / wall
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", default="50,100,200", help="Comma-separated concurrency levels")
+    parser.add_argument("--latency", type=float, default=0.02, help="Injected stub latency per request (seconds)")
+    parser.add_argument("--rest-url", default="", help="Use an existing PostgREST instead of the stub")
+    parser.add_argument("--documents", type=int, default=50, help="Number of synthetic documents to seed")
+    parser.add_argument("--sync-baseline", action="store_true", help="Also run the blocking client for comparison")
+    parser.add_argument("--buffered", action="store_true", help="Also run with the write-behind message buffer")
+    args = parser.parse_args()
+
+    if args.rest_url:
+        server = nullcontext(args.rest_url)
+    else:
+        server = run_stub_server(create_postgrest_stub, latency=args.latency, seed_count=args.documents)
+
+    with server as url:
+        settings.SUPABASE_REST_URL = url if args.rest_url else f"{url}/rest/v1"
+        settings.SUPABASE_URL = url
+        modes = ["async"] + (["buffered"] if args.buffered else []) + (["sync"] if args.sync_baseline else [])
+        for mode in modes:
+            for level in (int(x) for x in args.levels.split(",")):
+                r = asyncio.run(_run_level(level, mode))
+                drain = f" drain={r['drain_seconds']:.2f}s" if mode == "buffered" else ""
+                print(f"{mode:<8} c={r['concurrency']:<4} wall={r['wall_seconds']:.2f}s "
+                      f"p50={r['p50_ms']:.0f}ms p95={r['p95_ms']:.0f}ms {r['chats_per_second']:.0f} chats/s{drain}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark for the embedding backfill.
+
+Seeds stub PostgREST with documents that have no embedding and embeds them
+against a stub OpenAI server, first with the previous one-document-at-a-time
+loop and then with the batched, concurrent pipeline. The OpenAI stub can
+rate-limit embedding requests (429 with Retry-After) so the adaptive
+concurrency and backoff are exercised. With --interrupt the pipeline run is
+cancelled part way and resumed from its checkpoint.
+
+Usage:
+    python -m benchmarks.embedding_backfill --documents 2000 --latency 0.2 --rate-limit 20
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.stubs import create_openai_stub, create_postgrest_stub, run_stub_server, use_stub_environment
+
+use_stub_environment()
+
+from app.core.config import settings  # noqa: E402
+
+async def _reset_embeddings(rest_url: str) -> None:
+    async with httpx.AsyncClient() as client:
+        response = await client.patch(f"{rest_url}/documents", params={"id": "gt.0"}, json={"content_embedding": None})
+        response.raise_for_status()
+
+async def _missing_embeddings(rest_url: str) -> int:
+    async with httpx.AsyncClient() as client:
+        response = await client.get(f"{rest_url}/documents", params={"select": "id", "content_embedding": "is.null"})
+        response.raise_for_status()
+        return len(response.json())
+
+async def _sequential(limit: int) -> float:
+    """The previous update_all_embeddings loop: one request and one update per document"""
+    from app.repositories.document_repository import document_repository
+    from app.services.embedding_service import embedding_service
+
+    documents = await document_repository.get_documents_without_embeddings()
+    documents = documents[:limit]
+    start = time.perf_counter()
+    for doc in documents:
+        embedding = await embedding_service.generate_embedding(f"{doc['title']} {doc['content']}")
+        await document_repository.update_document(doc["id"], embedding=embedding)
+    elapsed = time.perf_counter() - start
+    print(f"sequential: {len(documents)} docs in {elapsed:.1f}s ({len(documents) / elapsed:.1f} docs/s)")
+    return len(documents) / elapsed
+
+async def _pipeline(args, rest_url: str, checkpoint_path: str) -> float:
+    from app.services.embedding_backfill import EmbeddingBackfill
+
+    backfill = EmbeddingBackfill(batch_size=args.batch_size, concurrency=args.concurrency, checkpoint_path=checkpoint_path)
+    start = time.perf_counter()
+    if args.interrupt:
+        backfill.start(mode="missing", resume=False)
+        await asyncio.sleep(args.interrupt)
+        await backfill.stop()
+        interrupted = backfill.progress()
+        print(f"pipeline interrupted after {args.interrupt}s: {interrupted['processed']} embedded, "
+              f"checkpoint at ID {interrupted['last_id']}")
+    progress = await backfill.run(mode="missing", resume=True)
+    elapsed = time.perf_counter() - start
+    total = progress["processed"]
+    print(f"pipeline (batch {args.batch_size}, concurrency {args.concurrency}): {total} docs in {elapsed:.1f}s "
+          f"({total / elapsed:.1f} docs/s), {progress['requests']} requests, {progress['throttled']} throttled, "
+          f"state {progress['state']}, resumed from {progress['resumed_from']}")
+    missing = await _missing_embeddings(rest_url)
+    print(f"  documents still without an embedding: {missing}")
+    return total / elapsed
+
+async def run(args, rest_url: str) -> None:
+    baseline = await _sequential(args.sequential_documents)
+    await _reset_embeddings(rest_url)
+    with tempfile.TemporaryDirectory() as directory:
+        rate = await _pipeline(args, rest_url, os.path.join(directory, "checkpoint.json"))
+    print(f"speedup: {rate / baseline:.1f}x")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--sequential-documents", type=int, default=100,
+                        help="documents embedded by the one-at-a-time baseline (it is slow)")
+    parser.add_argument("--latency", type=float, default=0.2, help="stub embedding request latency (s)")
+    parser.add_argument("--per-input-latency", type=float, default=0.002, help="extra stub latency per input text (s)")
+    parser.add_argument("--rate-limit", type=float, default=20.0, help="stub embedding requests per second, 0 for none")
+    parser.add_argument("--db-latency", type=float, default=0.01)
+    parser.add_argument("--batch-size", type=int, default=settings.EMBEDDING_BACKFILL_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=settings.EMBEDDING_BACKFILL_CONCURRENCY)
+    parser.add_argument("--interrupt", type=float, default=0.0, help="cancel the pipeline after this many seconds, then resume")
+    args = parser.parse_args()
+
+    with run_stub_server(create_openai_stub, latency=args.latency, per_input_latency=args.per_input_latency,
+                         embedding_requests_per_second=args.rate_limit) as openai_url, \
+            run_stub_server(create_postgrest_stub, latency=args.db_latency, seed_count=args.documents,
+                            seed_embeddings=False) as postgrest_url:
+        settings.OPENAI_BASE_URL = f"{openai_url}/v1"
+        settings.SUPABASE_REST_URL = f"{postgrest_url}/rest/v1"
+        asyncio.run(run(args, settings.SUPABASE_REST_URL))
+
+if __name__ == "__main__":
+    main()
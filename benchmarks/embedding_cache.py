@@ -0,0 +1,126 @@
+"""
+Benchmark: query embedding cache lookups, memory and SQLite disk tier.
+
+Times get() for memory hits, disk hits (memory cleared) and misses on a
+temporary SQLite file, and the disk tier's pruning of a full file.
+
+With --check, only the disk tier's retention is verified: expired rows are
+deleted when the tier is opened and when a write comes after
+prune_interval_seconds, the oldest rows beyond disk_max_entries go first,
+and entries still within both limits stay readable. Failures are listed and
+the exit status is 1.
+
+Usage:
+    python -m benchmarks.embedding_cache --entries 5000
+    python -m benchmarks.embedding_cache --check
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, List
+
+from app.services.embedding_cache import EmbeddingCache
+
+MODEL = "text-embedding-ada-002"
+
+def _vector(rng: random.Random, dimension: int) -> List[float]:
+    return [rng.random() for _ in range(dimension)]
+
+def _rows(path: str) -> int:
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+
+def _age(path: str, seconds: float) -> None:
+    """Make every stored row seconds older"""
+    with sqlite3.connect(path) as db:
+        db.execute("UPDATE query_embeddings SET created_at = created_at - ?", (seconds,))
+
+async def check(directory: str) -> List[str]:
+    """Verify disk tier retention; returns the failures"""
+    failures = []
+    rng = random.Random(1)
+
+    def expect(condition: bool, message: str) -> None:
+        print(f"  {'ok  ' if condition else 'FAIL'} {message}")
+        if not condition:
+            failures.append(message)
+
+    # Size cap: the oldest rows beyond disk_max_entries are deleted on the next prune
+    path = os.path.join(directory, "cap.db")
+    cache = EmbeddingCache(db_path=path, disk_max_entries=10, prune_interval_seconds=3600)
+    for n in range(15):
+        await cache.set(f"question {n}", MODEL, _vector(rng, 8))
+    expect(_rows(path) == 15, "no prune within prune_interval_seconds")
+    cache.prune_interval_seconds = 0
+    await cache.set("question 15", MODEL, _vector(rng, 8))
+    expect(_rows(path) == 10, "a write after the interval caps the file at disk_max_entries")
+    cache.clear()
+    expect(await cache.get("question 0", MODEL) is None, "the oldest rows are deleted first")
+    expect(await cache.get("question 15", MODEL) is not None, "the newest rows are kept")
+
+    # TTL: expired rows are deleted when the tier is opened, fresh ones kept
+    path = os.path.join(directory, "ttl.db")
+    cache = EmbeddingCache(db_path=path, disk_ttl_seconds=60)
+    for n in range(5):
+        await cache.set(f"old {n}", MODEL, _vector(rng, 8))
+    _age(path, 120)
+    for n in range(3):
+        await cache.set(f"new {n}", MODEL, _vector(rng, 8))
+    reopened = EmbeddingCache(db_path=path, disk_ttl_seconds=60)
+    await reopened.get("new 0", MODEL)
+    expect(_rows(path) == 3, "opening the tier deletes rows older than disk_ttl_seconds")
+    expect(await reopened.get("new 1", MODEL) is not None, "rows within disk_ttl_seconds stay readable")
+    return failures
+
+async def _time(lookup: Callable, texts: List[str]) -> List[float]:
+    latencies = []
+    for text in texts:
+        start = time.perf_counter()
+        await lookup(text, MODEL)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def _summary(latencies: List[float]) -> str:
+    latencies = sorted(latencies)
+    return f"p50={statistics.median(latencies) * 1e6:.0f}us p99={latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1e6:.0f}us"
+
+async def benchmark(directory: str, entries: int, dimension: int) -> None:
+    rng = random.Random(0)
+    path = os.path.join(directory, "bench.db")
+    cache = EmbeddingCache(max_entries=entries, db_path=path, disk_max_entries=entries)
+    texts = [f"pertanyaan nomor {n} tentang layanan" for n in range(entries)]
+    for text in texts:
+        await cache.set(text, MODEL, _vector(rng, dimension))
+
+    print(f"memory hit: {_summary(await _time(cache.get, texts))}")
+    cache.clear()
+    print(f"disk hit:   {_summary(await _time(cache.get, texts))}")
+    print(f"miss:       {_summary(await _time(cache.get, [f'{text}?' for text in texts]))}")
+
+    cache.disk_max_entries = entries // 2
+    start = time.perf_counter()
+    deleted = await cache._run_on_disk_thread(cache._prune, time.time())
+    print(f"prune of {deleted} rows to {cache.disk_max_entries}: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=5000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--check", action="store_true", help="only verify disk tier retention, exiting with 1 on a failure")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.check:
+            failures = asyncio.run(check(directory))
+            print("disk tier retention: OK" if not failures else f"disk tier retention: {len(failures)} failures")
+            sys.exit(1 if failures else 0)
+        asyncio.run(benchmark(directory, args.entries, args.dimension))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark: chat latency while a bulk upload is being embedded.
+
+Uploads documents through POST /api/v1/documents/bulk while a steady stream
+of chat requests runs against the same app, in two setups:
+
+- previous: every document gets its own in-process embedding task, as the
+  BackgroundTasks implementation did (no concurrency cap, lost on restart)
+- queue: documents are queued in embedding_jobs and worker.py embeds them
+  in a separate process
+
+Reports chat latency percentiles during the upload and the time until every
+document has an embedding.
+
+Usage:
+    python -m benchmarks.embedding_jobs --documents 500 --chat-rate 20 --latency 0.3
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import List
+
+import httpx
+
+from benchmarks.stubs import create_openai_stub, create_postgrest_stub, run_stub_server, use_stub_environment
+
+use_stub_environment()
+
+from app.core.config import settings  # noqa: E402
+
+async def _legacy_embed(doc_id: int, text: str) -> None:
+    """The previous BackgroundTasks job: one embedding request and one update per document"""
+    from app.repositories.document_repository import document_repository
+    from app.services.embedding_service import embedding_service
+    try:
+        embedding = await embedding_service.generate_embedding(text)
+        await document_repository.update_document(doc_id, embedding=embedding)
+    except Exception as e:
+        print(f"  legacy embedding failed for {doc_id}: {e}")
+
+async def _chat_load(client: httpx.AsyncClient, rate: float, stop: asyncio.Event) -> List[float]:
+    latencies: List[float] = []
+
+    async def one(i: int) -> None:
+        start = time.perf_counter()
+        # History bypasses the semantic cache, so every request reaches the model
+        response = await client.post("/api/v1/chat/", json={
+            "message": f"apa syarat permohonan domain nomor {i}?",
+            "conversation_history": [{"role": "user", "content": "halo"}]
+        })
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+
+    tasks, i = [], 0
+    while not stop.is_set():
+        tasks.append(asyncio.create_task(one(i)))
+        i += 1
+        await asyncio.sleep(1 / rate)
+    await asyncio.gather(*tasks)
+    return latencies
+
+async def _missing_embeddings(rest_url: str) -> int:
+    async with httpx.AsyncClient() as client:
+        response = await client.get(f"{rest_url}/documents", params={"select": "id", "content_embedding": "is.null"})
+        return len(response.json())
+
+async def run(setup: str, args, rest_url: str, offset: int) -> None:
+    from app.main import app
+
+    documents = [{"title": f"SOP unggahan {offset + i}", "content": f"Prosedur unggahan nomor {offset + i}"}
+                 for i in range(args.documents)]
+    # The lifespan closes the shared clients, which are bound to this run's event loop
+    async with app.router.lifespan_context(app), \
+            httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120) as client:
+        stop = asyncio.Event()
+        chat = asyncio.create_task(_chat_load(client, args.chat_rate, stop))
+        await asyncio.sleep(1.0)
+
+        start = time.perf_counter()
+        response = await client.post("/api/v1/documents/bulk", json={"documents": documents})
+        doc_ids = response.json()["document_ids"]
+        legacy = []
+        if setup == "previous":
+            legacy = [asyncio.create_task(_legacy_embed(doc_id, f"{doc['title']} {doc['content']}"))
+                      for doc_id, doc in zip(doc_ids, documents)]
+        while await _missing_embeddings(rest_url) > 0:
+            await asyncio.sleep(0.2)
+        embedded = time.perf_counter() - start
+        await asyncio.gather(*legacy)
+
+        stop.set()
+        latencies = sorted(await chat)
+    p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)]
+    print(f"{setup:>8}: {len(doc_ids)} documents embedded in {embedded:.1f}s; chat p50={statistics.median(latencies) * 1000:.0f}ms "
+          f"p99={p99 * 1000:.0f}ms max={latencies[-1] * 1000:.0f}ms over {len(latencies)} requests")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=500)
+    parser.add_argument("--chat-rate", type=float, default=20.0, help="chat requests per second during the upload")
+    parser.add_argument("--latency", type=float, default=0.3, help="stub OpenAI latency per request (s)")
+    parser.add_argument("--db-latency", type=float, default=0.01)
+    args = parser.parse_args()
+
+    with run_stub_server(create_openai_stub, latency=args.latency, token_interval=0.0) as openai_url, \
+            run_stub_server(create_postgrest_stub, latency=args.db_latency, seed_count=20) as postgrest_url:
+        settings.OPENAI_BASE_URL = f"{openai_url}/v1"
+        settings.SUPABASE_REST_URL = f"{postgrest_url}/rest/v1"
+
+        asyncio.run(run("previous", args, settings.SUPABASE_REST_URL, 0))
+        # The upload above also queued jobs; drop them so the worker only sees the second upload
+        httpx.delete(f"{settings.SUPABASE_REST_URL}/embedding_jobs", params={"id": "gt.0"}).raise_for_status()
+
+        env = dict(os.environ, OPENAI_BASE_URL=settings.OPENAI_BASE_URL, SUPABASE_REST_URL=settings.SUPABASE_REST_URL,
+                   EMBEDDING_WORKER_POLL_SECONDS="0.2")
+        worker = subprocess.Popen([sys.executable, "worker.py"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            asyncio.run(run("queue", args, settings.SUPABASE_REST_URL, args.documents))
+        finally:
+            worker.terminate()
+            worker.wait(timeout=10)
+
+if __name__ == "__main__":
+    main()
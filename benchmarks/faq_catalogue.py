@@ -0,0 +1,102 @@
+"""
+Benchmark: serving the FAQ list and FAQ context per request vs from the catalogue.
+
+Seeds stub PostgREST with --categories FAQ categories of --subcategories
+subcategories, each with one answer, and times per call:
+
+- database: the nested category/subcategory/answer query and the rendering,
+  on every call (what get_faq_list and get_all_faq_context did)
+- catalogue: faq_service.get_faq_list and get_all_faq_context served from the
+  in-memory catalogue
+
+Also reports the cost of one change check (row count and latest updated_at
+of the three FAQ tables), and that editing an answer through PostgREST is
+picked up by the next check. --db-latency is injected per stub PostgREST request.
+
+Usage:
+    python -m benchmarks.faq_catalogue --categories 20 --subcategories 15 --calls 2000 --db-latency 0.005
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Awaitable, Callable, List
+
+import httpx
+
+from benchmarks.stubs import create_postgrest_stub, run_stub_server, use_stub_environment
+
+use_stub_environment()
+
+from app.core.config import settings  # noqa: E402
+
+async def _seed(rest_url: str, categories: int, subcategories: int) -> None:
+    async with httpx.AsyncClient(base_url=rest_url) as client:
+        for c in range(categories):
+            category = (await client.post("/faq_categories", json={
+                "name": f"Layanan {c + 1}", "display_order": c, "is_active": True
+            })).json()[0]
+            for s in range(subcategories):
+                subcategory = (await client.post("/faq_subcategories", json={
+                    "category_id": category["id"], "name": f"Pertanyaan {c + 1}.{s + 1}", "display_order": s, "is_active": True
+                })).json()[0]
+                await client.post("/faq_items", json={
+                    "category_id": category["id"], "subcategory_id": subcategory["id"], "is_active": True,
+                    "answer": f"Jawaban untuk pertanyaan {c + 1}.{s + 1}: buka menu layanan, isi formulir, lalu kirim."
+                })
+
+async def _time(call: Callable[[], Awaitable[object]], calls: int) -> List[float]:
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        await call()
+        latencies.append(time.perf_counter() - start)
+    return sorted(latencies)
+
+def _report(name: str, latencies: List[float]) -> None:
+    print(f"{name:>22}: mean {statistics.mean(latencies) * 1e6:9.1f} us, p95 {latencies[int(len(latencies) * 0.95) - 1] * 1e6:9.1f} us")
+
+async def run(args, rest_url: str) -> None:
+    from app.services.faq_catalogue import FAQ_CONTEXT_TEMPLATE, faq_catalogue, render_catalogue
+    from app.services.faq_service import faq_service
+
+    await _seed(rest_url, args.categories, args.subcategories)
+    repository = faq_catalogue.repository
+
+    async def database_list():
+        return render_catalogue(await repository.get_faq_catalogue())[0]
+
+    async def database_context():
+        content = render_catalogue(await repository.get_faq_catalogue())[1]
+        return FAQ_CONTEXT_TEMPLATE.format(faq_content=content, whatsapp_number=settings.WHATSAPP_NUMBER)
+
+    snapshot = await faq_catalogue.reload()
+    print(f"{snapshot.entries} FAQ entries, context {len(snapshot.context)} chars, loaded in {snapshot.build_ms:.1f} ms, "
+          f"db latency {args.db_latency * 1000:.0f} ms")
+    db_calls = max(1, args.calls // 20)
+    _report("database list", await _time(database_list, db_calls))
+    _report("database context", await _time(database_context, db_calls))
+    _report("catalogue list", await _time(faq_service.get_faq_list, args.calls))
+    _report("catalogue context", await _time(faq_service.get_all_faq_context, args.calls))
+    _report("change check", await _time(faq_catalogue.check_once, db_calls))
+
+    async with httpx.AsyncClient(base_url=rest_url) as client:
+        await client.patch("/faq_items", params={"id": "eq.1"}, json={"answer": "Jawaban yang diperbarui."})
+    reloaded = await faq_catalogue.check_once()
+    updated = "Jawaban yang diperbarui." in (await faq_service.get_all_faq_context())
+    print(f"after editing an answer: reloaded {reloaded}, new answer served {updated}; {faq_catalogue.stats()}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--subcategories", type=int, default=15, help="subcategories per category")
+    parser.add_argument("--calls", type=int, default=2000, help="catalogue calls timed (database calls: 1/20)")
+    parser.add_argument("--db-latency", type=float, default=0.005, help="seconds added to each stub PostgREST request")
+    args = parser.parse_args()
+
+    with run_stub_server(create_postgrest_stub, latency=args.db_latency) as postgrest_url:
+        settings.SUPABASE_REST_URL = f"{postgrest_url}/rest/v1"
+        asyncio.run(run(args, settings.SUPABASE_REST_URL))
+
+if __name__ == "__main__":
+    main()
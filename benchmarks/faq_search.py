@@ -0,0 +1,130 @@
+"""
+Benchmark: reaching FAQ answers through keyword search and RAG retrieval.
+
+Seeds stub PostgREST with synthetic SOPs and FAQ items written in the same
+shared vocabulary, each FAQ answer naming two distinctive terms, and runs the
+embedding backfill (documents, chunks, then FAQ items). Per sampled FAQ item:
+
+- keyword: the item's two terms in reverse order, searched with the old
+  ILIKE '%query%' scan and with search_faq_content (full-text search on
+  search_content)
+- question: "bagaimana jika <term> <term>?" retrieved with
+  find_context_documents (hybrid_search over chunks and FAQ items)
+
+Reports how often the item is found by each keyword search, and how often it
+is the first passage or among the passages of the RAG context. Before FAQ
+items were embedded and searched, RAG context never held an FAQ answer.
+Finally edits one answer, checks that its embedding was cleared, and that a
+"missing" backfill re-embeds only that item. The stub's bag-of-words
+embeddings score far lower than real ones, so --threshold defaults to 0.1
+instead of the service's 0.3.
+
+Usage:
+    python -m benchmarks.faq_search --documents 20 --categories 10 --subcategories 10 --questions 100
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.stubs import create_openai_stub, create_postgrest_stub, run_stub_server, use_stub_environment
+
+use_stub_environment()
+
+from app.core.config import settings  # noqa: E402
+
+_COMMON = ("buka menu pilih klik tombol simpan isi formulir data pengguna server aplikasi akses layanan "
+           "periksa status konfigurasi unggah berkas verifikasi admin sistem jaringan domain hosting").split()
+
+def _term(rng: random.Random) -> str:
+    return "".join(rng.choice("bcdfghjklmnprstvz") + rng.choice("aiueo") for _ in range(3))
+
+async def _seed(rest_url: str, args, rng: random.Random) -> List[Dict[str, Any]]:
+    items = []
+    async with httpx.AsyncClient(base_url=rest_url) as client:
+        for d in range(args.documents):
+            steps = [f"{s + 1}. Langkah {_term(rng)}: {' '.join(rng.choices(_COMMON, k=20))}." for s in range(10)]
+            (await client.post("/documents", json={
+                "title": f"SOP layanan {d + 1}", "content": "Prosedur layanan:\n\n" + "\n\n".join(steps),
+                "document_type": "sop", "is_active": True
+            })).raise_for_status()
+        for c in range(args.categories):
+            category = (await client.post("/faq_categories", json={
+                "name": f"Layanan {c + 1}", "display_order": c, "is_active": True
+            })).json()[0]
+            for s in range(args.subcategories):
+                subcategory = (await client.post("/faq_subcategories", json={
+                    "category_id": category["id"], "name": f"Pertanyaan {c + 1}.{s + 1}", "display_order": s, "is_active": True
+                })).json()[0]
+                terms = (_term(rng), _term(rng))
+                item = (await client.post("/faq_items", json={
+                    "category_id": category["id"], "subcategory_id": subcategory["id"], "is_active": True,
+                    "answer": f"Untuk {terms[0]} {terms[1]}: {' '.join(rng.choices(_COMMON, k=15))}."
+                })).json()[0]
+                items.append({"id": item["id"], "terms": terms})
+    return items
+
+async def run(args, rest_url: str) -> None:
+    from app.repositories.faq_repository import faq_repository
+    from app.services.embedding_backfill import EmbeddingBackfill
+    from app.services.embedding_service import embedding_service
+
+    rng = random.Random(args.seed)
+    items = await _seed(rest_url, args, rng)
+    with tempfile.TemporaryDirectory() as directory:
+        backfill = EmbeddingBackfill(checkpoint_path=os.path.join(directory, "checkpoint.json"))
+        progress = await backfill.run(mode="all", resume=False)
+        print(f"{progress['processed']} documents and {progress['faq_processed']} FAQ items embedded "
+              f"in {progress['requests']} requests")
+
+        ilike, fts, first, anywhere, faq_passages = [], [], [], [], []
+        async with httpx.AsyncClient(base_url=rest_url) as client:
+            for item in rng.sample(items, min(args.questions, len(items))):
+                keyword = f"{item['terms'][1]} {item['terms'][0]}"
+                rows = (await client.get("/faq_items", params={"select": "id", "answer": f"ilike.*{keyword}*", "limit": 5})).json()
+                ilike.append(any(row["id"] == item["id"] for row in rows))
+                rows = await faq_repository.search_faq_content(keyword)
+                fts.append(any(row["id"] == item["id"] for row in rows))
+
+                passages = await embedding_service.find_context_documents(
+                    f"bagaimana jika {item['terms'][0]} {item['terms'][1]}?", threshold=args.threshold
+                )
+                hits = [p.get("source") == "faq" and p["id"] == item["id"] for p in passages]
+                first.append(bool(hits) and hits[0])
+                anywhere.append(any(hits))
+                faq_passages.append(sum(p.get("source") == "faq" for p in passages))
+
+            print(f"keyword search: ILIKE finds the item {statistics.mean(ilike):.0%}, full-text {statistics.mean(fts):.0%}")
+            print(f"RAG context: item first {statistics.mean(first):.0%}, among passages {statistics.mean(anywhere):.0%}, "
+                  f"FAQ passages per question {statistics.mean(faq_passages):.1f}")
+
+            edited = items[0]["id"]
+            await client.patch("/faq_items", params={"id": f"eq.{edited}"}, json={"answer": "Jawaban yang diperbarui."})
+            row = (await client.get("/faq_items", params={"select": "content_embedding", "id": f"eq.{edited}"})).json()[0]
+        progress = await backfill.run(mode="missing", resume=False)
+        print(f"after editing an answer: embedding cleared {row['content_embedding'] is None}, "
+              f"missing backfill re-embedded {progress['faq_processed']} FAQ item(s)")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--categories", type=int, default=10)
+    parser.add_argument("--subcategories", type=int, default=10, help="subcategories (one FAQ item each) per category")
+    parser.add_argument("--questions", type=int, default=100, help="FAQ items sampled")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=19)
+    args = parser.parse_args()
+
+    with run_stub_server(create_openai_stub, latency=0.0) as openai_url, \
+            run_stub_server(create_postgrest_stub, latency=0.0) as postgrest_url:
+        settings.OPENAI_BASE_URL = f"{openai_url}/v1"
+        settings.SUPABASE_REST_URL = f"{postgrest_url}/rest/v1"
+        asyncio.run(run(args, settings.SUPABASE_REST_URL))
+
+if __name__ == "__main__":
+    main()
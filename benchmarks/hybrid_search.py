@@ -0,0 +1,140 @@
+"""
+Benchmark: RAG retrieval with the two-step path vs hybrid search.
+
+Seeds stub PostgREST with synthetic SOPs of numbered steps written in a small
+shared vocabulary plus a few distinctive words, each step mentioning an error
+code, and embeds them with the backfill pipeline (documents and chunks). Two
+kinds of questions are asked per sampled step:
+
+- step: names the two distinctive terms of the step
+- keyword: quotes only the step's error code, wrapped in common words
+
+and find_context_documents runs in two setups:
+
+- two-step: vector chunk search, then whole-document search and full-text
+  search only when the previous call found nothing (up to three round-trips)
+- hybrid: hybrid_search fusing chunk vector and full-text candidates in one call
+
+Reports how often the target step is among the first --top passages and
+anywhere in the retrieved passages (recall), and the retrieval latency per
+question, with --db-latency injected per stub
+PostgREST request. Query embeddings are cached before timing. The stub's
+bag-of-words embeddings score far lower than real ones, so --threshold
+defaults to 0.1 instead of the service's 0.3. Set HYBRID_CANDIDATE_COUNT
+to see how longer candidate lists change the fused ranking.
+
+Usage:
+    python -m benchmarks.hybrid_search --documents 40 --steps 15 --questions 200 --db-latency 0.01
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.stubs import create_openai_stub, create_postgrest_stub, run_stub_server, use_stub_environment
+
+use_stub_environment()
+
+from app.core.config import settings  # noqa: E402
+
+_COMMON = ("buka menu pilih klik tombol simpan isi formulir data pengguna server aplikasi akses layanan "
+           "periksa status konfigurasi unggah berkas verifikasi admin sistem jaringan domain hosting").split()
+
+def _term(rng: random.Random) -> str:
+    return "".join(rng.choice("bcdfghjklmnprstvz") + rng.choice("aiueo") for _ in range(3))
+
+def _documents(count: int, steps: int, seed: int) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    documents = []
+    for d in range(count):
+        step_texts = []
+        for s in range(steps):
+            terms = (_term(rng), _term(rng))
+            code = f"e{rng.randint(10000, 99999)}"
+            sentence = " ".join(rng.choices(_COMMON, k=rng.randint(15, 25)))
+            text = (f"{s + 1}. Langkah {terms[0]} {terms[1]}: {sentence}. "
+                    f"Jika muncul kode {code}, ulangi langkah ini.")
+            step_texts.append({"terms": terms, "code": code, "text": text})
+        documents.append({
+            "title": f"SOP layanan {d + 1}",
+            "content": "Prosedur layanan:\n\n" + "\n\n".join(step["text"] for step in step_texts),
+            "steps": step_texts
+        })
+    return documents
+
+def _questions(documents: List[Dict[str, Any]], count: int, seed: int) -> List[Dict[str, str]]:
+    rng = random.Random(seed)
+    steps = [step for doc in documents for step in doc["steps"]]
+    questions = []
+    for step in rng.sample(steps, min(count, len(steps))):
+        target = step["text"].split(":", 1)[0]
+        questions.append({"kind": "step", "target": target,
+                          "query": f"bagaimana cara {step['terms'][0]} {step['terms'][1]}?"})
+        common = " ".join(rng.sample(_COMMON, 2))
+        questions.append({"kind": "keyword", "target": target,
+                          "query": f"kenapa {common} gagal dengan kode {step['code']}?"})
+    return questions
+
+async def run(args, rest_url: str) -> None:
+    from app.services.embedding_backfill import EmbeddingBackfill
+    from app.services.embedding_service import embedding_service
+
+    documents = _documents(args.documents, args.steps, args.seed)
+    async with httpx.AsyncClient() as client:
+        for doc in documents:
+            response = await client.post(f"{rest_url}/documents", json={
+                "title": doc["title"], "content": doc["content"], "document_type": "sop", "is_active": True
+            })
+            response.raise_for_status()
+    with tempfile.TemporaryDirectory() as directory:
+        backfill = EmbeddingBackfill(checkpoint_path=os.path.join(directory, "checkpoint.json"))
+        progress = await backfill.run(mode="all", resume=False)
+
+    questions = _questions(documents, args.questions, args.seed + 1)
+    for question in questions:
+        await embedding_service.embed_query(question["query"])
+    print(f"{progress['processed']} documents embedded, {len(questions)} questions, "
+          f"db latency {args.db_latency * 1000:.0f} ms, threshold {args.threshold}")
+
+    for setup in ("two-step", "hybrid"):
+        settings.HYBRID_SEARCH_ENABLED = setup == "hybrid"
+        hits: Dict[str, List[bool]] = {"step": [], "keyword": []}
+        found: Dict[str, List[bool]] = {"step": [], "keyword": []}
+        latencies = []
+        for question in questions:
+            start = time.perf_counter()
+            passages = await embedding_service.find_context_documents(question["query"], threshold=args.threshold)
+            latencies.append(time.perf_counter() - start)
+            matches = [question["target"] in passage["content"] for passage in passages]
+            hits[question["kind"]].append(any(matches[:args.top]))
+            found[question["kind"]].append(any(matches))
+        latencies.sort()
+        recall = ", ".join(f"{kind} {statistics.mean(hits[kind]):.0%} / {statistics.mean(found[kind]):.0%}" for kind in hits)
+        print(f"{setup:>8}: recall (top {args.top} / all passages) {recall}; latency mean {statistics.mean(latencies) * 1000:.1f} ms, "
+              f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=40)
+    parser.add_argument("--steps", type=int, default=15, help="numbered steps per document")
+    parser.add_argument("--questions", type=int, default=200, help="sampled steps, each asked both ways")
+    parser.add_argument("--top", type=int, default=3, help="passages counted for recall")
+    parser.add_argument("--threshold", type=float, default=0.1, help="similarity threshold for both setups")
+    parser.add_argument("--db-latency", type=float, default=0.01, help="seconds added to each stub PostgREST request")
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    with run_stub_server(create_openai_stub, latency=0.0, token_interval=0.0) as openai_url, \
+            run_stub_server(create_postgrest_stub, latency=args.db_latency) as postgrest_url:
+        settings.OPENAI_BASE_URL = f"{openai_url}/v1"
+        settings.SUPABASE_REST_URL = f"{postgrest_url}/rest/v1"
+        asyncio.run(run(args, settings.SUPABASE_REST_URL))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Micro-benchmark for special-intent resolution.
+
+Compares the compiled intent matcher with the previous per-call
+implementation (re-normalizing every pattern and scoring every token window
+with difflib.SequenceMatcher) on a golden message set: real phrasings, typo
+variants of every pattern, and unrelated questions. The registry is scaled
+to 10x and 100x the size of app/core/intents.json with synthetic intents.
+
+With --check, only the parity of the two is verified, over the first
+--reference-messages messages at 1x and 10x by default (100x takes
+minutes): mismatches are listed and the exit status is 1, so it can run after
+any change to app/core/intent_engine.py or intents.json. The report also exits
+with 1 when its parity sample differs.
+
+Usage:
+    python -m benchmarks.intent_resolve --scales 1 10 100 --messages 2000
+    python -m benchmarks.intent_resolve --check
+    python -m benchmarks.intent_resolve --check --scales 1 10 100
+"""
+import argparse
+import copy
+import json
+import random
+import re
+import statistics
+import sys
+import time
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional
+
+from benchmarks.stubs import use_stub_environment
+
+use_stub_environment()
+
+from app.core import intent_engine  # noqa: E402
+from app.core.intent_engine import CompiledIntents, _normalize  # noqa: E402
+
+VOCABULARY = [
+    "cara", "daftar", "akun", "website", "server", "migrasi", "domain", "email", "lupa", "password",
+    "reset", "hosting", "ssl", "sertifikat", "backup", "aplikasi", "layanan", "izin", "surat", "pengajuan",
+    "status", "jadwal", "jam", "kontak", "alamat", "kantor", "biaya", "syarat", "dokumen", "formulir",
+    "upload", "login", "error", "gagal", "akses", "jaringan", "vpn", "wifi", "laporan", "pantas",
+    "apa", "siapa", "bagaimana", "kapan", "dimana", "tolong", "bantu", "saya", "kamu", "mohon",
+]
+
+# Synthetic intents use their own words, so unrelated messages still scan the whole registry
+SYNTHETIC_VOCABULARY = [
+    "anggaran", "arsip", "bidang", "cuti", "disposisi", "evaluasi", "gaji", "inventaris", "kepegawaian", "kinerja",
+    "lelang", "mutasi", "nota", "pegawai", "pensiun", "perjalanan", "pengadaan", "rapat", "rekap", "sekretariat",
+    "tunjangan", "absensi", "honor", "kendaraan", "aset", "ruangan", "agenda", "notulen", "kwitansi", "spj",
+]
+
+GOLDEN_MESSAGES = [
+    "apa itu PANTAS?", "Apa itu pantas", "pantas itu apa ya", "apaa itu pantass", "jelasin pantas dong",
+    "siapa kamu?", "kamu siapa", "siapa andaa", "Siapa dirimu sebenarnya", "identitas kamu apa",
+    "layanan apa saja yang tersedia", "daftar FAQ", "list faq dong", "faq apa aja", "bantuan apa yang ada",
+    "cara migrasi website", "bagaimana migrasi website?", "SOP pembuatan website baru di AWDI",
+    "lupa password email dinas", "server down sejak pagi", "halo", "", "???", "terima kasih",
+    "tentang pantas", "deskripsi  pantas!!!", "pénjelasan pantas", "kamu adalah bot?", "semua faq",
+]
+
+# --- Previous implementation, kept as the golden reference ---
+
+def _reference_fuzzy_contains(text: str, pattern: str, threshold: float) -> bool:
+    if not text or not pattern:
+        return False
+    if pattern in text:
+        return True
+    t_tokens = text.split()
+    p_tokens = pattern.split()
+    if not t_tokens or not p_tokens:
+        return False
+    p_len = len(p_tokens)
+    for win_size in {max(1, p_len - 1), p_len, p_len + 1}:
+        if win_size > len(t_tokens):
+            continue
+        for i in range(0, len(t_tokens) - win_size + 1):
+            window = " ".join(t_tokens[i:i + win_size])
+            if SequenceMatcher(None, window, pattern).ratio() >= threshold:
+                return True
+    return False
+
+def _reference_match(text: str, matcher: Dict[str, Any]) -> bool:
+    t = _normalize(text or "")
+    m = matcher or {}
+    mtype = m.get("type", "includes")
+    patterns: List[str] = m.get("patterns", [])
+    if not t or not patterns:
+        return False
+    if mtype == "includes":
+        return any(_normalize(p or "") in t for p in patterns)
+    if mtype == "regex":
+        return any(re.search(p, t, re.IGNORECASE) for p in patterns)
+    if mtype == "fuzzy":
+        threshold = float(m.get("threshold", 0.82))
+        return any(_reference_fuzzy_contains(t, _normalize(p or ""), threshold) for p in patterns)
+    return False
+
+def _reference_resolve(registry: Dict[str, Any], message: str) -> Optional[Dict[str, Any]]:
+    for intent in registry.get("intents", []):
+        if _reference_match(message, intent.get("match", {})):
+            return intent.get("action")
+    return None
+
+# --- Data generation ---
+
+def _typo(text: str, rng: random.Random) -> str:
+    if not text:
+        return text
+    chars = list(text)
+    for _ in range(rng.randint(1, 2)):
+        i = rng.randrange(len(chars))
+        op = rng.choice(("insert", "delete", "replace", "repeat"))
+        if op == "insert":
+            chars.insert(i, rng.choice("abcdefghijklmnopqrstuvwxyz "))
+        elif op == "delete" and len(chars) > 1:
+            del chars[i]
+        elif op == "replace":
+            chars[i] = rng.choice("abcdefghijklmnopqrstuvwxyz")
+        else:
+            chars.insert(i, chars[i] * 2)
+    return "".join(chars)
+
+def scale_registry(base: Dict[str, Any], factor: int, rng: random.Random) -> Dict[str, Any]:
+    """Base intents followed by synthetic intents up to factor x the base size"""
+    registry = copy.deepcopy(base)
+    base_intents = base.get("intents", [])
+    for n in range(len(base_intents) * (factor - 1)):
+        template = base_intents[n % len(base_intents)]
+        patterns = [" ".join(rng.sample(SYNTHETIC_VOCABULARY, rng.randint(2, 3))) for _ in range(len(template["match"]["patterns"]))]
+        registry["intents"].append({
+            "id": f"synthetic_{n}",
+            "match": {**template["match"], "patterns": patterns},
+            "action": {"type": "template", "template": f"synthetic {n}"},
+        })
+    return registry
+
+def golden_messages(registry: Dict[str, Any], count: int, rng: random.Random) -> List[str]:
+    patterns = [p for intent in registry["intents"] for p in intent["match"].get("patterns", [])]
+    messages = list(GOLDEN_MESSAGES)
+    while len(messages) < count:
+        kind = rng.random()
+        words = rng.sample(VOCABULARY, rng.randint(2, 10))
+        if kind < 0.35:
+            # Typo'd pattern inside an otherwise ordinary question
+            at = rng.randint(0, len(words))
+            words.insert(at, _typo(rng.choice(patterns), rng))
+        elif kind < 0.45:
+            words.insert(rng.randint(0, len(words)), rng.choice(patterns))
+        messages.append(" ".join(words) + rng.choice(("", "?", "!", " ya", "...")))
+    return messages[:count]
+
+# --- Parity check ---
+
+def parity_mismatches(registry: Dict[str, Any], compiled: CompiledIntents, messages: List[str]) -> List[str]:
+    """Messages the compiled matcher resolves differently from the previous implementation"""
+    return [message for message in messages if compiled.resolve(message) != _reference_resolve(registry, message)]
+
+def check(base: Dict[str, Any], scales: List[int], count: int) -> int:
+    """Verify parity on the golden set at every scale; returns the number of mismatches"""
+    total = 0
+    for factor in scales:
+        rng = random.Random(factor)
+        registry = scale_registry(base, factor, rng)
+        messages = golden_messages(registry, max(count, len(GOLDEN_MESSAGES)), rng)
+        mismatches = parity_mismatches(registry, CompiledIntents(registry), messages)
+        print(f"{factor}x: {len(messages) - len(mismatches)}/{len(messages)} identical")
+        for message in mismatches:
+            print(f"  mismatch: {message!r}")
+        total += len(mismatches)
+    return total
+
+# --- Benchmark ---
+
+def _time_per_message(resolve, messages: List[str]) -> List[float]:
+    latencies = []
+    for message in messages:
+        start = time.perf_counter()
+        resolve(message)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def _summary(latencies: List[float]) -> str:
+    latencies = sorted(latencies)
+    return (f"mean={statistics.fmean(latencies) * 1e6:.0f}us p50={statistics.median(latencies) * 1e6:.0f}us "
+            f"p99={latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1e6:.0f}us")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", help="registry sizes (default: 1 10 100, with --check 1 10)")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--reference-messages", type=int, default=300,
+                        help="messages resolved with the previous implementation per scale (it is slow at 100x)")
+    parser.add_argument("--check", action="store_true",
+                        help="only verify parity, exiting with 1 on a mismatch")
+    args = parser.parse_args()
+
+    with open(intent_engine._INTENTS_PATH, "r", encoding="utf-8") as f:
+        base = json.load(f)
+
+    if args.check:
+        mismatches = check(base, args.scales or [1, 10], args.reference_messages)
+        print("golden parity: OK" if not mismatches else f"golden parity: {mismatches} mismatches")
+        sys.exit(1 if mismatches else 0)
+
+    failed = False
+    for factor in args.scales or [1, 10, 100]:
+        rng = random.Random(factor)
+        registry = scale_registry(base, factor, rng)
+        messages = golden_messages(registry, args.messages, rng)
+        pattern_count = sum(len(i["match"].get("patterns", [])) for i in registry["intents"])
+
+        start = time.perf_counter()
+        compiled = CompiledIntents(registry)
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        reference_messages = messages[:args.reference_messages]
+        checked = messages[:max(args.reference_messages, len(GOLDEN_MESSAGES))]
+        mismatches = len(parity_mismatches(registry, compiled, checked))
+        failed = failed or mismatches > 0
+        matched = sum(1 for message in messages if compiled.resolve(message) is not None)
+
+        print(f"{factor}x: {len(registry['intents'])} intents, {pattern_count} patterns (compiled in {compile_ms:.1f}ms)")
+        print(f"  previous: {_summary(_time_per_message(lambda m: _reference_resolve(registry, m), reference_messages))} "
+              f"over {len(reference_messages)} messages")
+        print(f"  compiled: {_summary(_time_per_message(compiled.resolve, messages))} over {len(messages)} messages")
+        print(f"  golden parity: {len(checked) - mismatches}/{len(checked)} identical, "
+              f"{matched}/{len(messages)} messages matched an intent")
+    if failed:
+        sys.exit("golden parity failed; run with --check to list the mismatches")
+
+if __name__ == "__main__":
+    main()
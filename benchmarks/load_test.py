@@ -0,0 +1,311 @@
+"""
+Load test: the whole API under mixed chat traffic at rising concurrency.
+
+Boots app.main:app with uvicorn in a child process, lifespan included,
+against the stub OpenAI server and the stub PostgREST (or a local
+PostgREST/Postgres with --rest-url, see benchmarks/docker-compose.yml), each
+with its own injected latency. For every --concurrency level, that many
+clients send POST /api/v1/chat/ back to back for --duration seconds, drawing
+each message from a traffic mix:
+
+- greeting: an initial greeting ("halo"), answered without upstream calls
+- intent: a special intent ("siapa kamu", "daftar faq")
+- full-doc: a full SOP requested with return_full_document (kb-direct)
+- llm: a question about a seeded SOP, answered by the language model with
+  retrieved context. A --repeat-share of them come from a small common set
+  and may be served by the semantic cache; the rest are unique
+
+--mix sets the weights. Per level it reports latency p50/p95/p99, throughput,
+errors, requests refused by admission control (429/503, after which the
+client waits for Retry-After), the responses per model_used, and the
+event-loop lag of the API process: a probe in the server loop sleeps
+--lag-interval at a time and records how late it wakes up.
+--openai-chat-rps makes the stub answer chat completions above that rate
+with 429, to see the API back off and refuse requests it cannot serve.
+
+--output writes the results as JSON, with the commit, settings and per-level
+figures; --compare prints the change against such a file (from another
+commit) per level. The load generator shares the machine with the API: at
+high concurrency check that it is not the bottleneck (the client CPU share
+is printed per level). The API logs at --app-log-level (WARNING by default,
+so request logging is not part of the measurement).
+
+Usage:
+    python -m benchmarks.load_test --concurrency 1,10,50,100 --duration 20 --output load.json
+    python -m benchmarks.load_test --openai-latency 1.0 --db-latency 0.02 --compare load.json
+    python -m benchmarks.load_test --mix greeting=0,intent=0,full-doc=0,llm=1 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import subprocess
+import time
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+import httpx
+import uvicorn
+
+from benchmarks.stubs import create_openai_stub, create_postgrest_stub, run_stub_server, use_stub_environment
+
+_TOPICS = ["migrasi website", "pembuatan website baru", "reset password email", "permohonan domain",
+           "backup server", "sertifikat ssl", "akun vpn", "hosting aplikasi", "pemulihan data", "email dinas"]
+# Free of ChatService.full_doc_keywords and intent patterns, so the language model answers them
+_QUESTIONS = ["apa syarat {topic}?", "berapa lama {topic} selesai?", "apakah {topic} dikenakan biaya?",
+              "kapan {topic} bisa diajukan?", "dokumen apa yang diperlukan untuk {topic}?"]
+_INTENTS = ["siapa kamu", "apa itu pantas", "daftar faq"]
+_GREETINGS = ["halo", "start", "hi"]
+
+def _request(kind: str, rng: random.Random, args) -> Dict[str, Any]:
+    topic = rng.choice(_TOPICS)
+    if kind == "greeting":
+        return {"message": rng.choice(_GREETINGS)}
+    if kind == "intent":
+        return {"message": rng.choice(_INTENTS)}
+    if kind == "full-doc":
+        # Titles of the stub's seeded documents ("SOP <Topic> <n>")
+        number = rng.randrange(max(args.documents, 1))
+        return {"message": f"SOP {_TOPICS[number % len(_TOPICS)].title()} {number}", "return_full_document": True}
+    question = rng.choice(_QUESTIONS).format(topic=topic)
+    if rng.random() < args.repeat_share:
+        # One of the 50 common questions, which the semantic cache can answer once seen
+        return {"message": question}
+    return {"message": f"{question} nomor tiket {rng.randrange(10 ** 6)}"}
+
+def _serve_app(env: Dict[str, str], port: int, lag_interval: float, log_level: str) -> None:
+    """Run app.main:app with an event-loop lag probe; settings are read from env at import"""
+    os.environ.update(env)
+    from app.main import app
+
+    samples: List[float] = []
+
+    async def probe() -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(lag_interval)
+            samples.append(max(0.0, time.perf_counter() - start - lag_interval))
+
+    app_lifespan = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def lifespan(application):
+        async with app_lifespan(application):
+            logging.getLogger().setLevel(log_level)
+            task = asyncio.create_task(probe())
+            yield
+            task.cancel()
+
+    async def loop_lag() -> List[float]:
+        taken = samples[:]
+        samples.clear()
+        return taken
+
+    app.router.lifespan_context = lifespan
+    app.add_api_route("/_load_test/loop-lag", loop_lag, include_in_schema=False)
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+@contextmanager
+def run_app_server(env: Dict[str, str], lag_interval: float, log_level: str) -> Iterator[str]:
+    """Run the API in a child process and yield its base URL once /health answers"""
+    port = _free_port()
+    process = multiprocessing.Process(target=_serve_app, args=(env, port, lag_interval, log_level), daemon=True)
+    process.start()
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 120
+    while True:
+        try:
+            if httpx.get(f"{url}/health", timeout=1.0).status_code == 200:
+                break
+        except httpx.HTTPError:
+            pass
+        if time.monotonic() > deadline or not process.is_alive():
+            process.terminate()
+            raise RuntimeError(f"API failed to start on port {port}")
+        time.sleep(0.1)
+    try:
+        yield url
+    finally:
+        process.terminate()
+        process.join(timeout=10)
+
+def _percentile(values: List[float], share: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+async def _run_level(client: httpx.AsyncClient, args, mix: Dict[str, float], concurrency: int, rng: random.Random) -> Dict[str, Any]:
+    latencies: Dict[str, List[float]] = {kind: [] for kind in mix}
+    model_used: Dict[str, int] = {}
+    errors = rejected = 0
+    kinds, weights = list(mix), list(mix.values())
+    deadline = time.perf_counter() + args.duration
+
+    async def user(seed: int) -> None:
+        nonlocal errors, rejected
+        user_rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            kind = user_rng.choices(kinds, weights)[0]
+            start = time.perf_counter()
+            try:
+                response = await client.post("/api/v1/chat/", json=_request(kind, user_rng, args))
+                elapsed = time.perf_counter() - start
+                if response.status_code in (429, 503):
+                    # Admission control refused it: wait as told, like a well-behaved client
+                    rejected += 1
+                    await asyncio.sleep(max(0.0, min(float(response.headers.get("retry-after", 1)), deadline - time.perf_counter())))
+                    continue
+                if response.status_code != 200:
+                    errors += 1
+                    continue
+                latencies[kind].append(elapsed)
+                used = response.json().get("model_used", "?")
+                model_used[used] = model_used.get(used, 0) + 1
+            except httpx.HTTPError:
+                errors += 1
+
+    await client.get("/_load_test/loop-lag")
+    cpu_start, start = time.process_time(), time.perf_counter()
+    await asyncio.gather(*(user(rng.randrange(2 ** 32)) for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    client_cpu = (time.process_time() - cpu_start) / wall
+    lag = (await client.get("/_load_test/loop-lag")).json()
+
+    every = [value for values in latencies.values() for value in values]
+    return {
+        "concurrency": concurrency,
+        "requests": len(every),
+        "errors": errors,
+        "rejected": rejected,
+        "seconds": round(wall, 3),
+        "throughput_rps": round(len(every) / wall, 2),
+        "latency_ms": {name: round(_percentile(every, share) * 1000, 2)
+                       for name, share in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))},
+        "latency_ms_by_kind": {
+            kind: {"requests": len(values), "p50": round(_percentile(values, 0.50) * 1000, 2),
+                   "p95": round(_percentile(values, 0.95) * 1000, 2)}
+            for kind, values in latencies.items() if values
+        },
+        "model_used": model_used,
+        "loop_lag_ms": {"p50": round(_percentile(lag, 0.50) * 1000, 2), "p99": round(_percentile(lag, 0.99) * 1000, 2),
+                        "max": round(max(lag, default=0.0) * 1000, 2), "samples": len(lag)},
+        "client_cpu_share": round(client_cpu, 3)
+    }
+
+def _print_level(result: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    latency, lag = result["latency_ms"], result["loop_lag_ms"]
+    print(f"{result['concurrency']:>5} {result['requests']:>8} {result['errors']:>6} {result['throughput_rps']:>9.1f} "
+          f"{latency['p50']:>8.1f} {latency['p95']:>8.1f} {latency['p99']:>8.1f} "
+          f"{lag['p50']:>8.1f} {lag['p99']:>8.1f} {lag['max']:>8.1f} {result['client_cpu_share']:>7.0%}")
+    if baseline:
+        def change(new: float, old: float) -> str:
+            return f"{(new - old) / old:+.1%}" if old else "n/a"
+        old_latency = baseline["latency_ms"]
+        print(f"{'vs':>5} {'':>8} {'':>6} {change(result['throughput_rps'], baseline['throughput_rps']):>9} "
+              f"{change(latency['p50'], old_latency['p50']):>8} {change(latency['p95'], old_latency['p95']):>8} "
+              f"{change(latency['p99'], old_latency['p99']):>8}")
+    by_kind = ", ".join(f"{kind} {figures['p50']:.1f}/{figures['p95']:.1f}"
+                        for kind, figures in result["latency_ms_by_kind"].items())
+    print(f"{'':>5} p50/p95 ms by kind: {by_kind}; model_used: {result['model_used']}; "
+          f"rejected (429/503): {result.get('rejected', 0)}")
+
+async def run(args, url: str, mix: Dict[str, float], baseline: Dict[int, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    rng = random.Random(args.seed)
+    levels = [int(level) for level in args.concurrency.split(",")]
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    results = []
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=args.timeout) as client:
+        # Warm up every route (tokenizer, FAQ catalogue, connection pools) outside the measurement
+        for kind in mix:
+            for _ in range(3):
+                await client.post("/api/v1/chat/", json=_request(kind, rng, args))
+        print(f"{'conc':>5} {'requests':>8} {'errors':>6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'lag p50':>8} {'lag p99':>8} {'lag max':>8} {'client':>7}")
+        for concurrency in levels:
+            result = await _run_level(client, args, mix, concurrency, rng)
+            _print_level(result, baseline.get(concurrency))
+            results.append(result)
+    return results
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,5,10,25,50", help="comma-separated concurrent clients per level")
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per level")
+    parser.add_argument("--mix", default="greeting=1,intent=1,full-doc=1,llm=7", help="traffic weights per kind")
+    parser.add_argument("--openai-latency", type=float, default=0.5, help="stub chat/embedding response latency (s)")
+    parser.add_argument("--token-interval", type=float, default=0.0, help="stub delay between streamed tokens (s)")
+    parser.add_argument("--openai-chat-rps", type=float, default=0.0,
+                        help="stub chat completions per second before it answers 429 (0: unlimited)")
+    parser.add_argument("--db-latency", type=float, default=0.02, help="stub PostgREST latency per request (s)")
+    parser.add_argument("--rest-url", default="", help="PostgREST of a local Postgres instead of the stub")
+    parser.add_argument("--documents", type=int, default=50, help="SOP documents seeded into the stub")
+    parser.add_argument("--repeat-share", type=float, default=0.3, help="share of llm questions drawn from a common set")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE", help="extra API setting (repeatable)")
+    parser.add_argument("--lag-interval", type=float, default=0.01, help="event-loop lag probe period (s)")
+    parser.add_argument("--app-log-level", default="WARNING")
+    parser.add_argument("--timeout", type=float, default=60.0, help="client timeout per request (s)")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="results JSON of an earlier run to compare against")
+    parser.add_argument("--seed", type=int, default=22)
+    args = parser.parse_args()
+
+    mix = {kind: float(weight) for kind, _, weight in (item.partition("=") for item in args.mix.split(","))}
+    unknown = set(mix) - {"greeting", "intent", "full-doc", "llm"}
+    if unknown:
+        parser.error(f"unknown traffic kinds: {', '.join(sorted(unknown))}")
+    mix = {kind: weight for kind, weight in mix.items() if weight > 0}
+    baseline: Dict[int, Dict[str, Any]] = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            previous = json.load(file)
+        baseline = {level["concurrency"]: level for level in previous["levels"]}
+        print(f"Comparing with {args.compare} (commit {previous.get('commit')}, {previous.get('started_at')})")
+
+    use_stub_environment()
+    started_at = datetime.now(timezone.utc).isoformat()
+    rest_server = nullcontext(args.rest_url) if args.rest_url else run_stub_server(
+        create_postgrest_stub, latency=args.db_latency, seed_count=args.documents)
+    with run_stub_server(create_openai_stub, latency=args.openai_latency, token_interval=args.token_interval,
+                         chat_requests_per_second=args.openai_chat_rps) as openai_url, \
+            rest_server as rest_url:
+        env = {
+            "OPENAI_BASE_URL": f"{openai_url}/v1",
+            "SUPABASE_REST_URL": rest_url if args.rest_url else f"{rest_url}/rest/v1",
+            **dict(item.split("=", 1) for item in args.env)
+        }
+        with run_app_server(env, args.lag_interval, args.app_log_level) as url:
+            levels = asyncio.run(run(args, url, mix, baseline))
+
+    if args.output:
+        report = {
+            "commit": _commit(),
+            "started_at": started_at,
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "arguments": {name: value for name, value in vars(args).items() if name not in ("output", "compare")},
+            "levels": levels
+        }
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
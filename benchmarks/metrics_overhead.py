@@ -0,0 +1,131 @@
+"""
+Benchmark: cost of the Prometheus metrics and stage timers.
+
+Two measurements:
+
+- per call: a timed stage (track_stage enter/exit), a histogram observation
+  and a counter increment, with metrics enabled and disabled, and the time to
+  render /metrics once the registry holds the series of a busy process
+- per request: --requests chat requests through ChatService.generate_response
+  against the stub upstreams with no injected latency, so instrumentation is
+  as large a share of the request as it can be. Requests alternate between
+  metrics enabled and disabled so drift affects both alike; reports the mean
+  and median request time of each, the number of histogram observations one
+  request records and their cost at the measured per-call time
+
+Questions are unique and the semantic cache is off, so every request takes
+the full LLM route (session, direct answer, retrieval, prompt, completion,
+store) with its embedding and database calls.
+
+Usage:
+    python -m benchmarks.metrics_overhead --requests 500
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from typing import Dict, List
+
+from benchmarks.stubs import create_openai_stub, create_postgrest_stub, run_stub_server, use_stub_environment
+
+use_stub_environment()
+
+from app.core.config import settings  # noqa: E402
+
+_WORDS = ("buka menu pilih klik tombol simpan isi formulir data pengguna server aplikasi akses layanan "
+          "periksa status konfigurasi unggah berkas verifikasi admin sistem jaringan domain hosting").split()
+
+def _per_call_ns(operation, repeat: int) -> float:
+    start = time.perf_counter_ns()
+    for _ in range(repeat):
+        operation()
+    return (time.perf_counter_ns() - start) / repeat
+
+def micro(args) -> float:
+    """Print per-call costs; returns the enabled cost of a timed stage in ns"""
+    from app.core.metrics import CHAT_REQUESTS, CHAT_STAGE_SECONDS, metrics, track_stage
+
+    def stage() -> None:
+        with track_stage("retrieval"):
+            pass
+
+    operations = {
+        "track_stage": stage,
+        "histogram.observe": lambda: CHAT_STAGE_SECONDS.observe(0.0123, "retrieval"),
+        "counter.inc": lambda: CHAT_REQUESTS.inc("chat", "llm"),
+    }
+    print(f"{'operation':>18} {'enabled ns':>11} {'disabled ns':>12}")
+    for name, operation in operations.items():
+        timings = []
+        for enabled in (True, False):
+            metrics.enabled = enabled
+            timings.append(_per_call_ns(operation, args.repeat))
+        print(f"{name:>18} {timings[0]:>11.0f} {timings[1]:>12.0f}")
+        if name == "track_stage":
+            stage_ns = timings[0]
+    metrics.enabled = True
+
+    start = time.perf_counter()
+    text = metrics.render()
+    print(f"render /metrics: {(time.perf_counter() - start) * 1000:.2f} ms for {len(text.splitlines())} lines")
+    return stage_ns
+
+async def per_request(args, stage_ns: float) -> None:
+    from app.core.metrics import Histogram, metrics
+    from app.models.schemas import ChatRequest
+    from app.services.chat_service import chat_service
+    from app.services.message_buffer import message_buffer
+
+    rng = random.Random(args.seed)
+    durations: Dict[bool, List[float]] = {True: [], False: []}
+    message_buffer.start()
+    try:
+        # Warm up connections, caches and the tokenizer outside the measurement
+        for _ in range(10):
+            await chat_service.generate_response(ChatRequest(message=" ".join(rng.choices(_WORDS, k=8))))
+        metrics.reset()
+        for number in range(2 * args.requests):
+            enabled = number % 2 == 0
+            metrics.enabled = enabled
+            request = ChatRequest(message=f"{' '.join(rng.choices(_WORDS, k=8))} {rng.random()}")
+            start = time.perf_counter()
+            await chat_service.generate_response(request)
+            durations[enabled].append(time.perf_counter() - start)
+        metrics.enabled = True
+        observations = sum(
+            metric.count(*labels) for metric in metrics._metrics if isinstance(metric, Histogram) for labels in metric._series
+        )
+    finally:
+        await message_buffer.stop()
+
+    requests = len(durations[True])
+    print(f"\n{'metrics':>8} {'requests':>9} {'mean ms':>8} {'median ms':>10}")
+    for enabled in (True, False):
+        values = durations[enabled]
+        print(f"{'on' if enabled else 'off':>8} {len(values):>9} {statistics.mean(values) * 1000:>8.3f} "
+              f"{statistics.median(values) * 1000:>10.3f}")
+    difference = statistics.median(durations[True]) - statistics.median(durations[False])
+    print(f"median difference: {difference * 1e6:+.0f} us per request "
+          f"({difference / statistics.median(durations[False]):+.2%})")
+    cost = observations / requests * stage_ns / 1000
+    print(f"{observations / requests:.0f} histogram observations per request, ~{cost:.0f} us at {stage_ns:.0f} ns "
+          f"per timed stage ({cost / 1e6 / statistics.median(durations[False]):.3%} of the median request)")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500, help="chat requests timed with metrics on, and as many off")
+    parser.add_argument("--repeat", type=int, default=200000, help="calls timed per operation")
+    parser.add_argument("--seed", type=int, default=21)
+    args = parser.parse_args()
+    settings.SEMANTIC_CACHE_ENABLED = False
+
+    stage_ns = micro(args)
+    with run_stub_server(create_openai_stub, latency=0.0, token_interval=0.0) as openai_url, \
+            run_stub_server(create_postgrest_stub, latency=0.0, seed_count=50) as rest_url:
+        settings.OPENAI_BASE_URL = f"{openai_url}/v1"
+        settings.SUPABASE_REST_URL = f"{rest_url}/rest/v1"
+        asyncio.run(per_request(args, stage_ns))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Load test: concurrent OpenAI calls against a local stub server.
+
+Fires N chat completions and N embeddings at once through the shared async
+client and compares the wall time with the legacy synchronous client, which
+serializes every call on the event loop.
+
+Usage:
+    python -m benchmarks.openai_concurrency --concurrency 20 --latency 0.5
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.stubs import create_openai_stub, run_stub_server, use_stub_environment
+
+use_stub_environment()
+
+import openai  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.core.openai_client import close_openai_client  # noqa: E402
+from app.services.chat_service import chat_service  # noqa: E402
+from app.services.embedding_service import embedding_service  # noqa: E402
+
+async def _measure_loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Return the worst event loop scheduling delay observed until stopped"""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+async def _run_async(concurrency: int) -> dict:
+    async def one_chat():
+        await chat_service.client.chat.completions.create(
+            model=settings.MODEL_NAME,
+            messages=[{"role": "user", "content": "halo"}],
+            timeout=settings.OPENAI_CHAT_TIMEOUT
+        )
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(_measure_loop_lag(stop))
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(one_chat() for _ in range(concurrency)),
+        *(embedding_service.generate_embedding(f"pertanyaan {i}") for i in range(concurrency))
+    )
+    elapsed = time.perf_counter() - start
+    stop.set()
+    lag = await lag_task
+    await close_openai_client()
+    return {"wall_seconds": elapsed, "max_loop_lag_seconds": lag}
+
+async def _run_sync_baseline(concurrency: int, base_url: str) -> dict:
+    client = openai.OpenAI(api_key=settings.OPENAI_API_KEY, base_url=base_url)
+
+    async def one_chat():
+        # Mirrors the previous implementation: a blocking call inside a coroutine
+        client.chat.completions.create(
+            model=settings.MODEL_NAME,
+            messages=[{"role": "user", "content": "halo"}]
+        )
+
+    async def one_embedding(i: int):
+        client.embeddings.create(model=embedding_service.embedding_model, input=f"pertanyaan {i}")
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(_measure_loop_lag(stop))
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(one_chat() for _ in range(concurrency)),
+        *(one_embedding(i) for i in range(concurrency))
+    )
+    elapsed = time.perf_counter() - start
+    stop.set()
+    lag = await lag_task
+    client.close()
+    return {"wall_seconds": elapsed, "max_loop_lag_seconds": lag}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.5, help="Injected stub latency per request (seconds)")
+    parser.add_argument("--skip-sync", action="store_true", help="Skip the blocking-client baseline")
+    args = parser.parse_args()
+
+    with run_stub_server(create_openai_stub, latency=args.latency) as url:
+        settings.OPENAI_BASE_URL = f"{url}/v1"
+        serialized = 2 * args.concurrency * args.latency
+
+        result = asyncio.run(_run_async(args.concurrency))
+        print(f"async client : {result['wall_seconds']:.2f}s for {2 * args.concurrency} calls "
+              f"(overlap x{serialized / result['wall_seconds']:.1f}, "
+              f"max loop lag {result['max_loop_lag_seconds'] * 1000:.1f}ms)")
+
+        if not args.skip_sync:
+            result = asyncio.run(_run_sync_baseline(args.concurrency, f"{url}/v1"))
+            print(f"sync client  : {result['wall_seconds']:.2f}s for {2 * args.concurrency} calls "
+                  f"(overlap x{serialized / result['wall_seconds']:.1f}, "
+                  f"max loop lag {result['max_loop_lag_seconds'] * 1000:.1f}ms)")
+
+if __name__ == "__main__":
+    main()
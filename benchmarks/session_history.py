@@ -0,0 +1,87 @@
+"""
+Benchmark: request cost of resending the history vs sending conversation_id.
+
+Plays conversations of --turns turns with answers of realistic SOP length
+and, for every turn, builds the request body two ways:
+
+- history: the client resends every previous message in conversation_history
+- session: the client sends conversation_id; the server reads the recent
+  history from the in-memory session store
+
+Reports the request body size and the time to parse and validate it into a
+ChatRequest (plus the session store lookup for the session setup), by turn.
+
+Usage:
+    python -m benchmarks.session_history --turns 30 --repeat 200
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from benchmarks.stubs import use_stub_environment
+
+use_stub_environment()
+
+from app.models.schemas import ChatRequest, Message  # noqa: E402
+
+_WORDS = ("buka menu pilih klik tombol simpan isi formulir data pengguna server aplikasi akses layanan "
+          "periksa status konfigurasi unggah berkas verifikasi admin sistem jaringan domain hosting").split()
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+def _conversation(rng: random.Random, turns: int) -> List[Dict[str, Any]]:
+    messages = []
+    for _ in range(turns):
+        messages.append({"role": "user", "content": _text(rng, rng.randint(5, 20)),
+                         "timestamp": datetime.now(timezone.utc).isoformat()})
+        messages.append({"role": "assistant", "content": _text(rng, rng.randint(80, 300)),
+                         "timestamp": datetime.now(timezone.utc).isoformat()})
+    return messages
+
+async def run(args) -> None:
+    from app.services.session_store import SessionStore
+
+    rng = random.Random(args.seed)
+    messages = _conversation(rng, args.turns)
+    store = SessionStore(max_sessions=10, max_messages=args.history_messages)
+    session_id = str(uuid.uuid4())
+    store._remember(session_id, [])
+
+    print(f"{'turn':>4} {'history bytes':>14} {'history us':>11} {'session bytes':>14} {'session us':>11}")
+    for turn in range(args.turns):
+        question = messages[2 * turn]["content"]
+        history_body = json.dumps({"message": question, "conversation_history": messages[:2 * turn]})
+        session_body = json.dumps({"message": question, "conversation_id": session_id})
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            ChatRequest.model_validate_json(history_body)
+        history_us = (time.perf_counter() - start) / args.repeat * 1e6
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            request = ChatRequest.model_validate_json(session_body)
+            await store.history(str(request.conversation_id))
+        session_us = (time.perf_counter() - start) / args.repeat * 1e6
+
+        if turn + 1 in (1, 2, 5) or (turn + 1) % 10 == 0 or turn + 1 == args.turns:
+            print(f"{turn + 1:>4} {len(history_body):>14} {history_us:>11.1f} {len(session_body):>14} {session_us:>11.1f}")
+        store.append(session_id, [Message(**messages[2 * turn]), Message(**messages[2 * turn + 1])])
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=200, help="parses timed per turn")
+    parser.add_argument("--history-messages", type=int, default=20, help="messages the session store keeps")
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark: import time and time to first request of the API.
+
+Every run starts a fresh interpreter, so nothing is cached between runs but
+the operating system's file cache:
+
+- import: the time to import app.main, measured inside the interpreter
+- ready: from launching uvicorn with app.main:app until GET /health first
+  answers, lifespan startup (warm-up, refresh loops) included
+- first chat: the first POST /api/v1/chat/ answered by the language model,
+  against the stub OpenAI server and stub PostgREST with no injected
+  latency, so only work done by the API is measured; launch to first chat is
+  ready plus this request
+- second chat: the same kind of request once everything is loaded
+
+Reports the median of --runs per --app-dir. To compare with another commit,
+check it out in a worktree and pass both directories; each is imported from
+its own tree with this interpreter.
+
+Usage:
+    python -m benchmarks.startup --runs 10
+    git worktree add /tmp/baseline HEAD~1
+    python -m benchmarks.startup --app-dir /tmp/baseline --app-dir . --runs 10
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.stubs import create_openai_stub, create_postgrest_stub, run_stub_server, use_stub_environment
+
+_IMPORT_SCRIPT = "import time; start = time.perf_counter(); import app.main; print(time.perf_counter() - start)"
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _environment(app_dir: str, env: Dict[str, str]) -> Dict[str, str]:
+    return {**os.environ, **env, "PYTHONPATH": app_dir, "PYTHONDONTWRITEBYTECODE": "1"}
+
+def measure_import(app_dir: str, env: Dict[str, str]) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", _IMPORT_SCRIPT], cwd=app_dir, env=_environment(app_dir, env),
+        capture_output=True, text=True, check=True
+    )
+    return float(output.stdout.strip().splitlines()[-1])
+
+def _chat(client: httpx.Client, url: str, message: str) -> float:
+    start = time.perf_counter()
+    response = client.post(f"{url}/api/v1/chat/", json={"message": message})
+    response.raise_for_status()
+    if response.json().get("model_used") in ("system-greeting", "direct-answer", "kb-direct", "semantic-cache"):
+        raise RuntimeError(f"Chat request was not answered by the language model: {response.json().get('model_used')}")
+    return time.perf_counter() - start
+
+def measure_requests(app_dir: str, env: Dict[str, str], run: int) -> Dict[str, float]:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=app_dir, env=_environment(app_dir, env), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        with httpx.Client(timeout=30.0) as client:
+            while True:
+                try:
+                    if client.get(f"{url}/health", timeout=1.0).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if process.poll() is not None or time.perf_counter() - start > 120:
+                    raise RuntimeError(f"API in {app_dir} failed to start")
+                time.sleep(0.005)
+            ready = time.perf_counter() - start
+            # Unique questions, so neither is answered from the semantic cache
+            first = _chat(client, url, f"apa syarat migrasi website untuk tiket {run}?")
+            second = _chat(client, url, f"berapa lama backup server untuk tiket {run}?")
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    return {"ready": ready, "first chat": first, "launch to first chat": ready + first, "second chat": second}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app-dir", action="append", help="repository checkout to measure (repeatable, default: this one)")
+    parser.add_argument("--runs", type=int, default=10, help="fresh processes per measurement")
+    args = parser.parse_args()
+    app_dirs = [os.path.abspath(path) for path in args.app_dir or [os.getcwd()]]
+
+    use_stub_environment()
+    results: Dict[str, Dict[str, List[float]]] = {}
+    with run_stub_server(create_openai_stub, latency=0.0, token_interval=0.0) as openai_url, \
+            run_stub_server(create_postgrest_stub, latency=0.0, seed_count=50) as rest_url:
+        env = {"OPENAI_BASE_URL": f"{openai_url}/v1", "SUPABASE_REST_URL": f"{rest_url}/rest/v1"}
+        # Alternate between the trees run by run, so drift affects each alike
+        for run in range(args.runs):
+            for app_dir in app_dirs:
+                timings = results.setdefault(app_dir, {})
+                timings.setdefault("import", []).append(measure_import(app_dir, env))
+                for name, value in measure_requests(app_dir, env, run).items():
+                    timings.setdefault(name, []).append(value)
+
+    names = list(next(iter(results.values())))
+    print(f"median of {args.runs} runs, ms")
+    print(f"{'':>22}" + "".join(f"{os.path.basename(path) or path:>16}" for path in app_dirs))
+    for name in names:
+        print(f"{name:>22}" + "".join(f"{statistics.median(results[path][name]) * 1000:>16.0f}" for path in app_dirs))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,674 @@
+"""
+Local stub upstream servers used by the benchmark scripts.
+
+The stubs speak just enough of the upstream wire protocols for the app to run
+against them, with a configurable injected latency per request.
+"""
+import asyncio
+import base64
+import fnmatch
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import socket
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+EMBEDDING_DIMENSION = 1536
+
+@lru_cache(maxsize=20000)
+def _token_vector(token: str, dimension: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(token.encode("utf-8")).digest()[:8], "big")
+    return np.random.default_rng(seed).standard_normal(dimension)
+
+def fake_embedding(text: str, dimension: int = EMBEDDING_DIMENSION) -> List[float]:
+    """
+    Deterministic bag-of-words pseudo-embedding.
+    Texts sharing words get a high cosine similarity, like real embeddings would.
+    """
+    tokens = re.findall(r"\w+", text.lower()) or [""]
+    vector = np.sum([_token_vector(token, dimension) for token in tokens], axis=0)
+    norm = float(np.linalg.norm(vector)) or 1.0
+    return (vector / norm).tolist()
+
+def create_openai_stub(
+    latency: float = 0.5,
+    answer: str = "1. Langkah pertama\n2. Langkah kedua",
+    token_interval: float = 0.01,
+    per_input_latency: float = 0.0,
+    embedding_requests_per_second: float = 0.0,
+    chat_requests_per_second: float = 0.0
+) -> FastAPI:
+    """
+    Create a stub OpenAI server with chat completion and embedding endpoints.
+    Embedding latency grows by ``per_input_latency`` per input; with
+    ``embedding_requests_per_second`` or ``chat_requests_per_second`` set,
+    requests above that rate get a 429 with a Retry-After header, like the
+    real rate limiter.
+    """
+    app = FastAPI()
+    app.state.requests = 0
+    app.state.throttled = 0
+    buckets = {
+        path: {"rate": rate, "tokens": max(rate, 1.0), "updated": time.monotonic()}
+        for path, rate in (("embeddings", embedding_requests_per_second), ("chat", chat_requests_per_second))
+    }
+
+    def _rate_limited(path: str) -> Optional[JSONResponse]:
+        bucket = buckets[path]
+        rate = bucket["rate"]
+        if rate <= 0:
+            return None
+        now = time.monotonic()
+        bucket["tokens"] = min(max(rate, 1.0), bucket["tokens"] + (now - bucket["updated"]) * rate)
+        bucket["updated"] = now
+        if bucket["tokens"] >= 1.0:
+            bucket["tokens"] -= 1.0
+            return None
+        app.state.throttled += 1
+        return JSONResponse(
+            {"error": {"message": "Rate limit reached for requests", "type": "requests", "code": "rate_limit_exceeded"}},
+            status_code=429,
+            headers={"retry-after": f"{(1.0 - bucket['tokens']) / rate:.3f}"}
+        )
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        throttled = _rate_limited("chat")
+        if throttled is not None:
+            return throttled
+        await asyncio.sleep(latency)
+        if body.get("stream"):
+            return StreamingResponse(_stream_completion(body), media_type="text/event-stream")
+        prompt_tokens = sum(len(m.get("content", "").split()) for m in body.get("messages", []))
+        completion_tokens = len(answer.split())
+        return {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-3.5-turbo"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    async def _stream_completion(body: Dict[str, Any]):
+        words = answer.split(" ")
+        for i, word in enumerate(words):
+            chunk = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "gpt-3.5-turbo"),
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": word if i == 0 else f" {word}"},
+                    "finish_reason": None
+                }]
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(token_interval)
+        if (body.get("stream_options") or {}).get("include_usage"):
+            prompt_tokens = sum(len(m.get("content", "").split()) for m in body.get("messages", []))
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words), "total_tokens": prompt_tokens + len(words)}
+            chunk = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "gpt-3.5-turbo"),
+                "choices": [],
+                "usage": usage
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        throttled = _rate_limited("embeddings")
+        if throttled is not None:
+            return throttled
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        await asyncio.sleep(latency + per_input_latency * len(inputs))
+        tokens = sum(len(text.split()) for text in inputs)
+        if body.get("encoding_format") == "base64":
+            # What the SDK requests when NumPy is installed: little-endian float32 bytes
+            encode = lambda vector: base64.b64encode(np.asarray(vector, dtype="<f4").tobytes()).decode("ascii")
+        else:
+            encode = lambda vector: vector
+        # JSONResponse skips FastAPI's per-float jsonable_encoder pass, which dominates for batches of vectors
+        return JSONResponse({
+            "object": "list",
+            "data": [
+                {"object": "embedding", "index": i, "embedding": encode(fake_embedding(text))}
+                for i, text in enumerate(inputs)
+            ],
+            "model": body.get("model", "text-embedding-ada-002"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        })
+
+    return app
+
+def _format_value(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+def _sort_key(value: Any) -> tuple:
+    # Numbers sort numerically (keyset pagination on id relies on it), everything else as text
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (0, value, "")
+    return (1, 0, _format_value(value))
+
+class PostgrestStore:
+    """In-memory tables and RPC functions backing the PostgREST stub"""
+
+    def __init__(self):
+        self.tables: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self.functions: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+            "search_similar_content": self._search_similar_content,
+            "search_similar_chunks": self._search_similar_chunks,
+            "hybrid_search": self._hybrid_search,
+            "bulk_update_embeddings": self._bulk_update_embeddings,
+            "bulk_update_faq_embeddings": self._bulk_update_faq_embeddings,
+            "enqueue_embedding_jobs": self._enqueue_embedding_jobs,
+            "claim_embedding_jobs": self._claim_embedding_jobs,
+            "vector_index_stats": self._vector_index_stats,
+            "rebuild_vector_index": self._rebuild_vector_index,
+        }
+        self._next_id: Dict[str, int] = defaultdict(int)
+        self._unit_vectors: Dict[int, tuple] = {}
+        # Embedding index per table as (method, options); searches are exact whatever it is
+        self.vector_indexes: Dict[str, tuple] = {
+            table: ("hnsw", "m=16, ef_construction=64") for table in ("documents", "document_chunks", "faq_items")
+        }
+
+    def insert(self, table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        row = dict(row)
+        if "id" not in row:
+            self._next_id[table] += 1
+            row["id"] = self._next_id[table]
+        now = datetime.now(timezone.utc).isoformat()
+        row.setdefault("created_at", now)
+        row.setdefault("updated_at", now)
+        self.tables[table].append(row)
+        return row
+
+    def _bulk_update_embeddings(self, params: Dict[str, Any]) -> int:
+        embeddings = {item["id"]: item["embedding"] for item in params["updates"]}
+        now = datetime.now(timezone.utc).isoformat()
+        updated = 0
+        for row in self.tables["documents"]:
+            if row["id"] in embeddings:
+                row["content_embedding"] = embeddings[row["id"]]
+                row["updated_at"] = now
+                updated += 1
+        if params.get("chunks") is not None:
+            existing = {row["id"] for row in self.tables["documents"]}
+            chunks = self.tables["document_chunks"]
+            chunks[:] = [chunk for chunk in chunks if chunk["document_id"] not in embeddings]
+            for item in params["chunks"]:
+                if item["document_id"] in existing:
+                    chunk = {key: value for key, value in item.items() if key != "embedding"}
+                    self.insert("document_chunks", {**chunk, "content_embedding": item["embedding"]})
+        return updated
+
+    def _bulk_update_faq_embeddings(self, params: Dict[str, Any]) -> int:
+        embeddings = {item["id"]: item["embedding"] for item in params["updates"]}
+        now = datetime.now(timezone.utc).isoformat()
+        updated = 0
+        for row in self.tables["faq_items"]:
+            if row["id"] in embeddings:
+                row["content_embedding"] = embeddings[row["id"]]
+                row["updated_at"] = now
+                updated += 1
+        return updated
+
+    def _vector_index_stats(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [
+            {
+                "table_name": table,
+                "row_count": len(self.tables[table]),
+                "embedded_count": sum(row.get("content_embedding") is not None for row in self.tables[table]),
+                "index_name": f"idx_{table}_embedding",
+                "index_method": method,
+                "index_options": options,
+                "index_bytes": 0
+            }
+            for table, (method, options) in self.vector_indexes.items()
+        ]
+
+    def _rebuild_vector_index(self, params: Dict[str, Any]) -> str:
+        table, method = params["target_table"], params["index_method"]
+        if method == "hnsw":
+            options = f"m = {params.get('m', 16)}, ef_construction = {params.get('ef_construction', 64)}"
+        else:
+            options = f"lists = {params['lists']}"
+        self.vector_indexes[table] = (method, options.replace(" = ", "="))
+        return f"idx_{table}_embedding USING {method} ({options})"
+
+    def _unit_vector(self, embedding: List[float]) -> np.ndarray:
+        # Keyed on the list object, so replacing a document's embedding invalidates the entry
+        cached = self._unit_vectors.get(id(embedding))
+        if cached is None or cached[0] is not embedding:
+            vector = np.asarray(embedding, dtype=np.float64)
+            cached = (embedding, vector / (np.linalg.norm(vector) or 1.0))
+            self._unit_vectors[id(embedding)] = cached
+        return cached[1]
+
+    def _enqueue_embedding_jobs(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        document_ids = list(dict.fromkeys(params["document_ids"]))
+        jobs = self.tables["embedding_jobs"]
+        jobs[:] = [job for job in jobs if not (job["document_id"] in document_ids and job["status"] in ("succeeded", "failed"))]
+        pending = {job["document_id"]: job for job in jobs if job["status"] == "pending"}
+        now = datetime.now(timezone.utc).isoformat()
+        queued = []
+        for document_id in document_ids:
+            job = pending.get(document_id)
+            if job is not None:
+                job.update({"run_after": now, "attempts": 0, "last_error": None, "updated_at": now})
+            else:
+                job = self.insert("embedding_jobs", {
+                    "document_id": document_id, "status": "pending", "attempts": 0,
+                    "max_attempts": params.get("max_attempts", 5), "run_after": now,
+                    "locked_by": None, "locked_until": None, "last_error": None
+                })
+            queued.append(job)
+        return queued
+
+    def _claim_embedding_jobs(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        jobs = self.tables["embedding_jobs"]
+        leased = {job["document_id"] for job in jobs
+                  if job["status"] == "running" and datetime.fromisoformat(job["locked_until"]) >= now}
+        due = [job for job in jobs
+               if (job["status"] == "pending" and datetime.fromisoformat(job["run_after"]) <= now)
+               or (job["status"] == "running" and datetime.fromisoformat(job["locked_until"]) < now)]
+        due.sort(key=lambda job: (job["run_after"], job["id"]))
+        claimed = []
+        for job in due:
+            if len(claimed) >= params.get("batch_size", 16):
+                break
+            if job["document_id"] in leased:
+                continue
+            leased.add(job["document_id"])
+            job.update({
+                "status": "running",
+                "attempts": job["attempts"] + 1,
+                "locked_by": params["worker_id"],
+                "locked_until": (now + timedelta(seconds=params.get("lease_seconds", 300))).isoformat(),
+                "updated_at": now.isoformat()
+            })
+            claimed.append(dict(job))
+        return claimed
+
+    def _search_similar_content(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        query = np.asarray(params["query_embedding"], dtype=np.float64)
+        query /= np.linalg.norm(query) or 1.0
+        threshold = params.get("match_threshold", 0.7)
+        docs = [doc for doc in self.tables["documents"] if doc.get("is_active", True) and doc.get("content_embedding")]
+        hits = []
+        if docs:
+            similarities = np.stack([self._unit_vector(doc["content_embedding"]) for doc in docs]) @ query
+            hits = [
+                {
+                    "id": doc["id"],
+                    "title": doc["title"],
+                    "content": doc["content"],
+                    "document_type": doc.get("document_type"),
+                    "similarity": float(similarity),
+                    "source": "document"
+                }
+                for doc, similarity in zip(docs, similarities) if similarity > threshold
+            ]
+        items, similarities = self._active_faq_items(params)
+        hits.extend(
+            {key: value for key, value in self._faq_hit(item, similarity).items() if key in
+             ("id", "title", "content", "document_type", "similarity", "source")}
+            for item, similarity in zip(items, similarities) if similarity > threshold
+        )
+        hits.sort(key=lambda d: d["similarity"], reverse=True)
+        return hits[:params.get("match_count", 5)]
+
+    def _active_faq_items(self, params: Dict[str, Any]) -> tuple:
+        """Active FAQ items with an embedding and their cosine similarity to the query embedding"""
+        query = np.asarray(params["query_embedding"], dtype=np.float64)
+        query /= np.linalg.norm(query) or 1.0
+        items = [item for item in self.tables["faq_items"] if item.get("is_active", True) and item.get("content_embedding")]
+        if not items:
+            return [], np.zeros(0)
+        return items, np.stack([self._unit_vector(item["content_embedding"]) for item in items]) @ query
+
+    def _faq_hit(self, item: Dict[str, Any], similarity: float) -> Dict[str, Any]:
+        """An FAQ item as a hybrid_search row: chunk 0 of no document, titled with its question or category"""
+        names = [next((row["name"] for row in self.tables[table] if row["id"] == item.get(key)), "")
+                 for table, key in (("faq_categories", "category_id"), ("faq_subcategories", "subcategory_id"))]
+        return {
+            "id": item["id"],
+            "document_id": None,
+            "chunk_index": 0,
+            "content": item["answer"],
+            "start_offset": 0,
+            "end_offset": len(item["answer"]),
+            "title": item.get("question") or " - ".join(names),
+            "document_type": "faq",
+            "similarity": float(similarity),
+            "source": "faq"
+        }
+
+    def _active_chunks(self, params: Dict[str, Any]) -> tuple:
+        """Chunks of active documents with their cosine similarity to the query embedding"""
+        query = np.asarray(params["query_embedding"], dtype=np.float64)
+        query /= np.linalg.norm(query) or 1.0
+        documents = {doc["id"]: doc for doc in self.tables["documents"] if doc.get("is_active", True)}
+        chunks = [chunk for chunk in self.tables["document_chunks"]
+                  if chunk["document_id"] in documents and chunk.get("content_embedding")]
+        if not chunks:
+            return documents, [], np.zeros(0)
+        return documents, chunks, np.stack([self._unit_vector(chunk["content_embedding"]) for chunk in chunks]) @ query
+
+    @staticmethod
+    def _chunk_hit(documents: Dict[int, Dict[str, Any]], chunk: Dict[str, Any], similarity: float) -> Dict[str, Any]:
+        return {
+            **{key: chunk[key] for key in ("id", "document_id", "chunk_index", "content", "start_offset", "end_offset")},
+            "title": documents[chunk["document_id"]]["title"],
+            "document_type": documents[chunk["document_id"]].get("document_type"),
+            "similarity": float(similarity),
+            "source": "document"
+        }
+
+    def _search_similar_chunks(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        threshold = params.get("match_threshold", 0.7)
+        documents, chunks, similarities = self._active_chunks(params)
+        hits = [self._chunk_hit(documents, chunk, similarity)
+                for chunk, similarity in zip(chunks, similarities) if similarity > threshold]
+        hits.sort(key=lambda c: c["similarity"], reverse=True)
+        return hits[:params.get("match_count", 8)]
+
+    def _hybrid_search(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """hybrid_search: vector and OR-matched word-overlap candidates over chunks and FAQ items, fused by reciprocal rank"""
+        threshold = params.get("match_threshold", 0.3)
+        candidates = params.get("candidate_count", 30)
+        rrf_k = params.get("rrf_k", 60)
+        documents, chunks, chunk_similarities = self._active_chunks(params)
+        items, item_similarities = self._active_faq_items(params)
+        rows = ([(self._chunk_hit(documents, chunk, similarity), chunk["content"])
+                 for chunk, similarity in zip(chunks, chunk_similarities)]
+                + [(self._faq_hit(item, similarity), f"{item.get('question') or ''} {item['answer']}")
+                   for item, similarity in zip(items, item_similarities)])
+        similarities = np.asarray([hit["similarity"] for hit, _ in rows])
+
+        nearest = np.argsort(-similarities)[:candidates]
+        vector_positions = {int(i): position for position, i in
+                            enumerate((i for i in nearest if similarities[i] > threshold), 1)}
+
+        # Stand-in for ts_rank_cd: distinct query words matched, then total occurrences
+        words = set(re.findall(r"\w{3,}", params["query_text"].lower()))
+        text_ranks = {}
+        for i, (_, text) in enumerate(rows):
+            tokens = re.findall(r"\w+", text.lower())
+            matched = words.intersection(tokens)
+            if matched:
+                text_ranks[i] = len(matched) + sum(tokens.count(w) for w in matched) / (len(tokens) + 1)
+        ranked = sorted(text_ranks, key=text_ranks.get, reverse=True)[:candidates]
+        text_positions = {i: position for position, i in enumerate(ranked, 1)}
+
+        hits = []
+        for i in set(vector_positions) | set(text_positions):
+            vector_position, text_position = vector_positions.get(i), text_positions.get(i)
+            score = sum(1.0 / (rrf_k + position) for position in (vector_position, text_position) if position)
+            hits.append({
+                **rows[i][0],
+                "text_rank": text_ranks.get(i) if text_position else None,
+                "vector_position": vector_position,
+                "text_position": text_position,
+                "score": score
+            })
+        hits.sort(key=lambda c: c["score"], reverse=True)
+        return hits[:params.get("match_count", 8)]
+
+def _row_matches(row: Dict[str, Any], column: str, expression: str) -> bool:
+    op, _, arg = expression.partition(".")
+    if op == "not":
+        return not _row_matches(row, column, arg)
+    if op.startswith(("fts", "plfts", "phfts", "wfts")):
+        _, _, arg = expression.partition(".")
+        text = row.get(column)
+        if text is None:
+            text = " ".join(str(v) for v in row.values() if isinstance(v, str))
+        words = re.findall(r"\w+", arg.lower())
+        return bool(words) and all(w in text.lower() for w in words)
+    value = row.get(column)
+    if isinstance(value, bool) or value is None:
+        # Postgres accepts booleans and null case-insensitively ("True", "NULL")
+        arg = arg.lower()
+    if op == "eq":
+        return _format_value(value) == arg
+    if op == "neq":
+        return _format_value(value) != arg
+    if op == "is":
+        return _format_value(value) == arg
+    if op in ("like", "ilike"):
+        pattern = arg.replace("%", "*")
+        if op == "ilike":
+            return fnmatch.fnmatch(str(value or "").lower(), pattern.lower())
+        return fnmatch.fnmatchcase(str(value or ""), pattern)
+    if op == "in":
+        return _format_value(value) in arg.strip("()").split(",")
+    if op == "cs":
+        return set(arg.strip("{}").split(",")) <= set(value or [])
+    if op in ("gt", "gte", "lt", "lte"):
+        if value is None:
+            return False
+        try:
+            left, right = float(value), float(arg)
+        except (TypeError, ValueError):
+            left, right = str(value), arg
+        return {"gt": left > right, "gte": left >= right, "lt": left < right, "lte": left <= right}[op]
+    return True
+
+_RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+def _filter_rows(rows: List[Dict[str, Any]], params) -> List[Dict[str, Any]]:
+    for column, expression in params.multi_items():
+        if column in _RESERVED_PARAMS:
+            continue
+        rows = [row for row in rows if _row_matches(row, column, expression)]
+    return rows
+
+def _split_select(select: str) -> List[str]:
+    """Split a select list on top-level commas: "name,faq_subcategories(name,faq_items(answer))" """
+    items, depth, current = [], 0, ""
+    for char in select:
+        if char == "," and depth == 0:
+            items.append(current.strip())
+            current = ""
+            continue
+        depth += (char == "(") - (char == ")")
+        current += char
+    if current.strip():
+        items.append(current.strip())
+    return items
+
+def _foreign_key(table: str) -> str:
+    """Column referencing a table by the naming convention of schema.sql: faq_categories -> category_id"""
+    name = table.rsplit("_", 1)[-1]
+    name = name[:-3] + "y" if name.endswith("ies") else name.rstrip("s")
+    return f"{name}_id"
+
+def _select_columns(store: "PostgrestStore", table: str, rows: List[Dict[str, Any]], select: str) -> List[Dict[str, Any]]:
+    """Apply a select list, embedding related tables (one-to-many and many-to-one) like PostgREST"""
+    items = _split_select(select or "*")
+    selected = []
+    for row in rows:
+        result = dict(row) if "*" in items else {}
+        for item in items:
+            if "(" not in item:
+                if item != "*":
+                    result[item] = row.get(item)
+                continue
+            related, _, columns = item.partition("(")
+            columns = columns[:-1]
+            key = _foreign_key(related)
+            if key in row:
+                # Many-to-one: this row references the related table
+                parents = [parent for parent in store.tables[related] if parent.get("id") == row[key]]
+                result[related] = (_select_columns(store, related, parents, columns) or [None])[0]
+            else:
+                children = [child for child in store.tables[related] if child.get(_foreign_key(table)) == row.get("id")]
+                result[related] = _select_columns(store, related, children, columns)
+        selected.append(result)
+    return selected
+
+def create_postgrest_stub(latency: float = 0.02, seed_count: int = 0, seed_embeddings: bool = True) -> FastAPI:
+    """Create a stub PostgREST server serving tables and RPC functions from memory"""
+    app = FastAPI()
+    app.state.store = PostgrestStore()
+    seed_documents(app.state.store, count=seed_count, with_embeddings=seed_embeddings)
+    app.state.requests = 0
+
+    @app.post("/rest/v1/rpc/{function}")
+    async def rpc(function: str, request: Request):
+        app.state.requests += 1
+        await asyncio.sleep(latency)
+        handler = app.state.store.functions.get(function)
+        if handler is None:
+            return JSONResponse({"message": f"function {function} not found"}, status_code=404)
+        params = await request.json() if await request.body() else {}
+        return handler(params)
+
+    @app.api_route("/rest/v1/{table}", methods=["GET", "POST", "PATCH", "DELETE"])
+    async def table(table: str, request: Request):
+        app.state.requests += 1
+        await asyncio.sleep(latency)
+        store: PostgrestStore = app.state.store
+        params = request.query_params
+
+        if request.method == "POST":
+            payload = await request.json()
+            rows = payload if isinstance(payload, list) else [payload]
+            prefer = request.headers.get("prefer", "")
+            if "resolution=ignore-duplicates" in prefer:
+                key = params.get("on_conflict") or "id"
+                existing = {row.get(key) for row in store.tables[table]}
+                rows = [row for row in rows if row.get(key) not in existing]
+            inserted = [store.insert(table, row) for row in rows]
+            if "return=minimal" in prefer:
+                return Response(status_code=201)
+            return JSONResponse(inserted, status_code=201)
+
+        rows = _filter_rows(store.tables[table], params)
+
+        if request.method == "PATCH":
+            changes = await request.json()
+            for row in rows:
+                if table == "faq_items" and any(key in changes and changes[key] != row.get(key) for key in ("question", "answer")):
+                    # reset_faq_items_embedding trigger
+                    row["content_embedding"] = None
+                row.update(changes)
+                row["updated_at"] = datetime.now(timezone.utc).isoformat()
+            return rows
+
+        if request.method == "DELETE":
+            store.tables[table] = [row for row in store.tables[table] if row not in rows]
+            return rows
+
+        for spec in reversed((params.get("order") or "").split(",")):
+            if not spec:
+                continue
+            column, _, direction = spec.partition(".")
+            rows = sorted(rows, key=lambda r: _sort_key(r.get(column)), reverse=direction.startswith("desc"))
+        total = len(rows)
+        offset = int(params.get("offset", 0))
+        limit = params.get("limit")
+        rows = rows[offset:offset + int(limit)] if limit is not None else rows[offset:]
+        rows = _select_columns(store, table, rows, params.get("select") or "*")
+        headers = {}
+        if "count=exact" in request.headers.get("prefer", ""):
+            headers["content-range"] = f"{offset}-{offset + len(rows) - 1}/{total}" if rows else f"*/{total}"
+        return JSONResponse(rows, headers=headers)
+
+    return app
+
+def seed_documents(store: PostgrestStore, count: int = 50, with_embeddings: bool = True) -> None:
+    """Populate the stub store with synthetic SOP documents and (optionally) their embeddings"""
+    topics = ["migrasi website", "pembuatan website baru", "reset password email", "permohonan domain",
+              "backup server", "sertifikat ssl", "akun vpn", "hosting aplikasi", "pemulihan data", "email dinas"]
+    for i in range(count):
+        topic = topics[i % len(topics)]
+        steps = "\n".join(f"{n}. Langkah {n} untuk {topic} nomor {i}" for n in range(1, 15))
+        title = f"SOP {topic.title()} {i}"
+        content = f"Prosedur {topic}:\n{steps}"
+        store.insert("documents", {
+            "title": title,
+            "content": content,
+            "document_type": "sop",
+            "tags": [topic.split()[0]],
+            "content_embedding": fake_embedding(f"{title} {content}") if with_embeddings else None,
+            "is_active": True
+        })
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _serve(factory: Callable[..., FastAPI], kwargs: Dict[str, Any], port: int) -> None:
+    uvicorn.run(factory(**kwargs), host="127.0.0.1", port=port, log_level="warning", lifespan="off")
+
+@contextmanager
+def run_stub_server(factory: Callable[..., FastAPI], port: int = 0, **kwargs) -> Iterator[str]:
+    """
+    Run a stub app built by ``factory(**kwargs)`` in a child process and yield its base URL.
+    A separate process keeps the stub from competing with the code under test for the GIL.
+    """
+    port = port or _free_port()
+    process = multiprocessing.Process(target=_serve, args=(factory, kwargs, port), daemon=True)
+    process.start()
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                break
+        except OSError:
+            if time.monotonic() > deadline or not process.is_alive():
+                process.terminate()
+                raise RuntimeError(f"Stub server {factory.__name__} failed to start on port {port}")
+            time.sleep(0.05)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        process.join(timeout=5)
+
+def use_stub_environment() -> None:
+    """Provide placeholder credentials so the app settings validate without real upstreams"""
+    os.environ.setdefault("OPENAI_API_KEY", "sk-stub")
+    os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+    os.environ.setdefault("SUPABASE_ANON_KEY", "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.stub")
+    os.environ.setdefault("DEBUG", "False")
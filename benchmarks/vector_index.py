@@ -0,0 +1,63 @@
+"""
+Micro-benchmark for the in-process document vector index.
+
+Builds an index of synthetic 1536-dim embeddings, checks that its top-k
+results match a brute-force float64 reference (same threshold/limit
+semantics as the search_similar_content RPC) and reports query latency.
+
+Usage:
+    python -m benchmarks.vector_index --documents 5000 --queries 500
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from benchmarks.stubs import use_stub_environment
+
+use_stub_environment()
+
+from app.core.vector_index import VectorIndex  # noqa: E402
+
+def _reference_search(embeddings: np.ndarray, ids, query: np.ndarray, threshold: float, limit: int):
+    sims = embeddings @ query / (np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query))
+    order = [i for i in np.argsort(-sims, kind="stable") if sims[i] > threshold]
+    return [ids[i] for i in order[:limit]]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--threshold", type=float, default=0.3)
+    parser.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    centers = rng.normal(size=(50, args.dimension))
+    embeddings = centers[rng.integers(0, 50, args.documents)] + rng.normal(scale=0.8, size=(args.documents, args.dimension))
+    ids = list(range(1, args.documents + 1))
+
+    index = VectorIndex(dimension=args.dimension)
+    start = time.perf_counter()
+    index.load({"id": i, "title": f"Doc {i}", "content": "", "content_embedding": e.tolist()} for i, e in zip(ids, embeddings))
+    print(f"load: {len(index)} vectors in {(time.perf_counter() - start) * 1000:.0f}ms "
+          f"({index._matrix.nbytes / 1e6:.1f} MB float32)")
+
+    queries = centers[rng.integers(0, 50, args.queries)] + rng.normal(scale=0.8, size=(args.queries, args.dimension))
+    latencies, mismatches = [], 0
+    for query in queries:
+        start = time.perf_counter()
+        hits = index.search(query.tolist(), threshold=args.threshold, limit=args.limit)
+        latencies.append(time.perf_counter() - start)
+        if [h["id"] for h in hits] != _reference_search(embeddings, ids, query, args.threshold, args.limit):
+            mismatches += 1
+
+    latencies.sort()
+    print(f"search: p50={statistics.median(latencies) * 1000:.2f}ms "
+          f"p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f}ms over {args.queries} queries")
+    print(f"parity with brute-force reference: {args.queries - mismatches}/{args.queries} identical result lists")
+
+if __name__ == "__main__":
+    main()
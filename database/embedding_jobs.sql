@@ -0,0 +1,84 @@
+-- Durable queue for embedding work
+-- Run this in your Supabase SQL Editor after vector_schema.sql
+-- Jobs are processed by worker.py, outside the API processes.
+
+CREATE TABLE IF NOT EXISTS embedding_jobs (
+    id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    document_id BIGINT NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'running', 'succeeded', 'failed')),
+    attempts INT NOT NULL DEFAULT 0,
+    max_attempts INT NOT NULL DEFAULT 5,
+    run_after TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    locked_by TEXT,
+    locked_until TIMESTAMPTZ,
+    last_error TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- At most one queued job per document: enqueueing again while a job waits is a no-op
+CREATE UNIQUE INDEX IF NOT EXISTS idx_embedding_jobs_pending_document
+ON embedding_jobs(document_id) WHERE status = 'pending';
+
+CREATE INDEX IF NOT EXISTS idx_embedding_jobs_claim
+ON embedding_jobs(run_after, id) WHERE status IN ('pending', 'running');
+
+CREATE INDEX IF NOT EXISTS idx_embedding_jobs_document
+ON embedding_jobs(document_id, id DESC);
+
+DROP TRIGGER IF EXISTS update_embedding_jobs_updated_at ON embedding_jobs;
+CREATE TRIGGER update_embedding_jobs_updated_at BEFORE UPDATE ON embedding_jobs
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- Queue an embedding job per document.
+-- Jobs read the document when they run, so a document with a pending job
+-- needs no second one; its retry delay is cleared instead. Finished jobs of
+-- the same documents are superseded and removed, which keeps the table at
+-- roughly one row per document.
+CREATE OR REPLACE FUNCTION enqueue_embedding_jobs(document_ids bigint[], max_attempts int DEFAULT 5)
+RETURNS SETOF embedding_jobs
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    DELETE FROM embedding_jobs j
+    WHERE j.document_id = ANY(document_ids) AND j.status IN ('succeeded', 'failed');
+
+    RETURN QUERY
+    INSERT INTO embedding_jobs (document_id, max_attempts)
+    SELECT DISTINCT unnest(document_ids), enqueue_embedding_jobs.max_attempts
+    ON CONFLICT (document_id) WHERE status = 'pending'
+    DO UPDATE SET run_after = NOW(), attempts = 0, last_error = NULL
+    RETURNING *;
+END;
+$$;
+
+-- Claim up to batch_size due jobs for one worker.
+-- SKIP LOCKED lets any number of workers claim concurrently without waiting
+-- on each other. Running jobs whose lease expired (crashed worker) are
+-- claimed again; a document is never claimed while another worker holds a
+-- live lease on it, so an older embedding cannot overwrite a newer one.
+CREATE OR REPLACE FUNCTION claim_embedding_jobs(worker_id text, batch_size int DEFAULT 16, lease_seconds int DEFAULT 300)
+RETURNS SETOF embedding_jobs
+LANGUAGE sql
+AS $$
+    UPDATE embedding_jobs j
+    SET status = 'running',
+        attempts = j.attempts + 1,
+        locked_by = worker_id,
+        locked_until = NOW() + make_interval(secs => lease_seconds)
+    WHERE j.id IN (
+        SELECT c.id
+        FROM embedding_jobs c
+        WHERE ((c.status = 'pending' AND c.run_after <= NOW())
+            OR (c.status = 'running' AND c.locked_until < NOW()))
+        AND NOT EXISTS (
+            SELECT 1 FROM embedding_jobs r
+            WHERE r.document_id = c.document_id AND r.id <> c.id
+            AND r.status = 'running' AND r.locked_until >= NOW()
+        )
+        ORDER BY c.run_after, c.id
+        LIMIT batch_size
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING j.*;
+$$;
@@ -8,10 +8,13 @@ CREATE EXTENSION IF NOT EXISTS vector;
 ALTER TABLE faq_items 
 ADD COLUMN IF NOT EXISTS content_embedding vector(1536);
 
--- Create index for vector similarity search
+-- Create index for vector similarity search. HNSW needs no training data, so
+-- unlike ivfflat it can be built on an empty table; manage_vector_indexes.py
+-- inspects the corpus and rebuilds the vector indexes (HNSW or ivfflat sized
+-- to the table) as it grows.
 CREATE INDEX IF NOT EXISTS idx_faq_items_embedding 
-ON faq_items USING ivfflat (content_embedding vector_cosine_ops) 
-WITH (lists = 100);
+ON faq_items USING hnsw (content_embedding vector_cosine_ops) 
+WITH (m = 16, ef_construction = 64);
 
 -- Add full-text search capability
 ALTER TABLE faq_items 
@@ -24,6 +27,24 @@ GENERATED ALWAYS AS (
 CREATE INDEX IF NOT EXISTS idx_faq_items_search_content 
 ON faq_items USING gin(search_content);
 
+-- An edited question or answer needs a new embedding: clear the old one so the
+-- next embedding backfill ("missing" mode) embeds the item again
+CREATE OR REPLACE FUNCTION reset_faq_item_embedding()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF NEW.question IS DISTINCT FROM OLD.question OR NEW.answer IS DISTINCT FROM OLD.answer THEN
+        NEW.content_embedding := NULL;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS reset_faq_items_embedding ON faq_items;
+CREATE TRIGGER reset_faq_items_embedding BEFORE UPDATE ON faq_items
+    FOR EACH ROW EXECUTE FUNCTION reset_faq_item_embedding();
+
 -- Create documents table for additional knowledge base
 CREATE TABLE IF NOT EXISTS documents (
     id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
@@ -42,8 +63,8 @@ CREATE TABLE IF NOT EXISTS documents (
 
 -- Create indexes for documents
 CREATE INDEX IF NOT EXISTS idx_documents_embedding 
-ON documents USING ivfflat (content_embedding vector_cosine_ops) 
-WITH (lists = 100);
+ON documents USING hnsw (content_embedding vector_cosine_ops) 
+WITH (m = 16, ef_construction = 64);
 
 CREATE INDEX IF NOT EXISTS idx_documents_search_content 
 ON documents USING gin(search_content);
@@ -51,33 +72,445 @@ ON documents USING gin(search_content);
 CREATE INDEX IF NOT EXISTS idx_documents_type_active 
 ON documents(document_type, is_active);
 
--- Function to search similar content
+-- Keep updated_at current so in-process indexes can detect changed rows
+DROP TRIGGER IF EXISTS update_documents_updated_at ON documents;
+CREATE TRIGGER update_documents_updated_at BEFORE UPDATE ON documents 
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- Chunks of long documents, split along numbered steps and paragraphs and
+-- embedded separately so retrieval can return the relevant steps only.
+-- content = documents.content[start_offset:end_offset] (0-based, end exclusive)
+CREATE TABLE IF NOT EXISTS document_chunks (
+    id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    document_id BIGINT NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    chunk_index INT NOT NULL,
+    content TEXT NOT NULL,
+    start_offset INT NOT NULL,
+    end_offset INT NOT NULL,
+    content_embedding vector(1536),
+    search_content tsvector GENERATED ALWAYS AS (
+        to_tsvector('indonesian', content)
+    ) STORED,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    UNIQUE (document_id, chunk_index)
+);
+
+CREATE INDEX IF NOT EXISTS idx_document_chunks_embedding 
+ON document_chunks USING hnsw (content_embedding vector_cosine_ops) 
+WITH (m = 16, ef_construction = 64);
+
+CREATE INDEX IF NOT EXISTS idx_document_chunks_search_content 
+ON document_chunks USING gin(search_content);
+
+-- Bulk embedding writes for the backfill pipeline and the embedding worker.
+-- PostgREST upserts cannot target documents (GENERATED ALWAYS id, NOT NULL
+-- title/content), so batches are applied with one UPDATE ... FROM.
+-- updates: [{"id": 1, "embedding": [0.1, ...]}, ...]
+-- chunks (optional): [{"document_id": 1, "chunk_index": 0, "content": "...",
+--   "start_offset": 0, "end_offset": 780, "embedding": [0.1, ...]}, ...]
+-- When chunks is given, the chunks of every updated document are replaced.
+DROP FUNCTION IF EXISTS bulk_update_embeddings(jsonb);
+CREATE OR REPLACE FUNCTION bulk_update_embeddings(updates jsonb, chunks jsonb DEFAULT NULL)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    updated_count integer;
+BEGIN
+    WITH batch AS (
+        SELECT (item->>'id')::bigint AS id, (item->>'embedding')::vector(1536) AS embedding
+        FROM jsonb_array_elements(updates) AS item
+    ), updated AS (
+        UPDATE documents d
+        SET content_embedding = batch.embedding
+        FROM batch
+        WHERE d.id = batch.id
+        RETURNING d.id
+    )
+    SELECT count(*)::integer INTO updated_count FROM updated;
+
+    IF chunks IS NOT NULL THEN
+        DELETE FROM document_chunks c
+        USING jsonb_array_elements(updates) AS item
+        WHERE c.document_id = (item->>'id')::bigint;
+
+        INSERT INTO document_chunks (document_id, chunk_index, content, start_offset, end_offset, content_embedding)
+        SELECT
+            (item->>'document_id')::bigint,
+            (item->>'chunk_index')::int,
+            item->>'content',
+            (item->>'start_offset')::int,
+            (item->>'end_offset')::int,
+            (item->>'embedding')::vector(1536)
+        FROM jsonb_array_elements(chunks) AS item
+        -- Skip chunks of documents deleted since they were read
+        WHERE EXISTS (SELECT 1 FROM documents d WHERE d.id = (item->>'document_id')::bigint);
+    END IF;
+
+    RETURN updated_count;
+END;
+$$;
+
+-- FAQ embedding writes for the backfill pipeline, one UPDATE ... FROM per batch.
+-- updates: [{"id": 1, "embedding": [0.1, ...]}, ...]
+CREATE OR REPLACE FUNCTION bulk_update_faq_embeddings(updates jsonb)
+RETURNS integer
+LANGUAGE sql
+AS $$
+    WITH batch AS (
+        SELECT (item->>'id')::bigint AS id, (item->>'embedding')::vector(1536) AS embedding
+        FROM jsonb_array_elements(updates) AS item
+    ), updated AS (
+        UPDATE faq_items f
+        SET content_embedding = batch.embedding
+        FROM batch
+        WHERE f.id = batch.id
+        RETURNING f.id
+    )
+    SELECT count(*)::integer FROM updated;
+$$;
+
+-- Per-query ANN search settings for the vector search functions below: the
+-- ivfflat lists probed (ivfflat.probes) and the HNSW candidate list size
+-- (hnsw.ef_search). More means better recall and slower queries; NULL keeps
+-- the server setting. set_config(..., true) lasts until the end of the
+-- transaction, i.e. the PostgREST request.
+CREATE OR REPLACE FUNCTION set_vector_search_options(ivfflat_probes int DEFAULT NULL, hnsw_ef_search int DEFAULT NULL)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF ivfflat_probes IS NOT NULL THEN
+        PERFORM set_config('ivfflat.probes', ivfflat_probes::text, true);
+    END IF;
+    IF hnsw_ef_search IS NOT NULL THEN
+        PERFORM set_config('hnsw.ef_search', hnsw_ef_search::text, true);
+    END IF;
+END;
+$$;
+
+-- Function to search similar content: whole documents and FAQ items ranked
+-- together by similarity. source ('document' or 'faq') tells them apart, as
+-- their ids come from different tables; FAQ items are titled with their
+-- question, or "Category - Subcategory" when they have none. ivfflat_probes
+-- and hnsw_ef_search are passed to set_vector_search_options.
+DROP FUNCTION IF EXISTS search_similar_content(vector, float, int);
 CREATE OR REPLACE FUNCTION search_similar_content(
     query_embedding vector(1536),
     match_threshold float DEFAULT 0.7,
-    match_count int DEFAULT 5
+    match_count int DEFAULT 5,
+    ivfflat_probes int DEFAULT NULL,
+    hnsw_ef_search int DEFAULT NULL
 )
 RETURNS TABLE (
     id bigint,
     title text,
     content text,
     document_type text,
+    similarity float,
+    source text
+)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+BEGIN
+    PERFORM set_vector_search_options(ivfflat_probes, hnsw_ef_search);
+    RETURN QUERY
+    SELECT hits.id, hits.title, hits.content, hits.document_type, hits.similarity, hits.source
+    FROM (
+        -- Nearest rows of each table first so the ANN indexes serve each ORDER BY ... LIMIT
+        (SELECT
+            d.id,
+            d.title,
+            d.content,
+            d.document_type,
+            1 - (d.content_embedding <=> query_embedding) AS similarity,
+            'document'::text AS source
+        FROM documents d
+        WHERE d.is_active = true
+        ORDER BY d.content_embedding <=> query_embedding
+        LIMIT match_count)
+        UNION ALL
+        (SELECT
+            f.id,
+            coalesce(f.question, fc.name || ' - ' || fs.name),
+            f.answer,
+            'faq'::text,
+            1 - (f.content_embedding <=> query_embedding),
+            'faq'::text
+        FROM faq_items f
+        LEFT JOIN faq_categories fc ON fc.id = f.category_id
+        LEFT JOIN faq_subcategories fs ON fs.id = f.subcategory_id
+        WHERE f.is_active = true
+        ORDER BY f.content_embedding <=> query_embedding
+        LIMIT match_count)
+    ) hits
+    WHERE hits.similarity > match_threshold
+    ORDER BY hits.similarity DESC
+    LIMIT match_count;
+END;
+$$;
+
+-- Function to search similar chunks of active documents
+DROP FUNCTION IF EXISTS search_similar_chunks(vector, float, int);
+CREATE OR REPLACE FUNCTION search_similar_chunks(
+    query_embedding vector(1536),
+    match_threshold float DEFAULT 0.7,
+    match_count int DEFAULT 8,
+    ivfflat_probes int DEFAULT NULL,
+    hnsw_ef_search int DEFAULT NULL
+)
+RETURNS TABLE (
+    id bigint,
+    document_id bigint,
+    chunk_index int,
+    content text,
+    start_offset int,
+    end_offset int,
+    title text,
+    document_type text,
     similarity float
 )
 LANGUAGE plpgsql
 AS $$
 BEGIN
+    PERFORM set_vector_search_options(ivfflat_probes, hnsw_ef_search);
     RETURN QUERY
     SELECT 
-        d.id,
+        c.id,
+        c.document_id,
+        c.chunk_index,
+        c.content,
+        c.start_offset,
+        c.end_offset,
         d.title,
-        d.content,
         d.document_type,
-        1 - (d.content_embedding <=> query_embedding) as similarity
-    FROM documents d
+        1 - (c.content_embedding <=> query_embedding) as similarity
+    FROM document_chunks c
+    JOIN documents d ON d.id = c.document_id
     WHERE d.is_active = true
-    AND 1 - (d.content_embedding <=> query_embedding) > match_threshold
-    ORDER BY d.content_embedding <=> query_embedding
+    AND 1 - (c.content_embedding <=> query_embedding) > match_threshold
+    ORDER BY c.content_embedding <=> query_embedding
     LIMIT match_count;
 END;
-$$;
\ No newline at end of file
+$$;
+
+-- Hybrid chunk search in one round-trip: pgvector similarity and Indonesian
+-- full-text ranking over document chunks and FAQ items, fused with
+-- reciprocal-rank fusion (score = sum over signals of 1 / (rrf_k + rank)).
+-- Each signal contributes its best candidate_count rows, so a row found by
+-- both ranks highest.
+-- Keep candidate_count close to match_count: with long candidate lists the
+-- many rows both signals rank moderately crowd out the best hit of one.
+-- The question is matched with OR semantics, so rows sharing only some of
+-- its words (codes, names, error messages) are still candidates.
+-- ivfflat_probes and hnsw_ef_search as in search_similar_content.
+-- similarity is computed for every returned row; text_rank, vector_position
+-- and text_position are NULL for rows the signal did not find.
+-- FAQ items (source 'faq') come back whole as chunk 0 of no document, titled
+-- like in search_similar_content.
+DROP FUNCTION IF EXISTS hybrid_search(text, vector, float, int, int, int);
+CREATE OR REPLACE FUNCTION hybrid_search(
+    query_text text,
+    query_embedding vector(1536),
+    match_threshold float DEFAULT 0.3,
+    match_count int DEFAULT 8,
+    candidate_count int DEFAULT 8,
+    rrf_k int DEFAULT 60,
+    ivfflat_probes int DEFAULT NULL,
+    hnsw_ef_search int DEFAULT NULL
+)
+RETURNS TABLE (
+    id bigint,
+    document_id bigint,
+    chunk_index int,
+    content text,
+    start_offset int,
+    end_offset int,
+    title text,
+    document_type text,
+    similarity float,
+    text_rank float,
+    vector_position int,
+    text_position int,
+    score float,
+    source text
+)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+BEGIN
+    PERFORM set_vector_search_options(ivfflat_probes, hnsw_ef_search);
+    RETURN QUERY
+    WITH query AS (
+        -- Any stemmed word may match; 'simple' reads the lexemes back without stemming them again
+        SELECT to_tsquery('simple', replace(plainto_tsquery('indonesian', query_text)::text, ' & ', ' | ')) AS tsquery
+    ), nearest AS (
+        -- Nearest rows of each table first so the ANN indexes serve each ORDER BY ... LIMIT
+        SELECT candidates.source, candidates.id, candidates.similarity
+        FROM (
+            (SELECT 'document'::text AS source, c.id, 1 - (c.content_embedding <=> query_embedding) AS similarity
+            FROM document_chunks c
+            JOIN documents d ON d.id = c.document_id
+            WHERE d.is_active = true
+            ORDER BY c.content_embedding <=> query_embedding
+            LIMIT candidate_count)
+            UNION ALL
+            (SELECT 'faq'::text, f.id, 1 - (f.content_embedding <=> query_embedding)
+            FROM faq_items f
+            WHERE f.is_active = true
+            ORDER BY f.content_embedding <=> query_embedding
+            LIMIT candidate_count)
+        ) candidates
+        ORDER BY candidates.similarity DESC NULLS LAST
+        LIMIT candidate_count
+    ), vector_hits AS (
+        SELECT n.source, n.id, n.similarity, row_number() OVER (ORDER BY n.similarity DESC) AS vector_position
+        FROM nearest n
+        WHERE n.similarity > match_threshold
+    ), text_hits AS (
+        SELECT ranked.source, ranked.id, ranked.text_rank, row_number() OVER (ORDER BY ranked.text_rank DESC) AS text_position
+        FROM (
+            SELECT candidates.source, candidates.id, candidates.text_rank
+            FROM (
+                (SELECT 'document'::text AS source, c.id, ts_rank_cd(c.search_content, q.tsquery) AS text_rank
+                FROM document_chunks c
+                JOIN documents d ON d.id = c.document_id
+                CROSS JOIN query q
+                WHERE d.is_active = true
+                AND c.search_content @@ q.tsquery
+                ORDER BY text_rank DESC
+                LIMIT candidate_count)
+                UNION ALL
+                (SELECT 'faq'::text, f.id, ts_rank_cd(f.search_content, q.tsquery) AS text_rank
+                FROM faq_items f
+                CROSS JOIN query q
+                WHERE f.is_active = true
+                AND f.search_content @@ q.tsquery
+                ORDER BY text_rank DESC
+                LIMIT candidate_count)
+            ) candidates
+            ORDER BY candidates.text_rank DESC
+            LIMIT candidate_count
+        ) ranked
+    ), fused AS (
+        SELECT
+            coalesce(v.source, t.source) AS source,
+            coalesce(v.id, t.id) AS id,
+            v.similarity,
+            t.text_rank,
+            v.vector_position,
+            t.text_position,
+            coalesce(1.0 / (rrf_k + v.vector_position), 0) + coalesce(1.0 / (rrf_k + t.text_position), 0) AS score
+        FROM vector_hits v
+        FULL OUTER JOIN text_hits t ON t.source = v.source AND t.id = v.id
+    )
+    SELECT
+        f.id,
+        c.document_id,
+        coalesce(c.chunk_index, 0),
+        coalesce(c.content, fi.answer),
+        coalesce(c.start_offset, 0),
+        coalesce(c.end_offset, length(fi.answer)),
+        coalesce(d.title, fi.question, fc.name || ' - ' || fs.name),
+        coalesce(d.document_type, 'faq'),
+        coalesce(f.similarity, 1 - (coalesce(c.content_embedding, fi.content_embedding) <=> query_embedding))::float,
+        f.text_rank::float,
+        f.vector_position::int,
+        f.text_position::int,
+        f.score::float,
+        f.source
+    FROM fused f
+    LEFT JOIN document_chunks c ON f.source = 'document' AND c.id = f.id
+    LEFT JOIN documents d ON d.id = c.document_id
+    LEFT JOIN faq_items fi ON f.source = 'faq' AND fi.id = f.id
+    LEFT JOIN faq_categories fc ON fc.id = fi.category_id
+    LEFT JOIN faq_subcategories fs ON fs.id = fi.subcategory_id
+    ORDER BY f.score DESC
+    LIMIT match_count;
+END;
+$$;
+
+-- Vector index management (manage_vector_indexes.py). Only the embedding
+-- indexes of these tables can be inspected and rebuilt.
+CREATE OR REPLACE FUNCTION vector_index_stats()
+RETURNS TABLE (
+    table_name text,
+    row_count bigint,
+    embedded_count bigint,
+    index_name text,
+    index_method text,
+    index_options text,
+    index_bytes bigint
+)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+DECLARE
+    tbl text;
+BEGIN
+    FOREACH tbl IN ARRAY ARRAY['documents', 'document_chunks', 'faq_items'] LOOP
+        table_name := tbl;
+        index_name := format('idx_%s_embedding', tbl);
+        EXECUTE format('SELECT count(*), count(content_embedding) FROM %I', tbl) INTO row_count, embedded_count;
+        SELECT am.amname::text, array_to_string(c.reloptions, ', '), pg_relation_size(c.oid)
+        INTO index_method, index_options, index_bytes
+        FROM pg_class c
+        JOIN pg_am am ON am.oid = c.relam
+        WHERE c.relname = index_name AND c.relkind = 'i';
+        RETURN NEXT;
+    END LOOP;
+END;
+$$;
+
+-- Drop and recreate one embedding index. index_method 'hnsw' uses m and
+-- ef_construction, 'ivfflat' uses lists (trained on the rows present now, so
+-- rebuild it after the corpus grew). Writes to the table wait until the build
+-- finishes; builds of large tables may need a longer statement_timeout and
+-- more maintenance_work_mem than a PostgREST request has, in which case run
+-- the statement printed by manage_vector_indexes.py --print-sql in psql.
+-- Runs as the table owner; API roles other than service_role cannot call it.
+CREATE OR REPLACE FUNCTION rebuild_vector_index(
+    target_table text,
+    index_method text,
+    lists int DEFAULT NULL,
+    m int DEFAULT 16,
+    ef_construction int DEFAULT 64
+)
+RETURNS text
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    index_name text := format('idx_%s_embedding', target_table);
+    options text;
+BEGIN
+    IF target_table NOT IN ('documents', 'document_chunks', 'faq_items') THEN
+        RAISE EXCEPTION 'no vector index on table %', target_table;
+    END IF;
+    IF index_method = 'hnsw' THEN
+        options := format('m = %s, ef_construction = %s', m, ef_construction);
+    ELSIF index_method = 'ivfflat' AND lists > 0 THEN
+        options := format('lists = %s', lists);
+    ELSE
+        RAISE EXCEPTION 'index_method must be hnsw, or ivfflat with lists > 0';
+    END IF;
+    EXECUTE format('DROP INDEX IF EXISTS %I', index_name);
+    EXECUTE format(
+        'CREATE INDEX %I ON %I USING %s (content_embedding vector_cosine_ops) WITH (%s)',
+        index_name, target_table, index_method, options
+    );
+    RETURN format('%s USING %s (%s)', index_name, index_method, options);
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION rebuild_vector_index(text, text, int, int, int) FROM PUBLIC;
+DO $$
+BEGIN
+    -- Supabase grants new functions to its API roles explicitly
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'anon') THEN
+        REVOKE EXECUTE ON FUNCTION rebuild_vector_index(text, text, int, int, int) FROM anon, authenticated;
+    END IF;
+END;
+$$;
@@ -0,0 +1,63 @@
+"""
+Generate embeddings for the knowledge base.
+
+Runs the batched embedding backfill in the foreground: documents with their
+chunks, then FAQ items. An interrupted run (Ctrl+C, crash) resumes from its
+checkpoint the next time it is started.
+
+Usage:
+    python generate_embeddings.py            # documents without an embedding
+    python generate_embeddings.py --all      # re-embed every document and FAQ item
+    python generate_embeddings.py --no-resume
+"""
+import argparse
+import asyncio
+import logging
+
+from app.core.config import settings
+from app.services.embedding_backfill import embedding_backfill
+
+async def _report_progress(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        progress = embedding_backfill.progress()
+        if progress.get("state") != "running":
+            continue
+        print(
+            f"  {progress['processed']}/{progress['total'] if progress['total'] is not None else '?'} embedded, "
+            f"{progress['failed']} failed, {progress['docs_per_second']} docs/s, "
+            f"concurrency {progress.get('concurrency')}, ETA {progress.get('eta_seconds')}s"
+        )
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--all", action="store_true", help="re-embed every active document and FAQ item, not only missing ones")
+    parser.add_argument("--no-resume", action="store_true", help="ignore the checkpoint of an interrupted run")
+    parser.add_argument("--batch-size", type=int, default=embedding_backfill.batch_size)
+    parser.add_argument("--concurrency", type=int, default=embedding_backfill.concurrency)
+    args = parser.parse_args()
+    settings.validate_settings()
+
+    # force: importing app.services already configured the root logger at INFO
+    logging.basicConfig(level=logging.WARNING, force=True)
+    embedding_backfill.batch_size = args.batch_size
+    embedding_backfill.concurrency = args.concurrency
+
+    reporter = asyncio.create_task(_report_progress(5.0))
+    try:
+        progress = await embedding_backfill.run(mode="all" if args.all else "missing", resume=not args.no_resume)
+    finally:
+        reporter.cancel()
+
+    print(
+        f"Backfill {progress['state']}: {progress['processed']} embedded, {progress['failed']} failed "
+        f"in {progress.get('elapsed_seconds', 0)}s ({progress['requests']} requests, {progress['throttled']} throttled); "
+        f"FAQ items: {progress['faq_processed']} embedded, {progress['faq_failed']} failed"
+    )
+    if progress["failed_ids"]:
+        print(f"Rejected document IDs: {progress['failed_ids']}")
+    if progress["state"] == "incomplete":
+        print("Some batches failed; run again to resume from the checkpoint.")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+"""
+Inspect and rebuild the pgvector indexes of the knowledge base.
+
+Without --apply, prints each vector-indexed table's size, its current
+embedding index and the index planned for it, plus the search settings that
+go with the plan. With --apply, rebuilds the planned indexes through the
+rebuild_vector_index function of database/vector_schema.sql. Rebuilding
+blocks writes to the table while it runs; large tables may outlast a
+PostgREST request, so --print-sql prints the statements to run in psql or
+the SQL editor instead. On Supabase, pass the service role key with --api-key.
+
+ivfflat lists are trained on the rows present when the index is built:
+rebuild ivfflat indexes after the corpus grew or changed a lot.
+
+Usage:
+    python manage_vector_indexes.py                          # inspect, plan HNSW
+    python manage_vector_indexes.py --method ivfflat         # plan ivfflat sized to each table
+    python manage_vector_indexes.py --method hnsw --apply
+    python manage_vector_indexes.py --method ivfflat --table documents --print-sql
+"""
+import argparse
+import asyncio
+import logging
+from typing import List
+
+from app.core.ann_index import VECTOR_INDEX_TABLES, VectorIndexPlan, plan_vector_index
+from app.core.config import settings
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--method", choices=("hnsw", "ivfflat"), default="hnsw")
+    parser.add_argument("--table", action="append", choices=VECTOR_INDEX_TABLES, help="table to plan (repeatable; default all)")
+    parser.add_argument("--lists", type=int, help="ivfflat lists (default: rows / 1000, sqrt(rows) above a million rows)")
+    parser.add_argument("--m", type=int, default=16, help="HNSW connections per node")
+    parser.add_argument("--ef-construction", type=int, default=64, help="HNSW candidate list size while building")
+    parser.add_argument("--apply", action="store_true", help="rebuild the planned indexes now")
+    parser.add_argument("--print-sql", action="store_true", help="print the rebuild statements instead of running them")
+    parser.add_argument("--api-key", help="PostgREST key allowed to rebuild indexes (default SUPABASE_ANON_KEY)")
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds a rebuild request may take")
+    args = parser.parse_args()
+
+    # force: importing app configured the root logger at INFO
+    logging.basicConfig(level=logging.WARNING, force=True)
+    if args.api_key:
+        settings.SUPABASE_ANON_KEY = args.api_key
+    settings.SUPABASE_TIMEOUT = args.timeout
+    # Imported after the settings above: the shared client is built from them on first use
+    from app.db import close_async_supabase_client
+    from app.repositories.document_repository import document_repository
+
+    try:
+        stats = await document_repository.get_vector_index_stats()
+        if stats is None:
+            raise SystemExit("Could not read vector index stats; is database/vector_schema.sql applied?")
+        tables = args.table or list(VECTOR_INDEX_TABLES)
+        plans: List[VectorIndexPlan] = []
+        for row in stats:
+            if row["table_name"] not in tables:
+                continue
+            rows = row["embedded_count"] or 0
+            current = f"{row['index_method']} ({row['index_options']})" if row["index_method"] else "none"
+            plan = plan_vector_index(
+                row["table_name"], rows, method=args.method, lists=args.lists,
+                m=args.m, ef_construction=args.ef_construction, match_count=settings.CHUNK_MATCH_COUNT
+            )
+            plans.append(plan)
+            print(f"{row['table_name']:>16}: {row['row_count']} rows, {rows} embedded; "
+                  f"index {current}, {(row['index_bytes'] or 0) / 2 ** 20:.1f} MiB -> planned {plan.method} ({plan.options()})")
+
+        if plans and args.method == "ivfflat":
+            probes = max(plan.probes for plan in plans)
+            print(f"Search setting for the planned indexes: VECTOR_SEARCH_IVFFLAT_PROBES={probes} "
+                  f"(more probes: better recall, slower queries)")
+        elif plans:
+            print(f"Search setting for the planned indexes: VECTOR_SEARCH_HNSW_EF_SEARCH={plans[0].ef_search} "
+                  f"(more candidates: better recall, slower queries)")
+
+        if args.print_sql:
+            print("\n" + "\n".join(plan.sql() for plan in plans))
+        elif args.apply:
+            for plan in plans:
+                print(f"Rebuilt {await document_repository.rebuild_vector_index(plan)}")
+    finally:
+        await close_async_supabase_client()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,177 @@
+"""
+Production server: several uvicorn workers sharing state built before they fork.
+
+The master process imports the app and builds its read-only state once
+(app.main.preload_state: tokenizer, compiled intents, FAQ catalogue and, with
+LOCAL_VECTOR_INDEX_ENABLED, the document vector index), moves it out of the
+garbage collector's reach and forks the workers, so those pages stay shared
+copy-on-write instead of being built and held once per worker. Workers accept
+connections from one shared socket and open their own OpenAI and database
+connections on first use; their lifespan refresh loops then only fetch what
+changed since the preload. A worker that exits unexpectedly is replaced.
+Workers share their metrics through METRICS_MULTIPROCESS_DIR (a temporary
+directory by default), so /metrics reports all of them whichever answers.
+With more than one worker, a session's history kept in memory is checked
+against chat_messages before use, since another worker may have answered
+the conversation's last turn.
+
+SIGTERM or Ctrl+C drains the workers: they stop accepting connections, give
+in-flight requests and streams up to API_GRACEFUL_SHUTDOWN_SECONDS, store the
+pending chat messages and exit. A second signal stops them without waiting.
+Needs os.fork (Linux, macOS); run.py remains the development server.
+
+Usage:
+    python serve.py                          # API_WORKERS workers, 0 for one per CPU
+    python serve.py --workers 4 --host 0.0.0.0 --port 8000
+"""
+import argparse
+import asyncio
+import gc
+import glob
+import logging
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import time
+from typing import Dict
+
+import uvicorn
+
+from app.core.config import settings
+
+logger = logging.getLogger("serve")
+
+def _bind(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def _share_metrics() -> str:
+    """Point the metrics registry at an empty shared directory; returns it"""
+    from app.core.metrics import metrics
+
+    directory = settings.METRICS_MULTIPROCESS_DIR or tempfile.mkdtemp(prefix="chatbot-metrics-")
+    os.makedirs(directory, exist_ok=True)
+    # Values of a previous run are not this one's
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        os.remove(path)
+    metrics.directory = directory
+    return directory
+
+def _spawn(app, sock: socket.socket, args) -> int:
+    """Fork a worker serving app on sock; returns its pid"""
+    pid = os.fork()
+    if pid:
+        return pid
+    code = 0
+    try:
+        # Own process group: a terminal Ctrl+C reaches the master, which forwards one SIGTERM
+        os.setpgid(0, 0)
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, signal.SIG_DFL)
+        config = uvicorn.Config(
+            app,
+            log_level=args.log_level,
+            access_log=args.access_log,
+            timeout_graceful_shutdown=settings.API_GRACEFUL_SHUTDOWN_SECONDS,
+            timeout_keep_alive=args.keep_alive
+        )
+        uvicorn.Server(config).run(sockets=[sock])
+    except BaseException as e:
+        logger.error(f"Worker {os.getpid()} failed: {e}")
+        code = 1
+    finally:
+        logging.shutdown()
+        os._exit(code)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=settings.API_WORKERS, help="worker processes (0: one per CPU)")
+    parser.add_argument("--host", default=settings.API_HOST)
+    parser.add_argument("--port", type=int, default=settings.API_PORT)
+    parser.add_argument("--backlog", type=int, default=2048, help="pending connections the socket queues")
+    parser.add_argument("--keep-alive", type=int, default=5, help="seconds an idle HTTP connection is kept open")
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--access-log", action="store_true", help="log every request")
+    args = parser.parse_args()
+    if not hasattr(os, "fork"):
+        raise SystemExit("serve.py needs os.fork; use run.py on this platform")
+    workers = args.workers if args.workers > 0 else os.cpu_count() or 1
+
+    try:
+        settings.validate_settings()
+    except ValueError as e:
+        raise SystemExit(f"Invalid configuration: {e}")
+
+    from app.main import app, preload_state
+    from app.services.session_store import session_store
+
+    start = time.perf_counter()
+    asyncio.run(preload_state())
+    logger.info(f"Preloaded shared state in {(time.perf_counter() - start) * 1000:.0f}ms")
+    metrics_directory = _share_metrics()
+    # Any worker may answer the next turn of a conversation
+    session_store.shared = session_store.shared or workers > 1
+    sock = _bind(args.host, args.port, args.backlog)
+    # Objects built so far are never collected, so the collector does not write to their shared pages
+    gc.collect()
+    gc.freeze()
+
+    children: Dict[int, float] = {}
+    signals = 0
+
+    def stop(signum, frame) -> None:
+        nonlocal signals
+        signals += 1
+        logger.info(f"{'Draining' if signals == 1 else 'Stopping'} {len(children)} workers")
+        for pid in children:
+            try:
+                # uvicorn drains on the first signal and exits at once on the second
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        children[_spawn(app, sock, args)] = time.monotonic()
+    logger.info(f"Serving on http://{args.host}:{args.port} with {workers} workers (master pid {os.getpid()})")
+
+    deadline = None
+    while children:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            if signals and deadline is None:
+                # Lifespan shutdown (message buffer flush) runs after the graceful period
+                deadline = time.monotonic() + settings.API_GRACEFUL_SHUTDOWN_SECONDS + 30
+            if deadline is not None and time.monotonic() > deadline:
+                logger.error(f"Killing {len(children)} workers that did not stop in time")
+                for pid in children:
+                    os.kill(pid, signal.SIGKILL)
+                deadline = float("inf")
+            time.sleep(0.2)
+            continue
+        started = children.pop(pid, None)
+        if signals or started is None:
+            continue
+        logger.warning(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, starting a new one")
+        if time.monotonic() - started < 5:
+            # Failing at startup: do not respawn in a tight loop
+            time.sleep(5)
+        children[_spawn(app, sock, args)] = time.monotonic()
+    sock.close()
+    if not settings.METRICS_MULTIPROCESS_DIR:
+        shutil.rmtree(metrics_directory, ignore_errors=True)
+    logger.info("All workers stopped")
+
+if __name__ == "__main__":
+    main()
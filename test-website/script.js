@@ -2,6 +2,8 @@ class ChatbotInterface {
     constructor() {
         this.apiUrl = 'http://127.0.0.1:8000';
         this.conversationHistory = [];
+        // The server keeps the history of this conversation; only new messages are sent
+        this.conversationId = null;
         this.initializeElements();
     this.checkApiStatus();
     }
@@ -55,19 +57,24 @@ class ChatbotInterface {
 
     // Removed auto initial conversation to avoid sending 'start' that triggers refusal
 
-    addMessage(sender, content, showNumberOptions = false) {
+    createMessageElement(sender) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `message ${sender}`;
         
         const contentDiv = document.createElement('div');
         contentDiv.className = 'message-content';
-        contentDiv.textContent = content;
         
         messageDiv.appendChild(contentDiv);
+        this.messagesContainer.appendChild(messageDiv);
+        return contentDiv;
+    }
+
+    addMessage(sender, content, showNumberOptions = false) {
+        const contentDiv = this.createMessageElement(sender);
+        contentDiv.textContent = content;
 
         // Disabled number options UI to avoid random expansions
 
-        this.messagesContainer.appendChild(messageDiv);
         this.scrollToBottom();
 
         // Add to conversation history
@@ -112,42 +119,89 @@ class ChatbotInterface {
         this.showTyping();
         this.sendButton.disabled = true;
 
+        let contentDiv = null;
+        let answer = '';
+
         try {
-            const response = await fetch(`${this.apiUrl}/api/v1/chat/`, {
+            const response = await fetch(`${this.apiUrl}/api/v1/chat/stream`, {
                 method: 'POST',
                 mode: 'cors',
                 credentials: 'omit',
                 headers: {
                     'Content-Type': 'application/json',
+                    'Accept': 'text/event-stream',
                 },
                 body: JSON.stringify({
                     message: message,
-                    conversation_history: this.conversationHistory
+                    conversation_id: this.conversationId
                 })
             });
 
-            if (!response.ok) {
+            if (!response.ok || !response.body) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
 
-            const data = await response.json();
-            
-            // Simulate typing delay
-            setTimeout(() => {
-                this.hideTyping();
-                
-                // Always render plain text without clickable options
-                this.addMessage('bot', data.response, false);
-                this.sendButton.disabled = false;
-            }, 1000 + Math.random() * 1000); // 1-2 second delay
+            for await (const { event, data } of this.readEvents(response.body)) {
+                if (event === 'meta') {
+                    this.conversationId = data.conversation_id;
+                } else if (event === 'delta') {
+                    if (!contentDiv) {
+                        this.hideTyping();
+                        contentDiv = this.createMessageElement('bot');
+                    }
+                    answer += data.text;
+                    contentDiv.textContent = answer;
+                    this.scrollToBottom();
+                } else if (event === 'error') {
+                    throw new Error(data.detail);
+                }
+            }
+
+            this.hideTyping();
+            if (!contentDiv) {
+                throw new Error('Empty response');
+            }
+            this.conversationHistory.push({
+                role: 'assistant',
+                content: answer,
+                timestamp: new Date().toISOString()
+            });
 
         } catch (error) {
             console.error('Error sending message:', error);
             this.hideTyping();
             this.addMessage('bot', 'Sorry, I encountered an error. Please try again.');
+        } finally {
             this.sendButton.disabled = false;
         }
     }
+
+    // Parse a Server-Sent Events body into {event, data} objects
+    async *readEvents(body) {
+        const reader = body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let event = 'message';
+                let data = '';
+                for (const line of rawEvent.split('\n')) {
+                    if (line.startsWith('event:')) event = line.slice(6).trim();
+                    else if (line.startsWith('data:')) data += line.slice(5).trim();
+                }
+                if (data) yield { event, data: JSON.parse(data) };
+            }
+        }
+    }
 }
 
 // Initialize the chatbot interface when the page loads
@@ -0,0 +1,38 @@
+import asyncio
+import logging
+import signal
+
+from app.core.config import settings
+from app.core.openai_client import close_openai_client
+from app.db import close_async_supabase_client
+from app.services.embedding_worker import embedding_worker
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    force=True
+)
+logger = logging.getLogger(__name__)
+
+async def main():
+    """Process queued embedding jobs until interrupted"""
+    settings.validate_settings()
+    task = asyncio.create_task(embedding_worker.run())
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, task.cancel)
+        except NotImplementedError:
+            # Windows: Ctrl+C still raises KeyboardInterrupt
+            pass
+    try:
+        await task
+    except asyncio.CancelledError:
+        # Claimed jobs that were not finished are picked up again once their lease expires
+        logger.info(f"Embedding worker stopped: {embedding_worker.stats()}")
+    finally:
+        await close_openai_client()
+        await close_async_supabase_client()
+
+if __name__ == "__main__":
+    asyncio.run(main())